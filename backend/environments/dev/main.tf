@@ -4,6 +4,10 @@
 locals {
   project_name = "transaction-monitor"
   environment  = "dev"
+
+  # Shared by the storage and lambda modules: the archive lifecycle depends on both
+  transaction_retention_days = 0
+  compaction_layer_arn       = ""
 }
 
 # ==============================
@@ -14,6 +18,9 @@ module "storage" {
 
   project_name = local.project_name
   environment  = local.environment
+
+  transaction_retention_days = local.transaction_retention_days
+  compaction_enabled         = local.compaction_layer_arn != ""
 }
 
 # ==============================
@@ -42,4 +49,6 @@ module "lambda" {
   dynamodb_table_arn          = module.storage.transactions_table_arn
   user_profiles_table_name    = module.storage.user_profiles_table_name
   user_profiles_table_arn     = module.storage.user_profiles_table_arn
+  transaction_retention_days  = local.transaction_retention_days
+  compaction_layer_arn        = local.compaction_layer_arn
 }
@@ -43,6 +43,11 @@ output "login_url" {
   value       = "${module.api_gateway.api_gateway_url}/login"
 }
 
+output "change_feed_url" {
+  description = "WebSocket URL of the real-time change feed"
+  value       = module.lambda.change_feed_url
+}
+
 output "frontend_config" {
   value = {
   region                      = var.aws_region
@@ -0,0 +1,98 @@
+# ======================================================
+# TRANSACTIONS BATCH ENDPOINT (POST - Protected by Cognito)
+# ======================================================
+resource "aws_api_gateway_resource" "transactions_batch_resource" {
+  rest_api_id = aws_api_gateway_rest_api.transaction_api.id
+  parent_id   = aws_api_gateway_resource.transactions_resource.id
+  path_part   = "batch"
+}
+
+resource "aws_api_gateway_method" "transactions_batch_post" {
+  rest_api_id   = aws_api_gateway_rest_api.transaction_api.id
+  resource_id   = aws_api_gateway_resource.transactions_batch_resource.id
+  http_method   = "POST"
+  authorization = "COGNITO_USER_POOLS"
+  authorizer_id = aws_api_gateway_authorizer.cognito_authorizer.id
+}
+
+resource "aws_api_gateway_method" "transactions_batch_options" {
+  rest_api_id   = aws_api_gateway_rest_api.transaction_api.id
+  resource_id   = aws_api_gateway_resource.transactions_batch_resource.id
+  http_method   = "OPTIONS"
+  authorization = "NONE"
+}
+
+resource "aws_api_gateway_integration" "transactions_batch_integration" {
+  rest_api_id             = aws_api_gateway_rest_api.transaction_api.id
+  resource_id             = aws_api_gateway_resource.transactions_batch_resource.id
+  http_method             = aws_api_gateway_method.transactions_batch_post.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = var.lambda_invoke_arn
+}
+
+resource "aws_api_gateway_integration" "transactions_batch_options_integration" {
+  rest_api_id   = aws_api_gateway_rest_api.transaction_api.id
+  resource_id   = aws_api_gateway_resource.transactions_batch_resource.id
+  http_method   = aws_api_gateway_method.transactions_batch_options.http_method
+  type          = "MOCK"
+
+  # With */* as a binary media type the template would otherwise be skipped
+  content_handling = "CONVERT_TO_TEXT"
+
+  request_templates = {
+    "application/json" = "{\"statusCode\": 200}"
+  }
+}
+
+resource "aws_api_gateway_method_response" "transactions_batch_post_response_200" {
+  rest_api_id = aws_api_gateway_rest_api.transaction_api.id
+  resource_id = aws_api_gateway_resource.transactions_batch_resource.id
+  http_method = aws_api_gateway_method.transactions_batch_post.http_method
+  status_code = "200"
+
+  response_parameters = {
+    "method.response.header.Access-Control-Allow-Origin" = true
+  }
+}
+
+resource "aws_api_gateway_method_response" "transactions_batch_options_response_200" {
+  rest_api_id = aws_api_gateway_rest_api.transaction_api.id
+  resource_id = aws_api_gateway_resource.transactions_batch_resource.id
+  http_method = aws_api_gateway_method.transactions_batch_options.http_method
+  status_code = "200"
+
+  response_parameters = {
+    "method.response.header.Access-Control-Allow-Origin"  = true
+    "method.response.header.Access-Control-Allow-Headers" = true
+    "method.response.header.Access-Control-Allow-Methods" = true
+  }
+}
+
+resource "aws_api_gateway_integration_response" "transactions_batch_post_integration_response" {
+  rest_api_id = aws_api_gateway_rest_api.transaction_api.id
+  resource_id = aws_api_gateway_resource.transactions_batch_resource.id
+  http_method = aws_api_gateway_method.transactions_batch_post.http_method
+  status_code = aws_api_gateway_method_response.transactions_batch_post_response_200.status_code
+
+  response_parameters = {
+    "method.response.header.Access-Control-Allow-Origin" = "'${var.cors_allowed_origin}'"
+  }
+
+  depends_on = [aws_api_gateway_integration.transactions_batch_integration]
+}
+
+resource "aws_api_gateway_integration_response" "transactions_batch_options_integration_response" {
+  rest_api_id  = aws_api_gateway_rest_api.transaction_api.id
+  resource_id  = aws_api_gateway_resource.transactions_batch_resource.id
+  http_method  = aws_api_gateway_method.transactions_batch_options.http_method
+  status_code  = aws_api_gateway_method_response.transactions_batch_options_response_200.status_code
+
+  response_parameters = {
+    "method.response.header.Access-Control-Allow-Origin"  = "'${var.cors_allowed_origin}'"
+    "method.response.header.Access-Control-Allow-Headers" = "'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,Idempotency-Key'"
+    "method.response.header.Access-Control-Allow-Methods" = "'POST,OPTIONS'"
+  }
+
+  depends_on = [aws_api_gateway_integration.transactions_batch_options_integration]
+}
@@ -0,0 +1,97 @@
+# ======================================================
+# FX RATES ENDPOINT (GET - Public)
+# ======================================================
+resource "aws_api_gateway_resource" "fx_rates_resource" {
+  rest_api_id = aws_api_gateway_rest_api.transaction_api.id
+  parent_id   = aws_api_gateway_rest_api.transaction_api.root_resource_id
+  path_part   = "fx-rates"
+}
+
+resource "aws_api_gateway_method" "fx_rates_get" {
+  rest_api_id   = aws_api_gateway_rest_api.transaction_api.id
+  resource_id   = aws_api_gateway_resource.fx_rates_resource.id
+  http_method   = "GET"
+  authorization = "NONE"
+}
+
+resource "aws_api_gateway_method" "fx_rates_options" {
+  rest_api_id   = aws_api_gateway_rest_api.transaction_api.id
+  resource_id   = aws_api_gateway_resource.fx_rates_resource.id
+  http_method   = "OPTIONS"
+  authorization = "NONE"
+}
+
+resource "aws_api_gateway_integration" "fx_rates_integration" {
+  rest_api_id             = aws_api_gateway_rest_api.transaction_api.id
+  resource_id             = aws_api_gateway_resource.fx_rates_resource.id
+  http_method             = aws_api_gateway_method.fx_rates_get.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = var.lambda_invoke_arn
+}
+
+resource "aws_api_gateway_integration" "fx_rates_options_integration" {
+  rest_api_id   = aws_api_gateway_rest_api.transaction_api.id
+  resource_id   = aws_api_gateway_resource.fx_rates_resource.id
+  http_method   = aws_api_gateway_method.fx_rates_options.http_method
+  type          = "MOCK"
+
+  # With */* as a binary media type the template would otherwise be skipped
+  content_handling = "CONVERT_TO_TEXT"
+
+  request_templates = {
+    "application/json" = "{\"statusCode\": 200}"
+  }
+}
+
+resource "aws_api_gateway_method_response" "fx_rates_get_response_200" {
+  rest_api_id = aws_api_gateway_rest_api.transaction_api.id
+  resource_id = aws_api_gateway_resource.fx_rates_resource.id
+  http_method = aws_api_gateway_method.fx_rates_get.http_method
+  status_code = "200"
+
+  response_parameters = {
+    "method.response.header.Access-Control-Allow-Origin" = true
+  }
+}
+
+resource "aws_api_gateway_method_response" "fx_rates_options_response_200" {
+  rest_api_id = aws_api_gateway_rest_api.transaction_api.id
+  resource_id = aws_api_gateway_resource.fx_rates_resource.id
+  http_method = aws_api_gateway_method.fx_rates_options.http_method
+  status_code = "200"
+
+  response_parameters = {
+    "method.response.header.Access-Control-Allow-Origin"  = true
+    "method.response.header.Access-Control-Allow-Headers" = true
+    "method.response.header.Access-Control-Allow-Methods" = true
+  }
+}
+
+resource "aws_api_gateway_integration_response" "fx_rates_get_integration_response" {
+  rest_api_id = aws_api_gateway_rest_api.transaction_api.id
+  resource_id = aws_api_gateway_resource.fx_rates_resource.id
+  http_method = aws_api_gateway_method.fx_rates_get.http_method
+  status_code = aws_api_gateway_method_response.fx_rates_get_response_200.status_code
+
+  response_parameters = {
+    "method.response.header.Access-Control-Allow-Origin" = "'${var.cors_allowed_origin}'"
+  }
+
+  depends_on = [aws_api_gateway_integration.fx_rates_integration]
+}
+
+resource "aws_api_gateway_integration_response" "fx_rates_options_integration_response" {
+  rest_api_id  = aws_api_gateway_rest_api.transaction_api.id
+  resource_id  = aws_api_gateway_resource.fx_rates_resource.id
+  http_method  = aws_api_gateway_method.fx_rates_options.http_method
+  status_code  = aws_api_gateway_method_response.fx_rates_options_response_200.status_code
+
+  response_parameters = {
+    "method.response.header.Access-Control-Allow-Origin"  = "'${var.cors_allowed_origin}'"
+    "method.response.header.Access-Control-Allow-Headers" = "'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'"
+    "method.response.header.Access-Control-Allow-Methods" = "'GET,OPTIONS'"
+  }
+
+  depends_on = [aws_api_gateway_integration.fx_rates_options_integration]
+}
\ No newline at end of file
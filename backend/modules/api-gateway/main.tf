@@ -7,6 +7,9 @@ resource "aws_api_gateway_rest_api" "transaction_api" {
   name        = "${var.project_name}-api-${var.environment}"
   description = "Transaction monitoring API"
 
+  # Lets the function return gzipped bodies (isBase64Encoded); request bodies then arrive base64-encoded
+  binary_media_types = ["*/*"]
+
   endpoint_configuration {
     types = ["REGIONAL"]
   }
@@ -51,6 +54,9 @@ resource "aws_api_gateway_integration" "transaction_options_integration" {
   http_method   = aws_api_gateway_method.transaction_options.http_method
   type          = "MOCK"
 
+  # With */* as a binary media type the template would otherwise be skipped
+  content_handling = "CONVERT_TO_TEXT"
+
   request_templates = {
     "application/json" = "{\"statusCode\": 200}"
   }
@@ -151,7 +157,7 @@ resource "aws_api_gateway_integration_response" "transaction_options_integration
 
   response_parameters = {
     "method.response.header.Access-Control-Allow-Origin"  = "'${var.cors_allowed_origin}'"
-    "method.response.header.Access-Control-Allow-Headers" = "'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'"
+    "method.response.header.Access-Control-Allow-Headers" = "'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,Idempotency-Key'"
     "method.response.header.Access-Control-Allow-Methods" = "'GET,POST,PUT,DELETE,OPTIONS'"
   }
 
@@ -219,6 +225,8 @@ resource "aws_api_gateway_integration" "signup_options_integration" {
   resource_id   = aws_api_gateway_resource.signup_resource.id
   http_method   = aws_api_gateway_method.signup_options.http_method
   type          = "MOCK"
+
+  content_handling = "CONVERT_TO_TEXT"
   request_templates = {
     "application/json" = "{\"statusCode\": 200}"
   }
@@ -313,6 +321,8 @@ resource "aws_api_gateway_integration" "login_options_integration" {
   resource_id   = aws_api_gateway_resource.login_resource.id
   http_method   = aws_api_gateway_method.login_options.http_method
   type          = "MOCK"
+
+  content_handling = "CONVERT_TO_TEXT"
   request_templates = {
     "application/json" = "{\"statusCode\": 200}"
   }
@@ -401,6 +411,8 @@ resource "aws_api_gateway_integration" "user_profile_options_integration" {
   resource_id   = aws_api_gateway_resource.user_profile_resource.id
   http_method   = aws_api_gateway_method.user_profile_options.http_method
   type          = "MOCK"
+
+  content_handling = "CONVERT_TO_TEXT"
   request_templates = {
     "application/json" = "{\"statusCode\": 200}"
   }
@@ -533,6 +545,18 @@ resource "aws_api_gateway_deployment" "api_deployment" {
     aws_api_gateway_integration.transactions_options_integration,
     aws_api_gateway_integration_response.transactions_get_integration_response,
     aws_api_gateway_integration_response.transactions_options_integration_response,
+    aws_api_gateway_integration.transactions_batch_integration,
+    aws_api_gateway_integration.transactions_batch_options_integration,
+    aws_api_gateway_integration_response.transactions_batch_post_integration_response,
+    aws_api_gateway_integration_response.transactions_batch_options_integration_response,
+    aws_api_gateway_integration.transactions_export_integration,
+    aws_api_gateway_integration.transactions_export_options_integration,
+    aws_api_gateway_integration_response.transactions_export_post_integration_response,
+    aws_api_gateway_integration_response.transactions_export_options_integration_response,
+    aws_api_gateway_integration.analytics_integration,
+    aws_api_gateway_integration.analytics_options_integration,
+    aws_api_gateway_integration_response.analytics_get_integration_response,
+    aws_api_gateway_integration_response.analytics_options_integration_response,
     aws_api_gateway_integration.user_profile_get_integration,
     aws_api_gateway_integration.user_profile_put_integration,
     aws_api_gateway_integration.user_profile_options_integration,
@@ -561,6 +585,18 @@ resource "aws_api_gateway_deployment" "api_deployment" {
       aws_api_gateway_integration.transaction_integration.id,
       aws_api_gateway_integration.transaction_options_integration.id,
       aws_api_gateway_integration_response.transaction_options_integration_response.id,
+      aws_api_gateway_resource.transactions_batch_resource.id,
+      aws_api_gateway_method.transactions_batch_post.id,
+      aws_api_gateway_integration.transactions_batch_integration.id,
+      aws_api_gateway_integration_response.transactions_batch_options_integration_response.id,
+      aws_api_gateway_resource.transactions_export_resource.id,
+      aws_api_gateway_method.transactions_export_post.id,
+      aws_api_gateway_integration.transactions_export_integration.id,
+      aws_api_gateway_integration_response.transactions_export_options_integration_response.id,
+      aws_api_gateway_resource.analytics_resource.id,
+      aws_api_gateway_method.analytics_get.id,
+      aws_api_gateway_integration.analytics_integration.id,
+      aws_api_gateway_integration_response.analytics_options_integration_response.id,
       aws_api_gateway_resource.user_profile_resource.id,
       aws_api_gateway_method.user_profile_get.id,
       aws_api_gateway_method.user_profile_put.id,
@@ -575,6 +611,11 @@ resource "aws_api_gateway_deployment" "api_deployment" {
       aws_api_gateway_method.login_post.id,
       aws_api_gateway_integration.login_integration.id,
       aws_api_gateway_integration_response.login_options_integration_response.id,
+      aws_api_gateway_resource.fx_rates_resource.id,
+      aws_api_gateway_method.fx_rates_get.id,
+      aws_api_gateway_integration.fx_rates_integration.id,
+      aws_api_gateway_integration_response.fx_rates_options_integration_response.id,
+      aws_api_gateway_rest_api.transaction_api.binary_media_types,
       var.cors_allowed_origin
     ]))
   }
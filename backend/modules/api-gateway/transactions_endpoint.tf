@@ -37,6 +37,9 @@ resource "aws_api_gateway_integration" "transactions_options_integration" {
   http_method   = aws_api_gateway_method.transactions_options.http_method
   type          = "MOCK"
 
+  # With */* as a binary media type the template would otherwise be skipped
+  content_handling = "CONVERT_TO_TEXT"
+
   request_templates = {
     "application/json" = "{\"statusCode\": 200}"
   }
@@ -0,0 +1,317 @@
+"""Coalesced, rate-limited high-risk alerts.
+
+AlertAggregator buffers flagged transactions per user. The first alert in a
+quiet period goes out on the next flush so reviewers hear about it right
+away; anything else flagged for that user within window_seconds is held and
+sent as one digest when the window closes. Redelivered transactions are
+dropped by transaction_id. Every published message takes a token from a
+per-topic TokenBucket; when the bucket is empty digests stay buffered and
+merge with later alerts instead of being sent.
+
+The buffer lives in the warm container. With a store (TableWindows), every
+window still holding alerts after a flush is also written to DynamoDB with
+the wall-clock time it is due. sweep(), run on a schedule, publishes the
+saved windows that are overdue, so a digest held by a container that gets
+no more traffic, or is recycled, still goes out. Whoever publishes a saved
+window first claims it with a conditional delete, so the container and the
+sweeper never both send it. Without a store, a digest still pending when the
+container is recycled is lost; the transactions themselves stay flagged in
+DynamoDB, so reviewers can still find them.
+"""
+import json
+import logging
+import time
+import uuid
+
+import encoding
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_SECONDS = 60
+DEFAULT_MAX_DIGEST_ITEMS = 50
+DEFAULT_MAX_PENDING = 500
+SNS_BATCH_LIMIT = 10
+DEFAULT_WINDOW_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_SWEEP_GRACE_SECONDS = 60
+
+class TokenBucket:
+    """rate tokens per second, holding at most capacity"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self._clock = clock
+        self._updated = clock()
+
+    def take(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+def format_alert(record):
+    matched = record.get('blocked_merchant') or record.get('merchant_keyword') or 'none'
+    factors = ', '.join(record.get('risk_factors') or []) or 'none'
+    message = f"""
+🚨 HIGH RISK TRANSACTION DETECTED
+
+Transaction ID: {record.get('transaction_id')}
+Amount: {record.get('currency', 'USD')} {record.get('amount')}
+Merchant: {record.get('merchant')}
+Risk Score: {float(record.get('risk_score', 0))}/100
+Matched Keyword: {matched}
+Risk Factors: {factors}
+Rules Version: {record.get('rules_version', 'unknown')}
+Status: {record.get('status', 'flagged').upper()}
+User: {record.get('user_id', 'unknown')}
+Time: {record.get('timestamp')}
+
+⚠️ This transaction requires immediate review.
+    """.strip()
+    return f"🚨 High Risk Transaction Alert - Risk Score: {float(record.get('risk_score', 0))}", message
+
+def format_digest(user_id, records, max_items=DEFAULT_MAX_DIGEST_ITEMS):
+    """One message for several flagged transactions; identical charges are folded into one line"""
+    groups = {}
+    for record in records:
+        key = (record.get('merchant'), record.get('currency', 'USD'), str(record.get('amount')))
+        groups.setdefault(key, []).append(record)
+    lines = []
+    for (merchant, currency, amount), group in list(groups.items())[:max_items]:
+        risk = max(float(r.get('risk_score', 0)) for r in group)
+        repeat = f" x{len(group)}" if len(group) > 1 else ''
+        lines.append(f"- {currency} {amount} at {merchant}{repeat} (risk {risk}, first {group[0].get('transaction_id')})")
+    if len(groups) > max_items:
+        lines.append(f"... and {len(groups) - max_items} more")
+    message = f"""
+🚨 HIGH RISK TRANSACTIONS DETECTED
+
+User: {user_id}
+Flagged transactions: {len(records)}
+From: {records[0].get('timestamp')}
+To: {records[-1].get('timestamp')}
+
+{chr(10).join(lines)}
+
+⚠️ These transactions require immediate review.
+    """.strip()
+    return f"🚨 High Risk Alert Digest - {len(records)} flagged", message
+
+def format_window(user_id, records, max_items=DEFAULT_MAX_DIGEST_ITEMS):
+    if len(records) == 1:
+        return format_alert(records[0])
+    return format_digest(user_id, records, max_items)
+
+class TableWindows:
+    """Held alert windows: one item per (user_id, window_id), with a TTL"""
+
+    def __init__(self, table, conditions, ttl=DEFAULT_WINDOW_TTL_SECONDS):
+        self.table = table
+        self.conditions = conditions
+        self.ttl = ttl
+
+    def save(self, user_id, window_id, due_at, records, now=None):
+        now = int(now if now is not None else time.time())
+        # Records as one JSON string: Decimals from DynamoDB and floats from queue messages alike
+        self.table.put_item(Item={'user_id': user_id, 'window_id': window_id, 'due_at': int(due_at),
+                                  'records': encoding.dumps(records), 'expires_at': now + self.ttl})
+
+    def claim(self, user_id, window_id):
+        """Delete a saved window before publishing it; False if someone else already has"""
+        try:
+            self.table.delete_item(Key={'user_id': user_id, 'window_id': window_id},
+                                   ConditionExpression=self.conditions.Attr('window_id').exists())
+            return True
+        except Exception as e:
+            # botocore ClientError; matched by code so botocore isn't imported up front
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+            return False
+
+    def due(self, cutoff):
+        """[(user_id, window_id, records), ...] for saved windows due at or before cutoff"""
+        kwargs = {'FilterExpression': self.conditions.Attr('due_at').lte(int(cutoff))}
+        found = []
+        while True:
+            response = self.table.scan(**kwargs)
+            for item in response.get('Items', []):
+                found.append((item['user_id'], item['window_id'], json.loads(item['records'])))
+            if 'LastEvaluatedKey' not in response:
+                return found
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def sweep(store, publisher, grace_seconds=DEFAULT_SWEEP_GRACE_SECONDS, max_digest_items=DEFAULT_MAX_DIGEST_ITEMS,
+          now=None):
+    """Publish saved windows overdue by more than grace_seconds; returns messages sent.
+
+    The grace period leaves a window to the container holding it while that
+    container is still flushing on its own traffic. A window that fails to
+    publish is saved again for the next sweep.
+    """
+    now = now if now is not None else time.time()
+    cutoff = now - grace_seconds
+    entries = []
+    for user_id, window_id, records in store.due(cutoff):
+        if not records or not store.claim(user_id, window_id):
+            continue
+        subject, message = format_window(user_id, records, max_digest_items)
+        entry = {'Id': str(len(entries)), 'Subject': subject, 'Message': message}
+        entries.append(((user_id, window_id, records), entry))
+
+    sent = 0
+    for start in range(0, len(entries), SNS_BATCH_LIMIT):
+        chunk = entries[start:start + SNS_BATCH_LIMIT]
+        try:
+            failed = publisher([entry for _, entry in chunk])
+        except Exception as e:
+            logger.error(f"Failed to publish swept alert digests: {str(e)}")
+            failed = {entry['Id'] for _, entry in chunk}
+        for (user_id, window_id, records), entry in chunk:
+            if entry['Id'] in failed:
+                # Still overdue, so the next sweep retries it
+                store.save(user_id, window_id, cutoff, records)
+            else:
+                sent += 1
+    if entries:
+        logger.info(f"Alert sweep: {sent} of {len(entries)} overdue digests delivered")
+    return sent
+
+class AlertAggregator:
+    """Per-user alert windows in front of a publisher.
+
+    publisher(entries) receives up to SNS_BATCH_LIMIT dicts with Id, Subject
+    and Message and returns the set of Ids that failed. store, if given, is a
+    TableWindows that holds windows across containers (see the module
+    docstring).
+    """
+
+    def __init__(self, publisher, window_seconds=DEFAULT_WINDOW_SECONDS, bucket=None,
+                 max_digest_items=DEFAULT_MAX_DIGEST_ITEMS, max_pending=DEFAULT_MAX_PENDING, clock=time.monotonic,
+                 store=None, wall_clock=time.time):
+        self.publisher = publisher
+        self.window_seconds = window_seconds
+        self.bucket = bucket
+        self.max_digest_items = max_digest_items
+        self.max_pending = max_pending
+        self.store = store
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._windows = {}
+        self.stats = {
+            'delivered_alerts': 0, 'delivered_messages': 0, 'suppressed_duplicates': 0,
+            'suppressed_overflow': 0, 'rate_limited': 0, 'publish_failures': 0, 'taken_by_sweep': 0
+        }
+
+    def _open(self, now, immediate):
+        # saved: ids of the records last written to the store
+        return {'id': uuid.uuid4().hex, 'opened': now, 'records': [], 'ids': set(), 'immediate': immediate,
+                'saved': set(), 'dirty': False}
+
+    def pending(self):
+        return sum(len(window['records']) for window in self._windows.values())
+
+    def add(self, record):
+        user_id = record.get('user_id', 'unknown')
+        now = self._clock()
+        window = self._windows.get(user_id)
+        if window is None or (not window['records'] and now - window['opened'] >= self.window_seconds):
+            window = self._open(now, immediate=True)
+            self._windows[user_id] = window
+        transaction_id = record.get('transaction_id')
+        if transaction_id in window['ids']:
+            self.stats['suppressed_duplicates'] += 1
+            return
+        window['ids'].add(transaction_id)
+        window['records'].append(record)
+        window['dirty'] = True
+        if len(window['records']) > self.max_pending:
+            window['records'].pop(0)
+            self.stats['suppressed_overflow'] += 1
+
+    def flush(self, force=False):
+        """Publish every window that is due (or all of them with force); returns messages sent"""
+        now = self._clock()
+        ready = []
+        for user_id, window in list(self._windows.items()):
+            expired = now - window['opened'] >= self.window_seconds
+            if window['records'] and (force or window['immediate'] or expired):
+                ready.append(user_id)
+            elif not window['records'] and expired:
+                del self._windows[user_id]
+
+        entries = []
+        for user_id in ready:
+            if self.bucket and not self.bucket.take():
+                self.stats['rate_limited'] += 1
+                continue
+            window = self._windows[user_id]
+            if window['saved'] and not self._claim(user_id, window, now):
+                continue
+            subject, message = format_window(user_id, window['records'], self.max_digest_items)
+            entries.append((user_id, {'Id': str(len(entries)), 'Subject': subject, 'Message': message}))
+
+        sent = 0
+        for start in range(0, len(entries), SNS_BATCH_LIMIT):
+            chunk = entries[start:start + SNS_BATCH_LIMIT]
+            try:
+                failed = self.publisher([entry for _, entry in chunk])
+            except Exception as e:
+                logger.error(f"Failed to publish alert digests: {str(e)}")
+                failed = {entry['Id'] for _, entry in chunk}
+            for user_id, entry in chunk:
+                window = self._windows[user_id]
+                if entry['Id'] in failed:
+                    self.stats['publish_failures'] += 1
+                    window['dirty'] = True
+                    continue
+                self.stats['delivered_alerts'] += len(window['records'])
+                self.stats['delivered_messages'] += 1
+                sent += 1
+                # Later alerts for this user wait for the next window; only the
+                # ids just delivered are kept to catch redeliveries
+                window.update(opened=now, records=[], immediate=False, saved=set(), dirty=False,
+                              ids={record.get('transaction_id') for record in window['records']})
+
+        self._save(now)
+        if ready:
+            logger.info(f"Alert digests: {self.stats['delivered_alerts']} alerts delivered in "
+                        f"{self.stats['delivered_messages']} messages, "
+                        f"{self.stats['suppressed_duplicates'] + self.stats['suppressed_overflow']} suppressed, "
+                        f"{self.stats['rate_limited']} rate-limited, {self.pending()} pending")
+        return sent
+
+    def _claim(self, user_id, window, now):
+        """Take a saved window back from the store before publishing it; False skips it this flush"""
+        try:
+            claimed = self.store.claim(user_id, window['id'])
+        except Exception as e:
+            logger.error(f"Failed to claim alert window for {user_id}: {str(e)}")
+            return False
+        if claimed:
+            window.update(saved=set(), dirty=True)
+            return True
+        # The sweeper already published what was saved; keep only what arrived since
+        self.stats['taken_by_sweep'] += len(window['saved'])
+        records = [record for record in window['records'] if record.get('transaction_id') not in window['saved']]
+        ids = window['ids']
+        window.update(self._open(now, immediate=False))
+        window.update(records=records, ids=ids, dirty=bool(records))
+        return False
+
+    def _save(self, now):
+        """Write every window still holding alerts that changed since it was last saved"""
+        if self.store is None:
+            return
+        for user_id, window in self._windows.items():
+            if not window['records'] or not window['dirty']:
+                continue
+            due_at = self._wall_clock() + max(0.0, window['opened'] + self.window_seconds - now)
+            try:
+                self.store.save(user_id, window['id'], due_at, window['records'])
+                window.update(saved={record.get('transaction_id') for record in window['records']}, dirty=False)
+            except Exception as e:
+                logger.error(f"Failed to save alert window for {user_id}: {str(e)}")
@@ -0,0 +1,190 @@
+"""Per-user analytics rollups.
+
+Every stored transaction adds to three items in the rollup table, keyed by
+(user_id, bucket):
+
+- 'total': overall counters, risk-band histogram and per-currency totals
+- 'day#YYYY-MM-DD': daily counters plus hourly h<HH>_count/h<HH>_amount
+- 'merchant#<name>': per-merchant count, amount and risk sums
+
+Counters are only ever incremented with UpdateItem ADD, so concurrent writers
+never overwrite each other and GET /analytics reads O(days + merchants) items
+however many transactions a user has.
+
+GET /analytics?days=N reads the day buckets of the last N days, so its
+daily, hourly and weekday series and its 'window' totals cover those days.
+'summary' and 'merchants' come from the 'total' and 'merchant#' buckets,
+which have no dates, so they always cover all time; 'scope' in the
+response says which is which.
+"""
+import datetime
+from decimal import Decimal
+
+from risk_scoring import exchange_rates
+
+TOTAL_BUCKET = 'total'
+DAY_PREFIX = 'day#'
+MERCHANT_PREFIX = 'merchant#'
+MAX_MERCHANT_KEY_LENGTH = 200
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+def risk_band(risk_score):
+    """Same bands as the dashboard charts: low < 30 <= medium <= 70 < high"""
+    if risk_score > 70:
+        return 'high'
+    if risk_score >= 30:
+        return 'medium'
+    return 'low'
+
+def _add(bucket, attr, value):
+    bucket['add'][attr] = bucket['add'].get(attr, 0) + value
+
+def rollup_deltas(records):
+    """Merge transaction records into {bucket: {'add': {attr: n}, 'set': {attr: v}}}"""
+    deltas = {}
+    known_currencies = exchange_rates.get().rates
+    for record in records:
+        amount = Decimal(str(record['amount']))
+        risk = Decimal(str(record['risk_score']))
+        flagged = 1 if record.get('status') == 'flagged' else 0
+        timestamp = datetime.datetime.fromisoformat(record['timestamp'])
+        currency = record.get('currency') if record.get('currency') in known_currencies else 'OTHER'
+        merchant = str(record.get('merchant', '')).strip()[:MAX_MERCHANT_KEY_LENGTH]
+
+        buckets = (
+            TOTAL_BUCKET,
+            DAY_PREFIX + timestamp.date().isoformat(),
+            MERCHANT_PREFIX + merchant
+        )
+        for name in buckets:
+            bucket = deltas.setdefault(name, {'add': {}, 'set': {}})
+            _add(bucket, 'txn_count', 1)
+            _add(bucket, 'amount_sum', amount)
+            _add(bucket, 'risk_sum', risk)
+            _add(bucket, 'flagged_count', flagged)
+
+        total = deltas[TOTAL_BUCKET]
+        _add(total, f"band_{risk_band(risk)}", 1)
+        _add(total, f"cur_{currency}_count", 1)
+        _add(total, f"cur_{currency}_amount", amount)
+
+        day = deltas[buckets[1]]
+        _add(day, f"h{timestamp.hour:02d}_count", 1)
+        _add(day, f"h{timestamp.hour:02d}_amount", amount)
+
+        deltas[buckets[2]]['set']['merchant'] = merchant
+    return deltas
+
+def update_kwargs(user_id, bucket, delta):
+    """UpdateItem arguments applying one bucket's delta with ADD (and SET for labels)"""
+    names = {}
+    values = {}
+    adds = []
+    for i, (attr, value) in enumerate(sorted(delta['add'].items())):
+        names[f'#a{i}'] = attr
+        values[f':a{i}'] = value
+        adds.append(f'#a{i} :a{i}')
+    expression = 'ADD ' + ', '.join(adds)
+    sets = []
+    for i, (attr, value) in enumerate(sorted(delta['set'].items())):
+        names[f'#s{i}'] = attr
+        values[f':s{i}'] = value
+        sets.append(f'#s{i} = :s{i}')
+    if sets:
+        expression = 'SET ' + ', '.join(sets) + ' ' + expression
+    return {
+        'Key': {'user_id': user_id, 'bucket': bucket},
+        'UpdateExpression': expression,
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values
+    }
+
+def _num(item, attr):
+    return float(item.get(attr, 0))
+
+def _avg(total, count):
+    return round(total / count, 2) if count else 0.0
+
+SCOPES = {'summary': 'all_time', 'merchants': 'all_time',
+          'window': 'window', 'daily': 'window', 'hourly': 'window', 'weekday': 'window'}
+
+def build_analytics(items, first_day=None, last_day=None):
+    """Shape rollup items into the GET /analytics response body; first_day/last_day bound the day buckets read"""
+    summary_item = {}
+    days = []
+    merchants = []
+    for item in items:
+        bucket = item['bucket']
+        if bucket == TOTAL_BUCKET:
+            summary_item = item
+        elif bucket.startswith(DAY_PREFIX):
+            days.append(item)
+        elif bucket.startswith(MERCHANT_PREFIX):
+            merchants.append(item)
+
+    count = _num(summary_item, 'txn_count')
+    currencies = {}
+    for attr in summary_item:
+        if attr.startswith('cur_') and attr.endswith('_count'):
+            code = attr[len('cur_'):-len('_count')]
+            currencies[code] = {
+                'count': int(_num(summary_item, attr)),
+                'volume': _num(summary_item, f'cur_{code}_amount')
+            }
+
+    hourly = [{'hour': h, 'count': 0, 'amount': 0.0} for h in range(24)]
+    weekday = {name: {'day': name, 'count': 0, 'amount': 0.0} for name in WEEKDAYS}
+    daily = []
+    window = {'from': first_day.isoformat() if first_day else None,
+              'to': last_day.isoformat() if last_day else None,
+              'count': 0, 'amount_sum': 0.0, 'risk_sum': 0.0, 'flagged': 0}
+    for item in sorted(days, key=lambda i: i['bucket']):
+        date = item['bucket'][len(DAY_PREFIX):]
+        day_count = _num(item, 'txn_count')
+        daily.append({
+            'date': date,
+            'count': int(day_count),
+            'amount': _num(item, 'amount_sum'),
+            'avg_risk': _avg(_num(item, 'risk_sum'), day_count),
+            'flagged': int(_num(item, 'flagged_count'))
+        })
+        window['count'] += int(day_count)
+        window['amount_sum'] += _num(item, 'amount_sum')
+        window['risk_sum'] += _num(item, 'risk_sum')
+        window['flagged'] += int(_num(item, 'flagged_count'))
+        name = WEEKDAYS[datetime.date.fromisoformat(date).weekday()]
+        weekday[name]['count'] += int(day_count)
+        weekday[name]['amount'] += _num(item, 'amount_sum')
+        for h in range(24):
+            hourly[h]['count'] += int(_num(item, f'h{h:02d}_count'))
+            hourly[h]['amount'] += _num(item, f'h{h:02d}_amount')
+
+    merchant_rows = []
+    for item in merchants:
+        merchant_count = _num(item, 'txn_count')
+        merchant_rows.append({
+            'merchant': item.get('merchant', item['bucket'][len(MERCHANT_PREFIX):]),
+            'count': int(merchant_count),
+            'amount': _num(item, 'amount_sum'),
+            'avg_risk': _avg(_num(item, 'risk_sum'), merchant_count),
+            'flagged': int(_num(item, 'flagged_count'))
+        })
+    merchant_rows.sort(key=lambda row: row['amount'], reverse=True)
+    window['avg_risk'] = _avg(window.pop('risk_sum'), window['count'])
+
+    return {
+        'scope': dict(SCOPES),
+        'summary': {
+            'count': int(count),
+            'amount_sum': _num(summary_item, 'amount_sum'),
+            'avg_risk': _avg(_num(summary_item, 'risk_sum'), count),
+            'flagged': int(_num(summary_item, 'flagged_count')),
+            'risk_bands': {band: int(_num(summary_item, f'band_{band}')) for band in ('low', 'medium', 'high')},
+            'currencies': currencies
+        },
+        'window': window,
+        'daily': daily,
+        'hourly': hourly,
+        'weekday': list(weekday.values()),
+        'merchants': merchant_rows
+    }
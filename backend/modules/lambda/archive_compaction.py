@@ -0,0 +1,318 @@
+"""Compaction of the S3 transaction archive into daily Parquet partitions.
+
+log_to_s3 and log_batch_to_s3 write transactions/<date>/<id>.json and
+transactions/<date>/batch-<id>.ndjson objects. compact_day() reads every
+object under one day's prefix and writes
+
+    compacted/date=<date>/part-00000.parquet, part-00001.parquet, ...
+    compacted/date=<date>/_manifest.json
+
+Each part covers a fixed number of source objects taken in key order, so
+a rerun over the same listing produces the same parts. Rows in a part are
+sorted by user_id and timestamp and written in row groups of
+row_group_rows, so the user_id statistics of each row group are narrow: a
+reader looking for one user (transaction_tiers.ColdReader) fetches the
+footer and the row groups that can hold that user, not the part. After each part is
+written it is read back and its row count is checked against the rows
+parsed for it. Progress is saved to _progress.json, and an interrupted
+run resumes at the first unfinished part. The manifest is written last and
+records the listing fingerprint. A day whose manifest matches the current
+listing is skipped; a day that gained objects since is compacted again.
+Source objects are only deleted with delete_sources=True, after the
+manifest is written. Objects that arrive for a day whose sources were
+deleted are compacted into new parts next to the existing ones.
+
+Stores: LocalStore (a directory, for tests and benchmarks) and S3Store
+(any boto3 S3 client, including a moto mock). Both open() an object as a
+seekable file; S3Store's fetches only the byte ranges that are read.
+pyarrow is imported on first use; the deployed compactor gets it from the
+AWS SDK for pandas layer.
+"""
+import datetime
+import hashlib
+import io
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+SOURCE_PREFIX = 'transactions'
+COMPACTED_PREFIX = 'compacted'
+MANIFEST_NAME = '_manifest.json'
+PROGRESS_NAME = '_progress.json'
+DEFAULT_OBJECTS_PER_PART = 50000
+DEFAULT_READ_WORKERS = 32
+DEFAULT_LOOKBACK_DAYS = 3
+DEFAULT_ROW_GROUP_ROWS = 10000
+STRING_COLUMNS = ('transaction_id', 'user_id', 'merchant', 'currency', 'status',
+                  'merchant_keyword', 'blocked_merchant', 'trusted_merchant', 'rules_version')
+
+class CompactionError(Exception):
+    pass
+
+class LocalStore:
+    """Object store over a local directory; keys are relative paths"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def list(self, prefix):
+        base = os.path.join(self.root, prefix)
+        keys = []
+        for directory, _, files in os.walk(base):
+            for name in files:
+                keys.append(os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, '/'))
+        return sorted(keys)
+
+    def list_dirs(self, prefix):
+        """Names of the directories directly under prefix"""
+        base = os.path.join(self.root, prefix)
+        if not os.path.isdir(base):
+            return []
+        return sorted(name for name in os.listdir(base) if os.path.isdir(os.path.join(base, name)))
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def get(self, key):
+        path = os.path.join(self.root, key)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def open(self, key):
+        return open(os.path.join(self.root, key), 'rb')
+
+    def put(self, key, body):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(body)
+        os.replace(path + '.tmp', path)
+
+    def delete(self, keys):
+        for key in keys:
+            try:
+                os.remove(os.path.join(self.root, key))
+            except FileNotFoundError:
+                pass
+
+class RangeFile(io.RawIOBase):
+    """Read-only, seekable S3 object; each read is a ranged GetObject for just those bytes"""
+
+    def __init__(self, client, bucket, key):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.size = client.head_object(Bucket=bucket, Key=key)['ContentLength']
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def readinto(self, buffer):
+        end = min(self.position + len(buffer), self.size)
+        if end <= self.position:
+            return 0
+        body = self.client.get_object(Bucket=self.bucket, Key=self.key,
+                                      Range=f"bytes={self.position}-{end - 1}")['Body'].read()
+        buffer[:len(body)] = body
+        self.position += len(body)
+        return len(body)
+
+class S3Store:
+    def __init__(self, client, bucket):
+        self.client = client
+        self.bucket = bucket
+
+    def list(self, prefix):
+        keys = []
+        for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=prefix + '/'):
+            keys.extend(item['Key'] for item in page.get('Contents', []))
+        return sorted(keys)
+
+    def list_dirs(self, prefix):
+        names = []
+        for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=prefix + '/',
+                                                                          Delimiter='/'):
+            names.extend(item['Prefix'][len(prefix) + 1:].rstrip('/') for item in page.get('CommonPrefixes', []))
+        return sorted(names)
+
+    def get(self, key):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+        except Exception as e:
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise
+
+    def open(self, key):
+        return RangeFile(self.client, self.bucket, key)
+
+    def put(self, key, body):
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=body)
+
+    def delete(self, keys):
+        for start in range(0, len(keys), 1000):
+            self.client.delete_objects(Bucket=self.bucket, Delete={
+                'Objects': [{'Key': key} for key in keys[start:start + 1000]], 'Quiet': True})
+
+def fingerprint(keys):
+    digest = hashlib.sha256()
+    for key in keys:
+        digest.update(key.encode('utf-8') + b'\n')
+    return digest.hexdigest()
+
+def parse_object(key, body):
+    """Records in one archive object: a single JSON document or newline-delimited JSON"""
+    text = body.decode('utf-8')
+    if key.endswith('.ndjson'):
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    return [json.loads(text)]
+
+def to_table(records):
+    import pyarrow as pa
+    def column(name):
+        return [record.get(name) for record in records]
+    def number(value):
+        return float(value) if value is not None else None
+    timestamps = [datetime.datetime.fromisoformat(value) if value else None for value in column('timestamp')]
+    arrays = {name: pa.array(column(name), type=pa.string()) for name in STRING_COLUMNS}
+    arrays['timestamp'] = pa.array(timestamps, type=pa.timestamp('us', tz='UTC'))
+    arrays['amount'] = pa.array([number(v) for v in column('amount')], type=pa.float64())
+    arrays['risk_score'] = pa.array([number(v) for v in column('risk_score')], type=pa.float64())
+    arrays['risk_factors'] = pa.array(column('risk_factors'), type=pa.list_(pa.string()))
+    return pa.table(arrays)
+
+def write_part(store, key, table, row_group_rows=DEFAULT_ROW_GROUP_ROWS):
+    """Write a Parquet part, sorted by user, and return the row count read back from it"""
+    import pyarrow.parquet as pq
+    table = table.sort_by([('user_id', 'ascending'), ('timestamp', 'ascending')])
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression='zstd', row_group_size=row_group_rows)
+    store.put(key, buffer.getvalue())
+    return pq.ParquetFile(io.BytesIO(store.get(key))).metadata.num_rows
+
+def load_json(store, key):
+    body = store.get(key)
+    return json.loads(body) if body is not None else None
+
+def compact_day(store, day, objects_per_part=DEFAULT_OBJECTS_PER_PART, read_workers=DEFAULT_READ_WORKERS,
+                delete_sources=False, row_group_rows=DEFAULT_ROW_GROUP_ROWS):
+    """Compact one day's archive objects; returns the manifest (existing one if already up to date)"""
+    day = str(day)
+    source_keys = [key for key in store.list(f"{SOURCE_PREFIX}/{day}") if key.endswith(('.json', '.ndjson'))]
+    output_prefix = f"{COMPACTED_PREFIX}/date={day}"
+    source_fingerprint = fingerprint(source_keys)
+
+    manifest = load_json(store, f"{output_prefix}/{MANIFEST_NAME}")
+    if manifest and (manifest.get('source_fingerprint') == source_fingerprint or not source_keys):
+        logger.info(f"Archive for {day} already compacted ({manifest['rows']} rows)")
+        return manifest
+    if not source_keys:
+        logger.info(f"No archive objects for {day}")
+        return None
+    # Parts whose sources are gone can't be rebuilt, so they are kept and new parts follow them
+    carried = manifest['parts'] if manifest and manifest.get('sources_deleted') else []
+
+    progress = load_json(store, f"{output_prefix}/{PROGRESS_NAME}")
+    if (not progress or progress.get('source_fingerprint') != source_fingerprint
+            or progress.get('objects_per_part') != objects_per_part):
+        progress = {'source_fingerprint': source_fingerprint, 'objects_per_part': objects_per_part, 'parts': []}
+    first_index = len(carried)
+
+    chunks = [source_keys[start:start + objects_per_part] for start in range(0, len(source_keys), objects_per_part)]
+    with ThreadPoolExecutor(max_workers=read_workers) as pool:
+        for index in range(len(progress['parts']), len(chunks)):
+            chunk = chunks[index]
+            records = []
+            for key, body in zip(chunk, pool.map(store.get, chunk)):
+                if body is None:
+                    raise CompactionError(f"{key} disappeared during compaction")
+                records.extend(parse_object(key, body))
+            part_key = f"{output_prefix}/part-{first_index + index:05d}.parquet"
+            written = write_part(store, part_key, to_table(records), row_group_rows)
+            if written != len(records):
+                raise CompactionError(f"{part_key}: wrote {written} rows, expected {len(records)}")
+            progress['parts'].append({'key': part_key, 'rows': written, 'objects': len(chunk),
+                                      'first_source': chunk[0], 'last_source': chunk[-1]})
+            store.put(f"{output_prefix}/{PROGRESS_NAME}", json.dumps(progress).encode('utf-8'))
+            logger.info(f"{part_key}: {written} rows from {len(chunk)} objects")
+
+    # Parts left over from an earlier run over a longer listing
+    parts = carried + progress['parts']
+    part_keys = {part['key'] for part in parts}
+    stale = [key for key in store.list(output_prefix) if key.endswith('.parquet') and key not in part_keys]
+    store.delete(stale)
+
+    manifest = {
+        'date': day,
+        'source_objects': len(source_keys) + (manifest['source_objects'] if carried else 0),
+        'source_fingerprint': source_fingerprint,
+        'sources_deleted': delete_sources or bool(carried),
+        'rows': sum(part['rows'] for part in parts),
+        'parts': parts,
+        'format': 'parquet',
+        'compression': 'zstd',
+        'compacted_at': datetime.datetime.now(datetime.timezone.utc).isoformat()
+    }
+    store.put(f"{output_prefix}/{MANIFEST_NAME}", json.dumps(manifest, indent=2).encode('utf-8'))
+    store.delete([f"{output_prefix}/{PROGRESS_NAME}"])
+    logger.info(f"Compacted {day}: {manifest['rows']} rows from {len(source_keys)} objects "
+                f"into {len(parts)} parts")
+    if delete_sources:
+        store.delete(source_keys)
+    return manifest
+
+def read_day(store, day, columns=None):
+    """pyarrow Table of one compacted day, checked against its manifest"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    manifest = load_json(store, f"{COMPACTED_PREFIX}/date={day}/{MANIFEST_NAME}")
+    if not manifest:
+        raise CompactionError(f"{day} has not been compacted")
+    tables = [pq.read_table(io.BytesIO(store.get(part['key'])), columns=columns) for part in manifest['parts']]
+    table = pa.concat_tables(tables)
+    if table.num_rows != manifest['rows']:
+        raise CompactionError(f"{day}: read {table.num_rows} rows, manifest lists {manifest['rows']}")
+    return table
+
+def handler(event, context):
+    """Scheduled entry point: compacts the previous UTC day, or event['date'].
+
+    A scheduled run also revisits the COMPACTION_LOOKBACK_DAYS days before
+    that, so objects archived late (side-effect retries) are compacted
+    before the raw prefix expires; days that are up to date cost a listing.
+    """
+    import aws_clients
+    store = S3Store(aws_clients.client('s3'), os.environ['S3_BUCKET'])
+    objects_per_part = int(os.environ.get('COMPACTION_OBJECTS_PER_PART', DEFAULT_OBJECTS_PER_PART))
+    delete_sources = os.environ.get('COMPACTION_DELETE_SOURCES', 'false').lower() == 'true'
+    row_group_rows = int(os.environ.get('COMPACTION_ROW_GROUP_ROWS', DEFAULT_ROW_GROUP_ROWS))
+    if (event or {}).get('date'):
+        days = [event['date']]
+    else:
+        yesterday = datetime.datetime.now(datetime.timezone.utc).date() - datetime.timedelta(days=1)
+        lookback = int(os.environ.get('COMPACTION_LOOKBACK_DAYS', DEFAULT_LOOKBACK_DAYS))
+        days = [str(yesterday - datetime.timedelta(days=offset)) for offset in range(lookback + 1)]
+    results = []
+    for day in days:
+        manifest = compact_day(store, day, objects_per_part=objects_per_part, delete_sources=delete_sources,
+                               row_group_rows=row_group_rows)
+        results.append({'date': day, 'rows': manifest['rows'] if manifest else 0,
+                        'parts': len(manifest['parts']) if manifest else 0})
+    return results[0] if len(results) == 1 else {'days': results}
@@ -0,0 +1,340 @@
+"""Aggregate queries over the S3 transaction archive.
+
+run_query() answers questions like 'flagged volume per merchant last
+quarter' straight from the archive, without touching DynamoDB:
+
+    query = Query(start='2026-07-01', end='2026-09-30', statuses=['flagged'], group_by=['merchant'])
+    rows = run_query(store, query)
+
+Days outside [start, end] are never listed. A day with an up-to-date
+compacted manifest (see archive_compaction) is read from its Parquet parts;
+otherwise its transactions/<date>/ JSON and NDJSON objects are read.
+Filters on user_id, merchant, currency, status and risk_score are pushed
+down: into pyarrow's Parquet reader, where row-group statistics skip whole
+row groups, and for JSON into a byte search for the filtered values that
+skips objects and lines before they are parsed.
+
+USD amounts use the exchange rates in effect at each transaction's
+timestamp (fx_rates.RateTable.rates_at). Files are read in parallel on a
+thread pool; LocalStore files are memory-mapped rather than read into
+memory. Each file is folded into per-group totals as it is read, so memory
+grows with the number of groups, not the number of rows.
+"""
+import datetime
+import json
+import logging
+import mmap
+from concurrent.futures import ThreadPoolExecutor
+
+import encoding
+from archive_compaction import (COMPACTED_PREFIX, MANIFEST_NAME, SOURCE_PREFIX, LocalStore, fingerprint,
+                                load_json, parse_object)
+from risk_scoring import exchange_rates
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 16
+GROUP_COLUMNS = ('date', 'user_id', 'merchant', 'currency', 'status')
+RESULT_COLUMNS = ('transactions', 'amount', 'amount_usd', 'avg_risk_score', 'max_risk_score', 'flagged')
+# Totals per group: count, amount, amount_usd, risk_score sum, risk_score count, risk_score max, flagged
+_COUNT, _AMOUNT, _AMOUNT_USD, _RISK_SUM, _RISK_COUNT, _RISK_MAX, _FLAGGED = range(7)
+
+class QueryError(Exception):
+    pass
+
+def _day(value):
+    if value is None or isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value))
+    except ValueError:
+        raise QueryError(f"Invalid date: {value}")
+
+def _values(values):
+    if values is None:
+        return None
+    return frozenset([values] if isinstance(values, str) else values)
+
+def _needles(values):
+    """The encoded forms of values: as encoding.dumps writes them (raw UTF-8) and, for
+    objects archived before it, as json.dumps does (non-ASCII escaped to \\uXXXX)"""
+    needles = set()
+    for value in values:
+        needles.add(encoding.dumps(value).encode('utf-8'))
+        needles.add(json.dumps(value).encode('ascii'))
+    return sorted(needles)
+
+class Query:
+    """Date range (inclusive), filters and grouping for run_query"""
+
+    def __init__(self, start=None, end=None, user_ids=None, merchants=None, currencies=None, statuses=None,
+                 min_risk_score=None, max_risk_score=None, group_by=()):
+        self.start = _day(start)
+        self.end = _day(end)
+        if self.start and self.end and self.start > self.end:
+            raise QueryError(f"start {self.start} is after end {self.end}")
+        self.filters = {'user_id': _values(user_ids), 'merchant': _values(merchants),
+                        'currency': _values(currencies), 'status': _values(statuses)}
+        self.min_risk_score = min_risk_score
+        self.max_risk_score = max_risk_score
+        self.group_by = tuple(group_by)
+        unknown = [column for column in self.group_by if column not in GROUP_COLUMNS]
+        if unknown:
+            raise QueryError(f"Cannot group by {', '.join(unknown)}; choose from {', '.join(GROUP_COLUMNS)}")
+        # Each filtered value as it appears in an archive object; a record must contain one per filter
+        self.needles = [_needles(values) for values in self.filters.values() if values]
+
+    def includes_day(self, day):
+        return (self.start is None or day >= self.start) and (self.end is None or day <= self.end)
+
+    def matches(self, record):
+        for column, values in self.filters.items():
+            if values is not None and record.get(column) not in values:
+                return False
+        if self.min_risk_score is not None or self.max_risk_score is not None:
+            risk_score = record.get('risk_score')
+            if risk_score is None:
+                return False
+            if self.min_risk_score is not None and risk_score < self.min_risk_score:
+                return False
+            if self.max_risk_score is not None and risk_score > self.max_risk_score:
+                return False
+        return True
+
+    def parquet_filters(self):
+        filters = [(column, 'in', sorted(values)) for column, values in self.filters.items() if values is not None]
+        if self.min_risk_score is not None:
+            filters.append(('risk_score', '>=', float(self.min_risk_score)))
+        if self.max_risk_score is not None:
+            filters.append(('risk_score', '<=', float(self.max_risk_score)))
+        return filters or None
+
+def archive_days(store, query):
+    """Days present in the archive (raw or compacted) that fall in the query's range"""
+    days = set()
+    for name in store.list_dirs(SOURCE_PREFIX):
+        days.add(name)
+    for name in store.list_dirs(COMPACTED_PREFIX):
+        if name.startswith('date='):
+            days.add(name[len('date='):])
+    selected = []
+    for name in sorted(days):
+        try:
+            day = datetime.date.fromisoformat(name)
+        except ValueError:
+            continue
+        if query.includes_day(day):
+            selected.append(day)
+    return selected
+
+def plan_day(store, day):
+    """(parquet_keys, json_keys) to read for one day"""
+    source_keys = [key for key in store.list(f"{SOURCE_PREFIX}/{day}") if key.endswith(('.json', '.ndjson'))]
+    manifest = load_json(store, f"{COMPACTED_PREFIX}/date={day}/{MANIFEST_NAME}")
+    if manifest:
+        part_keys = [part['key'] for part in manifest['parts']]
+        if manifest.get('source_fingerprint') == fingerprint(source_keys):
+            return part_keys, []
+        if manifest.get('sources_deleted'):
+            # The compacted sources are gone; what is left arrived after the last compaction
+            return part_keys, source_keys
+    return [], source_keys
+
+def _add(totals, key, count, amount, amount_usd, risk_sum, risk_count, risk_max, flagged):
+    entry = totals.get(key)
+    if entry is None:
+        totals[key] = [count, amount, amount_usd, risk_sum, risk_count, risk_max, flagged]
+        return
+    entry[_COUNT] += count
+    entry[_AMOUNT] += amount
+    entry[_AMOUNT_USD] += amount_usd
+    entry[_RISK_SUM] += risk_sum
+    entry[_RISK_COUNT] += risk_count
+    if risk_max is not None and (entry[_RISK_MAX] is None or risk_max > entry[_RISK_MAX]):
+        entry[_RISK_MAX] = risk_max
+    entry[_FLAGGED] += flagged
+
+def _group_key(query, day, record):
+    return tuple(str(day) if column == 'date' else record.get(column) for column in query.group_by)
+
+def _scan_records(query, rates, day, lines, totals):
+    needles = query.needles
+    for line in lines:
+        if needles and not all(any(needle in line for needle in values) for values in needles):
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        if not query.matches(record):
+            continue
+        amount = record.get('amount') or 0.0
+        risk_score = record.get('risk_score')
+        amount_usd = rates.to_usd_at(amount, record.get('currency'), record.get('timestamp'))
+        _add(totals, _group_key(query, day, record), 1, amount, amount_usd,
+             risk_score or 0.0, 0 if risk_score is None else 1, risk_score,
+             1 if record.get('status') == 'flagged' else 0)
+
+def _open_mapped(store, key):
+    """mmap of a LocalStore file, or None for an empty file"""
+    with open(store.path(key), 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None
+
+def scan_json(store, query, rates, day, key):
+    """Per-group totals of one JSON or NDJSON archive object"""
+    totals = {}
+    if isinstance(store, LocalStore):
+        body = _open_mapped(store, key)
+        if body is None:
+            return totals
+    else:
+        body = store.get(key)
+        if body is None:
+            logger.warning(f"{key} disappeared before it was read")
+            return totals
+    try:
+        # An object without every filtered value somewhere in it can't match
+        if any(all(body.find(needle) == -1 for needle in values) for values in query.needles):
+            return totals
+        if key.endswith('.ndjson'):
+            lines = iter(body.readline, b'') if isinstance(body, mmap.mmap) else body.splitlines()
+        else:
+            lines = [body[:]]
+        _scan_records(query, rates, day, lines, totals)
+    finally:
+        if isinstance(body, mmap.mmap):
+            body.close()
+    return totals
+
+def _parquet_source(store, key, ranged=False):
+    import pyarrow as pa
+    if isinstance(store, LocalStore):
+        return pa.memory_map(store.path(key))
+    return store.open(key) if ranged else pa.BufferReader(store.get(key))
+
+def scan_parquet(store, query, rates, day, key):
+    """Per-group totals of one compacted Parquet part, aggregated by pyarrow"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    keys = [column for column in query.group_by if column != 'date']
+    if 'currency' not in keys:
+        keys.append('currency')
+    # One table per exchange-rate snapshot in effect during the day
+    periods = rates.periods(day, day + datetime.timedelta(days=1))
+    columns = set(keys) | {'amount', 'risk_score', 'status'}
+    if len(periods) > 1:
+        columns.add('timestamp')
+    table = pq.read_table(_parquet_source(store, key), columns=sorted(columns), filters=query.parquet_filters())
+    totals = {}
+    if not table.num_rows:
+        return totals
+    table = table.append_column('flagged', pc.cast(pc.equal(table['status'], 'flagged'), pa.int64()))
+    for index, (period_start, period_end, period_rates) in enumerate(periods):
+        chunk = table
+        if len(periods) > 1:
+            timestamps = pc.cast(table['timestamp'], pa.int64())
+            # The first period also takes rows without a timestamp
+            in_period = pc.and_(pc.greater_equal(timestamps, int(period_start * 1e6)),
+                                pc.less(timestamps, int(period_end * 1e6)))
+            chunk = table.filter(pc.fill_null(in_period, index == 0))
+        grouped = chunk.group_by(keys).aggregate([
+            ('amount', 'count', pc.CountOptions(mode='all')), ('amount', 'sum'),
+            ('risk_score', 'sum'), ('risk_score', 'count'), ('risk_score', 'max'), ('flagged', 'sum')])
+        for row in grouped.to_pylist():
+            if not row['amount_count']:
+                continue
+            amount = row['amount_sum'] or 0.0
+            rate = period_rates.get(row['currency'])
+            amount_usd = amount / rate if rate is not None else rates.to_usd(amount, row['currency'])
+            group = tuple(str(day) if column == 'date' else row[column] for column in query.group_by)
+            _add(totals, group, row['amount_count'], amount, amount_usd, row['risk_score_sum'] or 0.0,
+                 row['risk_score_count'], row['risk_score_max'], row['flagged_sum'] or 0)
+    return totals
+
+def _object_records(store, key, columns, query, ranged=False):
+    if key.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        filters = query.parquet_filters() if query is not None else None
+        return pq.read_table(_parquet_source(store, key, ranged), columns=columns, filters=filters).to_pylist()
+    body = store.get(key)
+    if body is None:
+        return []
+    if query is None:
+        return parse_object(key, body)
+    if any(all(body.find(needle) == -1 for needle in values) for values in query.needles):
+        return []
+    records = []
+    for line in body.splitlines() if key.endswith('.ndjson') else [body]:
+        if not line.strip() or not all(any(needle in line for needle in values) for values in query.needles):
+            continue
+        record = json.loads(line)
+        if query.matches(record):
+            records.append(record)
+    return records
+
+def day_records(store, day, columns=None, query=None, workers=1):
+    """Every archived record of one day as dicts, read the way run_query reads the day.
+
+    columns selects Parquet columns; JSON records keep all their fields.
+    With a query, only records passing its filters are returned (its date
+    range is not applied). workers > 1 reads the day's objects in parallel.
+    """
+    part_keys, json_keys = plan_day(store, day)
+    yield from read_records(store, part_keys + json_keys, columns, query, workers)
+
+def read_records(store, keys, columns=None, query=None, workers=1, ranged=False):
+    """Records of the given archive objects, as day_records reads them.
+
+    ranged reads Parquet parts with ranged GETs: the footer, then only the
+    row groups whose statistics can match the query's filters. That pays
+    off for a selective filter on a column the parts are sorted by
+    (user_id, see archive_compaction); a full read is cheaper as one GET.
+    """
+    if workers > 1 and len(keys) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for records in pool.map(lambda key: _object_records(store, key, columns, query, ranged), keys):
+                yield from records
+        return
+    for key in keys:
+        yield from _object_records(store, key, columns, query, ranged)
+
+def run_query(store, query, workers=DEFAULT_WORKERS, stats=None, rates=None):
+    """Result rows, one per group, ordered by group key; stats (a dict) receives the files read.
+
+    rates is an fx_rates.RateTable, by default the one risk scoring uses.
+    """
+    rates = rates or exchange_rates.get()
+    tasks = []
+    days = archive_days(store, query)
+    for day in days:
+        part_keys, json_keys = plan_day(store, day)
+        tasks.extend((scan_parquet, day, key) for key in part_keys)
+        tasks.extend((scan_json, day, key) for key in json_keys)
+
+    totals = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for partial in pool.map(lambda task: task[0](store, query, rates, task[1], task[2]), tasks):
+            for key, entry in partial.items():
+                _add(totals, key, *entry)
+    if stats is not None:
+        stats.update({'days': len(days), 'parquet_parts': sum(1 for task in tasks if task[0] is scan_parquet),
+                      'json_objects': sum(1 for task in tasks if task[0] is scan_json)})
+
+    rows = []
+    for key in sorted(totals, key=lambda key: tuple('' if value is None else str(value) for value in key)):
+        entry = totals[key]
+        row = dict(zip(query.group_by, key))
+        row.update({
+            'transactions': entry[_COUNT],
+            'amount': round(entry[_AMOUNT], 2),
+            'amount_usd': round(entry[_AMOUNT_USD], 2),
+            'avg_risk_score': round(entry[_RISK_SUM] / entry[_RISK_COUNT], 2) if entry[_RISK_COUNT] else None,
+            'max_risk_score': entry[_RISK_MAX],
+            'flagged': entry[_FLAGGED]
+        })
+        rows.append(row)
+    return rows
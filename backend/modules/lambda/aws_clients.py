@@ -0,0 +1,70 @@
+"""Lazily constructed, memoized AWS clients.
+
+boto3 is only imported, and each client or Table only built, the first time
+a route actually uses it, so OPTIONS preflights and /test never pay for
+boto3 at all and /login only builds the Cognito client. All clients share
+one botocore Config with a larger connection pool, TCP keep-alive and
+tight timeouts so a slow dependency fails fast instead of holding the
+invocation until the Lambda timeout. Every client is registered with the
+metrics hooks, so each AWS operation is timed in sampled invocations.
+"""
+import functools
+import os
+
+import metrics
+
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '25'))
+CONNECT_TIMEOUT = float(os.environ.get('AWS_CONNECT_TIMEOUT', '2'))
+READ_TIMEOUT = float(os.environ.get('AWS_READ_TIMEOUT', '5'))
+MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', '3'))
+
+@functools.lru_cache(maxsize=None)
+def client_config():
+    from botocore.config import Config
+    return Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        retries={'max_attempts': MAX_ATTEMPTS, 'mode': 'standard'},
+        tcp_keepalive=True
+    )
+
+@functools.lru_cache(maxsize=None)
+def client(service_name, endpoint_url=None):
+    import boto3
+    kwargs = {'endpoint_url': endpoint_url} if endpoint_url else {}
+    return metrics.instrument_client(boto3.client(service_name, config=client_config(), **kwargs))
+
+@functools.lru_cache(maxsize=None)
+def resource(service_name):
+    import boto3
+    resource = boto3.resource(service_name, config=client_config())
+    metrics.instrument_client(resource.meta.client)
+    return resource
+
+@functools.lru_cache(maxsize=None)
+def table(name):
+    return resource('dynamodb').Table(name)
+
+@functools.lru_cache(maxsize=None)
+def dynamodb_conditions():
+    """boto3.dynamodb.conditions (Key, Attr), imported once on first use"""
+    from boto3.dynamodb import conditions
+    return conditions
+
+class LazyClient:
+    """Stands in for a client or Table and builds it on first attribute access"""
+
+    def __init__(self, factory, *args):
+        self._factory = factory
+        self._args = args
+        self._target = None
+
+    def __getattr__(self, name):
+        if self._target is None:
+            self._target = self._factory(*self._args)
+        return getattr(self._target, name)
+
+    @property
+    def initialized(self):
+        return self._target is not None
@@ -0,0 +1,284 @@
+"""Per-user change feed over WebSocket, fed by the transactions table's stream.
+
+The dashboard opens a WebSocket connection to the change-feed API with its
+ID token; $connect records (connection_id, user_id) in the connections
+table and $disconnect removes it. The stream consumer receives batches of
+DynamoDB Streams records (NEW_AND_OLD_IMAGES) for the transactions table
+and pushes each connected user only the rows that changed:
+
+    {"type": "transactions", "upserts": [{...}, ...], "removed": ["<id>", ...]}
+
+Within a batch, several changes to one row collapse into the last one.
+Changes that don't alter anything the client shows are dropped, such as
+expires_at being set or removed by tiering. So are TTL deletions: an
+expired row has moved to the S3 archive and is still listed by
+GET /transactions.
+
+Records are grouped by user before anything is decoded. Connections are
+looked up once per batch, and only rows for users with an open connection
+are decoded and serialized. Most users are not watching, so a large batch
+mostly costs one pass over the raw records. Messages are split to stay
+under the API Gateway WebSocket frame limit. Sends to different
+connections run in parallel, and a connection that API Gateway reports as
+gone is removed from the table.
+
+Delivery is best effort. A client that was disconnected re-fetches the
+first page of GET /transactions when it reconnects.
+"""
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger()
+
+MESSAGE_TYPE = 'transactions'
+# post_to_connection accepts at most 128 KB per message
+MAX_MESSAGE_BYTES = 120000
+DEFAULT_SEND_WORKERS = 16
+# API Gateway closes WebSocket connections after two hours; the TTL sweeps up missed $disconnects
+DEFAULT_CONNECTION_TTL_SECONDS = 7200
+CONNECTIONS_USER_INDEX = 'UserIndex'
+# Above this many users in one batch, one scan of the connections table beats a query per user
+SCAN_USERS_THRESHOLD = 25
+
+# Attributes of a transaction the client sees; expires_at is bookkeeping for the hot/cold tiers
+PUBLIC_FIELDS = (
+    'transaction_id', 'user_id', 'timestamp', 'amount', 'merchant', 'currency',
+    'risk_score', 'status', 'merchant_keyword', 'blocked_merchant', 'trusted_merchant', 'risk_factors',
+    'rules_version'
+)
+
+# send() outcomes
+SENT = 'sent'
+GONE = 'gone'
+FAILED = 'failed'
+
+def attribute_value(value):
+    """Python value of a low-level DynamoDB attribute value, as the JSON messages carry it"""
+    kind, inner = next(iter(value.items()))
+    if kind == 'S' or kind == 'B':
+        return inner
+    if kind == 'N':
+        return float(inner)
+    if kind == 'BOOL':
+        return inner
+    if kind == 'NULL':
+        return None
+    if kind == 'M':
+        return {name: attribute_value(item) for name, item in inner.items()}
+    if kind == 'L':
+        return [attribute_value(item) for item in inner]
+    if kind == 'NS':
+        return [float(item) for item in inner]
+    # SS, BS
+    return list(inner)
+
+def public_item(image):
+    """Client-facing transaction from a stream image"""
+    return {name: attribute_value(image[name]) for name in PUBLIC_FIELDS if name in image}
+
+def _visible_change(old, new):
+    for name in PUBLIC_FIELDS:
+        if old.get(name) != new.get(name):
+            return True
+    return False
+
+def _is_ttl_delete(record):
+    identity = record.get('userIdentity') or {}
+    return identity.get('type') == 'Service' and identity.get('principalId') == 'dynamodb.amazonaws.com'
+
+def group_changes(records, stats=None):
+    """{user_id: {transaction_id: new image, or None if the row was deleted}} for a batch of stream records.
+
+    Images are left in their low-level form; stats, if given, counts the
+    records dropped as 'skipped'.
+    """
+    changes = {}
+    skipped = 0
+    for record in records:
+        data = record.get('dynamodb') or {}
+        event_name = record.get('eventName')
+        new = data.get('NewImage')
+        old = data.get('OldImage')
+        if event_name == 'REMOVE':
+            if old is None or _is_ttl_delete(record):
+                skipped += 1
+                continue
+            image, value = old, None
+        elif new is not None:
+            if event_name == 'MODIFY' and old is not None and not _visible_change(old, new):
+                skipped += 1
+                continue
+            image, value = new, new
+        else:
+            skipped += 1
+            continue
+        user_id = image.get('user_id', {}).get('S')
+        transaction_id = image.get('transaction_id', {}).get('S')
+        if user_id is None or transaction_id is None:
+            skipped += 1
+            continue
+        user_changes = changes.get(user_id)
+        if user_changes is None:
+            user_changes = changes[user_id] = {}
+        # Later records for the same row replace earlier ones, keeping the row's first position
+        user_changes[transaction_id] = value
+    if stats is not None:
+        stats['skipped'] = stats.get('skipped', 0) + skipped
+    return changes
+
+def _message(upserts, removed):
+    return (f'{{"type": "{MESSAGE_TYPE}", "upserts": [' + ', '.join(upserts) + '], "removed": '
+            + json.dumps(removed) + '}')
+
+def messages(user_changes, max_bytes=MAX_MESSAGE_BYTES):
+    """JSON messages carrying one user's changes, each at most max_bytes (barring a single oversized row)"""
+    upserts, removed = [], []
+    size = len(_message([], []))
+    result = []
+    for transaction_id, image in user_changes.items():
+        if image is None:
+            encoded = json.dumps(transaction_id)
+        else:
+            encoded = json.dumps(public_item(image))
+        # Plus a separator
+        length = len(encoded.encode('utf-8')) + 2
+        if (upserts or removed) and size + length > max_bytes:
+            result.append(_message(upserts, removed))
+            upserts, removed = [], []
+            size = len(_message([], []))
+        if image is None:
+            removed.append(transaction_id)
+        else:
+            upserts.append(encoded)
+        size += length
+    if upserts or removed:
+        result.append(_message(upserts, removed))
+    return result
+
+class MemoryConnections:
+    """In-process connection registry with the same interface as TableConnections"""
+
+    def __init__(self):
+        self.by_connection = {}
+        self.by_user = {}
+        self._lock = threading.Lock()
+
+    def add(self, connection_id, user_id, now=None):
+        with self._lock:
+            self.by_connection[connection_id] = user_id
+            self.by_user.setdefault(user_id, set()).add(connection_id)
+
+    def remove(self, connection_id):
+        with self._lock:
+            user_id = self.by_connection.pop(connection_id, None)
+            connections = self.by_user.get(user_id)
+            if connections is not None:
+                connections.discard(connection_id)
+                if not connections:
+                    del self.by_user[user_id]
+
+    def for_users(self, user_ids):
+        """{user_id: [connection_id, ...]} for the users in user_ids that have connections"""
+        with self._lock:
+            return {user_id: list(self.by_user[user_id]) for user_id in user_ids if user_id in self.by_user}
+
+class TableConnections:
+    """Connections table: one item per connection_id, with a user_id index and a TTL"""
+
+    def __init__(self, table, conditions, ttl=DEFAULT_CONNECTION_TTL_SECONDS, scan_threshold=SCAN_USERS_THRESHOLD):
+        self.table = table
+        self.conditions = conditions
+        self.ttl = ttl
+        self.scan_threshold = scan_threshold
+
+    def add(self, connection_id, user_id, now=None):
+        now = int(now if now is not None else time.time())
+        self.table.put_item(Item={'connection_id': connection_id, 'user_id': user_id,
+                                  'connected_at': now, 'expires_at': now + self.ttl})
+
+    def remove(self, connection_id):
+        self.table.delete_item(Key={'connection_id': connection_id})
+
+    def for_users(self, user_ids):
+        """{user_id: [connection_id, ...]} for the users in user_ids that have connections"""
+        user_ids = set(user_ids)
+        now = int(time.time())
+        found = {}
+        if len(user_ids) > self.scan_threshold:
+            kwargs = {'ProjectionExpression': 'connection_id, user_id, expires_at'}
+            while True:
+                response = self.table.scan(**kwargs)
+                for item in response.get('Items', []):
+                    if item['user_id'] in user_ids and item.get('expires_at', now) >= now:
+                        found.setdefault(item['user_id'], []).append(item['connection_id'])
+                if 'LastEvaluatedKey' not in response:
+                    return found
+                kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        Key = self.conditions.Key
+        for user_id in user_ids:
+            response = self.table.query(
+                IndexName=CONNECTIONS_USER_INDEX,
+                KeyConditionExpression=Key('user_id').eq(user_id),
+                ProjectionExpression='connection_id, expires_at'
+            )
+            connections = [item['connection_id'] for item in response.get('Items', [])
+                           if item.get('expires_at', now) >= now]
+            if connections:
+                found[user_id] = connections
+        return found
+
+def post_to_connection(client, connection_id, data):
+    """Send data through an apigatewaymanagementapi client; returns SENT, GONE or FAILED"""
+    try:
+        client.post_to_connection(ConnectionId=connection_id, Data=data.encode('utf-8'))
+        return SENT
+    except client.exceptions.GoneException:
+        return GONE
+    except Exception as e:
+        logger.warning(f"Change feed send to {connection_id} failed: {str(e)}")
+        return FAILED
+
+def _deliver(send, connection_id, payloads):
+    # Messages for one connection go in order, so a later change never arrives first
+    for data in payloads:
+        outcome = send(connection_id, data)
+        if outcome != SENT:
+            return outcome
+    return SENT
+
+def publish(records, connections, send, workers=DEFAULT_SEND_WORKERS, max_bytes=MAX_MESSAGE_BYTES):
+    """Push one batch of stream records to the registry's connections through send(connection_id, data).
+
+    Returns counts for the batch; sent, gone and failed count connections.
+    """
+    stats = {'records': len(records), 'skipped': 0, 'users': 0, 'watched_users': 0,
+             'messages': 0, 'sent': 0, 'gone': 0, 'failed': 0}
+    changes = group_changes(records, stats)
+    stats['users'] = len(changes)
+    if not changes:
+        return stats
+    watching = connections.for_users(changes)
+    stats['watched_users'] = len(watching)
+
+    deliveries = []
+    for user_id, connection_ids in watching.items():
+        payloads = messages(changes[user_id], max_bytes)
+        stats['messages'] += len(payloads) * len(connection_ids)
+        deliveries.extend((connection_id, payloads) for connection_id in connection_ids)
+    if len(deliveries) <= 1:
+        outcomes = [_deliver(send, connection_id, payloads) for connection_id, payloads in deliveries]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(deliveries))) as pool:
+            outcomes = list(pool.map(lambda delivery: _deliver(send, *delivery), deliveries))
+
+    for (connection_id, _), outcome in zip(deliveries, outcomes):
+        stats[outcome] += 1
+        if outcome == GONE:
+            try:
+                connections.remove(connection_id)
+            except Exception as e:
+                logger.warning(f"Could not remove stale connection {connection_id}: {str(e)}")
+    return stats
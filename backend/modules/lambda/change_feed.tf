@@ -0,0 +1,110 @@
+# Real-time change feed (change_feed.py): the dashboard holds a WebSocket connection to this API,
+# and a consumer of the transactions table's stream pushes each user the rows that changed
+resource "aws_apigatewayv2_api" "change_feed" {
+  name                       = "${var.project_name}-${var.environment}-change-feed"
+  protocol_type              = "WEBSOCKET"
+  route_selection_expression = "$request.body.action"
+}
+
+resource "aws_apigatewayv2_integration" "change_feed" {
+  api_id             = aws_apigatewayv2_api.change_feed.id
+  integration_type   = "AWS_PROXY"
+  integration_uri    = aws_lambda_function.change_feed_websocket.invoke_arn
+  integration_method = "POST"
+}
+
+resource "aws_apigatewayv2_route" "change_feed" {
+  for_each  = toset(["$connect", "$disconnect", "$default"])
+  api_id    = aws_apigatewayv2_api.change_feed.id
+  route_key = each.value
+  target    = "integrations/${aws_apigatewayv2_integration.change_feed.id}"
+}
+
+resource "aws_apigatewayv2_stage" "change_feed" {
+  api_id      = aws_apigatewayv2_api.change_feed.id
+  name        = var.environment
+  auto_deploy = true
+
+  default_route_settings {
+    throttling_rate_limit  = 100
+    throttling_burst_limit = 50
+  }
+}
+
+# $connect / $disconnect: verifies the ID token and keeps the connections table
+resource "aws_lambda_function" "change_feed_websocket" {
+  filename         = data.archive_file.lambda_zip.output_path
+  source_code_hash = data.archive_file.lambda_zip.output_base64sha256
+
+  function_name = "${var.lambda_function_name}-change-feed-ws"
+  role          = aws_iam_role.lambda_role.arn
+  handler       = "lambda_code.websocket_handler"
+  runtime       = "python3.11"
+  timeout       = 10
+  memory_size   = 256
+
+  environment {
+    variables = {
+      S3_BUCKET              = var.s3_bucket_name
+      PROJECT_NAME           = var.project_name
+      ENVIRONMENT            = var.environment
+      LOG_LEVEL              = "INFO"
+      CONNECTIONS_TABLE_NAME = aws_dynamodb_table.ws_connections.name
+
+      CHANGE_FEED_CONNECTION_TTL_SECONDS = "7200"
+
+      JWT_CACHE_MAX_ENTRIES = "1024"
+      CSRF_SECRET           = random_password.csrf_secret.result
+      METRICS_SAMPLE_RATE   = "0.1"
+    }
+  }
+}
+
+resource "aws_lambda_permission" "change_feed_websocket" {
+  statement_id  = "AllowExecutionFromWebSocketAPI"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.change_feed_websocket.function_name
+  principal     = "apigateway.amazonaws.com"
+  source_arn    = "${aws_apigatewayv2_api.change_feed.execution_arn}/*/*"
+}
+
+# Stream consumer: same package, fans each batch out through the stage's management API
+resource "aws_lambda_function" "change_feed_consumer" {
+  filename         = data.archive_file.lambda_zip.output_path
+  source_code_hash = data.archive_file.lambda_zip.output_base64sha256
+
+  function_name = "${var.lambda_function_name}-change-feed"
+  role          = aws_iam_role.lambda_role.arn
+  handler       = "lambda_code.change_feed_handler"
+  runtime       = "python3.11"
+  timeout       = 60
+  memory_size   = 512
+
+  environment {
+    variables = {
+      S3_BUCKET              = var.s3_bucket_name
+      PROJECT_NAME           = var.project_name
+      ENVIRONMENT            = var.environment
+      LOG_LEVEL              = "INFO"
+      CONNECTIONS_TABLE_NAME = aws_dynamodb_table.ws_connections.name
+      CHANGE_FEED_ENDPOINT   = replace(aws_apigatewayv2_stage.change_feed.invoke_url, "wss://", "https://")
+
+      CHANGE_FEED_SEND_WORKERS = "16"
+
+      CSRF_SECRET         = random_password.csrf_secret.result
+      METRICS_SAMPLE_RATE = "1"
+    }
+  }
+}
+
+# Deltas are only useful while fresh: old records are skipped and a failing batch is not retried for long
+resource "aws_lambda_event_source_mapping" "change_feed" {
+  event_source_arn                   = aws_dynamodb_table.transactions.stream_arn
+  function_name                      = aws_lambda_function.change_feed_consumer.arn
+  starting_position                  = "LATEST"
+  batch_size                         = 1000
+  maximum_batching_window_in_seconds = 1
+  maximum_record_age_in_seconds      = 300
+  maximum_retry_attempts             = 2
+  bisect_batch_on_function_error     = true
+}
@@ -0,0 +1,47 @@
+# Daily compaction of the S3 transaction archive into Parquet (archive_compaction.py).
+# pyarrow comes from the AWS SDK for pandas layer, so the function is only
+# created when compaction_layer_arn is set.
+resource "aws_lambda_function" "archive_compactor" {
+  count            = var.compaction_layer_arn == "" ? 0 : 1
+  filename         = data.archive_file.lambda_zip.output_path
+  source_code_hash = data.archive_file.lambda_zip.output_base64sha256
+
+  function_name = "${var.lambda_function_name}-archive-compactor"
+  role          = aws_iam_role.lambda_role.arn
+  handler       = "archive_compaction.handler"
+  runtime       = "python3.11"
+  timeout       = 900
+  memory_size   = 2048
+  layers        = [var.compaction_layer_arn]
+
+  environment {
+    variables = {
+      S3_BUCKET                   = var.s3_bucket_name
+      COMPACTION_OBJECTS_PER_PART = "50000"
+      COMPACTION_DELETE_SOURCES   = "false"
+      COMPACTION_LOOKBACK_DAYS    = "3"
+    }
+  }
+}
+
+# Shortly after midnight UTC, compact the previous day
+resource "aws_cloudwatch_event_rule" "archive_compaction" {
+  count               = var.compaction_layer_arn == "" ? 0 : 1
+  name                = "${var.project_name}-${var.environment}-archive-compaction"
+  schedule_expression = "cron(30 0 * * ? *)"
+}
+
+resource "aws_cloudwatch_event_target" "archive_compaction" {
+  count = var.compaction_layer_arn == "" ? 0 : 1
+  rule  = aws_cloudwatch_event_rule.archive_compaction[0].name
+  arn   = aws_lambda_function.archive_compactor[0].arn
+}
+
+resource "aws_lambda_permission" "archive_compaction_schedule" {
+  count         = var.compaction_layer_arn == "" ? 0 : 1
+  statement_id  = "AllowExecutionFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.archive_compactor[0].function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.archive_compaction[0].arn
+}
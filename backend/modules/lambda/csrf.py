@@ -0,0 +1,73 @@
+"""Stateless CSRF tokens.
+
+A token is 'v1.<expires>.<nonce>.<signature>', where the signature is an
+HMAC-SHA256 over the version, expiry, nonce and the subject the token was
+issued to (the Cognito username, or 'anonymous' before login). Validation
+recomputes the HMAC in-process, so neither issuing nor checking a token
+touches DynamoDB. A token issued to one user does not validate for another.
+
+ReplayCache optionally remembers spent nonces until their tokens expire,
+making each token single-use within a warm container. It is per container,
+so it narrows replay rather than ruling it out; use the table-backed mode
+in lambda_code when tokens must be strictly single-use.
+"""
+import base64
+import hashlib
+import hmac
+import secrets
+import time
+from collections import OrderedDict
+
+VERSION = 'v1'
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_REPLAY_CACHE_ENTRIES = 4096
+
+def _signature(secret, expires, nonce, subject):
+    message = f"{VERSION}.{expires}.{nonce}.{subject}".encode('utf-8')
+    digest = hmac.new(secret, message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode('ascii').rstrip('=')
+
+def issue_token(secret, subject, ttl=DEFAULT_TTL_SECONDS, now=None):
+    """New token for subject; returns (token, expires) with expires in epoch seconds"""
+    expires = int((now if now is not None else time.time()) + ttl)
+    nonce = secrets.token_urlsafe(12)
+    return f"{VERSION}.{expires}.{nonce}.{_signature(secret, expires, nonce, subject)}", expires
+
+def parse_token(secret, token, subject, now=None):
+    """(nonce, expires) of a valid, unexpired token for subject, otherwise None"""
+    try:
+        version, expires, nonce, signature = token.split('.')
+        expires = int(expires)
+    except (AttributeError, ValueError):
+        return None
+    if version != VERSION or expires <= (now if now is not None else time.time()):
+        return None
+    if not hmac.compare_digest(signature, _signature(secret, expires, nonce, subject)):
+        return None
+    return nonce, expires
+
+class ReplayCache:
+    """Spent nonces until their token's expiry, bounded to max_entries"""
+
+    def __init__(self, max_entries=DEFAULT_REPLAY_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._spent = OrderedDict()
+
+    def __len__(self):
+        return len(self._spent)
+
+    def spend(self, nonce, expires, now=None):
+        """Mark nonce as used; False if it already was"""
+        now = now if now is not None else time.time()
+        while self._spent:
+            oldest, oldest_expires = next(iter(self._spent.items()))
+            if oldest_expires > now:
+                break
+            del self._spent[oldest]
+        # Checked before making room, so a full cache never forgets the nonce being replayed
+        if nonce in self._spent:
+            return False
+        if len(self._spent) >= self.max_entries:
+            self._spent.popitem(last=False)
+        self._spent[nonce] = expires
+        return True
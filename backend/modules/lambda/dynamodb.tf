@@ -26,6 +26,16 @@ resource "aws_dynamodb_table" "transactions" {
     projection_type    = "ALL"
   }
 
+  # Set only when transaction_retention_days > 0, and only on rows already written to the S3 archive
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  # Feeds the change-feed consumer (change_feed.tf)
+  stream_enabled   = true
+  stream_view_type = "NEW_AND_OLD_IMAGES"
+
   tags = {
     Name        = "${var.project_name}-${var.environment}-transactions"
     Environment = var.environment
@@ -54,4 +64,169 @@ resource "aws_dynamodb_table" "csrf_tokens" {
     Environment = var.environment
     Project     = var.project_name
   }
-}
\ No newline at end of file
+}
+
+# DynamoDB table for per-user analytics rollups
+resource "aws_dynamodb_table" "analytics_rollups" {
+  name           = "${var.project_name}-${var.environment}-analytics-rollups"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "user_id"
+  range_key      = "bucket"
+
+  attribute {
+    name = "user_id"
+    type = "S"
+  }
+
+  attribute {
+    name = "bucket"
+    type = "S"
+  }
+
+  tags = {
+    Name        = "${var.project_name}-${var.environment}-analytics-rollups"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+# DynamoDB table for per-user spend and velocity counters
+resource "aws_dynamodb_table" "spend_counters" {
+  name           = "${var.project_name}-${var.environment}-spend-counters"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "user_id"
+  range_key      = "period"
+
+  attribute {
+    name = "user_id"
+    type = "S"
+  }
+
+  attribute {
+    name = "period"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  tags = {
+    Name        = "${var.project_name}-${var.environment}-spend-counters"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+# Streaming amount statistics per user and per (user, merchant) for anomaly scoring
+resource "aws_dynamodb_table" "user_stats" {
+  name           = "${var.project_name}-${var.environment}-user-stats"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "user_id"
+  range_key      = "stats_key"
+
+  attribute {
+    name = "user_id"
+    type = "S"
+  }
+
+  attribute {
+    name = "stats_key"
+    type = "S"
+  }
+
+  tags = {
+    Name        = "${var.project_name}-${var.environment}-user-stats"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+# Idempotency keys for transaction submission: one item per (caller, route, key) holding the stored response
+resource "aws_dynamodb_table" "idempotency_keys" {
+  name           = "${var.project_name}-${var.environment}-idempotency-keys"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "idempotency_key"
+
+  attribute {
+    name = "idempotency_key"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  tags = {
+    Name        = "${var.project_name}-${var.environment}-idempotency-keys"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+# Held alert digests (alerts.py): one item per open window, swept once overdue
+resource "aws_dynamodb_table" "alert_windows" {
+  name           = "${var.project_name}-${var.environment}-alert-windows"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "user_id"
+  range_key      = "window_id"
+
+  attribute {
+    name = "user_id"
+    type = "S"
+  }
+
+  attribute {
+    name = "window_id"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  tags = {
+    Name        = "${var.project_name}-${var.environment}-alert-windows"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+# Open change-feed WebSocket connections: one item per connection, looked up by user
+resource "aws_dynamodb_table" "ws_connections" {
+  name           = "${var.project_name}-${var.environment}-ws-connections"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "connection_id"
+
+  attribute {
+    name = "connection_id"
+    type = "S"
+  }
+
+  attribute {
+    name = "user_id"
+    type = "S"
+  }
+
+  global_secondary_index {
+    name               = "UserIndex"
+    hash_key           = "user_id"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["expires_at"]
+  }
+
+  # Connections last at most two hours; catches any $disconnect that never arrived
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  tags = {
+    Name        = "${var.project_name}-${var.environment}-ws-connections"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
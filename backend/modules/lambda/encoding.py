@@ -0,0 +1,118 @@
+"""JSON encoding for API responses, S3 archive objects and queue messages.
+
+DynamoDB returns numbers as Decimal. dumps() writes them as JSON numbers
+while it serializes everything else, so handlers no longer copy records or
+convert items field by field first. It uses orjson when it is installed
+(from a layer, say) and the standard library otherwise. Both produce the
+same compact output; JSON_ENCODER=json forces the standard library.
+
+Bodies that never change (the OPTIONS preflight, /test) are serialized
+once, by constant_response().
+
+compress_response() gzips a response body of at least GZIP_MIN_BYTES when
+the request's Accept-Encoding allows it. It returns the body
+base64-encoded, with Content-Encoding: gzip. Besides saving bytes on the
+wire, this keeps a large page well under Lambda's 6 MB response limit.
+API Gateway only decodes base64 bodies for binary media types, so the REST
+API declares */* as binary. As a result, request bodies arrive
+base64-encoded as well, and request_body() undoes that.
+"""
+import base64
+import binascii
+import json
+import os
+import zlib
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+GZIP_MIN_BYTES = 8192
+GZIP_LEVEL = 1
+# zlib window bits for a gzip header and trailer
+GZIP_WBITS = 31
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+_encoder = json.JSONEncoder(default=_default, separators=(',', ':'), ensure_ascii=False)
+
+def dumps_json(value):
+    return _encoder.encode(value)
+
+def dumps_orjson(value):
+    return orjson.dumps(value, default=_default).decode('utf-8')
+
+if orjson is not None and os.environ.get('JSON_ENCODER', 'auto') != 'json':
+    dumps = dumps_orjson
+    ENCODER = 'orjson'
+else:
+    dumps = dumps_json
+    ENCODER = 'json'
+
+def constant_response(status_code, headers, document):
+    """A response whose body is serialized now; return a copy of it (dict(response)) from handlers"""
+    return {'statusCode': status_code, 'headers': headers, 'body': dumps(document)}
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header value allows gzip"""
+    if not accept_encoding:
+        return False
+    qualities = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = params.strip().replace(' ', '')
+        try:
+            qualities[coding.strip().lower()] = float(quality[2:]) if quality.startswith('q=') else 1.0
+        except ValueError:
+            qualities[coding.strip().lower()] = 0.0
+    # gzip named explicitly (gzip;q=0 included) overrides the wildcard
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
+
+def header(headers, name):
+    """A request header, with the name matched case-insensitively"""
+    if not headers:
+        return None
+    value = headers.get(name)
+    if value is not None:
+        return value
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+def gzip_bytes(payload, level=GZIP_LEVEL):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(payload) + compressor.flush()
+
+def compress_response(response, accept_encoding, min_bytes=GZIP_MIN_BYTES, level=GZIP_LEVEL):
+    """response with its body gzipped and base64-encoded if it is large enough and the client accepts gzip"""
+    body = response.get('body')
+    if (not body or len(body) < min_bytes or response.get('isBase64Encoded')
+            or not accepts_gzip(accept_encoding)):
+        return response
+    headers = response.get('headers') or {}
+    if 'Content-Encoding' in headers:
+        return response
+    compressed = gzip_bytes(body.encode('utf-8'), level)
+    return dict(response,
+                headers={**headers, 'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'},
+                body=base64.b64encode(compressed).decode('ascii'),
+                isBase64Encoded=True)
+
+def request_body(event):
+    """The request body as text, decoded from base64 if API Gateway encoded it; ValueError if it isn't base64 UTF-8"""
+    body = event.get('body')
+    if not body or not event.get('isBase64Encoded'):
+        return body
+    try:
+        return base64.b64decode(body, validate=True).decode('utf-8')
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(f"Request body could not be decoded: {str(e)}")
@@ -0,0 +1,241 @@
+"""Exchange rates: units of each currency per USD, versioned over time.
+
+A rates file (local path or s3://bucket/key) holds dated snapshots:
+
+    {"snapshots": [
+        {"effective": "2026-01-01", "rates": {"USD": 1.0, "EUR": 0.93, ...}},
+        {"effective": "2026-10-01T00:00:00+00:00", "rates": {"USD": 1.0, "EUR": 0.92, ...}}
+    ]}
+
+or a single {"rates": {...}} that applies at all times. A RateTable serves
+the snapshot in effect now as a plain dict, so to_usd() is one dict lookup
+and a division, and answers rates_at(timestamp) for historical records with
+a binary search over the snapshot start times.
+
+ReloadingRates keeps a RateTable per container in the same way
+merchant_matcher.ReloadingMatcher keeps its keyword automaton: the first
+get() loads the file, afterwards its ETag is polled at most once per
+refresh_interval and changes are loaded on a daemon thread while the old
+table keeps serving. Without a file, or if it can't be loaded, the built-in
+DEFAULT_RATES are used.
+
+POST /transaction and /transactions/batch reject a currency that has no
+rate in the current snapshot, so new records are never converted at a
+guessed rate. to_usd() still treats an unknown currency as USD (with a
+warning) for records stored before that check, or for currencies a later
+rates file dropped.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from bisect import bisect_right
+
+from merchant_matcher import LocalKeywordSource, S3KeywordSource
+
+logger = logging.getLogger(__name__)
+
+BASE_CURRENCY = 'USD'
+DEFAULT_REFRESH_SECONDS = 300
+# Units of each currency per USD
+DEFAULT_RATES = {
+    'USD': 1.0, 'EUR': 0.92, 'GBP': 0.79, 'GHS': 12.05,
+    'JPY': 149.50, 'INR': 83.25, 'NGN': 775.00, 'ZAR': 18.75,
+    'KES': 129.50, 'CAD': 1.36
+}
+
+class RatesError(Exception):
+    pass
+
+def to_epoch(value):
+    """Epoch seconds of an ISO date/datetime string, a datetime/date, or a number"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            raise RatesError(f"Invalid timestamp: {value}")
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return value.timestamp()
+    if isinstance(value, datetime.date):
+        return datetime.datetime(value.year, value.month, value.day, tzinfo=datetime.timezone.utc).timestamp()
+    raise RatesError(f"Invalid timestamp: {value!r}")
+
+def parse_rates(text):
+    """[(effective_epoch, rates)] from a rates file, oldest first"""
+    try:
+        document = json.loads(text)
+    except ValueError as e:
+        raise RatesError(f"Rates file is not valid JSON: {str(e)}")
+    entries = document.get('snapshots') if isinstance(document, dict) else None
+    if entries is None:
+        entries = [{'effective': 0, 'rates': document.get('rates') if isinstance(document, dict) else None}]
+    snapshots = []
+    for entry in entries:
+        rates = entry.get('rates')
+        if not isinstance(rates, dict) or not rates:
+            raise RatesError('Every snapshot needs a non-empty rates object')
+        try:
+            rates = {str(code).upper(): float(rate) for code, rate in rates.items()}
+        except (TypeError, ValueError):
+            raise RatesError('Rates must be numbers')
+        if any(not math.isfinite(rate) or rate <= 0 for rate in rates.values()):
+            raise RatesError('Rates must be positive')
+        rates[BASE_CURRENCY] = 1.0
+        snapshots.append((to_epoch(entry.get('effective', 0)), rates))
+    snapshots.sort(key=lambda snapshot: snapshot[0])
+    return snapshots
+
+class RateTable:
+    def __init__(self, snapshots, version='default', now=None):
+        self.version = version
+        self._starts = [start for start, _ in snapshots]
+        self._snapshots = [rates for _, rates in snapshots]
+        self._warned = set()
+        self.advance(now)
+
+    def advance(self, now=None):
+        """Make the snapshot in effect at now (default: the current time) the current one"""
+        now = time.time() if now is None else now
+        index = max(0, bisect_right(self._starts, now) - 1)
+        self.rates = self._snapshots[index]
+        self.effective = self._starts[index]
+        self.valid_until = self._starts[index + 1] if index + 1 < len(self._starts) else math.inf
+
+    def __len__(self):
+        return len(self._snapshots)
+
+    def _unknown(self, currency):
+        if currency not in self._warned:
+            self._warned.add(currency)
+            logger.warning(f"No exchange rate for currency {currency!r}; treating it as USD")
+        return 1.0
+
+    def to_usd(self, amount, currency):
+        rate = self.rates.get(currency)
+        return amount / (rate if rate is not None else self._unknown(currency))
+
+    def rates_at(self, timestamp):
+        """Rates in effect at timestamp; the oldest snapshot for anything before it"""
+        index = bisect_right(self._starts, to_epoch(timestamp)) - 1
+        return self._snapshots[max(0, index)]
+
+    def to_usd_at(self, amount, currency, timestamp):
+        if timestamp is None or len(self._starts) == 1:
+            return self.to_usd(amount, currency)
+        rate = self.rates_at(timestamp).get(currency)
+        return amount / (rate if rate is not None else self._unknown(currency))
+
+    def periods(self, start, end):
+        """[(from_epoch, to_epoch, rates)] covering [start, end), one per snapshot in effect"""
+        start, end = to_epoch(start), to_epoch(end)
+        first = max(0, bisect_right(self._starts, start) - 1)
+        periods = []
+        for index in range(first, len(self._snapshots)):
+            period_start = max(start, self._starts[index])
+            if period_start >= end:
+                break
+            period_end = min(end, self._starts[index + 1]) if index + 1 < len(self._starts) else end
+            periods.append((period_start, period_end, self._snapshots[index]))
+        return periods
+
+    def document(self, at=None):
+        """GET /fx-rates body: the current rates, or those in effect at 'at'"""
+        if at is None:
+            rates, effective = self.rates, self.effective
+        else:
+            index = max(0, bisect_right(self._starts, to_epoch(at)) - 1)
+            rates, effective = self._snapshots[index], self._starts[index]
+        return {
+            'base': BASE_CURRENCY,
+            'version': self.version,
+            'effective': datetime.datetime.fromtimestamp(effective, datetime.timezone.utc).isoformat(),
+            'rates': rates
+        }
+
+def default_table():
+    return RateTable([(0.0, dict(DEFAULT_RATES))])
+
+class LocalRateSource(LocalKeywordSource):
+    def load(self):
+        with open(self.path, encoding='utf-8') as f:
+            return parse_rates(f.read())
+
+class S3RateSource(S3KeywordSource):
+    def load(self):
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key)
+        return parse_rates(response['Body'].read().decode('utf-8'))
+
+def rate_source(location):
+    """Build a source from 's3://bucket/key' or a local file path"""
+    if not location:
+        return None
+    if location.startswith('s3://'):
+        bucket, _, key = location[len('s3://'):].partition('/')
+        return S3RateSource(bucket, key)
+    return LocalRateSource(location)
+
+class ReloadingRates:
+    """Serves a RateTable and swaps in a new one when the rates file changes"""
+
+    def __init__(self, source=None, refresh_interval=DEFAULT_REFRESH_SECONDS):
+        self.source = source
+        self.refresh_interval = refresh_interval
+        self.etag = None
+        self._table = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get(self):
+        table = self._table
+        if table is None:
+            with self._lock:
+                if self._table is None:
+                    self._table = default_table()
+                    self._checked_at = time.monotonic()
+                    if self.source:
+                        self._refresh()
+            table = self._table
+        elif time.monotonic() - self._checked_at >= self.refresh_interval:
+            # A snapshot dated in the future takes over within one refresh interval of its start
+            if time.time() >= table.valid_until:
+                table.advance()
+            if self.source:
+                self._start_background_refresh()
+            else:
+                self._checked_at = time.monotonic()
+        return table
+
+    def _start_background_refresh(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self._checked_at = time.monotonic()
+        threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self._refresh()
+        finally:
+            self._refreshing = False
+
+    def _refresh(self):
+        try:
+            etag = self.source.etag()
+            if etag == self.etag:
+                return
+            snapshots = self.source.load()
+            version = hashlib.sha256(json.dumps(snapshots, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+            self._table = RateTable(snapshots, version=version)
+            self.etag = etag
+            logger.info(f"Exchange rates loaded: {len(snapshots)} snapshots, version {version} (etag {etag})")
+        except Exception as e:
+            logger.error(f"Failed to refresh exchange rates: {str(e)}")
@@ -34,10 +34,17 @@ resource "aws_iam_role_policy" "lambda_permissions" {
         Effect   = "Allow"
         Action   = [
           "s3:PutObject",
-          "s3:GetObject"
+          "s3:GetObject",
+          "s3:DeleteObject",
+          "s3:AbortMultipartUpload"
         ]
         Resource = "${var.s3_bucket_arn}/*"
       },
+      {
+        Effect   = "Allow"
+        Action   = ["s3:ListBucket"]
+        Resource = var.s3_bucket_arn
+      },
       {
         Effect = "Allow"
         Action = [
@@ -60,6 +67,7 @@ resource "aws_iam_role_policy" "lambda_permissions" {
         Effect = "Allow"
         Action = [
           "dynamodb:PutItem",
+          "dynamodb:BatchWriteItem",
           "dynamodb:GetItem",
           "dynamodb:Query",
           "dynamodb:Scan",
@@ -71,6 +79,13 @@ resource "aws_iam_role_policy" "lambda_permissions" {
           "${aws_dynamodb_table.transactions.arn}/index/*",
           aws_dynamodb_table.csrf_tokens.arn,
           "${aws_dynamodb_table.csrf_tokens.arn}/index/*",
+          aws_dynamodb_table.analytics_rollups.arn,
+          aws_dynamodb_table.spend_counters.arn,
+          aws_dynamodb_table.user_stats.arn,
+          aws_dynamodb_table.idempotency_keys.arn,
+          aws_dynamodb_table.alert_windows.arn,
+          aws_dynamodb_table.ws_connections.arn,
+          "${aws_dynamodb_table.ws_connections.arn}/index/*",
           "arn:aws:dynamodb:*:*:table/${var.project_name}-${var.environment}-user-profiles"
         ]
       },
@@ -80,6 +95,33 @@ resource "aws_iam_role_policy" "lambda_permissions" {
           "sns:Publish"
         ]
         Resource = aws_sns_topic.transaction_alerts.arn
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "sqs:SendMessage",
+          "sqs:ReceiveMessage",
+          "sqs:DeleteMessage",
+          "sqs:GetQueueAttributes"
+        ]
+        Resource = aws_sqs_queue.side_effects.arn
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:DescribeStream",
+          "dynamodb:GetRecords",
+          "dynamodb:GetShardIterator",
+          "dynamodb:ListStreams"
+        ]
+        Resource = aws_dynamodb_table.transactions.stream_arn
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "execute-api:ManageConnections"
+        ]
+        Resource = "${aws_apigatewayv2_api.change_feed.execution_arn}/*"
       }
     ]
   })
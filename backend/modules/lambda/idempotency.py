@@ -0,0 +1,158 @@
+"""Idempotency keys for POST routes.
+
+A client that may retry a request (timeouts, API Gateway retries, double
+clicks) sends the same Idempotency-Key header with each attempt. The first
+attempt runs the handler; every later one gets the stored response back
+without re-scoring or repeating any side effects.
+
+The key table holds one item per (caller, route, key):
+
+- status: 'in_progress' while the first attempt runs, then 'complete'
+- request_hash: SHA-256 of the request body, so a key reused for a
+  different request is rejected rather than answered with the wrong response
+- status_code, response: the stored response, its body zlib-compressed
+- locked_until: epoch seconds after which an in-progress claim is treated
+  as abandoned (the container died before completing it)
+- expires_at: TTL
+
+An attempt claims its key with one conditional PutItem. If the claim fails,
+the item returned with the failure says whether to replay the response,
+answer 409 because the first attempt is still running, or answer 422 for a
+different body. Completed keys are also kept in a per-container LRU, so a
+retry that lands on the same warm container costs no DynamoDB calls.
+Without a table only that LRU is used, which catches retries within one
+container but not concurrent duplicates across containers.
+"""
+import hashlib
+import time
+import zlib
+
+KEY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+DEFAULT_TTL_SECONDS = 86400
+DEFAULT_LOCK_SECONDS = 60
+# DynamoDB items are capped at 400 KB; larger responses are recorded but not replayed
+MAX_STORED_RESPONSE_BYTES = 350000
+
+IN_PROGRESS = 'in_progress'
+COMPLETE = 'complete'
+
+# begin() outcomes
+NEW = 'new'
+REPLAY = 'replay'
+CONFLICT = 'conflict'
+MISMATCH = 'mismatch'
+
+def header_key(headers):
+    """The Idempotency-Key header value, or None; header names are matched case-insensitively"""
+    for name, value in (headers or {}).items():
+        if name.lower() == 'idempotency-key':
+            return value
+    return None
+
+def validate_key(key):
+    """Error message for an unusable key, otherwise None"""
+    if not isinstance(key, str) or not key.strip():
+        return f'{KEY_HEADER} must not be empty'
+    if len(key) > MAX_KEY_LENGTH:
+        return f'{KEY_HEADER} must be at most {MAX_KEY_LENGTH} characters'
+    if not key.isprintable():
+        return f'{KEY_HEADER} must be printable'
+    return None
+
+def scope(user_id, route, key):
+    return f"{user_id}#{route}#{key}"
+
+def request_hash(body):
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return hashlib.sha256(body or b'').hexdigest()
+
+def _plain(value):
+    """Python value of a resource or low-level attribute (ConditionalCheckFailed returns the latter)"""
+    if isinstance(value, dict) and len(value) == 1:
+        kind, inner = next(iter(value.items()))
+        if kind == 'N':
+            return float(inner)
+        if kind in ('S', 'B'):
+            return inner
+    # boto3.dynamodb.types.Binary
+    return getattr(value, 'value', value)
+
+def stored_response(item):
+    """{'request_hash', 'status_code', 'body'} of a completed item; body is None if it wasn't stored"""
+    body = _plain(item.get('response')) if item.get('response') is not None else None
+    return {
+        'request_hash': _plain(item.get('request_hash')),
+        'status_code': int(_plain(item['status_code'])),
+        'body': zlib.decompress(bytes(body)).decode('utf-8') if body is not None else None
+    }
+
+class IdempotencyStore:
+    def __init__(self, table=None, conditions=None, cache=None, ttl=DEFAULT_TTL_SECONDS,
+                 lock_seconds=DEFAULT_LOCK_SECONDS):
+        self.table = table
+        self.conditions = conditions
+        self.cache = cache
+        self.ttl = ttl
+        self.lock_seconds = lock_seconds
+
+    def begin(self, key, fingerprint, now=None):
+        """Claim key for a request with body hash fingerprint; returns (outcome, stored response or None)"""
+        if self.cache is not None:
+            found, stored = self.cache.get(key)
+            if found:
+                return (REPLAY if stored['request_hash'] == fingerprint else MISMATCH), stored
+        if self.table is None:
+            return NEW, None
+        now = int(now if now is not None else time.time())
+        Attr = self.conditions.Attr
+        # A new key, an expired one the TTL sweep hasn't removed yet, or a claim abandoned mid-request
+        condition = (Attr('idempotency_key').not_exists() | Attr('expires_at').lt(now)
+                     | (Attr('status').eq(IN_PROGRESS) & Attr('locked_until').lt(now)))
+        try:
+            self.table.put_item(
+                Item={'idempotency_key': key, 'status': IN_PROGRESS, 'request_hash': fingerprint,
+                      'locked_until': now + self.lock_seconds, 'expires_at': now + self.ttl},
+                ConditionExpression=condition,
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+            return NEW, None
+        except Exception as e:
+            # botocore ClientError; matched by code so botocore isn't imported up front
+            response = getattr(e, 'response', {})
+            if response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+            item = response.get('Item')
+            if item is None:
+                item = self.table.get_item(Key={'idempotency_key': key}, ConsistentRead=True).get('Item') or {}
+        if _plain(item.get('request_hash')) != fingerprint:
+            return MISMATCH, None
+        if _plain(item.get('status')) != COMPLETE:
+            return CONFLICT, None
+        stored = stored_response(item)
+        if self.cache is not None:
+            self.cache.put(key, stored)
+        return REPLAY, stored
+
+    def complete(self, key, fingerprint, status_code, body, now=None):
+        """Store the response of the attempt that claimed key"""
+        stored = {'request_hash': fingerprint, 'status_code': status_code, 'body': body}
+        if self.table is not None:
+            now = int(now if now is not None else time.time())
+            compressed = zlib.compress((body or '').encode('utf-8'))
+            item = {'idempotency_key': key, 'status': COMPLETE, 'request_hash': fingerprint,
+                    'status_code': status_code, 'expires_at': now + self.ttl}
+            if len(compressed) <= MAX_STORED_RESPONSE_BYTES:
+                item['response'] = compressed
+            else:
+                stored['body'] = None
+            self.table.put_item(Item=item)
+        if self.cache is not None:
+            self.cache.put(key, stored)
+        return stored
+
+    def release(self, key):
+        """Drop a claim whose attempt failed, so a retry runs the handler again"""
+        if self.table is not None:
+            self.table.delete_item(Key={'idempotency_key': key})
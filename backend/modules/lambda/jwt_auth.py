@@ -0,0 +1,194 @@
+"""Verification of Cognito-issued JWTs.
+
+Cognito signs ID and access tokens with RS256. The signature is checked
+against the user pool's JWKS document, which is fetched once per container
+and refetched only when a token names a kid that isn't cached (key
+rotation), at most once every min_refresh_seconds. RSA PKCS#1 v1.5
+verification needs only pow() and hashlib, so the Lambda package doesn't
+carry a crypto dependency.
+
+Verified tokens are kept in a small LRU until they expire, so a session
+making repeated requests to the same container pays for the signature
+check once.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_MAX_ENTRIES = 1024
+DEFAULT_LEEWAY_SECONDS = 30
+DEFAULT_JWKS_MIN_REFRESH_SECONDS = 60
+JWKS_FETCH_TIMEOUT = 3
+# DER prefix of DigestInfo for SHA-256 (RFC 8017, section 9.2)
+SHA256_DIGEST_INFO = bytes.fromhex('3031300d060960864801650304020105000420')
+
+class AuthError(Exception):
+    def __init__(self, message, status_code=401):
+        super().__init__(message)
+        self.status_code = status_code
+
+def b64url_decode(segment):
+    return base64.urlsafe_b64decode(segment + '=' * (-len(segment) % 4))
+
+def issuer_url(user_pool_id):
+    """Issuer (iss) of tokens from a pool; the region is the pool id's prefix"""
+    region = user_pool_id.split('_')[0]
+    return f"https://cognito-idp.{region}.amazonaws.com/{user_pool_id}"
+
+def rsa_verify_sha256(modulus, exponent, message, signature):
+    """RSASSA-PKCS1-v1_5 signature check with SHA-256"""
+    size = (modulus.bit_length() + 7) // 8
+    if len(signature) != size:
+        return False
+    value = int.from_bytes(signature, 'big')
+    if value >= modulus:
+        return False
+    encoded = pow(value, exponent, modulus).to_bytes(size, 'big')
+    digest_info = SHA256_DIGEST_INFO + hashlib.sha256(message).digest()
+    expected = b'\x00\x01' + b'\xff' * (size - len(digest_info) - 3) + b'\x00' + digest_info
+    return hmac.compare_digest(encoded, expected)
+
+def fetch_json(url):
+    import urllib.request
+    with urllib.request.urlopen(url, timeout=JWKS_FETCH_TIMEOUT) as response:
+        return json.loads(response.read())
+
+class Jwks:
+    """RSA public keys from a JWKS URL, keyed by kid"""
+
+    def __init__(self, url, fetch=fetch_json, min_refresh_seconds=DEFAULT_JWKS_MIN_REFRESH_SECONDS,
+                 clock=time.monotonic):
+        self.url = url
+        self.fetch = fetch
+        self.min_refresh_seconds = min_refresh_seconds
+        self._clock = clock
+        self._keys = {}
+        self._fetched_at = None
+        self.fetches = 0
+
+    def key(self, kid):
+        """(modulus, exponent) for kid, refetching the document once if kid is unknown"""
+        if kid not in self._keys and (self._fetched_at is None
+                                      or self._clock() - self._fetched_at >= self.min_refresh_seconds):
+            self.refresh()
+        key = self._keys.get(kid)
+        if key is None:
+            raise AuthError('Invalid token')
+        return key
+
+    def refresh(self):
+        self._fetched_at = self._clock()
+        try:
+            document = self.fetch(self.url)
+        except Exception as e:
+            logger.error(f"Failed to fetch JWKS from {self.url}: {str(e)}")
+            if not self._keys:
+                raise AuthError('Authentication temporarily unavailable', 503)
+            return
+        self.fetches += 1
+        keys = {}
+        for jwk in (document.get('keys') if isinstance(document, dict) else None) or []:
+            if not isinstance(jwk, dict) or not isinstance(jwk.get('kid'), str):
+                continue
+            if jwk.get('kty') != 'RSA' or jwk.get('alg', 'RS256') != 'RS256' or jwk.get('use', 'sig') != 'sig':
+                continue
+            try:
+                modulus = int.from_bytes(b64url_decode(jwk['n']), 'big')
+                exponent = int.from_bytes(b64url_decode(jwk['e']), 'big')
+            except (KeyError, ValueError, TypeError, AttributeError) as e:
+                logger.warning(f"Skipping malformed JWKS key {jwk['kid']}: {str(e)}")
+                continue
+            if modulus and exponent:
+                keys[jwk['kid']] = (modulus, exponent)
+        self._keys = keys
+        logger.info(f"Loaded {len(keys)} signing keys from JWKS")
+
+class TokenCache:
+    """LRU of verified token -> claims; entries drop out when the token expires"""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, token, now):
+        entry = self._entries.get(token)
+        if entry is not None and now >= entry[0]:
+            del self._entries[token]
+            entry = None
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        self._entries.move_to_end(token)
+        self.stats['hits'] += 1
+        return entry[1]
+
+    def put(self, token, claims, expires_at):
+        self._entries[token] = (expires_at, claims)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+class JwtVerifier:
+    """Checks signature, expiry, issuer and audience of Cognito ID and access tokens"""
+
+    def __init__(self, jwks, issuer, client_id, cache=None, leeway=DEFAULT_LEEWAY_SECONDS, clock=time.time):
+        self.jwks = jwks
+        self.issuer = issuer
+        self.client_id = client_id
+        self.cache = cache if cache is not None else TokenCache()
+        self.leeway = leeway
+        self._clock = clock
+
+    def verify(self, token):
+        """Claims of a valid token; raises AuthError otherwise"""
+        now = self._clock()
+        claims = self.cache.get(token, now)
+        if claims is not None:
+            return claims
+        # Anything malformed (bad base64 or JSON, non-ASCII, JSON that isn't an object) is a 401, not a 500
+        try:
+            header_b64, payload_b64, signature_b64 = token.split('.')
+            header = json.loads(b64url_decode(header_b64))
+            signature = b64url_decode(signature_b64)
+            signed = f"{header_b64}.{payload_b64}".encode('ascii')
+        except (ValueError, TypeError, AttributeError, UnicodeError):
+            raise AuthError('Invalid token')
+        if not isinstance(header, dict) or header.get('alg') != 'RS256' or not isinstance(header.get('kid'), str):
+            raise AuthError('Invalid token')
+        modulus, exponent = self.jwks.key(header['kid'])
+        if not rsa_verify_sha256(modulus, exponent, signed, signature):
+            raise AuthError('Invalid token')
+        try:
+            claims = json.loads(b64url_decode(payload_b64))
+        except (ValueError, TypeError, AttributeError, UnicodeError):
+            raise AuthError('Invalid token')
+        self._check_claims(claims, now)
+        self.cache.put(token, claims, float(claims['exp']) + self.leeway)
+        return claims
+
+    def _check_claims(self, claims, now):
+        if not isinstance(claims, dict) or not isinstance(claims.get('exp'), (int, float)):
+            raise AuthError('Invalid token')
+        if now >= claims['exp'] + self.leeway:
+            raise AuthError('Token expired')
+        if claims.get('iss') != self.issuer:
+            raise AuthError('Invalid token')
+        # ID tokens name the app client in aud, access tokens in client_id
+        token_use = claims.get('token_use')
+        audience = claims.get('aud') if token_use == 'id' else claims.get('client_id') if token_use == 'access' else None
+        if audience != self.client_id:
+            raise AuthError('Invalid token')
@@ -1,56 +1,88 @@
+import base64
 import json
-import boto3
 import datetime
 import uuid
 import logging
 import os
 import secrets
+import time
 from decimal import Decimal
 
+import alerts
+import analytics
+import archive_compaction
+import aws_clients
+import change_feed
+import csrf
+import encoding
+import idempotency
+import jwt_auth
+import metrics
+import transaction_export
+from alerts import AlertAggregator, TokenBucket
+from aws_clients import LazyClient
+from jwt_auth import AuthError, Jwks, JwtVerifier, TokenCache
+from routing import AUTH_NONE, AUTH_OPTIONAL, AUTH_REQUIRED, Route, Router
+import spend_counters
+import transaction_tiers
+import user_stats
+from ttl_cache import TTLCache, profile_version
+from fx_rates import RatesError
+from risk_scoring import exchange_rates, risk_threshold, score_transaction, to_usd
+
 # Force redeployment - updated permissions
 
 # ------------------- SETUP -------------------
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# S3 client
-try:
-    s3_client = boto3.client('s3')
-except Exception as e:
-    logger.error(f"Failed to initialize S3 client: {str(e)}")
-    raise
-
-# DynamoDB clients
-try:
-    dynamodb = boto3.resource('dynamodb')
-    csrf_table = dynamodb.Table('csrf-tokens')
-    transactions_table_name = os.environ.get('DYNAMODB_TABLE_NAME')
-    if transactions_table_name:
-        transactions_table = dynamodb.Table(transactions_table_name)
-    else:
-        transactions_table = None
-    
-    # User profiles table
-    user_profiles_table = dynamodb.Table('transaction-monitor-dev-user-profiles')
-except Exception as e:
-    logger.error(f"Failed to initialize DynamoDB client: {str(e)}")
-    csrf_table = None
-    transactions_table = None
-    user_profiles_table = None
-
-# Cognito client
-try:
-    cognito_client = boto3.client('cognito-idp')
-except Exception as e:
-    logger.error(f"Failed to initialize Cognito client: {str(e)}")
-    raise
-
-# SNS client
-try:
-    sns_client = boto3.client('sns')
-except Exception as e:
-    logger.error(f"Failed to initialize SNS client: {str(e)}")
-    sns_client = None
+# AWS clients and tables are built on first use (see aws_clients.py), so
+# routes only pay for the clients they actually touch
+s3_client = LazyClient(aws_clients.client, 's3')
+cognito_client = LazyClient(aws_clients.client, 'cognito-idp')
+sns_client = LazyClient(aws_clients.client, 'sns')
+
+# DynamoDB
+dynamodb = LazyClient(aws_clients.resource, 'dynamodb')
+csrf_table = LazyClient(aws_clients.table, 'csrf-tokens')
+transactions_table_name = os.environ.get('DYNAMODB_TABLE_NAME')
+transactions_table = LazyClient(aws_clients.table, transactions_table_name) if transactions_table_name else None
+
+# User profiles table
+user_profiles_table = LazyClient(aws_clients.table, 'transaction-monitor-dev-user-profiles')
+
+# Per-user analytics rollups
+analytics_table_name = os.environ.get('ANALYTICS_TABLE_NAME')
+analytics_table = LazyClient(aws_clients.table, analytics_table_name) if analytics_table_name else None
+
+# Per-user daily/monthly spend and velocity counters
+spend_counters_table_name = os.environ.get('SPEND_COUNTERS_TABLE_NAME')
+spend_counters_table = LazyClient(aws_clients.table, spend_counters_table_name) if spend_counters_table_name else None
+
+# Per-user streaming amount statistics for anomaly scoring
+user_stats_table_name = os.environ.get('USER_STATS_TABLE_NAME')
+user_stats_table = LazyClient(aws_clients.table, user_stats_table_name) if user_stats_table_name else None
+
+# Idempotency keys for POST /transaction and /transactions/batch
+idempotency_table_name = os.environ.get('IDEMPOTENCY_TABLE_NAME')
+idempotency_table = LazyClient(aws_clients.table, idempotency_table_name) if idempotency_table_name else None
+
+# WebSocket change feed: open connections per user, and the management API of the WebSocket stage
+connections_table_name = os.environ.get('CONNECTIONS_TABLE_NAME')
+connections_table = LazyClient(aws_clients.table, connections_table_name) if connections_table_name else None
+CHANGE_FEED_URL = os.environ.get('CHANGE_FEED_URL')
+CHANGE_FEED_ENDPOINT = os.environ.get('CHANGE_FEED_ENDPOINT')
+management_client = (LazyClient(aws_clients.client, 'apigatewaymanagementapi', CHANGE_FEED_ENDPOINT)
+                     if CHANGE_FEED_ENDPOINT else None)
+
+# Held alert digests, so they survive the container and the scheduled sweep can send them
+alert_windows_table_name = os.environ.get('ALERT_WINDOWS_TABLE_NAME')
+alert_windows_table = LazyClient(aws_clients.table, alert_windows_table_name) if alert_windows_table_name else None
+
+# SQS client for the asynchronous side-effect queue
+SIDE_EFFECTS_MODE = os.environ.get('SIDE_EFFECTS_MODE', 'sync')
+SIDE_EFFECTS_QUEUE_URL = os.environ.get('SIDE_EFFECTS_QUEUE_URL')
+sqs_client = LazyClient(aws_clients.client, 'sqs') if SIDE_EFFECTS_QUEUE_URL else None
 
 S3_BUCKET = os.environ.get('S3_BUCKET')
 PROJECT_NAME = os.environ.get('PROJECT_NAME')
@@ -61,18 +93,102 @@ if not S3_BUCKET or not PROJECT_NAME or not ENVIRONMENT:
     raise ValueError("S3_BUCKET, PROJECT_NAME, and ENVIRONMENT env vars are required")
 
 _cognito_cache = {}
+
+def stored_profile_version(user_id):
+    """Version of the stored profile (0 when there is none), read without the rest of the item"""
+    item = user_profiles_table.get_item(
+        Key={'user_id': user_id}, ProjectionExpression='#v', ExpressionAttributeNames={'#v': 'version'}
+    ).get('Item')
+    return profile_version(item)
+
+# Other containers' profile updates show up here at the next version check
+_profile_cache = TTLCache(
+    max_entries=int(os.environ.get('PROFILE_CACHE_MAX_ENTRIES', '1024')),
+    ttl=float(os.environ.get('PROFILE_CACHE_TTL_SECONDS', '60')),
+    version=profile_version,
+    revalidate=stored_profile_version,
+    revalidate_after=float(os.environ.get('PROFILE_CACHE_REVALIDATE_SECONDS', '5')),
+    name='Profile cache'
+)
+# Last written stats per (user, key); the conditional write catches any that went stale
+_user_stats_cache = TTLCache(
+    max_entries=int(os.environ.get('USER_STATS_CACHE_MAX_ENTRIES', '4096')),
+    ttl=float(os.environ.get('USER_STATS_CACHE_TTL_SECONDS', '3600')),
+    log_every=0
+)
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', idempotency.DEFAULT_TTL_SECONDS))
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', idempotency.DEFAULT_LOCK_SECONDS))
+# Completed keys, so a retry reaching the same container is answered without a DynamoDB call
+_idempotency_cache = TTLCache(
+    max_entries=int(os.environ.get('IDEMPOTENCY_CACHE_MAX_ENTRIES', '1024')),
+    ttl=IDEMPOTENCY_TTL_SECONDS,
+    log_every=0
+)
+CHANGE_FEED_CONNECTION_TTL_SECONDS = int(os.environ.get('CHANGE_FEED_CONNECTION_TTL_SECONDS',
+                                                        change_feed.DEFAULT_CONNECTION_TTL_SECONDS))
+CHANGE_FEED_SEND_WORKERS = int(os.environ.get('CHANGE_FEED_SEND_WORKERS', change_feed.DEFAULT_SEND_WORKERS))
+# Without a table, connections are only known to the container that accepted them
+change_feed_connections = (
+    change_feed.TableConnections(connections_table, LazyClient(aws_clients.dynamodb_conditions),
+                                 ttl=CHANGE_FEED_CONNECTION_TTL_SECONDS)
+    if connections_table else change_feed.MemoryConnections()
+)
 POOL_NAME = f"{PROJECT_NAME}-{ENVIRONMENT}-userpool"
 
 UTC = datetime.timezone.utc
 _today_cache = {'date': None, 'str': None}
-HIGH_RISK_MERCHANTS = ['casino', 'crypto', 'gambling']
+
+# Batch ingestion limits (DynamoDB BatchWriteItem accepts at most 25 puts per call)
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '5000'))
+DYNAMODB_BATCH_CHUNK = 25
+BATCH_WRITE_MAX_ATTEMPTS = 5
+BATCH_WRITE_BASE_DELAY = 0.05
+
+# GET /transactions paging
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+SCAN_FALLBACK_MAX_PAGES = 5
+# Key attributes of each cursor mode: a UserTimestampIndex or scan LastEvaluatedKey, or an archive position
+CURSOR_KEYS = {
+    'query': {'transaction_id', 'user_id', 'timestamp'},
+    'scan': {'transaction_id'},
+    'archive': {'day', 'after'},
+}
+# Hot/cold tiering: with a retention, transactions expire from the table after that many days
+# and older pages are read from the S3 archive, at most ARCHIVE_MAX_DAYS_PER_PAGE days per request
+TRANSACTION_RETENTION_DAYS = int(os.environ.get('TRANSACTION_RETENTION_DAYS', '0'))
+ARCHIVE_MAX_DAYS_PER_PAGE = int(os.environ.get('ARCHIVE_MAX_DAYS_PER_PAGE', '7'))
+# Retry-After for a cold page whose days the compactor hasn't reached yet
+ARCHIVE_NOT_READY_RETRY_AFTER = '3600'
+_archive_days = transaction_tiers.ArchiveDays()
+# POST /transactions/export: rows per UserTimestampIndex page, multipart part size, how long the
+# presigned download URL lasts and how long one request may spend before handing back a cursor
+EXPORT_QUERY_PAGE_SIZE = int(os.environ.get('EXPORT_QUERY_PAGE_SIZE', transaction_export.DEFAULT_QUERY_PAGE_SIZE))
+EXPORT_PART_BYTES = int(os.environ.get('EXPORT_PART_BYTES', transaction_export.DEFAULT_PART_BYTES))
+EXPORT_URL_TTL_SECONDS = int(os.environ.get('EXPORT_URL_TTL_SECONDS', transaction_export.DEFAULT_URL_TTL_SECONDS))
+EXPORT_TIME_BUDGET_SECONDS = float(os.environ.get('EXPORT_TIME_BUDGET_SECONDS',
+                                                  transaction_export.DEFAULT_TIME_BUDGET_SECONDS))
+DEFAULT_ANALYTICS_DAYS = 30
+MAX_ANALYTICS_DAYS = 366
+VELOCITY_WINDOW_MINUTES = int(os.environ.get('VELOCITY_WINDOW_MINUTES', spend_counters.DEFAULT_WINDOW_MINUTES))
+TRANSACTION_FIELDS = {
+    'transaction_id', 'user_id', 'timestamp', 'amount', 'merchant', 'currency',
+    'risk_score', 'status', 'merchant_keyword', 'blocked_merchant', 'trusted_merchant', 'risk_factors',
+    'rules_version'
+}
 
 CORS_HEADERS = {
     'Access-Control-Allow-Origin': 'https://d1n1njxujlyqzf.cloudfront.net',
-    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,X-CSRF-Token',
+    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,X-CSRF-Token,Idempotency-Key',
     'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
     'Content-Type': 'application/json'
 }
+# Serialized once; handlers return copies
+PREFLIGHT_RESPONSE = encoding.constant_response(200, CORS_HEADERS, {'message': 'CORS preflight'})
+TEST_RESPONSE = encoding.constant_response(200, CORS_HEADERS, {'message': 'API is working!'})
+# Larger bodies are gzipped for clients that send Accept-Encoding: gzip
+RESPONSE_GZIP_MIN_BYTES = int(os.environ.get('RESPONSE_GZIP_MIN_BYTES', encoding.GZIP_MIN_BYTES))
+RESPONSE_GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', encoding.GZIP_LEVEL))
 
 # ------------------- HELPERS -------------------
 def get_cognito_resources():
@@ -84,6 +200,40 @@ def get_cognito_resources():
     _cognito_cache['app_client_id'] = app_client_id
     return user_pool_id, app_client_id
 
+def build_jwt_verifier():
+    user_pool_id, app_client_id = get_cognito_resources()
+    issuer = jwt_auth.issuer_url(user_pool_id)
+    return JwtVerifier(
+        Jwks(os.environ.get('JWKS_URL') or f"{issuer}/.well-known/jwks.json"),
+        issuer, app_client_id,
+        TokenCache(max_entries=int(os.environ.get('JWT_CACHE_MAX_ENTRIES', '1024')))
+    )
+
+# CSRF tokens: 'stateless' HMAC tokens checked in-process, or 'table' to keep
+# every issued token in the csrf-tokens table
+CSRF_MODE = os.environ.get('CSRF_MODE', 'stateless')
+CSRF_ENFORCE = os.environ.get('CSRF_ENFORCE', 'false').lower() == 'true'
+CSRF_TTL_SECONDS = int(os.environ.get('CSRF_TTL_SECONDS', csrf.DEFAULT_TTL_SECONDS))
+if os.environ.get('CSRF_SECRET'):
+    CSRF_SECRET = os.environ['CSRF_SECRET'].encode('utf-8')
+else:
+    # Tokens from this container won't validate in any other one
+    logger.warning("CSRF_SECRET is not set; using a per-container secret")
+    CSRF_SECRET = secrets.token_bytes(32)
+_csrf_replay_entries = int(os.environ.get('CSRF_REPLAY_CACHE_ENTRIES', '0'))
+_csrf_replay_cache = csrf.ReplayCache(_csrf_replay_entries) if _csrf_replay_entries else None
+
+# Route and AWS call latency as CloudWatch embedded metrics, for a sample of invocations
+metrics_recorder = metrics.Recorder(
+    namespace=os.environ.get('METRICS_NAMESPACE', metrics.DEFAULT_NAMESPACE),
+    sample_rate=float(os.environ.get('METRICS_SAMPLE_RATE', '0.1')),
+    service=f"{PROJECT_NAME}-{ENVIRONMENT}"
+)
+metrics.install(metrics_recorder)
+
+# Verified token -> claims cache and JWKS keys live as long as the container
+jwt_verifier = build_jwt_verifier()
+
 def log_to_s3(transaction_record):
     transaction_id = transaction_record.get('transaction_id', 'unknown')
     try:
@@ -93,26 +243,476 @@ def log_to_s3(transaction_record):
             _today_cache['str'] = str(today)
         key = f"transactions/{_today_cache['str']}/{transaction_id}.json"
 
-        # Convert Decimal to float for JSON serialization
-        json_record = {}
-        for k, v in transaction_record.items():
-            if isinstance(v, Decimal):
-                json_record[k] = float(v)
-            else:
-                json_record[k] = v
-
         s3_client.put_object(
             Bucket=S3_BUCKET,
             Key=key,
-            Body=json.dumps(json_record),
+            Body=encoding.dumps(transaction_record),
             ContentType='application/json'
         )
         logger.info(f"Transaction {transaction_id} logged to S3: {key}")
+        return True
     except Exception as e:
         logger.error(f"Failed to log transaction {transaction_id} to S3: {str(e)}")
+        return False
 
-def validate_csrf_token(token):
-    if not csrf_table or not token:
+def log_batch_to_s3(transaction_records, batch_id):
+    """Archive a whole batch as a single newline-delimited JSON object"""
+    if not transaction_records:
+        return
+    try:
+        today = datetime.datetime.now(UTC).date()
+        if _today_cache['date'] != today:
+            _today_cache['date'] = today
+            _today_cache['str'] = str(today)
+        key = f"transactions/{_today_cache['str']}/batch-{batch_id}.ndjson"
+
+        lines = [encoding.dumps(record) for record in transaction_records]
+
+        s3_client.put_object(
+            Bucket=S3_BUCKET,
+            Key=key,
+            Body='\n'.join(lines) + '\n',
+            ContentType='application/x-ndjson'
+        )
+        logger.info(f"Batch {batch_id} ({len(transaction_records)} transactions) logged to S3: {key}")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to log batch {batch_id} to S3: {str(e)}")
+        return False
+
+def pin_transactions(transaction_records):
+    """Keep transactions whose archive write failed in the table past their expiry"""
+    if not transactions_table:
+        return
+    conditions = aws_clients.dynamodb_conditions()
+    for record in transaction_records:
+        if 'expires_at' not in record:
+            continue
+        try:
+            transactions_table.update_item(
+                ConditionExpression=conditions.Attr('transaction_id').exists(),
+                **transaction_tiers.pin_kwargs(record['transaction_id'])
+            )
+        except Exception as e:
+            logger.error(f"Failed to pin unarchived transaction {record['transaction_id']}: {str(e)}")
+
+def batch_put_items(table, items, key_attr='transaction_id'):
+    """Write items in 25-item BatchWriteItem chunks, retrying unprocessed items.
+
+    Returns the key_attr values of items that could not be written.
+    """
+    failed = []
+    for start in range(0, len(items), DYNAMODB_BATCH_CHUNK):
+        pending = [{'PutRequest': {'Item': item}} for item in items[start:start + DYNAMODB_BATCH_CHUNK]]
+        attempt = 0
+        while pending:
+            try:
+                response = dynamodb.batch_write_item(RequestItems={table.name: pending})
+            except Exception as e:
+                logger.error(f"BatchWriteItem failed for chunk at offset {start}: {str(e)}")
+                break
+            pending = response.get('UnprocessedItems', {}).get(table.name, [])
+            if not pending:
+                break
+            attempt += 1
+            if attempt >= BATCH_WRITE_MAX_ATTEMPTS:
+                logger.error(f"Giving up on {len(pending)} unprocessed items after {attempt} attempts")
+                break
+            # Exponential backoff before resubmitting throttled items
+            time.sleep(min(BATCH_WRITE_BASE_DELAY * (2 ** attempt), 1.0))
+        failed.extend(request['PutRequest']['Item'][key_attr] for request in pending)
+    return failed
+
+def encode_cursor(mode, last_evaluated_key, user_id, boundary=None):
+    """Opaque page cursor wrapping a DynamoDB LastEvaluatedKey (or archive position), scoped to one user.
+
+    boundary pins the hot/cold split for the rest of the listing, so items
+    crossing it between pages are neither repeated nor skipped.
+    """
+    cursor = {'m': mode, 'k': last_evaluated_key, 'u': user_id}
+    if boundary:
+        cursor['b'] = boundary
+    raw = json.dumps(cursor, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Return (mode, ExclusiveStartKey, user_id, boundary); raises ValueError for malformed cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        decoded = json.loads(raw)
+        mode, key, user_id, boundary = decoded['m'], decoded['k'], decoded['u'], decoded.get('b')
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if mode not in CURSOR_KEYS or not isinstance(key, dict) or set(key) != CURSOR_KEYS[mode]:
+        raise ValueError('Invalid cursor')
+    if boundary is not None and not isinstance(boundary, str):
+        raise ValueError('Invalid cursor')
+    if mode == 'archive':
+        after = key['after']
+        if not isinstance(key['day'], str) or not (after is None or (
+                isinstance(after, list) and len(after) == 2 and all(isinstance(value, str) for value in after))):
+            raise ValueError('Invalid cursor')
+    # A start key DynamoDB would reject, or one from another user's partition, is the client's error
+    elif not all(isinstance(value, str) for value in key.values()) or key.get('user_id', user_id) != user_id:
+        raise ValueError('Invalid cursor')
+    return mode, key, user_id, boundary
+
+def parse_timestamp_param(value):
+    """Normalize an ISO date/datetime query parameter to the stored UTC isoformat"""
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=UTC)
+    return parsed.astimezone(UTC).isoformat()
+
+def parse_page_params(params):
+    """Validate limit/cursor/since/until/fields, returning (options, error_message)"""
+    try:
+        limit = int(params.get('limit') or DEFAULT_PAGE_SIZE)
+    except ValueError:
+        return None, 'limit must be an integer'
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        return None, f'limit must be between 1 and {MAX_PAGE_SIZE}'
+
+    options = {'limit': limit, 'mode': 'query', 'start_key': None, 'cursor_user': None, 'boundary': None,
+               'since': None, 'until': None, 'fields': None}
+    if params.get('cursor'):
+        try:
+            (options['mode'], options['start_key'], options['cursor_user'],
+             options['boundary']) = decode_cursor(params['cursor'])
+        except ValueError as e:
+            return None, str(e)
+
+    for name in ('since', 'until'):
+        if params.get(name):
+            try:
+                options[name] = parse_timestamp_param(params[name])
+            except ValueError:
+                return None, f'{name} must be an ISO 8601 timestamp'
+
+    if params.get('fields'):
+        fields = {f.strip() for f in params['fields'].split(',') if f.strip()}
+        unknown = fields - TRANSACTION_FIELDS
+        if unknown:
+            return None, f"Unknown fields: {', '.join(sorted(unknown))}"
+        # Items always carry their identity and sort key
+        options['fields'] = sorted(fields | {'transaction_id', 'timestamp'})
+    return options, None
+
+def _projection_kwargs(fields):
+    if not fields:
+        return {}
+    names = {f'#f{i}': field for i, field in enumerate(fields)}
+    return {'ProjectionExpression': ', '.join(names), 'ExpressionAttributeNames': names}
+
+def query_transactions_page(user_id, options, tiers=None):
+    """Fetch one page of a user's transactions, newest first.
+
+    Returns (items, next_cursor). With a retention the table only answers
+    for the hot range; older transactions come from archive_transactions_page.
+    A range that starts before the hot boundary continues into the archive in
+    the same request, while an open-ended listing hands back a cursor there.
+    tiers (a dict) receives the boundary and the items each tier served.
+    Falls back to a bounded, resumable scan when the UserTimestampIndex
+    query fails.
+    """
+    conditions = aws_clients.dynamodb_conditions()
+
+    start_key = options['start_key']
+    if start_key is not None and options['cursor_user'] != user_id:
+        raise ValueError('Invalid cursor')
+
+    boundary = options['boundary']
+    if boundary is None and TRANSACTION_RETENTION_DAYS > 0:
+        boundary = transaction_tiers.hot_boundary(TRANSACTION_RETENTION_DAYS)
+    if tiers is not None:
+        tiers.update(boundary=boundary, hot=0, cold=0, days=0)
+    if options['mode'] == 'archive':
+        return archive_transactions_page(user_id, options, boundary, start_key, [], tiers)
+
+    if options['mode'] == 'query':
+        since, until = options['since'], options['until']
+        crosses = boundary is not None and (since is None or since < boundary)
+        if crosses:
+            since = boundary
+            if until is not None and until < boundary:
+                position = {'day': str(transaction_tiers.day_of(until)), 'after': None}
+                return archive_transactions_page(user_id, options, boundary, position, [], tiers)
+
+        key_condition = conditions.Key('user_id').eq(user_id)
+        if since and until:
+            key_condition = key_condition & conditions.Key('timestamp').between(since, until)
+        elif since:
+            key_condition = key_condition & conditions.Key('timestamp').gte(since)
+        elif until:
+            key_condition = key_condition & conditions.Key('timestamp').lte(until)
+
+        kwargs = {
+            'IndexName': 'UserTimestampIndex',
+            'KeyConditionExpression': key_condition,
+            'ScanIndexForward': False,  # Most recent first
+            'Limit': options['limit']
+        }
+        kwargs.update(_projection_kwargs(options['fields']))
+        if start_key:
+            kwargs['ExclusiveStartKey'] = start_key
+        try:
+            response = transactions_table.query(**kwargs)
+        except Exception as query_error:
+            if start_key:
+                raise
+            logger.error(f"Query failed, falling back to bounded scan: {str(query_error)}")
+        else:
+            items, last_key = response.get('Items', []), response.get('LastEvaluatedKey')
+            if tiers is not None:
+                tiers['hot'] = len(items)
+            if last_key:
+                return items, encode_cursor('query', last_key, user_id, boundary)
+            if not crosses:
+                return items, None
+            position = {'day': str(transaction_tiers.day_of(min(until or boundary, boundary))), 'after': None}
+            if len(items) >= options['limit'] or options['since'] is None:
+                return items, encode_cursor('archive', position, user_id, boundary)
+            return archive_transactions_page(user_id, options, boundary, position, items, tiers)
+
+    # Scan fallback: read at most SCAN_FALLBACK_MAX_PAGES pages per request and hand back a cursor
+    filter_expression = conditions.Attr('user_id').eq(user_id)
+    if options['since']:
+        filter_expression = filter_expression & conditions.Attr('timestamp').gte(options['since'])
+    if options['until']:
+        filter_expression = filter_expression & conditions.Attr('timestamp').lte(options['until'])
+    kwargs = {'FilterExpression': filter_expression, 'Limit': options['limit']}
+    kwargs.update(_projection_kwargs(options['fields']))
+
+    items = []
+    last_key = start_key if options['mode'] == 'scan' else None
+    for _ in range(SCAN_FALLBACK_MAX_PAGES):
+        if last_key:
+            kwargs['ExclusiveStartKey'] = last_key
+        response = transactions_table.scan(**kwargs)
+        items.extend(response.get('Items', []))
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key or len(items) >= options['limit']:
+            break
+    items.sort(key=lambda item: item.get('timestamp', ''), reverse=True)
+    return items, encode_cursor('scan', last_key, user_id) if last_key else None
+
+def _table_rows(user_id, start, end):
+    """Every row the table still holds for user_id with start <= timestamp < end"""
+    conditions = aws_clients.dynamodb_conditions()
+    kwargs = {
+        'IndexName': 'UserTimestampIndex',
+        'KeyConditionExpression': conditions.Key('user_id').eq(user_id) & conditions.Key('timestamp').between(start, end)
+    }
+    rows = []
+    while True:
+        response = transactions_table.query(**kwargs)
+        rows.extend(row for row in response.get('Items', []) if row.get('timestamp', '') < end)
+        if not response.get('LastEvaluatedKey'):
+            return rows
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def archive_transactions_page(user_id, options, boundary, position, items, tiers=None):
+    """Fill the page with transactions older than boundary, a day at a time back from position.
+
+    position is {'day': 'YYYY-MM-DD', 'after': [timestamp, transaction_id] or None}; 'after'
+    resumes a day part-way through. Only days present in the archive are visited, and at
+    most ARCHIVE_MAX_DAYS_PER_PAGE of them per request.
+    """
+    try:
+        start_day = datetime.date.fromisoformat(position['day'])
+        after = tuple(position['after']) if position.get('after') else None
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if boundary is None:
+        raise ValueError('Invalid cursor')
+
+    store = archive_compaction.S3Store(s3_client, S3_BUCKET)
+    archived = set(_archive_days.get(store))
+    first_day = transaction_tiers.day_of(options['since']) if options['since'] else None
+    days = sorted((day for day in archived if day <= start_day and (first_day is None or day >= first_day)),
+                  reverse=True)
+    reader = transaction_tiers.ColdReader(store, user_id)
+    limit, until, fields = options['limit'], options['until'], options['fields']
+    next_position = None
+    for index, day in enumerate(days):
+        if index == ARCHIVE_MAX_DAYS_PER_PAGE:
+            next_position = {'day': str(day), 'after': None}
+            break
+        start = max(transaction_tiers.day_start(day), options['since'] or '')
+        end = min(transaction_tiers.day_start(day + datetime.timedelta(days=1)), boundary)
+        records = transaction_tiers.merge(_table_rows(user_id, start, end),
+                                          reader.records(day, start, end, archived))
+        if until:
+            records = [record for record in records if record.get('timestamp', '') <= until]
+        if after and day == start_day:
+            records = [record for record in records if transaction_tiers.sort_key(record) < after]
+        if tiers is not None:
+            tiers['days'] += 1
+            tiers['cold'] += min(len(records), limit - len(items))
+        if fields:
+            records = [{field: record[field] for field in fields if field in record} for record in records]
+        room = limit - len(items)
+        items.extend(records[:room])
+        if len(records) > room:
+            next_position = {'day': str(day), 'after': list(transaction_tiers.sort_key(items[-1]))}
+            break
+        if len(items) >= limit:
+            if index + 1 < len(days):
+                next_position = {'day': str(days[index + 1]), 'after': None}
+            break
+    return items, encode_cursor('archive', next_position, user_id, boundary) if next_position else None
+
+def parse_export_params(body):
+    """Validate an export request body, returning (options, error_message)"""
+    if not isinstance(body, dict):
+        return None, 'Request body must be a JSON object'
+    try:
+        export_format, min_risk, max_risk, status = transaction_export.parse_filters(body)
+    except transaction_export.ExportError as e:
+        return None, str(e)
+    options = {'format': export_format, 'min_risk': min_risk, 'max_risk': max_risk, 'status': status,
+               'mode': 'query', 'start_key': None, 'cursor_user': None, 'boundary': None,
+               'since': None, 'until': None}
+    if body.get('cursor'):
+        try:
+            (options['mode'], options['start_key'], options['cursor_user'],
+             options['boundary']) = decode_cursor(str(body['cursor']))
+        except ValueError as e:
+            return None, str(e)
+        if options['mode'] == 'scan':
+            return None, 'Invalid cursor'
+    for name in ('since', 'until'):
+        if body.get(name):
+            try:
+                options[name] = parse_timestamp_param(str(body[name]))
+            except ValueError:
+                return None, f'{name} must be an ISO 8601 timestamp'
+    return options, None
+
+def export_pages(user_id, options, state):
+    """The user's transactions matching an export's filters, newest first, one page at a time.
+
+    The hot range is read from UserTimestampIndex with the date range in
+    the key condition and the risk/status filters as a FilterExpression.
+    With a retention, older days follow from the archive, merged with the
+    table's rows the way archive_transactions_page reads them. Before each
+    page is yielded, state['cursor'] is set to the cursor that resumes
+    after it (None after the last page).
+    """
+    start_key = options['start_key']
+    if start_key is not None and options['cursor_user'] != user_id:
+        raise ValueError('Invalid cursor')
+    boundary = options['boundary']
+    if boundary is None and TRANSACTION_RETENTION_DAYS > 0:
+        boundary = transaction_tiers.hot_boundary(TRANSACTION_RETENTION_DAYS)
+    since, until = options['since'], options['until']
+    filters = (options['min_risk'], options['max_risk'], options['status'])
+    crosses = boundary is not None and (since is None or since < boundary)
+    archive_start = None
+    if crosses:
+        archive_start = {'day': str(transaction_tiers.day_of(min(until or boundary, boundary))), 'after': None}
+
+    if options['mode'] == 'query' and not (crosses and until is not None and until < boundary):
+        conditions = aws_clients.dynamodb_conditions()
+        hot_since = boundary if crosses else since
+        key_condition = conditions.Key('user_id').eq(user_id)
+        if hot_since and until:
+            key_condition = key_condition & conditions.Key('timestamp').between(hot_since, until)
+        elif hot_since:
+            key_condition = key_condition & conditions.Key('timestamp').gte(hot_since)
+        elif until:
+            key_condition = key_condition & conditions.Key('timestamp').lte(until)
+        kwargs = {
+            'IndexName': 'UserTimestampIndex',
+            'KeyConditionExpression': key_condition,
+            'ScanIndexForward': False,
+            'Limit': EXPORT_QUERY_PAGE_SIZE
+        }
+        expression = transaction_export.filter_expression(conditions, *filters)
+        if expression is not None:
+            kwargs['FilterExpression'] = expression
+        if start_key:
+            kwargs['ExclusiveStartKey'] = start_key
+        while True:
+            response = transactions_table.query(**kwargs)
+            last_key = response.get('LastEvaluatedKey')
+            if last_key:
+                state['cursor'] = encode_cursor('query', last_key, user_id, boundary)
+            else:
+                state['cursor'] = encode_cursor('archive', archive_start, user_id, boundary) if crosses else None
+            yield response.get('Items', [])
+            if not last_key:
+                break
+            kwargs['ExclusiveStartKey'] = last_key
+        if not crosses:
+            return
+        position = archive_start
+    elif options['mode'] == 'archive':
+        position = start_key
+    elif crosses:
+        position = archive_start
+    else:
+        state['cursor'] = None
+        return
+
+    try:
+        start_day = datetime.date.fromisoformat(position['day'])
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if boundary is None:
+        raise ValueError('Invalid cursor')
+    store = archive_compaction.S3Store(s3_client, S3_BUCKET)
+    archived = set(_archive_days.get(store))
+    first_day = transaction_tiers.day_of(since) if since else None
+    days = sorted((day for day in archived if day <= start_day and (first_day is None or day >= first_day)),
+                  reverse=True)
+    reader = transaction_tiers.ColdReader(store, user_id)
+    state['cursor'] = None
+    for index, day in enumerate(days):
+        start = max(transaction_tiers.day_start(day), since or '')
+        end = min(transaction_tiers.day_start(day + datetime.timedelta(days=1)), boundary)
+        records = transaction_tiers.merge(_table_rows(user_id, start, end),
+                                          reader.records(day, start, end, archived))
+        # Partitions after this day were only needed for it and the day before
+        reader.release(day + datetime.timedelta(days=1))
+        records = [record for record in records if (not until or record.get('timestamp', '') <= until)
+                   and transaction_export.matches(record, *filters)]
+        state['cursor'] = (encode_cursor('archive', {'day': str(days[index + 1]), 'after': None}, user_id, boundary)
+                           if index + 1 < len(days) else None)
+        yield records
+
+def update_analytics_rollups(transaction_records):
+    """Fold stored transactions into the per-user rollup items with atomic ADDs"""
+    if not analytics_table or not transaction_records:
+        return
+    by_user = {}
+    for record in transaction_records:
+        by_user.setdefault(record['user_id'], []).append(record)
+    for user_id, records in by_user.items():
+        for bucket, delta in analytics.rollup_deltas(records).items():
+            try:
+                analytics_table.update_item(**analytics.update_kwargs(user_id, bucket, delta))
+            except Exception as e:
+                logger.error(f"Failed to update analytics rollup {bucket} for {user_id}: {str(e)}")
+
+def issue_csrf_token(subject):
+    """New CSRF token bound to subject; returns (token, expires)"""
+    if CSRF_MODE != 'table':
+        return csrf.issue_token(CSRF_SECRET, subject, CSRF_TTL_SECONDS)
+    token = secrets.token_urlsafe(32)
+    now = int(time.time())
+    csrf_table.put_item(Item={'token': token, 'subject': subject, 'expires': now + CSRF_TTL_SECONDS, 'created': now})
+    return token, now + CSRF_TTL_SECONDS
+
+def validate_csrf_token(token, subject='anonymous'):
+    if not token:
+        return False
+    if CSRF_MODE != 'table':
+        parsed = csrf.parse_token(CSRF_SECRET, token, subject)
+        if parsed is None:
+            return False
+        return _csrf_replay_cache is None or _csrf_replay_cache.spend(*parsed)
+    if not csrf_table:
         return False
     try:
         response = csrf_table.get_item(Key={'token': token})
@@ -122,74 +722,331 @@ def validate_csrf_token(token):
         if int(datetime.datetime.utcnow().timestamp()) > item['expires']:
             csrf_table.delete_item(Key={'token': token})
             return False
-        return True
+        return item.get('subject', subject) == subject
     except Exception as e:
         logger.error(f"CSRF validation error: {str(e)}")
         return False
 
-def send_alert(transaction_record):
-    """Send SNS alert for high-risk transactions"""
+def publish_alerts(entries):
+    """Publish alert messages to the SNS topic; returns the entry Ids that failed"""
     if not sns_client or not SNS_TOPIC_ARN:
         logger.warning("SNS not configured, skipping alert")
-        return
-    
+        return set()
+    if len(entries) == 1:
+        sns_client.publish(TopicArn=SNS_TOPIC_ARN, Subject=entries[0]['Subject'], Message=entries[0]['Message'])
+        return set()
+    response = sns_client.publish_batch(TopicArn=SNS_TOPIC_ARN, PublishBatchRequestEntries=entries)
+    for failure in response.get('Failed', []):
+        logger.error(f"Failed to publish alert {failure.get('Id')}: {failure.get('Message')}")
+    return {failure['Id'] for failure in response.get('Failed', [])}
+
+alert_windows = (alerts.TableWindows(alert_windows_table, LazyClient(aws_clients.dynamodb_conditions))
+                 if alert_windows_table else None)
+alert_aggregator = AlertAggregator(
+    publish_alerts,
+    window_seconds=float(os.environ.get('ALERT_WINDOW_SECONDS', alerts.DEFAULT_WINDOW_SECONDS)),
+    bucket=TokenBucket(
+        rate=float(os.environ.get('ALERT_RATE_PER_MINUTE', '30')) / 60.0,
+        capacity=int(os.environ.get('ALERT_BURST', '10'))
+    ),
+    store=alert_windows
+)
+ALERT_SWEEP_GRACE_SECONDS = float(os.environ.get('ALERT_SWEEP_GRACE_SECONDS', alerts.DEFAULT_SWEEP_GRACE_SECONDS))
+
+def send_alerts(transaction_records):
+    """Buffer flagged transactions into per-user alert windows and publish whatever is due"""
+    for record in transaction_records:
+        if record.get('status') == 'flagged':  # Above the user's risk threshold
+            alert_aggregator.add(record)
+    alert_aggregator.flush()
+
+def alert_sweep_handler(event, context):
+    """EventBridge schedule: publish held alert digests that no container flushed in time"""
+    if alert_windows is None:
+        logger.warning("Alert windows table not configured, nothing to sweep")
+        return {'sent': 0}
+    return {'sent': alerts.sweep(alert_windows, publish_alerts, ALERT_SWEEP_GRACE_SECONDS)}
+
+def enqueue_side_effects(transaction_record):
+    """Hand the post-write work to the side-effect queue; False means run it inline instead"""
+    if SIDE_EFFECTS_MODE != 'async' or not sqs_client or not SIDE_EFFECTS_QUEUE_URL:
+        return False
     try:
-        risk_score = float(transaction_record.get('risk_score', 0))
-        if risk_score > 70:  # High risk threshold
-            message = f"""
-🚨 HIGH RISK TRANSACTION DETECTED
-
-Transaction ID: {transaction_record.get('transaction_id')}
-Amount: {transaction_record.get('currency', 'USD')} {transaction_record.get('amount')}
-Merchant: {transaction_record.get('merchant')}
-Risk Score: {risk_score}/100
-Status: {transaction_record.get('status', 'flagged').upper()}
-User: {transaction_record.get('user_id', 'unknown')}
-Time: {transaction_record.get('timestamp')}
-
-⚠️ This transaction requires immediate review.
-            """.strip()
-            
-            sns_client.publish(
-                TopicArn=SNS_TOPIC_ARN,
-                Subject=f"🚨 High Risk Transaction Alert - Risk Score: {risk_score}",
-                Message=message
+        sqs_client.send_message(
+            QueueUrl=SIDE_EFFECTS_QUEUE_URL,
+            MessageBody=encoding.dumps(transaction_record)
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Failed to enqueue side effects for {transaction_record.get('transaction_id')}: {str(e)}")
+        return False
+
+def side_effects_handler(event, context):
+    """SQS consumer: one S3 archive object, one alert per user and merged rollup updates per batch"""
+    metrics_recorder.begin('SQS side-effects')
+    response = process_side_effects(event)
+    metrics_recorder.end()
+    return response
+
+def process_side_effects(event):
+    alert_aggregator.flush()
+    records = []
+    message_ids = []
+    for message in event.get('Records', []):
+        try:
+            records.append(json.loads(message['body']))
+            message_ids.append(message['messageId'])
+        except (KeyError, ValueError) as e:
+            logger.error(f"Dropping malformed side-effect message {message.get('messageId')}: {str(e)}")
+    if not records:
+        return {'batchItemFailures': []}
+
+    batch_id = str(uuid.uuid4())
+    if not log_batch_to_s3(records, batch_id):
+        # Let SQS redeliver the whole batch rather than lose the archive, and keep the rows until it lands
+        pin_transactions(records)
+        return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in message_ids]}
+
+    update_analytics_rollups(records)
+    send_alerts(records)
+
+    logger.info(f"Side-effect batch {batch_id}: {len(records)} transactions, "
+                f"{sum(1 for r in records if r.get('status') == 'flagged')} flagged")
+    return {'batchItemFailures': []}
+
+def websocket_handler(event, context):
+    """$connect, $disconnect and $default routes of the change-feed WebSocket API"""
+    request_context = event.get('requestContext') or {}
+    route_key = request_context.get('routeKey')
+    metrics_recorder.begin(f"WebSocket {route_key}")
+    try:
+        response = handle_websocket(route_key, request_context.get('connectionId'), event)
+    except Exception as e:
+        logger.error(f"WebSocket {route_key} error: {str(e)}", exc_info=True)
+        response = {'statusCode': 500, 'body': 'Internal server error'}
+    metrics_recorder.end(response['statusCode'])
+    return response
+
+def handle_websocket(route_key, connection_id, event):
+    if route_key == '$connect':
+        # Browsers can't set headers on the WebSocket handshake, so the ID token comes in the query string
+        token = (event.get('queryStringParameters') or {}).get('token')
+        if not token:
+            return {'statusCode': 401, 'body': 'Authorization token required'}
+        try:
+            claims = jwt_verifier.verify(token)
+        except AuthError as e:
+            logger.warning(f"Rejected change feed connection: {str(e)}")
+            return {'statusCode': e.status_code, 'body': str(e)}
+        user_id = claims.get('cognito:username', claims.get('username', 'anonymous'))
+        change_feed_connections.add(connection_id, user_id)
+        return {'statusCode': 200}
+    if route_key == '$disconnect':
+        change_feed_connections.remove(connection_id)
+        return {'statusCode': 200}
+    # $default: the feed is one-way, so client messages are only keep-alives
+    return {'statusCode': 200}
+
+def send_change_feed_message(connection_id, data):
+    return change_feed.post_to_connection(management_client, connection_id, data)
+
+def change_feed_handler(event, context):
+    """DynamoDB Streams consumer for the transactions table: pushes per-user deltas to open connections"""
+    metrics_recorder.begin('DynamoDB change-feed')
+    process_change_feed(event)
+    metrics_recorder.end()
+    return {'batchItemFailures': []}
+
+def process_change_feed(event):
+    records = event.get('Records', [])
+    if management_client is None:
+        logger.warning(f"CHANGE_FEED_ENDPOINT is not set; dropping {len(records)} stream records")
+        return None
+    # Delivery is best effort: a failed send is not retried, and the client catches up when it reconnects
+    stats = change_feed.publish(records, change_feed_connections, send_change_feed_message,
+                                workers=CHANGE_FEED_SEND_WORKERS)
+    for name in ('records', 'watched_users', 'messages', 'gone', 'failed'):
+        metrics_recorder.put_metric(f"ChangeFeed{name.title().replace('_', '')}", stats[name])
+    logger.info(f"Change feed batch: {stats['records']} records for {stats['users']} users, "
+                f"{stats['watched_users']} watched, {stats['sent']} connections updated, "
+                f"{stats['gone']} gone, {stats['failed']} failed")
+    return stats
+
+def validate_transaction_fields(body):
+    """Validate a transaction payload, returning (amount_float, error_message)"""
+    if not isinstance(body, dict):
+        return None, 'Transaction must be a JSON object'
+
+    amount = body.get('amount')
+    merchant = body.get('merchant')
+
+    if amount is None or merchant is None:
+        return None, 'Missing required fields: amount and merchant'
+
+    try:
+        amount_float = float(amount)
+    except (ValueError, TypeError):
+        return None, 'Amount must be a valid number'
+
+    if amount_float < 0:
+        return None, 'Amount cannot be negative'
+
+    if amount_float > 10000000:
+        return None, 'Amount exceeds maximum limit of 10M'
+
+    if not merchant or len(str(merchant).strip()) == 0:
+        return None, 'Merchant name cannot be empty'
+
+    # Only currencies with a current rate; anything else would be scored as if it were USD
+    currency = body.get('currency', 'USD')
+    if not isinstance(currency, str) or currency not in exchange_rates.get().rates:
+        return None, f"Unsupported currency: {currency}"
+    return amount_float, None
+
+def authenticate(event, auth):
+    """Verify the request's Bearer token as the route requires.
+
+    Records the caller in event['auth'] and returns None, or returns the
+    401/503 response to send instead.
+    """
+    event['auth'] = {'user_id': 'anonymous', 'claims': {}}
+    if auth == AUTH_NONE:
+        return None
+    headers = event.get('headers') or {}
+    auth_header = headers.get('Authorization') or headers.get('authorization') or ''
+    if not auth_header.startswith('Bearer '):
+        if auth == AUTH_REQUIRED:
+            return {'statusCode': 401, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Authorization token required'})}
+        return None
+    try:
+        claims = jwt_verifier.verify(auth_header[len('Bearer '):].strip())
+    except AuthError as e:
+        logger.warning(f"Rejected token: {str(e)}")
+        return {'statusCode': e.status_code, 'headers': CORS_HEADERS, 'body': json.dumps({'error': str(e)})}
+    event['auth'] = {'user_id': claims.get('cognito:username', claims.get('username', 'anonymous')), 'claims': claims}
+    return None
+
+def extract_user_id(event, default='anonymous'):
+    """Cognito username of the caller, as verified by authenticate()"""
+    return (event.get('auth') or {}).get('user_id', default)
+
+def load_profile(user_id, consistent=False):
+    """Stored profile for user_id (None if there is none), served from the container cache when fresh"""
+    if not consistent:
+        found, profile = _profile_cache.get(user_id)
+        if found:
+            return profile
+    kwargs = {'ConsistentRead': True} if consistent else {}
+    profile = user_profiles_table.get_item(Key={'user_id': user_id}, **kwargs).get('Item')
+    _profile_cache.put(user_id, profile)
+    return profile
+
+def save_profile(user_id, profile):
+    """Write a profile as the next version of the stored one.
+
+    The put is conditional on the version it replaces, so concurrent updates
+    from different containers cannot silently overwrite each other; on a
+    conflict the current version is re-read once and the write retried.
+    """
+    conditions = aws_clients.dynamodb_conditions()
+    current = load_profile(user_id)
+    for attempt in range(2):
+        previous = profile_version(current)
+        profile['version'] = previous + 1
+        try:
+            user_profiles_table.put_item(
+                Item=profile,
+                ConditionExpression=conditions.Attr('version').not_exists() | conditions.Attr('version').eq(previous)
             )
-            logger.info(f"Alert sent for transaction {transaction_record.get('transaction_id')}")
+            break
+        except Exception as e:
+            # botocore ClientError; matched by code so botocore isn't imported up front
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') != 'ConditionalCheckFailedException' or attempt:
+                raise
+            _profile_cache.invalidate(user_id)
+            current = load_profile(user_id, consistent=True)
+    _profile_cache.invalidate(user_id)
+    _profile_cache.put(user_id, profile)
+
+def get_scoring_profile(user_id):
+    """Fetch the stored user profile whose merchant lists and limits feed score_transaction"""
+    if not user_profiles_table or user_id == 'anonymous':
+        return None
+    try:
+        return load_profile(user_id)
     except Exception as e:
-        logger.error(f"Failed to send SNS alert: {str(e)}")
+        logger.error(f"Failed to load profile for scoring: {str(e)}")
+        return None
 
-def calculate_risk_score(transaction, amount=None):
-    risk_score = 0
-    if amount is None:
+def record_spend(user_id, body, amount_float, now):
+    """Add a transaction to the user's spend counters and return the state to score it against"""
+    if not spend_counters_table or user_id == 'anonymous':
+        return None
+    try:
+        return spend_counters.record_spend(
+            spend_counters_table, user_id, to_usd(amount_float, body.get('currency', 'USD')),
+            now, VELOCITY_WINDOW_MINUTES
+        )
+    except Exception as e:
+        logger.error(f"Failed to update spend counters: {str(e)}")
+        return None
+
+def record_user_stats(user_id, body, amount_float):
+    """Add a transaction to the user's amount statistics and return the history to score it against"""
+    if not user_stats_table or user_id == 'anonymous':
+        return None
+    try:
+        return user_stats.record(
+            user_stats_table, aws_clients.dynamodb_conditions(), user_id, body.get('merchant'),
+            to_usd(amount_float, body.get('currency', 'USD')), time.time(), _user_stats_cache
+        )
+    except Exception as e:
+        logger.error(f"Failed to update user stats: {str(e)}")
+        return None
+
+def forget_transaction(user_id, body, amount_float, now, spend, stats):
+    """Take a transaction that wasn't stored back out of the counters record_spend/record_user_stats added it to"""
+    usd_amount = to_usd(amount_float, body.get('currency', 'USD'))
+    if spend is not None:
         try:
-            amount = float(transaction.get('amount', 0))
-        except (ValueError, TypeError):
-            amount = 0
-    
-    # Convert to USD for consistent risk assessment
-    currency = transaction.get('currency', 'USD')
-    exchange_rates = {
-        'USD': 1.0, 'EUR': 0.92, 'GBP': 0.79, 'GHS': 12.05,
-        'JPY': 149.50, 'INR': 83.25, 'NGN': 775.00, 'ZAR': 18.75,
-        'KES': 129.50, 'CAD': 1.36
+            spend_counters.remove_spend(spend_counters_table, user_id, usd_amount, now, VELOCITY_WINDOW_MINUTES)
+        except Exception as e:
+            logger.error(f"Failed to take an unsaved transaction out of the spend counters: {str(e)}")
+    if stats is not None:
+        try:
+            user_stats.forget(user_stats_table, aws_clients.dynamodb_conditions(), user_id, body.get('merchant'),
+                              usd_amount, _user_stats_cache)
+        except Exception as e:
+            logger.error(f"Failed to take an unsaved transaction out of the user stats: {str(e)}")
+
+def forget_batch_spend(user_id, usd_amounts, now):
+    """Take batch transactions that weren't stored back out of the counters record_batch_spend added them to"""
+    try:
+        spend_counters.remove_spend(spend_counters_table, user_id, sum(round(usd_amount, 2) for usd_amount in usd_amounts),
+                                    now, VELOCITY_WINDOW_MINUTES, count=len(usd_amounts))
+    except Exception as e:
+        logger.error(f"Failed to take unsaved transactions out of the spend counters: {str(e)}")
+
+def build_transaction_record(body, amount_float, user_id, profile=None, spend=None, stats=None):
+    risk_score, details = score_transaction(body, amount_float, profile=profile, spend=spend, stats=stats)
+    record = {
+        'transaction_id': str(uuid.uuid4()),
+        'user_id': user_id,
+        'timestamp': datetime.datetime.now(UTC).isoformat(),
+        'amount': Decimal(str(amount_float)),
+        'merchant': body.get('merchant'),
+        'currency': body.get('currency', 'USD'),
+        'risk_score': Decimal(str(risk_score)),
+        'status': 'flagged' if risk_score > risk_threshold(profile, details['threshold']) else 'approved',
+        'rules_version': details['rules_version']
     }
-    
-    rate = exchange_rates.get(currency, 1.0)
-    usd_amount = amount / rate
-    
-    if usd_amount > 10000:
-        risk_score += 50
-    elif usd_amount > 5000:
-        risk_score += 30
-    elif usd_amount > 1000:
-        risk_score += 10
-    
-    merchant = str(transaction.get('merchant', '')).lower()
-    if any(risk_word in merchant for risk_word in HIGH_RISK_MERCHANTS):
-        risk_score += 40
-        logger.debug(f"High-risk merchant detected: {merchant}")
-    return min(risk_score, 100)
+    if TRANSACTION_RETENTION_DAYS > 0:
+        record['expires_at'] = transaction_tiers.expires_at(record['timestamp'], TRANSACTION_RETENTION_DAYS)
+    # Keep the keywords and budget/velocity factors that drove the score for review and alerts
+    for key in ('merchant_keyword', 'blocked_merchant', 'trusted_merchant', 'risk_factors'):
+        if details.get(key):
+            record[key] = details[key]
+    return record
 
 # ------------------- MAIN HANDLER -------------------
 def lambda_handler(event, context):
@@ -197,65 +1054,134 @@ def lambda_handler(event, context):
     method = event.get('httpMethod', '')
     logger.info(f"Lambda triggered. Path: {path}, Method: {method}")
 
+    route, allowed_methods = router.match(path, method)
+    metrics_recorder.begin(f"{method} {route.suffix}" if route else method if method == 'OPTIONS' else 'unmatched')
+    response = dispatch(event, method, route, allowed_methods)
+    response = encoding.compress_response(response, encoding.header(event.get('headers'), 'Accept-Encoding'),
+                                          RESPONSE_GZIP_MIN_BYTES, RESPONSE_GZIP_LEVEL)
+    metrics_recorder.end(response.get('statusCode'))
+    return response
+
+def dispatch(event, method, route, allowed_methods):
     if method == 'OPTIONS':
-        return {'statusCode': 200, 'headers': CORS_HEADERS, 'body': json.dumps({'message': 'CORS preflight'})}
+        return dict(PREFLIGHT_RESPONSE)
+
+    # Send digests whose window closed since the last invocation
+    alert_aggregator.flush()
 
     try:
-        if path.endswith('/transaction'):
-            return transaction_handler(event)
-        elif path.endswith('/transactions'):
-            return get_transactions_handler(event)
-        elif path.endswith('/user-profile'):
-            if method == 'GET':
-                return get_user_profile_handler(event)
-            elif method == 'PUT':
-                return update_user_profile_handler(event)
-        elif path.endswith('/signup'):
-            return signup_handler(event)
-        elif path.endswith('/login'):
-            return login_handler(event)
-        elif path.endswith('/csrf-token'):
-            return csrf_token_handler(event)
-        elif path.endswith('/test'):
-            return {'statusCode': 200, 'headers': CORS_HEADERS, 'body': json.dumps({'message': 'API is working!'})}
-        else:
-            logger.warning(f"No route for path: {path}")
-            return {'statusCode': 404, 'headers': CORS_HEADERS, 'body': json.dumps({'error': f'Path not found: {path}'})}
+        if route is None:
+            if allowed_methods:
+                headers = dict(CORS_HEADERS, Allow=','.join(allowed_methods))
+                return {'statusCode': 405, 'headers': headers, 'body': json.dumps({'error': f'Method {method} not allowed'})}
+            logger.warning(f"No route for path: {event.get('path', '')}")
+            return {'statusCode': 404, 'headers': CORS_HEADERS, 'body': json.dumps({'error': f"Path not found: {event.get('path', '')}"})}
+        if event.get('isBase64Encoded'):
+            # Every request body is base64-encoded, since the REST API treats */* as binary
+            try:
+                event['body'] = encoding.request_body(event)
+            except ValueError as e:
+                return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': str(e)})}
+            event['isBase64Encoded'] = False
+        auth_error = authenticate(event, route.auth)
+        if auth_error:
+            return auth_error
+        if route.csrf and CSRF_ENFORCE:
+            headers = event.get('headers') or {}
+            if not validate_csrf_token(headers.get('X-CSRF-Token') or headers.get('x-csrf-token'), extract_user_id(event)):
+                return {'statusCode': 403, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Invalid or missing CSRF token'})}
+        if route.idempotent:
+            return call_idempotent(event, route)
+        return route.handler(event)
     except Exception as e:
         logger.error(f"Handler error: {str(e)}", exc_info=True)
         return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Internal server error'})}
 
+def idempotency_store():
+    return idempotency.IdempotencyStore(
+        idempotency_table, aws_clients.dynamodb_conditions() if idempotency_table else None, _idempotency_cache,
+        ttl=IDEMPOTENCY_TTL_SECONDS, lock_seconds=IDEMPOTENCY_LOCK_SECONDS
+    )
+
+def call_idempotent(event, route):
+    """Run route.handler once per Idempotency-Key; retries get the first attempt's response"""
+    key = idempotency.header_key(event.get('headers'))
+    if key is None:
+        return route.handler(event)
+    error = idempotency.validate_key(key)
+    if error:
+        return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': error})}
+
+    store = idempotency_store()
+    scope = idempotency.scope(extract_user_id(event), route.suffix, key)
+    fingerprint = idempotency.request_hash(event.get('body'))
+    try:
+        outcome, stored = store.begin(scope, fingerprint)
+    except Exception as e:
+        # Running without the claim could repeat the side effects the client is guarding against
+        logger.error(f"Failed to claim idempotency key: {str(e)}")
+        return {'statusCode': 503, 'headers': {**CORS_HEADERS, 'Retry-After': '1'},
+                'body': json.dumps({'error': 'Service temporarily unavailable'})}
+    if outcome == idempotency.MISMATCH:
+        return {'statusCode': 422, 'headers': CORS_HEADERS,
+                'body': json.dumps({'error': f'{idempotency.KEY_HEADER} was already used for a different request'})}
+    if outcome == idempotency.CONFLICT:
+        return {'statusCode': 409, 'headers': {**CORS_HEADERS, 'Retry-After': '1'},
+                'body': json.dumps({'error': f'A request with this {idempotency.KEY_HEADER} is still in progress'})}
+    if outcome == idempotency.REPLAY:
+        if stored['body'] is None:
+            return {'statusCode': 409, 'headers': CORS_HEADERS,
+                    'body': json.dumps({'error': 'This request was already processed; its response is too large to replay'})}
+        return {'statusCode': stored['status_code'], 'headers': {**CORS_HEADERS, 'Idempotent-Replayed': 'true'},
+                'body': stored['body']}
+
+    try:
+        response = route.handler(event)
+    except Exception:
+        store.release(scope)
+        raise
+    try:
+        if response.get('statusCode', 500) >= 500:
+            store.release(scope)
+        else:
+            store.complete(scope, fingerprint, response['statusCode'], response.get('body'))
+    except Exception as e:
+        # The claim stays in progress until it expires, so retries get 409s rather than a second run
+        logger.error(f"Failed to store idempotent response for {scope}: {str(e)}")
+    return response
+
 # ------------------- ROUTES -------------------
+def test_handler(event):
+    return dict(TEST_RESPONSE)
+
 def csrf_token_handler(event):
     try:
-        token = secrets.token_urlsafe(32)
-        expiration = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
-        
-        if csrf_table:
-            csrf_table.put_item(
-                Item={
-                    'token': token,
-                    'expires': int(expiration.timestamp()),
-                    'created': int(datetime.datetime.utcnow().timestamp())
-                }
-            )
-        
+        # Bound to the caller, so a token fetched before login only works for anonymous requests
+        token, expires = issue_csrf_token(extract_user_id(event))
         return {
             'statusCode': 200,
             'headers': CORS_HEADERS,
-            'body': json.dumps({'token': token})
+            'body': json.dumps({'token': token, 'expires': expires})
         }
     except Exception as e:
         logger.error(f"CSRF token handler error: {str(e)}")
         return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Failed to generate CSRF token'})}
 
+def fx_rates_handler(event):
+    try:
+        params = event.get('queryStringParameters') or {}
+        try:
+            document = exchange_rates.get().document(at=params.get('at'))
+        except RatesError as e:
+            return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': str(e)})}
+        headers = {**CORS_HEADERS, 'Cache-Control': f"public, max-age={exchange_rates.refresh_interval}"}
+        return {'statusCode': 200, 'headers': headers, 'body': json.dumps(document)}
+    except Exception as e:
+        logger.error(f"FX rates handler error: {str(e)}")
+        return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Failed to load exchange rates'})}
+
 def transaction_handler(event):
     try:
-        # CSRF validation temporarily disabled for frontend rebuild
-        # csrf_token = event.get('headers', {}).get('X-CSRF-Token') or event.get('headers', {}).get('x-csrf-token')
-        # if not validate_csrf_token(csrf_token):
-        #     return {'statusCode': 403, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Invalid or missing CSRF token'})}
-        
         # Validate request body
         if not event.get('body'):
             return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Request body is required'})}
@@ -265,68 +1191,46 @@ def transaction_handler(event):
         except json.JSONDecodeError:
             return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Invalid JSON format'})}
         
-        amount = body.get('amount')
-        merchant = body.get('merchant')
-        currency = body.get('currency', 'USD')
-        
-        if amount is None or merchant is None:
-            return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Missing required fields: amount and merchant'})}
-        
-        try:
-            amount_float = float(amount)
-        except (ValueError, TypeError):
-            return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Amount must be a valid number'})}
-        
-        if amount_float < 0:
-            return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Amount cannot be negative'})}
-        
-        if amount_float > 10000000:
-            return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Amount exceeds maximum limit of 10M'})}
-        
-        if not merchant or len(str(merchant).strip()) == 0:
-            return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Merchant name cannot be empty'})}
-        # Extract user_id from JWT token
-        auth_header = event.get('headers', {}).get('Authorization', '')
-        user_id = 'anonymous'  # Default fallback
-        if auth_header.startswith('Bearer '):
-            try:
-                import base64
-                token = auth_header.split(' ')[1]
-                # Decode JWT payload (middle part)
-                payload = token.split('.')[1]
-                # Add padding if needed
-                payload += '=' * (4 - len(payload) % 4)
-                decoded = json.loads(base64.b64decode(payload))
-                user_id = decoded.get('cognito:username', decoded.get('username', 'anonymous'))
-            except Exception as e:
-                logger.error(f"Failed to decode JWT: {str(e)}")
-                user_id = 'anonymous'
-        
-        risk_score = calculate_risk_score(body, amount_float)
-        transaction_record = {
-            'transaction_id': str(uuid.uuid4()),
-            'user_id': user_id,
-            'timestamp': datetime.datetime.now(UTC).isoformat(),
-            'amount': Decimal(str(amount_float)),
-            'merchant': merchant,
-            'currency': currency,
-            'risk_score': Decimal(str(risk_score)),
-            'status': 'flagged' if risk_score > 70 else 'approved'
-        }
-        
+        amount_float, error = validate_transaction_fields(body)
+        if error:
+            return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': error})}
+
+        if not transactions_table:
+            return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Database not available'})}
+
+        user_id = extract_user_id(event)
+
+        profile = get_scoring_profile(user_id)
+        now = datetime.datetime.now(UTC)
+        spend = record_spend(user_id, body, amount_float, now)
+        stats = record_user_stats(user_id, body, amount_float)
+
         # Save to DynamoDB
-        if transactions_table:
+        saved = False
+        try:
+            transaction_record = build_transaction_record(body, amount_float, user_id, profile, spend, stats)
+            risk_score = int(transaction_record['risk_score'])
             try:
                 transactions_table.put_item(Item=transaction_record)
                 logger.info(f"Transaction {transaction_record['transaction_id']} saved to DynamoDB")
+                saved = True
             except Exception as e:
                 logger.error(f"Failed to save transaction to DynamoDB: {str(e)}")
-        
-        # Also log to S3 for backup
-        log_to_s3(transaction_record)
-        
-        # Send alert if high risk
-        send_alert(transaction_record)
+        finally:
+            if not saved:
+                # Only stored transactions count toward later budget, velocity and anomaly checks
+                forget_transaction(user_id, body, amount_float, now, spend, stats)
+        if not saved:
+            # A 5xx also releases the Idempotency-Key, so the client's retry runs again
+            return {'statusCode': 503, 'headers': {**CORS_HEADERS, 'Retry-After': '1'},
+                    'body': json.dumps({'error': 'Failed to save transaction'})}
+
+        # Rollups, S3 backup and high-risk alert: queued in async mode, otherwise inline
+        if not enqueue_side_effects(transaction_record):
+            update_analytics_rollups([transaction_record])
+            if not log_to_s3(transaction_record):
+                pin_transactions([transaction_record])
+            send_alerts([transaction_record])
         return {'statusCode': 200, 'headers': CORS_HEADERS, 'body': json.dumps({
             'transaction_id': transaction_record['transaction_id'],
             'risk_score': risk_score,
@@ -338,13 +1242,114 @@ def transaction_handler(event):
         logger.error(f"Transaction handler error: {str(e)}", exc_info=True)
         return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Internal server error'})}
 
+def batch_transaction_handler(event):
+    try:
+        if not event.get('body'):
+            return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Request body is required'})}
+
+        try:
+            body = json.loads(event.get('body', '{}'))
+        except json.JSONDecodeError:
+            return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Invalid JSON format'})}
+
+        items = body.get('transactions') if isinstance(body, dict) else None
+        if not isinstance(items, list) or not items:
+            return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'transactions must be a non-empty list'})}
+
+        if len(items) > MAX_BATCH_SIZE:
+            return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': f'Batch exceeds maximum size of {MAX_BATCH_SIZE}'})}
+
+        if not transactions_table:
+            return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Database not available'})}
+
+        user_id = extract_user_id(event)
+        profile = get_scoring_profile(user_id)
+        batch_id = str(uuid.uuid4())
+
+        results = [None] * len(items)
+        valid = []
+        for index, item in enumerate(items):
+            amount_float, error = validate_transaction_fields(item)
+            if error:
+                results[index] = {'index': index, 'error': error}
+                continue
+            valid.append((index, item, amount_float, to_usd(amount_float, item.get('currency', 'USD'))))
+
+        # One ADD per counter item for the whole batch; each transaction is scored as if submitted alone, in order
+        now = datetime.datetime.now(UTC)
+        spends = None
+        if spend_counters_table and user_id != 'anonymous' and valid:
+            try:
+                spends = spend_counters.record_batch_spend(
+                    spend_counters_table, user_id, [usd_amount for _, _, _, usd_amount in valid], now,
+                    VELOCITY_WINDOW_MINUTES
+                )
+            except Exception as e:
+                logger.error(f"Failed to update spend counters: {str(e)}")
+        batch_stats = None
+        if user_stats_table and user_id != 'anonymous':
+            try:
+                batch_stats = user_stats.BatchStats(
+                    user_stats_table, aws_clients.dynamodb_conditions(), user_id,
+                    [item.get('merchant') for item in items if isinstance(item, dict)], _user_stats_cache
+                )
+            except Exception as e:
+                logger.error(f"Failed to read user stats: {str(e)}")
+        at = now.timestamp()
+
+        records = []
+        unsaved = [usd_amount for _, _, _, usd_amount in valid]
+        try:
+            for position, (index, item, amount_float, usd_amount) in enumerate(valid):
+                stats = batch_stats.signals(item.get('merchant'), usd_amount, at) if batch_stats else None
+                records.append(build_transaction_record(item, amount_float, user_id, profile,
+                                                        spends[position] if spends else None, stats))
+            failed_ids = set(batch_put_items(transactions_table, records)) if records else set()
+            unsaved = [usd_amount for (_, _, _, usd_amount), record in zip(valid, records)
+                       if record['transaction_id'] in failed_ids]
+        finally:
+            if spends is not None and unsaved:
+                # Only stored transactions count toward later budget and velocity checks
+                forget_batch_spend(user_id, unsaved, now)
+
+        saved = []
+        for (index, _, _, _), record in zip(valid, records):
+            if record['transaction_id'] in failed_ids:
+                results[index] = {'index': index, 'error': 'Failed to save transaction'}
+                continue
+            saved.append(record)
+            results[index] = {
+                'index': index,
+                'transaction_id': record['transaction_id'],
+                'risk_score': int(record['risk_score']),
+                'status': record['status']
+            }
+        logger.info(f"Batch {batch_id}: {len(saved)} of {len(items)} transactions saved to DynamoDB")
+
+        update_analytics_rollups(saved)
+        if batch_stats is not None and saved:
+            try:
+                batch_stats.save([(r['merchant'], to_usd(float(r['amount']), r['currency']), at) for r in saved])
+            except Exception as e:
+                logger.error(f"Failed to update user stats: {str(e)}")
+
+        # One archive object per batch; flagged transactions join the user's alert digest
+        if not log_batch_to_s3(saved, batch_id):
+            pin_transactions(saved)
+        send_alerts(saved)
+
+        return {'statusCode': 200, 'headers': CORS_HEADERS, 'body': json.dumps({
+            'batch_id': batch_id,
+            'processed': len(saved),
+            'failed': len(items) - len(saved),
+            'results': results
+        })}
+    except Exception as e:
+        logger.error(f"Batch transaction handler error: {str(e)}", exc_info=True)
+        return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Internal server error'})}
+
 def signup_handler(event):
     try:
-        # CSRF validation temporarily disabled for frontend rebuild
-        # csrf_token = event.get('headers', {}).get('X-CSRF-Token') or event.get('headers', {}).get('x-csrf-token')
-        # if not validate_csrf_token(csrf_token):
-        #     return {'statusCode': 403, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Invalid or missing CSRF token'})}
-        
         # Validate request body
         if not event.get('body'):
             return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Request body is required'})}
@@ -400,91 +1405,150 @@ def signup_handler(event):
 
 def get_transactions_handler(event):
     try:
-        # Extract user_id from JWT token
-        auth_header = event.get('headers', {}).get('Authorization', '')
-        if not auth_header.startswith('Bearer '):
-            return {'statusCode': 401, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Authorization token required'})}
-        
-        try:
-            import base64
-            token = auth_header.split(' ')[1]
-            payload = token.split('.')[1]
-            payload += '=' * (4 - len(payload) % 4)
-            decoded = json.loads(base64.b64decode(payload))
-            user_id = decoded.get('cognito:username', decoded.get('username', 'anonymous'))
-        except Exception as e:
-            logger.error(f"Failed to decode JWT: {str(e)}")
-            user_id = 'anonymous'
-        
+        user_id = extract_user_id(event)
         logger.info(f"Fetching transactions for user_id: {user_id}")
         
         if not transactions_table:
-            return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Database not available'})}
+            return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': encoding.dumps({'error': 'Database not available'})}
         
-        # First try to query by user_id using GSI
+        options, error = parse_page_params(event.get('queryStringParameters') or {})
+        if error:
+            return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': encoding.dumps({'error': error})}
+
+        tiers = {}
         try:
-            from boto3.dynamodb.conditions import Key
-            response = transactions_table.query(
-                IndexName='UserTimestampIndex',
-                KeyConditionExpression=Key('user_id').eq(user_id),
-                ScanIndexForward=False  # Most recent first
-            )
-            transactions = response.get('Items', [])
-            logger.info(f"Found {len(transactions)} transactions for user {user_id}")
-        except Exception as query_error:
-            logger.error(f"Query failed, falling back to scan: {str(query_error)}")
-            # Fallback to scan if query fails
-            from boto3.dynamodb.conditions import Attr
-            response = transactions_table.scan(
-                FilterExpression=Attr('user_id').eq(user_id)
-            )
-            transactions = response.get('Items', [])
-        
-        # Convert Decimal to float for JSON serialization
+            transactions, next_cursor = query_transactions_page(user_id, options, tiers)
+        except ValueError as e:
+            return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': encoding.dumps({'error': str(e)})}
+        except transaction_tiers.ArchiveNotReady as e:
+            logger.warning(f"Cold page for user {user_id} deferred: {str(e)}")
+            return {'statusCode': 503, 'headers': {**CORS_HEADERS, 'Retry-After': ARCHIVE_NOT_READY_RETRY_AFTER},
+                    'body': encoding.dumps({'error': 'Archived transactions are not available yet'})}
+        logger.info(f"Found {len(transactions)} transactions for user {user_id}")
+        if tiers.get('boundary'):
+            # Hot hit rate is the mean of HotOnly; ColdItems / (HotItems + ColdItems) is the archive share
+            metrics_recorder.set_property('HotBoundary', tiers['boundary'])
+            metrics_recorder.put_metric('HotItems', tiers['hot'])
+            metrics_recorder.put_metric('ColdItems', tiers['cold'])
+            metrics_recorder.put_metric('ArchiveDaysRead', tiers['days'])
+            metrics_recorder.put_metric('HotOnly', 0 if tiers['days'] else 1)
+
         for transaction in transactions:
-            if 'amount' in transaction:
-                transaction['amount'] = float(transaction['amount'])
-            if 'risk_score' in transaction:
-                transaction['risk_score'] = float(transaction['risk_score'])
-        
+            transaction.pop('expires_at', None)
+
+        # Decimals are written as numbers by the encoder
         return {
             'statusCode': 200,
             'headers': CORS_HEADERS,
-            'body': json.dumps({'transactions': transactions})
+            'body': encoding.dumps({'transactions': transactions, 'count': len(transactions),
+                                    'next_cursor': next_cursor, 'change_feed_url': CHANGE_FEED_URL})
         }
     except Exception as e:
         logger.error(f"Get transactions handler error: {str(e)}", exc_info=True)
+        return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': encoding.dumps({'error': 'Internal server error'})}
+
+def export_transactions_handler(event):
+    try:
+        user_id = extract_user_id(event)
+
+        if not transactions_table:
+            return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Database not available'})}
+
+        try:
+            body = json.loads(event.get('body') or '{}')
+        except json.JSONDecodeError:
+            return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Invalid JSON format'})}
+        options, error = parse_export_params(body)
+        if error:
+            return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': error})}
+
+        content_type, extension = transaction_export.FORMATS[options['format']]
+        now = datetime.datetime.now(UTC)
+        key = f"{transaction_export.EXPORT_PREFIX}/{user_id}/{now.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.{extension}"
+        writer = transaction_export.MultipartWriter(s3_client, S3_BUCKET, key, content_type, EXPORT_PART_BYTES)
+        state = {}
+        started = time.monotonic()
+        try:
+            result = transaction_export.write_export(export_pages(user_id, options, state), writer, options['format'],
+                                                     state, started + EXPORT_TIME_BUDGET_SECONDS, time.monotonic)
+        except ValueError as e:
+            return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': str(e)})}
+        except transaction_tiers.ArchiveNotReady as e:
+            logger.warning(f"Export for user {user_id} deferred: {str(e)}")
+            return {'statusCode': 503, 'headers': {**CORS_HEADERS, 'Retry-After': ARCHIVE_NOT_READY_RETRY_AFTER},
+                    'body': json.dumps({'error': 'Archived transactions are not available yet'})}
+        logger.info(f"Exported {result['rows']} transactions for user {user_id} to {key} "
+                    f"({result['bytes']} bytes, {result['parts']} parts, complete: {result['complete']})")
+        metrics_recorder.put_metric('ExportRows', result['rows'])
+        metrics_recorder.put_metric('ExportBytes', result['bytes'])
+
+        url = transaction_export.download_url(s3_client, S3_BUCKET, key, f"transactions-{now.date()}.{extension}",
+                                              EXPORT_URL_TTL_SECONDS)
+        return {
+            'statusCode': 200,
+            'headers': CORS_HEADERS,
+            'body': json.dumps({'url': url, 'key': key, 'format': options['format'], 'rows': result['rows'],
+                                'bytes': result['bytes'], 'expires_in': EXPORT_URL_TTL_SECONDS,
+                                'complete': result['complete'], 'next_cursor': result['next_cursor']})
+        }
+    except Exception as e:
+        logger.error(f"Export transactions handler error: {str(e)}", exc_info=True)
+        return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Failed to export transactions'})}
+
+def analytics_handler(event):
+    try:
+        user_id = extract_user_id(event)
+
+        if not analytics_table:
+            return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Database not available'})}
+
+        params = event.get('queryStringParameters') or {}
+        try:
+            days = int(params.get('days') or DEFAULT_ANALYTICS_DAYS)
+        except ValueError:
+            return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'days must be an integer'})}
+        if days < 1 or days > MAX_ANALYTICS_DAYS:
+            return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': f'days must be between 1 and {MAX_ANALYTICS_DAYS}'})}
+
+        conditions = aws_clients.dynamodb_conditions()
+        today = datetime.datetime.now(UTC).date()
+        first_day = today - datetime.timedelta(days=days - 1)
+        key_conditions = [
+            # Daily buckets inside the window
+            conditions.Key('user_id').eq(user_id) & conditions.Key('bucket').between(
+                analytics.DAY_PREFIX + first_day.isoformat(), analytics.DAY_PREFIX + today.isoformat()),
+            # 'merchant#...' and 'total' sort after every 'day#' bucket
+            conditions.Key('user_id').eq(user_id) & conditions.Key('bucket').gte(analytics.MERCHANT_PREFIX)
+        ]
+        items = []
+        for key_condition in key_conditions:
+            kwargs = {'KeyConditionExpression': key_condition}
+            while True:
+                response = analytics_table.query(**kwargs)
+                items.extend(response.get('Items', []))
+                if 'LastEvaluatedKey' not in response:
+                    break
+                kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        result = analytics.build_analytics(items, first_day, today)
+        result['days'] = days
+        return {'statusCode': 200, 'headers': CORS_HEADERS, 'body': json.dumps(result)}
+    except Exception as e:
+        logger.error(f"Analytics handler error: {str(e)}", exc_info=True)
         return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Internal server error'})}
 
 def get_user_profile_handler(event):
     try:
-        auth_header = event.get('headers', {}).get('Authorization', '')
-        if not auth_header.startswith('Bearer '):
-            return {'statusCode': 401, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Authorization token required'})}
-        
-        try:
-            import base64
-            token = auth_header.split(' ')[1]
-            payload = token.split('.')[1]
-            payload += '=' * (4 - len(payload) % 4)
-            decoded = json.loads(base64.b64decode(payload))
-            user_id = decoded.get('cognito:username', decoded.get('username', 'anonymous'))
-        except Exception as e:
-            logger.error(f"Failed to decode JWT: {str(e)}")
-            return {'statusCode': 401, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Invalid token'})}
-        
+        user_id = extract_user_id(event)
+
         if not user_profiles_table:
-            return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Database not available'})}
+            return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': encoding.dumps({'error': 'Database not available'})}
         
         try:
-            response = user_profiles_table.get_item(Key={'user_id': user_id})
-            if 'Item' in response:
-                profile = response['Item']
-                # Convert Decimal to float for JSON serialization
-                for key, value in profile.items():
-                    if isinstance(value, Decimal):
-                        profile[key] = float(value)
-                return {'statusCode': 200, 'headers': CORS_HEADERS, 'body': json.dumps({'profile': profile})}
+            stored = load_profile(user_id)
+            if stored:
+                # The cached profile is serialized as is; the encoder writes its Decimals as numbers
+                return {'statusCode': 200, 'headers': CORS_HEADERS, 'body': encoding.dumps({'profile': stored})}
             else:
                 # Return default profile
                 default_profile = {
@@ -497,31 +1561,18 @@ def get_user_profile_handler(event):
                     'customRiskThreshold': 70,
                     'budgetAlerts': True
                 }
-                return {'statusCode': 200, 'headers': CORS_HEADERS, 'body': json.dumps({'profile': default_profile})}
+                return {'statusCode': 200, 'headers': CORS_HEADERS, 'body': encoding.dumps({'profile': default_profile})}
         except Exception as e:
             logger.error(f"Failed to get user profile: {str(e)}")
-            return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Failed to retrieve profile'})}
+            return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': encoding.dumps({'error': 'Failed to retrieve profile'})}
     except Exception as e:
         logger.error(f"Get user profile handler error: {str(e)}", exc_info=True)
-        return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Internal server error'})}
+        return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': encoding.dumps({'error': 'Internal server error'})}
 
 def update_user_profile_handler(event):
     try:
-        auth_header = event.get('headers', {}).get('Authorization', '')
-        if not auth_header.startswith('Bearer '):
-            return {'statusCode': 401, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Authorization token required'})}
-        
-        try:
-            import base64
-            token = auth_header.split(' ')[1]
-            payload = token.split('.')[1]
-            payload += '=' * (4 - len(payload) % 4)
-            decoded = json.loads(base64.b64decode(payload))
-            user_id = decoded.get('cognito:username', decoded.get('username', 'anonymous'))
-        except Exception as e:
-            logger.error(f"Failed to decode JWT: {str(e)}")
-            return {'statusCode': 401, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Invalid token'})}
-        
+        user_id = extract_user_id(event)
+
         if not event.get('body'):
             return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Request body is required'})}
         
@@ -546,7 +1597,7 @@ def update_user_profile_handler(event):
             return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Database not available'})}
         
         try:
-            user_profiles_table.put_item(Item=profile)
+            save_profile(user_id, profile)
             logger.info(f"User profile updated for user {user_id}")
             return {'statusCode': 200, 'headers': CORS_HEADERS, 'body': json.dumps({'message': 'Profile updated successfully'})}
         except Exception as e:
@@ -558,11 +1609,6 @@ def update_user_profile_handler(event):
 
 def login_handler(event):
     try:
-        # CSRF validation temporarily disabled for frontend rebuild
-        # csrf_token = event.get('headers', {}).get('X-CSRF-Token') or event.get('headers', {}).get('x-csrf-token')
-        # if not validate_csrf_token(csrf_token):
-        #     return {'statusCode': 403, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Invalid or missing CSRF token'})}
-        
         # Validate request body
         if not event.get('body'):
             return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Request body is required'})}
@@ -608,4 +1654,22 @@ def login_handler(event):
         return {'statusCode': 400, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Invalid JSON format'})}
     except Exception as e:
         logger.error(f"Login handler error: {str(e)}", exc_info=True)
-        return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Internal server error'})}
\ No newline at end of file
+        return {'statusCode': 500, 'headers': CORS_HEADERS, 'body': json.dumps({'error': 'Internal server error'})}
+
+# ------------------- ROUTE TABLE -------------------
+router = Router([
+    Route('/transaction', ('POST',), transaction_handler, AUTH_OPTIONAL, csrf=True, idempotent=True),
+    Route('/transactions/batch', ('POST',), batch_transaction_handler, AUTH_OPTIONAL, idempotent=True),
+    Route('/transactions', ('GET',), get_transactions_handler, AUTH_REQUIRED),
+    Route('/transactions/export', ('POST',), export_transactions_handler, AUTH_REQUIRED),
+    Route('/analytics', ('GET',), analytics_handler, AUTH_REQUIRED),
+    Route('/user-profile', ('GET',), get_user_profile_handler, AUTH_REQUIRED),
+    Route('/user-profile', ('PUT',), update_user_profile_handler, AUTH_REQUIRED),
+    Route('/signup', ('POST',), signup_handler, AUTH_NONE, csrf=True),
+    Route('/login', ('POST',), login_handler, AUTH_NONE, csrf=True),
+    Route('/csrf-token', ('GET',), csrf_token_handler, AUTH_OPTIONAL),
+    Route('/fx-rates', ('GET',), fx_rates_handler, AUTH_NONE),
+    Route('/test', ('GET',), test_handler, AUTH_NONE),
+])
+
+metrics_recorder.mark_initialized()
@@ -1,8 +1,19 @@
-# Create zip file from Python code
+# Create zip file from the Python modules in this directory
 data "archive_file" "lambda_zip" {
   type        = "zip"
-  source_file = "${path.module}/lambda_code.py"
+  source_dir  = path.module
   output_path = "${path.module}/transaction_processor.zip"
+  excludes = setunion(
+    fileset(path.module, "*.tf"),
+    fileset(path.module, "__pycache__/**"),
+    ["transaction_processor.zip"]
+  )
+}
+
+# HMAC key for stateless CSRF tokens, shared by every container
+resource "random_password" "csrf_secret" {
+  length  = 48
+  special = false
 }
 
 # Lambda function
@@ -16,15 +27,81 @@ resource "aws_lambda_function" "transaction_processor" {
   runtime       = "python3.11"
   timeout       = 30
   memory_size   = 256
+  # pyarrow for reading compacted archive days on GET /transactions; imported only by those reads
+  layers        = var.transaction_retention_days > 0 && var.compaction_layer_arn != "" ? [var.compaction_layer_arn] : []
 
   environment {
     variables = {
-      S3_BUCKET           = var.s3_bucket_name
-      DYNAMODB_TABLE_NAME = aws_dynamodb_table.transactions.name
-      PROJECT_NAME        = var.project_name
-      ENVIRONMENT         = var.environment
-      LOG_LEVEL           = "INFO"
-      SNS_TOPIC_ARN       = aws_sns_topic.transaction_alerts.arn
+      S3_BUCKET            = var.s3_bucket_name
+      DYNAMODB_TABLE_NAME  = aws_dynamodb_table.transactions.name
+      ANALYTICS_TABLE_NAME = aws_dynamodb_table.analytics_rollups.name
+      PROJECT_NAME         = var.project_name
+      ENVIRONMENT          = var.environment
+      LOG_LEVEL            = "INFO"
+      SNS_TOPIC_ARN        = aws_sns_topic.transaction_alerts.arn
+
+      MERCHANT_KEYWORDS_SOURCE          = var.merchant_keywords_source
+      MERCHANT_KEYWORDS_REFRESH_SECONDS = "300"
+
+      FX_RATES_SOURCE          = var.fx_rates_source
+      FX_RATES_REFRESH_SECONDS = "300"
+
+      RISK_RULES_SOURCE          = var.risk_rules_source
+      RISK_RULES_REFRESH_SECONDS = "300"
+
+      SPEND_COUNTERS_TABLE_NAME = aws_dynamodb_table.spend_counters.name
+      VELOCITY_WINDOW_MINUTES   = "10"
+      VELOCITY_MAX_TRANSACTIONS = "5"
+
+      USER_STATS_TABLE_NAME        = aws_dynamodb_table.user_stats.name
+      USER_STATS_CACHE_MAX_ENTRIES = "4096"
+
+      IDEMPOTENCY_TABLE_NAME        = aws_dynamodb_table.idempotency_keys.name
+      IDEMPOTENCY_TTL_SECONDS       = "86400"
+      IDEMPOTENCY_CACHE_MAX_ENTRIES = "1024"
+
+      TRANSACTION_RETENTION_DAYS = tostring(var.transaction_retention_days)
+      ARCHIVE_MAX_DAYS_PER_PAGE  = "7"
+
+      PROFILE_CACHE_TTL_SECONDS        = "60"
+      PROFILE_CACHE_REVALIDATE_SECONDS = "5"
+      PROFILE_CACHE_MAX_ENTRIES        = "1024"
+
+      JWT_CACHE_MAX_ENTRIES = "1024"
+
+      RESPONSE_GZIP_MIN_BYTES = "8192"
+      RESPONSE_GZIP_LEVEL     = "1"
+
+      EXPORT_QUERY_PAGE_SIZE     = "1000"
+      EXPORT_PART_BYTES          = "8388608"
+      EXPORT_URL_TTL_SECONDS     = "900"
+      EXPORT_TIME_BUDGET_SECONDS = "20"
+
+      CSRF_MODE                 = var.csrf_mode
+      CSRF_SECRET               = random_password.csrf_secret.result
+      CSRF_ENFORCE              = "false"
+      CSRF_REPLAY_CACHE_ENTRIES = "0"
+
+      METRICS_SAMPLE_RATE = "0.1"
+
+      SIDE_EFFECTS_MODE      = var.side_effects_mode
+      SIDE_EFFECTS_QUEUE_URL = aws_sqs_queue.side_effects.url
+
+      ALERT_WINDOW_SECONDS     = "60"
+      ALERT_RATE_PER_MINUTE    = "30"
+      ALERT_BURST              = "10"
+      ALERT_WINDOWS_TABLE_NAME = aws_dynamodb_table.alert_windows.name
+
+      CHANGE_FEED_URL = aws_apigatewayv2_stage.change_feed.invoke_url
+    }
+  }
+
+  lifecycle {
+    # Cold pages are only served from compacted days: the day before the hot boundary and the
+    # one after it must have been compacted by the nightly run, which takes a retention of 3 days
+    precondition {
+      condition     = var.transaction_retention_days == 0 || (var.compaction_layer_arn != "" && var.transaction_retention_days >= 3)
+      error_message = "transaction_retention_days > 0 requires compaction_layer_arn (cold pages are read from compacted Parquet) and a retention of at least 3 days."
     }
   }
 }
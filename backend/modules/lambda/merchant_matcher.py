@@ -0,0 +1,198 @@
+"""Aho-Corasick keyword matching for merchant names.
+
+KeywordMatcher compiles a keyword list into an automaton stored in flat
+arrays, so memory stays around 16 bytes per trie node and lookup cost
+depends on the merchant name length, not on how many keywords are loaded.
+
+ReloadingMatcher wraps a KeywordMatcher built from a keyword file on S3 or
+local disk and rebuilds it on a background thread when the file's ETag changes.
+"""
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REFRESH_SECONDS = 300
+
+class KeywordMatcher:
+    """Case-insensitive substring matcher over a fixed keyword set"""
+
+    def __init__(self, keywords):
+        words = sorted({str(k).strip().lower() for k in keywords if k and str(k).strip()})
+        self.keywords = words
+
+        # Node n's outgoing edges are chars[offsets[n]:offsets[n + 1]], sorted by code point.
+        # Nodes are numbered in BFS order, so the node reached by edge i is always i + 1.
+        offsets = array('I', [0])
+        chars = array('I')
+        fail = array('I', [0])
+        out = array('i', [-1])
+        self._offsets, self._chars, self._fail, self._out = offsets, chars, fail, out
+
+        # Each queued node covers the sorted keyword range sharing its prefix
+        queue = deque([(0, len(words), 0)])
+        node = 0
+        while queue:
+            lo, hi, depth = queue.popleft()
+            i = lo
+            # A keyword ending at this node sorts before its extensions
+            while i < hi and len(words[i]) == depth:
+                i += 1
+            while i < hi:
+                ch = words[i][depth]
+                code = ord(ch)
+                end = hi if code >= 0x10FFFF else bisect_left(words, words[i][:depth] + chr(code + 1), i, hi)
+                chars.append(code)
+                link = 0 if node == 0 else self._goto(fail[node], code)
+                fail.append(link)
+                out.append(i if len(words[i]) == depth + 1 else out[link])
+                queue.append((i, end, depth + 1))
+                i = end
+            offsets.append(len(chars))
+            node += 1
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def _goto(self, state, code):
+        offsets, chars, fail = self._offsets, self._chars, self._fail
+        while True:
+            lo = offsets[state]
+            hi = offsets[state + 1]
+            if lo < hi:
+                i = bisect_left(chars, code, lo, hi)
+                if i < hi and chars[i] == code:
+                    return i + 1
+            if state == 0:
+                return 0
+            state = fail[state]
+
+    def search(self, text):
+        """Return the first keyword found in text (already lowercased), or None"""
+        if not self.keywords:
+            return None
+        out = self._out
+        state = 0
+        for ch in text:
+            state = self._goto(state, ord(ch))
+            hit = out[state]
+            if hit >= 0:
+                return self.keywords[hit]
+        return None
+
+def parse_keywords(text):
+    """One keyword per line; blank lines and '#' comments are ignored"""
+    keywords = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            keywords.append(line)
+    return keywords
+
+class LocalKeywordSource:
+    def __init__(self, path):
+        self.path = path
+
+    def etag(self):
+        stat = os.stat(self.path)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def load(self):
+        with open(self.path, encoding='utf-8') as f:
+            return parse_keywords(f.read())
+
+class S3KeywordSource:
+    def __init__(self, bucket, key, s3_client=None):
+        self.bucket = bucket
+        self.key = key
+        self._s3_client = s3_client
+
+    @property
+    def s3_client(self):
+        if self._s3_client is None:
+            import aws_clients
+            self._s3_client = aws_clients.client('s3')
+        return self._s3_client
+
+    def etag(self):
+        return self.s3_client.head_object(Bucket=self.bucket, Key=self.key)['ETag']
+
+    def load(self):
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key)
+        return parse_keywords(response['Body'].read().decode('utf-8'))
+
+def keyword_source(location):
+    """Build a source from 's3://bucket/key' or a local file path"""
+    if not location:
+        return None
+    if location.startswith('s3://'):
+        bucket, _, key = location[len('s3://'):].partition('/')
+        return S3KeywordSource(bucket, key)
+    return LocalKeywordSource(location)
+
+class ReloadingMatcher:
+    """Serves a KeywordMatcher and swaps in a rebuilt one when the source changes.
+
+    The first get() loads the source synchronously; afterwards the source ETag is
+    polled at most once per refresh_interval and rebuilds run on a daemon thread
+    while the previous matcher keeps serving.
+    """
+
+    def __init__(self, source=None, default_keywords=(), refresh_interval=DEFAULT_REFRESH_SECONDS):
+        self.source = source
+        self.default_keywords = list(default_keywords)
+        self.refresh_interval = refresh_interval
+        self.etag = None
+        self._matcher = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get(self):
+        if self._matcher is None:
+            with self._lock:
+                if self._matcher is None:
+                    self._matcher = KeywordMatcher(self.default_keywords)
+                    self._checked_at = time.monotonic()
+                    if self.source:
+                        self._refresh()
+        elif self.source and time.monotonic() - self._checked_at >= self.refresh_interval:
+            self._start_background_refresh()
+        return self._matcher
+
+    def search(self, text):
+        return self.get().search(text)
+
+    def _start_background_refresh(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self._checked_at = time.monotonic()
+        threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self._refresh()
+        finally:
+            self._refreshing = False
+
+    def _refresh(self):
+        try:
+            etag = self.source.etag()
+            if etag == self.etag:
+                return
+            keywords = self.source.load()
+            start = time.perf_counter()
+            matcher = KeywordMatcher(self.default_keywords + keywords)
+            self._matcher = matcher
+            self.etag = etag
+            logger.info(f"Merchant keyword matcher rebuilt: {len(matcher)} keywords in "
+                        f"{time.perf_counter() - start:.2f}s (etag {etag})")
+        except Exception as e:
+            logger.error(f"Failed to refresh merchant keywords: {str(e)}")
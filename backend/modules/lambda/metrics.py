@@ -0,0 +1,169 @@
+"""Per-invocation latency metrics in CloudWatch Embedded Metric Format.
+
+A Recorder times each sampled invocation and every AWS operation it makes.
+AWS calls are timed through botocore's before-call / after-call event hooks,
+which aws_clients registers on every client it builds, so retries and
+response parsing are included. At the end of a sampled invocation one EMF
+JSON line is printed to stdout, where CloudWatch Logs turns it into metrics
+without any PutMetricData calls:
+
+- Duration, AwsTime and ComputeTime (Duration minus AwsTime) per Route
+- AwsCalls per Route, and one '<service>.<Operation>' metric per operation
+- ColdStart, plus InitDuration (module import time, see mark_initialized)
+  on the first invocation of a container
+- any values a route adds with put_metric, and properties with set_property
+
+Invocations are sampled at sample_rate; the first invocation of a container
+is always sampled. An unsampled invocation costs a random() call and the
+hooks return at once. With aggregate=True (local runs) the samples are also
+kept in memory, and summary() reports p50/p95/p99 per route and operation.
+"""
+import json
+import logging
+import random
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NAMESPACE = 'TransactionMonitor'
+_MODULE_LOADED = time.perf_counter()
+_recorder = None
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100.0 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+class Recorder:
+    def __init__(self, namespace=DEFAULT_NAMESPACE, sample_rate=1.0, aggregate=False, emit=True,
+                 stream=None, service=None):
+        self.namespace = namespace
+        self.sample_rate = sample_rate
+        self.aggregate = aggregate
+        self.emit = emit
+        self.stream = stream
+        self.service = service
+        self.cold = True
+        self.active = False
+        self.samples = {}
+        self.init_ms = None
+        self._route = None
+        self._started = 0.0
+        self._calls = []
+        self._metrics = {}
+        self._properties = {}
+
+    def mark_initialized(self):
+        """Call once the handler module has finished importing"""
+        self.init_ms = (time.perf_counter() - _MODULE_LOADED) * 1000
+
+    def begin(self, route):
+        """Start timing an invocation of route if it is sampled"""
+        cold, self.cold = self.cold, False
+        self.active = cold or (self.sample_rate > 0 and random.random() < self.sample_rate)
+        if not self.active:
+            return
+        self._route = route
+        self._cold_start = cold
+        self._calls = []
+        self._metrics = {}
+        self._properties = {}
+        self._started = time.perf_counter()
+
+    def record_call(self, operation, elapsed_ms):
+        if self.active:
+            self._calls.append((operation, elapsed_ms))
+
+    def put_metric(self, name, value, unit='Count'):
+        """Add a route-specific value to the current invocation's metrics"""
+        if self.active:
+            self._metrics[name] = (value, unit)
+
+    def set_property(self, name, value):
+        """Add a searchable field (not a metric) to the current invocation's EMF line"""
+        if self.active:
+            self._properties[name] = value
+
+    def end(self, status_code=None):
+        """Finish the current invocation; emits its EMF line when sampled"""
+        if not self.active:
+            return None
+        self.active = False
+        duration = (time.perf_counter() - self._started) * 1000
+        aws_time = sum(elapsed for _, elapsed in self._calls)
+        values = {'Duration': duration, 'AwsTime': aws_time, 'ComputeTime': max(0.0, duration - aws_time),
+                  'AwsCalls': len(self._calls), 'ColdStart': 1 if self._cold_start else 0}
+        if self._cold_start and self.init_ms is not None:
+            values['InitDuration'] = self.init_ms
+        values.update((name, value) for name, (value, _) in self._metrics.items())
+        by_operation = {}
+        for operation, elapsed in self._calls:
+            by_operation.setdefault(operation, []).append(elapsed)
+
+        if self.aggregate:
+            for name, value in values.items():
+                self.samples.setdefault((self._route, name), []).append(value)
+            for operation, elapsed in by_operation.items():
+                self.samples.setdefault((self._route, operation), []).extend(elapsed)
+        if not self.emit:
+            return None
+        document = self.document(values, by_operation, status_code)
+        try:
+            (self.stream or sys.stdout).write(json.dumps(document, separators=(',', ':')) + '\n')
+        except (OSError, ValueError) as e:
+            # Losing a metric line must never fail the request
+            logger.warning(f"Failed to emit metrics: {str(e)}")
+        return document
+
+    def document(self, values, by_operation, status_code=None):
+        units = {'AwsCalls': 'Count', 'ColdStart': 'Count'}
+        units.update((name, unit) for name, (_, unit) in self._metrics.items())
+        metrics = [{'Name': name, 'Unit': units.get(name, 'Milliseconds')} for name in values]
+        metrics += [{'Name': operation, 'Unit': 'Milliseconds'} for operation in by_operation]
+        document = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{'Namespace': self.namespace, 'Dimensions': [['Route']], 'Metrics': metrics}]
+            },
+            'Route': self._route,
+            'SampleRate': self.sample_rate
+        }
+        if self.service:
+            document['Service'] = self.service
+        if status_code is not None:
+            document['StatusCode'] = status_code
+        document.update(self._properties)
+        document.update({name: round(value, 3) for name, value in values.items()})
+        document.update({operation: [round(v, 3) for v in elapsed] for operation, elapsed in by_operation.items()})
+        return document
+
+    def summary(self):
+        """{(route, metric): {'count', 'p50', 'p95', 'p99'}} over the aggregated samples"""
+        return {key: {'count': len(values), 'p50': percentile(values, 50), 'p95': percentile(values, 95),
+                      'p99': percentile(values, 99)}
+                for key, values in sorted(self.samples.items()) if values}
+
+def install(recorder):
+    """Make recorder the target of the botocore hooks"""
+    global _recorder
+    _recorder = recorder
+
+def _before_call(context=None, **kwargs):
+    if _recorder is not None and _recorder.active and context is not None:
+        context['metrics_started'] = time.perf_counter()
+
+def _after_call(event_name, context=None, **kwargs):
+    started = context.get('metrics_started') if context else None
+    if started is not None and _recorder is not None:
+        # event_name is 'after-call.<service>.<Operation>' or 'after-call-error.<service>.<Operation>'
+        _, service, operation = event_name.split('.', 2)
+        _recorder.record_call(f"{service}.{operation}", (time.perf_counter() - started) * 1000)
+        del context['metrics_started']
+
+def instrument_client(client):
+    events = client.meta.events
+    events.register('before-call', _before_call, unique_id='metrics-before-call')
+    events.register('after-call', _after_call, unique_id='metrics-after-call')
+    events.register('after-call-error', _after_call, unique_id='metrics-after-call-error')
+    return client
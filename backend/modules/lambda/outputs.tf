@@ -11,3 +11,8 @@ output "lambda_invoke_arn" {
 output "lambda_function_arn" {
   value = aws_lambda_function.transaction_processor.arn
 }
+
+output "change_feed_url" {
+  description = "WebSocket URL of the real-time change feed"
+  value       = aws_apigatewayv2_stage.change_feed.invoke_url
+}
@@ -0,0 +1,71 @@
+"""NumPy batch scorer used for bulk and backfill rescoring.
+
+score_batch produces the same integer scores as risk_scoring.calculate_risk_score
+(called without a user profile) for every row, but works column-wise: currencies and merchants are resolved once
+per distinct value and amounts are bucketed with searchsorted.
+
+Distinct values are found with pandas.factorize (a hash table in C) when
+pandas is installed, and with np.unique (a sort) otherwise.
+"""
+import numpy as np
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+from risk_scoring import AMOUNT_BANDS, MAX_RISK_SCORE, MERCHANT_RISK_POINTS, exchange_rates, merchant_keywords
+
+# Ascending thresholds; bucket i holds amounts above _THRESHOLDS[i - 1]
+_THRESHOLDS = np.array(sorted(threshold for threshold, _ in AMOUNT_BANDS), dtype=np.float64)
+_BAND_POINTS = np.array([0] + [points for _, points in sorted(AMOUNT_BANDS)], dtype=np.int64)
+
+def factorize(values):
+    """Return (distinct values, int index of each row into them)"""
+    if pandas is not None:
+        inverse, uniques = pandas.factorize(np.asarray(values, dtype=object))
+        uniques = uniques.tolist()
+        missing = inverse < 0
+        if missing.any():
+            # Missing values get the -1 sentinel; the scalar scorer sees them as 'None'
+            inverse[missing] = len(uniques)
+            uniques.append('None')
+        return uniques, inverse
+    # np.unique sorts, which needs values of one type
+    uniques, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return uniques.tolist(), inverse.reshape(-1)
+
+def currency_rates(currencies, rates=None):
+    """Map currency codes to their per-USD rate (current rates by default), unknown codes falling back to 1.0"""
+    rates = rates if rates is not None else exchange_rates.get().rates
+    codes, inverse = factorize(currencies)
+    lookup = np.array([rates.get(code, 1.0) for code in codes], dtype=np.float64)
+    return lookup[inverse]
+
+def merchant_flags(merchants, matcher=None):
+    """Boolean array marking merchants that hit the high-risk keyword matcher"""
+    matcher = matcher or merchant_keywords.get()
+    names, inverse = factorize(merchants)
+    hits = np.fromiter((matcher.search(str(name).lower()) is not None for name in names),
+                       dtype=bool, count=len(names))
+    return hits[inverse]
+
+def score_batch(amounts, currencies, merchants, matcher=None):
+    """Vectorized calculate_risk_score over parallel amount/currency/merchant columns.
+
+    Returns an int64 array of risk scores.
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    if not (len(amounts) == len(currencies) == len(merchants)):
+        raise ValueError("amounts, currencies and merchants must have the same length")
+    if len(amounts) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    usd_amounts = amounts / currency_rates(currencies)
+    # side='left' counts thresholds strictly below each amount, matching the scalar '>' checks
+    bands = np.searchsorted(_THRESHOLDS, usd_amounts, side='left')
+    bands[np.isnan(usd_amounts)] = 0
+    scores = _BAND_POINTS[bands]
+
+    scores += np.where(merchant_flags(merchants, matcher), MERCHANT_RISK_POINTS, 0)
+    return np.minimum(scores, MAX_RISK_SCORE)
@@ -0,0 +1,485 @@
+"""Declarative risk rules, compiled once per container into closures.
+
+A rules document (risk_rules.json here, or RISK_RULES_SOURCE: a local path
+or s3://bucket/key, YAML if the name ends in .yaml/.yml and PyYAML is
+installed) holds a version, the default flag threshold and a list of rules:
+
+    {"version": "2026-10-17.1", "threshold": 70, "max_score": 100, "rules": [
+        {"id": "amount_over_10000", "group": "amount", "points": 50, "when": {"amount_usd_gt": 10000}},
+        {"id": "night_crypto", "points": 25, "factor": "night_crypto",
+         "when": {"hour_utc_in": [0, 5], "merchant_keyword": ["crypto", "bitcoin"]}}
+    ]}
+
+A rule adds its points when every condition in 'when' holds, checked in
+order and stopping at the first that doesn't. Rules sharing a 'group' are
+exclusive: the first one that fires, in document order, skips the rest
+(amount bands, budget bands). 'factor' names the rule in the result's
+risk_factors; 'detail' stores the value of its last condition (the matched
+keyword, for merchant conditions) under that key of the result.
+
+Conditions that read the user's profile, spend counters or amount
+statistics only run when those are known, as do rules listing them in
+'requires'. compile_rules builds each condition into a closure over its
+parsed arguments, and keeps one flat plan per combination of profile/spend/
+stats availability, so evaluation never looks at a rule it can't apply.
+Every evaluation returns the document's version with the score, and counts
+the hits of each rule; the counts are logged every log_every evaluations.
+
+ReloadingRules keeps the compiled rule set in the same way
+fx_rates.ReloadingRates keeps its rate table: the source's ETag is polled
+at most once per refresh_interval, a changed document is compiled on a
+daemon thread while the old rules keep serving, and a document that fails
+to load or compile is logged and ignored.
+"""
+import datetime
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+from merchant_matcher import KeywordMatcher, LocalKeywordSource, S3KeywordSource
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'risk_rules.json')
+DEFAULT_REFRESH_SECONDS = 300
+DEFAULT_LOG_EVERY = 1000
+DEFAULT_THRESHOLD = 70
+DEFAULT_MAX_SCORE = 100
+DEFAULT_VELOCITY_LIMIT = 5
+# Merchant keyword results remembered per condition; cleared when full or the keyword list changes
+MERCHANT_CACHE_SIZE = 4096
+
+# What a condition reads besides the transaction itself
+PROFILE, SPEND, STATS = 1, 2, 4
+REQUIREMENTS = {'profile': PROFILE, 'spend': SPEND, 'stats': STATS}
+
+Rule = namedtuple('Rule', ['id', 'index', 'points', 'factor', 'detail', 'group', 'requires', 'predicate'])
+
+class RulesError(Exception):
+    pass
+
+class Context:
+    """What conditions see: the transaction in USD, lowercased merchant, and the user's state"""
+    __slots__ = ('usd_amount', 'merchant', 'currency', 'profile', 'spend', 'stats', 'hour')
+
+def profile_number(profile, key):
+    """A positive number from the profile, or None"""
+    try:
+        value = float(profile[key])
+    except (KeyError, ValueError, TypeError):
+        return None
+    return value if value > 0 else None
+
+@functools.lru_cache(maxsize=1024)
+def _user_matcher(keywords):
+    return KeywordMatcher(keywords)
+
+def user_list_match(profile, list_name, merchant):
+    """Match a lowercased merchant against a profile's blockedMerchants/trustedMerchants"""
+    keywords = (profile or {}).get(list_name) or ()
+    if not keywords:
+        return None
+    return _user_matcher(tuple(keywords)).search(merchant)
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RulesError(f"expected a number, got {value!r}")
+    return value
+
+# ------------------- CONDITIONS -------------------
+# Each builder takes the condition's argument and the compile options and returns
+# (predicate, requirements); a predicate returns a truthy value when the condition holds.
+
+def _amount_gt(value, options):
+    limit = _number(value)
+    return (lambda ctx: ctx.usd_amount > limit), 0
+
+def _amount_gte(value, options):
+    limit = _number(value)
+    return (lambda ctx: ctx.usd_amount >= limit), 0
+
+def _amount_lt(value, options):
+    limit = _number(value)
+    return (lambda ctx: ctx.usd_amount < limit), 0
+
+def _amount_lte(value, options):
+    limit = _number(value)
+    return (lambda ctx: ctx.usd_amount <= limit), 0
+
+def _currency_in(value, options):
+    if not isinstance(value, list) or not value:
+        raise RulesError('expected a list of currency codes')
+    codes = frozenset(str(code).upper() for code in value)
+    return (lambda ctx: ctx.currency in codes), 0
+
+def _memoized_search(current_matcher):
+    """search() of the matcher current_matcher() returns, remembering results per merchant"""
+    cache = {}
+    built = [None]
+    def search(merchant):
+        matcher = current_matcher()
+        if matcher is not built[0]:
+            cache.clear()
+            built[0] = matcher
+        try:
+            return cache[merchant]
+        except KeyError:
+            if len(cache) >= MERCHANT_CACHE_SIZE:
+                cache.clear()
+            result = cache[merchant] = matcher.search(merchant)
+            return result
+    return search
+
+def _merchant_keyword(value, options):
+    if isinstance(value, str):
+        matcher = options['matchers'].get(value)
+        if matcher is None:
+            raise RulesError(f"unknown keyword list {value!r}")
+        # A ReloadingMatcher hands out a new KeywordMatcher whenever its list changes
+        current_matcher = matcher.get if hasattr(matcher, 'get') else (lambda: matcher)
+    elif isinstance(value, list) and value:
+        matcher = KeywordMatcher(value)
+        current_matcher = lambda: matcher  # noqa: E731
+    else:
+        raise RulesError('expected a keyword list name or a list of keywords')
+    search = _memoized_search(current_matcher)
+    return (lambda ctx: search(ctx.merchant)), 0
+
+def _merchant_in_profile_list(value, options):
+    if not isinstance(value, str):
+        raise RulesError('expected a profile attribute name')
+    cache = {}
+    def predicate(ctx):
+        keywords = ctx.profile.get(value)
+        if not keywords:
+            return None
+        key = (tuple(keywords), ctx.merchant)
+        try:
+            return cache[key]
+        except KeyError:
+            if len(cache) >= MERCHANT_CACHE_SIZE:
+                cache.clear()
+            result = cache[key] = _user_matcher(key[0]).search(ctx.merchant)
+            return result
+    return predicate, PROFILE
+
+def _hour_utc_in(value, options):
+    if not (isinstance(value, list) and len(value) == 2 and all(0 <= _number(hour) <= 24 for hour in value)):
+        raise RulesError('expected [start_hour, end_hour]')
+    start, end = value
+    if start <= end:
+        return (lambda ctx: start <= ctx.hour < end), 0
+    # Wraps past midnight, e.g. [22, 6]
+    return (lambda ctx: ctx.hour >= start or ctx.hour < end), 0
+
+def _over_monthly_remaining(value, options):
+    ratio = _number(value)
+    def predicate(ctx):
+        budget = profile_number(ctx.profile, 'monthlyBudget')
+        return bool(budget) and ctx.usd_amount > (budget - ctx.spend.get('month_usd', 0)) * ratio
+    return predicate, PROFILE | SPEND
+
+def _over_monthly_budget_share(value, options):
+    share = _number(value)
+    def predicate(ctx):
+        budget = profile_number(ctx.profile, 'monthlyBudget')
+        return bool(budget) and ctx.usd_amount > budget * share
+    return predicate, PROFILE | SPEND
+
+def _over_daily_remaining(value, options):
+    ratio = _number(value)
+    def predicate(ctx):
+        limit = profile_number(ctx.profile, 'dailyLimit')
+        return bool(limit) and ctx.usd_amount > (limit - ctx.spend.get('day_usd', 0)) * ratio
+    return predicate, PROFILE | SPEND
+
+def _velocity_over_limit(value, options):
+    """Over the profile's velocityLimit, or the given default (true: the configured one)"""
+    default = options['velocity_limit'] if value is True else _number(value)
+    def predicate(ctx):
+        return ctx.spend.get('velocity_count', 0) > (profile_number(ctx.profile, 'velocityLimit') or default)
+    return predicate, PROFILE | SPEND
+
+def _velocity_count_gt(value, options):
+    limit = _number(value)
+    return (lambda ctx: ctx.spend.get('velocity_count', 0) > limit), SPEND
+
+def _profile_equals(value, options):
+    if not isinstance(value, dict) or not value:
+        raise RulesError('expected an object of profile attributes')
+    if len(value) == 1:
+        (key, wanted), = value.items()
+        return (lambda ctx: ctx.profile.get(key) == wanted), PROFILE
+    expected = tuple(value.items())
+    return (lambda ctx: all(ctx.profile.get(key) == wanted for key, wanted in expected)), PROFILE
+
+def _amount_z_gt(value, options):
+    threshold = _number(value)
+    def predicate(ctx):
+        amount_z = ctx.stats.get('amount_z')
+        return amount_z is not None and amount_z > threshold
+    return predicate, STATS
+
+def _new_merchant(value, options):
+    """A merchant the user has never paid, once they have at least value transactions"""
+    min_history = _number(value)
+    return (lambda ctx: ctx.stats.get('history', 0) >= min_history and ctx.stats.get('merchant_history') == 0), STATS
+
+CONDITIONS = {
+    'amount_usd_gt': _amount_gt,
+    'amount_usd_gte': _amount_gte,
+    'amount_usd_lt': _amount_lt,
+    'amount_usd_lte': _amount_lte,
+    'currency_in': _currency_in,
+    'merchant_keyword': _merchant_keyword,
+    'merchant_in_profile_list': _merchant_in_profile_list,
+    'hour_utc_in': _hour_utc_in,
+    'over_monthly_remaining': _over_monthly_remaining,
+    'over_monthly_budget_share': _over_monthly_budget_share,
+    'over_daily_remaining': _over_daily_remaining,
+    'velocity_over_limit': _velocity_over_limit,
+    'velocity_count_gt': _velocity_count_gt,
+    'profile_equals': _profile_equals,
+    'amount_z_gt': _amount_z_gt,
+    'new_merchant': _new_merchant,
+}
+
+def _all(predicates):
+    def predicate(ctx):
+        value = None
+        for check in predicates:
+            value = check(ctx)
+            if not value:
+                return value
+        return value
+    return predicate
+
+# ------------------- COMPILATION -------------------
+def _compile_rule(rule, index, options):
+    if not isinstance(rule, dict) or not isinstance(rule.get('id'), str) or not rule['id']:
+        raise RulesError(f"Rule {index} needs a string id")
+    rule_id = rule['id']
+    when = rule.get('when')
+    if not isinstance(when, dict) or not when:
+        raise RulesError(f"Rule {rule_id}: 'when' must be a non-empty object")
+    try:
+        points = _number(rule.get('points'))
+    except RulesError as e:
+        raise RulesError(f"Rule {rule_id}: points: {str(e)}")
+    predicates, requires = [], 0
+    for name, value in when.items():
+        builder = CONDITIONS.get(name)
+        if builder is None:
+            raise RulesError(f"Rule {rule_id}: unknown condition {name!r}")
+        try:
+            predicate, needs = builder(value, options)
+        except RulesError as e:
+            raise RulesError(f"Rule {rule_id}: {name}: {str(e)}")
+        predicates.append(predicate)
+        requires |= needs
+    for name in rule.get('requires') or ():
+        if name not in REQUIREMENTS:
+            raise RulesError(f"Rule {rule_id}: unknown requirement {name!r}")
+        requires |= REQUIREMENTS[name]
+    uses_hour = 'hour_utc_in' in when
+    return Rule(rule_id, index, points, rule.get('factor'), rule.get('detail'), rule.get('group'), requires,
+                predicates[0] if len(predicates) == 1 else _all(predicates)), uses_hour
+
+def _plan(rules, available):
+    """Steps of the rules that can run with the available inputs; a group is one step.
+
+    Rules are flattened to (predicate, points, index, factor, detail) tuples.
+    """
+    steps, groups = [], {}
+    for rule in rules:
+        if rule.requires & ~available:
+            continue
+        entry = (rule.predicate, rule.points, rule.index, rule.factor, rule.detail)
+        if rule.group is None:
+            steps.append([entry])
+        elif rule.group in groups:
+            groups[rule.group].append(entry)
+        else:
+            groups[rule.group] = [entry]
+            steps.append(groups[rule.group])
+    return tuple(tuple(step) for step in steps)
+
+def compile_rules(document, matchers=None, velocity_limit=DEFAULT_VELOCITY_LIMIT, log_every=DEFAULT_LOG_EVERY):
+    """Build a RuleSet from a parsed rules document; raises RulesError if it is invalid"""
+    if not isinstance(document, dict):
+        raise RulesError('Rules document must be an object')
+    version = document.get('version')
+    if not isinstance(version, (str, int)) or isinstance(version, bool) or version == '':
+        raise RulesError('Rules document needs a version')
+    rules = document.get('rules')
+    if not isinstance(rules, list) or not rules:
+        raise RulesError('Rules document needs a non-empty rules list')
+    try:
+        threshold = _number(document.get('threshold', DEFAULT_THRESHOLD))
+        max_score = _number(document.get('max_score', DEFAULT_MAX_SCORE))
+    except RulesError as e:
+        raise RulesError(f"threshold/max_score: {str(e)}")
+    options = {'matchers': matchers or {}, 'velocity_limit': velocity_limit}
+    compiled, uses_hour = [], False
+    for index, rule in enumerate(rules):
+        rule, hour = _compile_rule(rule, index, options)
+        compiled.append(rule)
+        uses_hour = uses_hour or hour
+    ids = [rule.id for rule in compiled]
+    if len(set(ids)) != len(ids):
+        raise RulesError('Rule ids must be unique')
+    return RuleSet(str(version), threshold, max_score, compiled, uses_hour, log_every)
+
+class RuleSet:
+    def __init__(self, version, threshold, max_score, rules, uses_hour=False, log_every=DEFAULT_LOG_EVERY):
+        self.version = version
+        self.threshold = threshold
+        self.max_score = max_score
+        self.rules = rules
+        self.uses_hour = uses_hour
+        self.log_every = log_every
+        self.detail_keys = tuple(dict.fromkeys(rule.detail for rule in rules if rule.detail))
+        self._plans = [_plan(rules, available) for available in range((PROFILE | SPEND | STATS) + 1)]
+        self.hits = [0] * len(rules)
+        self.evaluations = 0
+
+    def __len__(self):
+        return len(self.rules)
+
+    def evaluate(self, usd_amount, merchant, currency='USD', profile=None, spend=None, stats=None, at=None):
+        """(score, details) for one transaction.
+
+        merchant is lowercased. details holds risk_factors, each rule's
+        'detail' key (None unless it fired) and rules_version.
+        """
+        ctx = Context()
+        ctx.usd_amount, ctx.merchant, ctx.currency = usd_amount, merchant, currency
+        ctx.profile, ctx.spend, ctx.stats = profile, spend, stats
+        if self.uses_hour:
+            ctx.hour = datetime.datetime.fromtimestamp(time.time() if at is None else at, datetime.timezone.utc).hour
+        available = (PROFILE if profile else 0) | (SPEND if spend is not None else 0) | (STATS if stats is not None else 0)
+
+        score, factors = 0, []
+        details = dict.fromkeys(self.detail_keys)
+        hits = self.hits
+        for step in self._plans[available]:
+            for predicate, points, index, factor, detail in step:
+                value = predicate(ctx)
+                if value:
+                    score += points
+                    hits[index] += 1
+                    if factor:
+                        factors.append(factor)
+                    if detail:
+                        details[detail] = value
+                    break
+        details['risk_factors'] = factors
+        details['rules_version'] = self.version
+
+        self.evaluations += 1
+        if self.log_every and self.evaluations % self.log_every == 0:
+            self.log_hits()
+        return max(0, min(score, self.max_score)), details
+
+    def hit_counts(self):
+        return {rule.id: self.hits[rule.index] for rule in self.rules}
+
+    def log_hits(self):
+        fired = sorted(((count, rule_id) for rule_id, count in self.hit_counts().items() if count), reverse=True)
+        logger.info(f"Risk rules {self.version}: {self.evaluations} evaluations, hits: "
+                    f"{', '.join(f'{rule_id}={count}' for count, rule_id in fired) or 'none'}")
+
+# ------------------- LOADING -------------------
+def parse_rules(text, yaml_format=False):
+    if yaml_format:
+        try:
+            import yaml
+        except ImportError:
+            raise RulesError('YAML rules need PyYAML installed')
+        try:
+            return yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise RulesError(f"Rules file is not valid YAML: {str(e)}")
+    try:
+        return json.loads(text)
+    except ValueError as e:
+        raise RulesError(f"Rules file is not valid JSON: {str(e)}")
+
+def _is_yaml(name):
+    return name.lower().endswith(('.yaml', '.yml'))
+
+class LocalRulesSource(LocalKeywordSource):
+    def load(self):
+        with open(self.path, encoding='utf-8') as f:
+            return parse_rules(f.read(), _is_yaml(self.path))
+
+class S3RulesSource(S3KeywordSource):
+    def load(self):
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key)
+        return parse_rules(response['Body'].read().decode('utf-8'), _is_yaml(self.key))
+
+def rules_source(location):
+    """Build a source from 's3://bucket/key' or a local file path"""
+    if not location:
+        return None
+    if location.startswith('s3://'):
+        bucket, _, key = location[len('s3://'):].partition('/')
+        return S3RulesSource(bucket, key)
+    return LocalRulesSource(location)
+
+class ReloadingRules:
+    """Serves a compiled RuleSet and swaps in a new one when the rules document changes"""
+
+    def __init__(self, source=None, refresh_interval=DEFAULT_REFRESH_SECONDS, **compile_options):
+        self.source = source
+        self.refresh_interval = refresh_interval
+        self.compile_options = compile_options
+        self.etag = None
+        self._rules = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get(self):
+        if self._rules is None:
+            with self._lock:
+                if self._rules is None:
+                    self._rules = compile_rules(LocalRulesSource(DEFAULT_RULES_PATH).load(), **self.compile_options)
+                    self._checked_at = time.monotonic()
+                    if self.source:
+                        self._refresh()
+        elif self.source and time.monotonic() - self._checked_at >= self.refresh_interval:
+            self._start_background_refresh()
+        return self._rules
+
+    def _start_background_refresh(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self._checked_at = time.monotonic()
+        threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self._refresh()
+        finally:
+            self._refreshing = False
+
+    def _refresh(self):
+        try:
+            etag = self.source.etag()
+            if etag == self.etag:
+                return
+            start = time.perf_counter()
+            rules = compile_rules(self.source.load(), **self.compile_options)
+            self._rules = rules
+            self.etag = etag
+            logger.info(f"Risk rules loaded: {len(rules)} rules, version {rules.version} in "
+                        f"{(time.perf_counter() - start) * 1000:.1f}ms (etag {etag})")
+        except Exception as e:
+            logger.error(f"Failed to refresh risk rules: {str(e)}")
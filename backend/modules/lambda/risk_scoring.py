@@ -0,0 +1,194 @@
+import logging
+import os
+
+import fx_rates
+import risk_rules
+from merchant_matcher import DEFAULT_REFRESH_SECONDS, ReloadingMatcher, keyword_source
+from risk_rules import profile_number as _profile_number, user_list_match
+
+logger = logging.getLogger(__name__)
+
+HIGH_RISK_MERCHANTS = ['casino', 'crypto', 'gambling']
+MERCHANT_RISK_POINTS = 40
+BLOCKED_MERCHANT_POINTS = 80
+TRUSTED_MERCHANT_POINTS = -20
+MAX_RISK_SCORE = 100
+DEFAULT_RISK_THRESHOLD = 70
+
+# Budget and velocity points, applied when the user's spend counters are known
+MONTHLY_BUDGET_EXCEEDED_POINTS = 60
+MONTHLY_BUDGET_NEAR_POINTS = 30
+BUDGET_NEAR_RATIO = 0.8
+DAILY_LIMIT_EXCEEDED_POINTS = 40
+# (share of monthly budget, points) for a single transaction
+BUDGET_SHARE_BANDS = ((0.5, 40), (0.25, 20))
+VELOCITY_POINTS = 30
+DEFAULT_VELOCITY_LIMIT = int(os.environ.get('VELOCITY_MAX_TRANSACTIONS', '5'))
+RISK_TOLERANCE_POINTS = {'low': 10, 'high': -10}
+
+# Statistical points from the user's own history (see user_stats): (z-score, points) checked
+# from the highest band down, and a merchant the user has never paid before
+AMOUNT_ZSCORE_BANDS = ((4.0, 30), (3.0, 15))
+NEW_MERCHANT_POINTS = 10
+NEW_MERCHANT_MIN_HISTORY = 5
+
+# (USD threshold, points) checked from the highest band down
+AMOUNT_BANDS = ((10000, 50), (5000, 30), (1000, 10))
+
+# Built-in rates, or the versioned rates file at FX_RATES_SOURCE (s3://bucket/key or a path)
+exchange_rates = fx_rates.ReloadingRates(
+    fx_rates.rate_source(os.environ.get('FX_RATES_SOURCE')),
+    refresh_interval=int(os.environ.get('FX_RATES_REFRESH_SECONDS', fx_rates.DEFAULT_REFRESH_SECONDS))
+)
+
+# Built-in categories plus the optional deny list at MERCHANT_KEYWORDS_SOURCE (s3://bucket/key or a path)
+merchant_keywords = ReloadingMatcher(
+    keyword_source(os.environ.get('MERCHANT_KEYWORDS_SOURCE')),
+    default_keywords=HIGH_RISK_MERCHANTS,
+    refresh_interval=int(os.environ.get('MERCHANT_KEYWORDS_REFRESH_SECONDS', DEFAULT_REFRESH_SECONDS))
+)
+
+# The risk_rules.json shipped with the code, or the rules document at RISK_RULES_SOURCE (s3://bucket/key or a path)
+rules = risk_rules.ReloadingRules(
+    risk_rules.rules_source(os.environ.get('RISK_RULES_SOURCE')),
+    refresh_interval=int(os.environ.get('RISK_RULES_REFRESH_SECONDS', risk_rules.DEFAULT_REFRESH_SECONDS)),
+    matchers={'high_risk': merchant_keywords},
+    velocity_limit=DEFAULT_VELOCITY_LIMIT
+)
+
+def to_usd(amount, currency):
+    return exchange_rates.get().to_usd(amount, currency)
+
+def risk_threshold(profile, default=DEFAULT_RISK_THRESHOLD):
+    """Scores above the user's customRiskThreshold, or else the rule set's threshold, are flagged"""
+    try:
+        return float((profile or {}).get('customRiskThreshold', default))
+    except (ValueError, TypeError):
+        return default
+
+def spend_risk(usd_amount, profile, spend, factors):
+    """Budget, velocity and risk-tolerance points for one transaction.
+
+    spend holds the user's day_usd/month_usd before this transaction and
+    velocity_count including it (see spend_counters).
+    """
+    points = 0
+    monthly_budget = _profile_number(profile, 'monthlyBudget')
+    if monthly_budget:
+        remaining = monthly_budget - spend.get('month_usd', 0)
+        if usd_amount > remaining:
+            points += MONTHLY_BUDGET_EXCEEDED_POINTS
+            factors.append('monthly_budget_exceeded')
+        elif usd_amount > remaining * BUDGET_NEAR_RATIO:
+            points += MONTHLY_BUDGET_NEAR_POINTS
+            factors.append('monthly_budget_near')
+        for share, share_points in BUDGET_SHARE_BANDS:
+            if usd_amount > monthly_budget * share:
+                points += share_points
+                factors.append(f'budget_share_over_{int(share * 100)}pct')
+                break
+
+    daily_limit = _profile_number(profile, 'dailyLimit')
+    if daily_limit and usd_amount > daily_limit - spend.get('day_usd', 0):
+        points += DAILY_LIMIT_EXCEEDED_POINTS
+        factors.append('daily_limit_exceeded')
+
+    velocity_limit = _profile_number(profile, 'velocityLimit') or DEFAULT_VELOCITY_LIMIT
+    if spend.get('velocity_count', 0) > velocity_limit:
+        points += VELOCITY_POINTS
+        factors.append('velocity')
+
+    points += RISK_TOLERANCE_POINTS.get(profile.get('riskTolerance'), 0)
+    return points
+
+def anomaly_risk(stats, factors):
+    """Points for an amount far from the user's usual spend and for a first-seen merchant.
+
+    stats holds the user's history before this transaction (user_stats.signals).
+    """
+    points = 0
+    amount_z = stats.get('amount_z')
+    if amount_z is not None:
+        for threshold, band_points in AMOUNT_ZSCORE_BANDS:
+            if amount_z > threshold:
+                points += band_points
+                factors.append(f'amount_z_over_{int(threshold)}')
+                break
+    if stats.get('history', 0) >= NEW_MERCHANT_MIN_HISTORY and stats.get('merchant_history') == 0:
+        points += NEW_MERCHANT_POINTS
+        factors.append('new_merchant')
+    return points
+
+def score_transaction(transaction, amount=None, profile=None, spend=None, stats=None):
+    """Score a transaction with the current rule set.
+
+    Returns (score, details): details holds the risk_factors and matched
+    keywords of the rules that fired, the rules_version that produced the
+    score and the rule set's default flag threshold.
+    """
+    if amount is None:
+        try:
+            amount = float(transaction.get('amount', 0))
+        except (ValueError, TypeError):
+            amount = 0
+    currency = transaction.get('currency', 'USD')
+    rule_set = rules.get()
+    score, details = rule_set.evaluate(to_usd(amount, currency), str(transaction.get('merchant', '')).lower(),
+                                       currency, profile=profile, spend=spend, stats=stats)
+    details['threshold'] = rule_set.threshold
+    return score, details
+
+def calculate_risk_score(transaction, amount=None, profile=None, details=None, spend=None, stats=None):
+    """Score a transaction from 0-100 with the built-in rules, written out by hand.
+
+    This is the if/elif form of the shipped risk_rules.json, kept as the
+    reference that bench_risk_rules.py checks score_transaction against and
+    that risk_batch reproduces column-wise.
+
+    profile applies the user's blocked/trusted merchant lists and, together
+    with spend (the user's running counters), their budget, daily limit,
+    velocity limit and risk tolerance. If details is a dict it receives the
+    keywords that matched and the budget/velocity factors that fired. stats
+    (the user's streaming amount statistics) adds the anomaly points.
+    """
+    risk_score = 0
+    if amount is None:
+        try:
+            amount = float(transaction.get('amount', 0))
+        except (ValueError, TypeError):
+            amount = 0
+    
+    # Convert to USD for consistent risk assessment
+    currency = transaction.get('currency', 'USD')
+    usd_amount = to_usd(amount, currency)
+    
+    for threshold, points in AMOUNT_BANDS:
+        if usd_amount > threshold:
+            risk_score += points
+            break
+    
+    merchant = str(transaction.get('merchant', '')).lower()
+    keyword = merchant_keywords.search(merchant)
+    if keyword:
+        risk_score += MERCHANT_RISK_POINTS
+        logger.debug(f"High-risk merchant detected: {merchant} (keyword: {keyword})")
+
+    blocked = user_list_match(profile, 'blockedMerchants', merchant)
+    if blocked:
+        risk_score += BLOCKED_MERCHANT_POINTS
+    trusted = user_list_match(profile, 'trustedMerchants', merchant)
+    if trusted:
+        risk_score += TRUSTED_MERCHANT_POINTS
+
+    factors = []
+    if profile and spend is not None:
+        risk_score += spend_risk(usd_amount, profile, spend, factors)
+    if stats is not None:
+        risk_score += anomaly_risk(stats, factors)
+
+    if details is not None:
+        details['risk_factors'] = factors
+        details['merchant_keyword'] = keyword
+        details['blocked_merchant'] = blocked
+        details['trusted_merchant'] = trusted
+    return max(0, min(risk_score, MAX_RISK_SCORE))
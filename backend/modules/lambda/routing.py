@@ -0,0 +1,40 @@
+"""Route table for lambda_handler.
+
+Routes match on the trailing path segments, since API Gateway may prefix
+the path with a stage name. Each route names the methods it serves and
+whether it needs a Bearer token: AUTH_REQUIRED rejects requests without a
+valid one, AUTH_OPTIONAL serves them as 'anonymous' but still rejects a
+token that fails verification, and AUTH_NONE ignores the header. Routes
+with csrf=True also need an X-CSRF-Token header when CSRF_ENFORCE is on,
+and routes with idempotent=True honour an Idempotency-Key header (see
+idempotency.py).
+"""
+from collections import namedtuple
+
+AUTH_NONE = 'none'
+AUTH_OPTIONAL = 'optional'
+AUTH_REQUIRED = 'required'
+
+Route = namedtuple('Route', ['suffix', 'methods', 'handler', 'auth', 'csrf', 'idempotent'], defaults=(False, False))
+
+class Router:
+    def __init__(self, routes):
+        self._routes = {}
+        for route in routes:
+            self._routes.setdefault(route.suffix, {})
+            for method in route.methods:
+                self._routes[route.suffix][method] = route
+        # Segment counts to try, longest suffix first ('/transactions/batch' before '/batch')
+        self._depths = sorted({suffix.count('/') for suffix in self._routes}, reverse=True)
+
+    def match(self, path, method):
+        """(route, allowed_methods); route is None when the path or the method doesn't match"""
+        path = path.rstrip('/')
+        for depth in self._depths:
+            parts = path.rsplit('/', depth)
+            if len(parts) <= depth:
+                continue
+            by_method = self._routes.get('/' + '/'.join(parts[1:]))
+            if by_method is not None:
+                return by_method.get(method), sorted(by_method)
+        return None, []
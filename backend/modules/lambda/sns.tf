@@ -13,4 +13,49 @@ resource "aws_sns_topic_subscription" "email_alerts" {
 # Output SNS Topic ARN
 output "sns_topic_arn" {
   value = aws_sns_topic.transaction_alerts.arn
-}
\ No newline at end of file
+}
+# Publishes held alert digests that no container flushed in time (alerts.sweep)
+resource "aws_lambda_function" "alert_sweeper" {
+  filename         = data.archive_file.lambda_zip.output_path
+  source_code_hash = data.archive_file.lambda_zip.output_base64sha256
+
+  function_name = "${var.lambda_function_name}-alert-sweeper"
+  role          = aws_iam_role.lambda_role.arn
+  handler       = "lambda_code.alert_sweep_handler"
+  runtime       = "python3.11"
+  timeout       = 60
+  memory_size   = 128
+
+  environment {
+    variables = {
+      PROJECT_NAME  = var.project_name
+      ENVIRONMENT   = var.environment
+      LOG_LEVEL     = "INFO"
+      SNS_TOPIC_ARN = aws_sns_topic.transaction_alerts.arn
+
+      ALERT_WINDOWS_TABLE_NAME  = aws_dynamodb_table.alert_windows.name
+      ALERT_SWEEP_GRACE_SECONDS = "60"
+
+      CSRF_SECRET         = random_password.csrf_secret.result
+      METRICS_SAMPLE_RATE = "1"
+    }
+  }
+}
+
+resource "aws_cloudwatch_event_rule" "alert_sweep" {
+  name                = "${var.project_name}-${var.environment}-alert-sweep"
+  schedule_expression = "rate(1 minute)"
+}
+
+resource "aws_cloudwatch_event_target" "alert_sweep" {
+  rule = aws_cloudwatch_event_rule.alert_sweep.name
+  arn  = aws_lambda_function.alert_sweeper.arn
+}
+
+resource "aws_lambda_permission" "alert_sweep_schedule" {
+  statement_id  = "AllowExecutionFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.alert_sweeper.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.alert_sweep.arn
+}
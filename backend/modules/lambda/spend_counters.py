@@ -0,0 +1,130 @@
+"""Per-user spend and velocity counters.
+
+Counters live in one table keyed by (user_id, period):
+
+- 'day#YYYY-MM-DD': usd_sum, txn_count and one v<minute>_count attribute per
+  velocity window of the day
+- 'month#YYYY-MM': usd_sum, txn_count
+
+A single transaction bumps both items with UpdateItem ADD and reads the new
+totals back from the same call (ReturnValues='ALL_NEW'), so the check costs
+two writes however long the user's history is, and concurrent submissions
+always see each other's spend. Since the counters move before the
+transaction is stored, a transaction that then fails to store is taken
+back out with remove_spend().
+
+A batch does the same with the whole batch's total (record_batch_spend),
+and each transaction in it is scored against the totals before the batch
+plus the transactions ahead of it. Batch and single submissions of the
+same transactions are therefore scored alike, velocity included.
+"""
+import datetime
+from decimal import Decimal
+
+DAY_PREFIX = 'day#'
+MONTH_PREFIX = 'month#'
+DEFAULT_WINDOW_MINUTES = 10
+
+# Items expire via DynamoDB TTL once their period can no longer be read
+DAY_RETENTION = datetime.timedelta(days=2)
+MONTH_RETENTION = datetime.timedelta(days=62)
+
+def period_keys(now):
+    return DAY_PREFIX + now.date().isoformat(), MONTH_PREFIX + now.strftime('%Y-%m')
+
+def window_attr(now, window_minutes):
+    """Attribute holding the count for the velocity window containing now"""
+    minute = (now.hour * 60 + now.minute) // window_minutes * window_minutes
+    return f"v{minute:04d}_count"
+
+def velocity_count(day_item, now, window_minutes):
+    """Sliding-window estimate of transactions in the last window_minutes.
+
+    The previous fixed window is weighted by how much of it still overlaps
+    the sliding window. Windows do not span midnight, so the estimate only
+    counts the current window during the first window of the day.
+    """
+    current = float(day_item.get(window_attr(now, window_minutes), 0))
+    previous_start = now - datetime.timedelta(minutes=window_minutes)
+    if previous_start.date() != now.date():
+        return current
+    previous = float(day_item.get(window_attr(previous_start, window_minutes), 0))
+    elapsed = ((now.hour * 60 + now.minute) % window_minutes + now.second / 60) / window_minutes
+    return current + previous * (1 - elapsed)
+
+def _add_kwargs(user_id, period, expires_at, usd_amount, count, extra=None):
+    adds = {'usd_sum': usd_amount, 'txn_count': count}
+    adds.update(extra or {})
+    names = {'#exp': 'expires_at'}
+    values = {':exp': int(expires_at.timestamp())}
+    clauses = []
+    for i, (attr, value) in enumerate(adds.items()):
+        names[f'#a{i}'] = attr
+        values[f':a{i}'] = value
+        clauses.append(f'#a{i} :a{i}')
+    return {
+        'Key': {'user_id': user_id, 'period': period},
+        'UpdateExpression': 'SET #exp = :exp ADD ' + ', '.join(clauses),
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values,
+        'ReturnValues': 'ALL_NEW'
+    }
+
+def _snapshot(day_item, month_item, usd_amount=0, count=0):
+    """Spend before the transaction(s) just added, as floats"""
+    return {
+        'day_usd': float(day_item.get('usd_sum', 0)) - usd_amount,
+        'day_count': int(day_item.get('txn_count', 0)) - count,
+        'month_usd': float(month_item.get('usd_sum', 0)) - usd_amount,
+        'month_count': int(month_item.get('txn_count', 0)) - count
+    }
+
+def record_spend(table, user_id, usd_amount, now, window_minutes=DEFAULT_WINDOW_MINUTES):
+    """Add one transaction to the user's counters and return the state it was scored against.
+
+    day_usd/month_usd exclude this transaction; velocity_count includes it.
+    """
+    day_key, month_key = period_keys(now)
+    amount = Decimal(str(round(usd_amount, 2)))
+    day_item = table.update_item(**_add_kwargs(
+        user_id, day_key, now + DAY_RETENTION, amount, 1, {window_attr(now, window_minutes): 1}
+    )).get('Attributes', {})
+    month_item = table.update_item(**_add_kwargs(
+        user_id, month_key, now + MONTH_RETENTION, amount, 1
+    )).get('Attributes', {})
+    spend = _snapshot(day_item, month_item, float(amount), 1)
+    spend['velocity_count'] = velocity_count(day_item, now, window_minutes)
+    return spend
+
+def record_batch_spend(table, user_id, usd_amounts, now, window_minutes=DEFAULT_WINDOW_MINUTES):
+    """Add a batch of transactions to the user's counters with one ADD per item, and return the state each
+    was scored against, as if they had been recorded one after another in usd_amounts order"""
+    day_key, month_key = period_keys(now)
+    amounts = [Decimal(str(round(usd_amount, 2))) for usd_amount in usd_amounts]
+    total, count = sum(amounts, Decimal(0)), len(amounts)
+    day_item = table.update_item(**_add_kwargs(
+        user_id, day_key, now + DAY_RETENTION, total, count, {window_attr(now, window_minutes): count}
+    )).get('Attributes', {})
+    month_item = table.update_item(**_add_kwargs(
+        user_id, month_key, now + MONTH_RETENTION, total, count
+    )).get('Attributes', {})
+    spend = _snapshot(day_item, month_item, float(total), count)
+    velocity_before = velocity_count(day_item, now, window_minutes) - count
+    spends = []
+    for index, amount in enumerate(amounts):
+        spends.append(dict(spend, velocity_count=velocity_before + index + 1))
+        spend['day_usd'] += float(amount)
+        spend['day_count'] += 1
+        spend['month_usd'] += float(amount)
+        spend['month_count'] += 1
+    return spends
+
+def remove_spend(table, user_id, usd_amount, now, window_minutes=DEFAULT_WINDOW_MINUTES, count=1):
+    """Undo record_spend() (or part of record_batch_spend(), with the total and count of the transactions)
+    for transactions that weren't stored; now must be the time they were recorded at"""
+    day_key, month_key = period_keys(now)
+    amount = -Decimal(str(round(usd_amount, 2)))
+    table.update_item(**_add_kwargs(
+        user_id, day_key, now + DAY_RETENTION, amount, -count, {window_attr(now, window_minutes): -count}
+    ))
+    table.update_item(**_add_kwargs(user_id, month_key, now + MONTH_RETENTION, amount, -count))
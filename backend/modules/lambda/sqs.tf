@@ -0,0 +1,60 @@
+# Queue for side effects of POST /transaction (S3 archive, SNS alerts, analytics rollups)
+resource "aws_sqs_queue" "side_effects_dlq" {
+  name                      = "${var.project_name}-${var.environment}-side-effects-dlq"
+  message_retention_seconds = 1209600
+}
+
+resource "aws_sqs_queue" "side_effects" {
+  name                       = "${var.project_name}-${var.environment}-side-effects"
+  visibility_timeout_seconds = 180
+  message_retention_seconds  = 345600
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.side_effects_dlq.arn
+    maxReceiveCount     = 5
+  })
+}
+
+# Consumer: same package, batches archive writes and coalesces alerts
+resource "aws_lambda_function" "side_effects_consumer" {
+  filename         = data.archive_file.lambda_zip.output_path
+  source_code_hash = data.archive_file.lambda_zip.output_base64sha256
+
+  function_name = "${var.lambda_function_name}-side-effects"
+  role          = aws_iam_role.lambda_role.arn
+  handler       = "lambda_code.side_effects_handler"
+  runtime       = "python3.11"
+  timeout       = 30
+  memory_size   = 256
+
+  environment {
+    variables = {
+      S3_BUCKET            = var.s3_bucket_name
+      DYNAMODB_TABLE_NAME  = aws_dynamodb_table.transactions.name
+      ANALYTICS_TABLE_NAME = aws_dynamodb_table.analytics_rollups.name
+      PROJECT_NAME         = var.project_name
+      ENVIRONMENT          = var.environment
+      LOG_LEVEL            = "INFO"
+      SNS_TOPIC_ARN        = aws_sns_topic.transaction_alerts.arn
+
+      ALERT_WINDOW_SECONDS     = "60"
+      ALERT_RATE_PER_MINUTE    = "30"
+      ALERT_BURST              = "10"
+      ALERT_WINDOWS_TABLE_NAME = aws_dynamodb_table.alert_windows.name
+
+      FX_RATES_SOURCE          = var.fx_rates_source
+      FX_RATES_REFRESH_SECONDS = "300"
+
+      CSRF_SECRET         = random_password.csrf_secret.result
+      METRICS_SAMPLE_RATE = "1"
+    }
+  }
+}
+
+resource "aws_lambda_event_source_mapping" "side_effects" {
+  event_source_arn                   = aws_sqs_queue.side_effects.arn
+  function_name                      = aws_lambda_function.side_effects_consumer.arn
+  batch_size                         = 100
+  maximum_batching_window_in_seconds = 5
+  function_response_types            = ["ReportBatchItemFailures"]
+}
@@ -0,0 +1,240 @@
+"""Transaction history exports, streamed to S3 as CSV or NDJSON.
+
+POST /transactions/export pages through the user's UserTimestampIndex
+partition (and, with a retention, their archived days) on the server. It
+encodes each page as soon as it arrives and writes the file to S3 as a
+multipart upload. The client downloads it from a presigned URL, so a
+history of any length never passes through API Gateway or the browser's
+memory.
+
+Memory is bounded by the part size. MultipartWriter holds at most two
+parts: one filling, and one uploading on a background thread while the
+next DynamoDB page is read. A file that stays under one part is written
+with a single PutObject instead. CSV text cells that start with =, +, -,
+@, a tab or a carriage return get a leading ' so a spreadsheet shows them
+as text instead of running them as formulas.
+
+The request must finish within API Gateway's 29-second integration
+timeout. An export that runs out of its time budget completes the file
+with the rows written so far and returns next_cursor. The same request
+sent again with that cursor writes the next file.
+"""
+import csv
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import encoding
+
+logger = logging.getLogger(__name__)
+
+# S3 rejects multipart parts under 5 MiB, except the last one
+MIN_PART_BYTES = 5 * 1024 * 1024
+DEFAULT_PART_BYTES = 8 * 1024 * 1024
+DEFAULT_URL_TTL_SECONDS = 900
+# Leaves a few seconds of API Gateway's 29-second timeout to complete the upload and answer
+DEFAULT_TIME_BUDGET_SECONDS = 20
+DEFAULT_QUERY_PAGE_SIZE = 1000
+EXPORT_PREFIX = 'exports'
+
+# format: (Content-Type, file extension)
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+STATUSES = ('approved', 'flagged')
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+COLUMNS = (
+    'transaction_id', 'timestamp', 'amount', 'currency', 'merchant', 'risk_score', 'status',
+    'merchant_keyword', 'blocked_merchant', 'trusted_merchant', 'risk_factors', 'rules_version'
+)
+
+class ExportError(Exception):
+    pass
+
+def parse_filters(body):
+    """(format, min_risk, max_risk, status) from an export request body; raises ExportError if invalid"""
+    export_format = body.get('format', 'csv')
+    if export_format not in FORMATS:
+        raise ExportError(f"format must be one of {', '.join(FORMATS)}")
+    bounds = []
+    for name in ('min_risk', 'max_risk'):
+        value = body.get(name)
+        if value is not None:
+            if isinstance(value, bool):
+                raise ExportError(f"{name} must be a number")
+            try:
+                value = float(value)
+            except (ValueError, TypeError):
+                raise ExportError(f"{name} must be a number")
+        bounds.append(value)
+    if None not in bounds and bounds[0] > bounds[1]:
+        raise ExportError('min_risk must not be greater than max_risk')
+    status = body.get('status')
+    if status is not None and status not in STATUSES:
+        raise ExportError(f"status must be one of {', '.join(STATUSES)}")
+    return export_format, bounds[0], bounds[1], status
+
+def filter_expression(conditions, min_risk=None, max_risk=None, status=None):
+    """FilterExpression for the risk and status filters, or None without any"""
+    Attr = conditions.Attr
+    terms = []
+    if min_risk is not None and max_risk is not None:
+        terms.append(Attr('risk_score').between(Decimal(str(min_risk)), Decimal(str(max_risk))))
+    elif min_risk is not None:
+        terms.append(Attr('risk_score').gte(Decimal(str(min_risk))))
+    elif max_risk is not None:
+        terms.append(Attr('risk_score').lte(Decimal(str(max_risk))))
+    if status is not None:
+        terms.append(Attr('status').eq(status))
+    expression = None
+    for term in terms:
+        expression = term if expression is None else expression & term
+    return expression
+
+def matches(record, min_risk=None, max_risk=None, status=None):
+    """filter_expression() applied in Python, for rows read from the archive"""
+    if status is not None and record.get('status') != status:
+        return False
+    if min_risk is None and max_risk is None:
+        return True
+    risk_score = record.get('risk_score')
+    if risk_score is None:
+        return False
+    risk_score = float(risk_score)
+    return (min_risk is None or risk_score >= min_risk) and (max_risk is None or risk_score <= max_risk)
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (list, tuple, set)):
+        value = ';'.join(str(item) for item in value)
+    # A spreadsheet would run a cell starting with one of these as a formula
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def csv_header():
+    return (','.join(COLUMNS) + '\n').encode('utf-8')
+
+def encode_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for row in rows:
+        writer.writerow([_csv_value(row.get(column)) for column in COLUMNS])
+    return buffer.getvalue().encode('utf-8')
+
+def encode_ndjson(rows):
+    return ''.join(encoding.dumps({column: row[column] for column in COLUMNS if column in row}) + '\n'
+                   for row in rows).encode('utf-8')
+
+ENCODERS = {'csv': encode_csv, 'ndjson': encode_ndjson}
+
+class MultipartWriter:
+    """Buffered writer of one S3 object; parts upload on a background thread, one at a time"""
+
+    def __init__(self, client, bucket, key, content_type, part_bytes=DEFAULT_PART_BYTES):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.content_type = content_type
+        self.part_bytes = max(part_bytes, MIN_PART_BYTES)
+        self.bytes = 0
+        self.upload_id = None
+        self._chunks = []
+        self._buffered = 0
+        self._parts = []
+        self._pending = None
+        self._pool = None
+
+    def write(self, data):
+        if not data:
+            return
+        self._chunks.append(data)
+        self._buffered += len(data)
+        self.bytes += len(data)
+        if self._buffered >= self.part_bytes:
+            self._flush()
+
+    def _upload_part(self, number, body):
+        response = self.client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                           PartNumber=number, Body=body)
+        return {'PartNumber': number, 'ETag': response['ETag']}
+
+    def _wait(self):
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            self._parts.append(pending.result())
+
+    def _flush(self):
+        body = b''.join(self._chunks)
+        self._chunks, self._buffered = [], 0
+        if self.upload_id is None:
+            self.upload_id = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ContentType=self.content_type)['UploadId']
+            self._pool = ThreadPoolExecutor(max_workers=1)
+        # At most one part in flight, so memory stays at about two parts
+        self._wait()
+        self._pending = self._pool.submit(self._upload_part, len(self._parts) + 1, body)
+
+    def close(self):
+        """Finish the object; returns the number of parts it was uploaded in"""
+        if self.upload_id is None:
+            self.client.put_object(Bucket=self.bucket, Key=self.key, Body=b''.join(self._chunks),
+                                   ContentType=self.content_type)
+            self._chunks, self._buffered = [], 0
+            return 1
+        try:
+            self._wait()
+            if self._chunks:
+                self._parts.append(self._upload_part(len(self._parts) + 1, b''.join(self._chunks)))
+                self._chunks, self._buffered = [], 0
+            self.client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                                  MultipartUpload={'Parts': self._parts})
+        finally:
+            self._pool.shutdown(wait=True)
+        return len(self._parts)
+
+    def abort(self):
+        """Discard the upload so S3 doesn't keep its parts"""
+        if self.upload_id is None:
+            return
+        self._pool.shutdown(wait=True)
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        except Exception as e:
+            logger.error(f"Failed to abort export upload {self.key}: {str(e)}")
+
+def write_export(pages, writer, export_format, state, deadline=None, clock=None):
+    """Encode pages of rows into writer until they run out or deadline (a clock() value) passes.
+
+    pages sets state['cursor'] before each page to the cursor that resumes
+    after it. Returns {'rows', 'bytes', 'parts', 'complete', 'next_cursor'};
+    the upload is aborted if anything fails.
+    """
+    encode = ENCODERS[export_format]
+    rows = 0
+    next_cursor = None
+    try:
+        if export_format == 'csv':
+            writer.write(csv_header())
+        for page in pages:
+            if page:
+                writer.write(encode(page))
+                rows += len(page)
+            if deadline is not None and state.get('cursor') and clock() >= deadline:
+                next_cursor = state['cursor']
+                break
+        parts = writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    return {'rows': rows, 'bytes': writer.bytes, 'parts': parts, 'complete': next_cursor is None,
+            'next_cursor': next_cursor}
+
+def download_url(client, bucket, key, filename, ttl=DEFAULT_URL_TTL_SECONDS):
+    """Presigned GET for an export, served as an attachment named filename"""
+    return client.generate_presigned_url('get_object', Params={
+        'Bucket': bucket, 'Key': key, 'ResponseContentDisposition': f'attachment; filename="{filename}"'
+    }, ExpiresIn=ttl)
@@ -0,0 +1,134 @@
+"""Hot/cold tiering of the transactions table.
+
+With a retention of N days, every stored transaction carries expires_at =
+its timestamp + N days, and DynamoDB's TTL deletes it some time after that.
+By then it is in the S3 archive: a writer whose archive write fails removes
+expires_at again (see pin_kwargs), so the row stays in the table instead.
+
+GET /transactions reads in two tiers, split at the hot boundary (now - N
+days). At or after the boundary the UserTimestampIndex query serves the
+page as before. Before it, pages are built one day at a time from the
+user's archived records for that day, merged with whatever rows the table
+still holds for it (TTL deletion lags expiry by up to two days, and pinned
+rows never expire), deduplicated by transaction_id.
+
+Archive objects are filed under the day they were written, which for a
+transaction stored just before midnight can be the next day, so a day's
+records come from its own partition and the following one. ColdReader
+keeps each partition it reads for the rest of the request, so paging back
+through consecutive days reads each partition once.
+
+Cold pages are only served from compacted days. Their Parquet parts are
+sorted by user_id, so ColdReader fetches each part's footer and the row
+groups that can hold the user with ranged reads, instead of every user's
+objects for the day. A partition that is not compacted yet (or a reader
+without pyarrow) raises ArchiveNotReady, which the API answers with 503
+and Retry-After: the compactor catches up within a day. Objects archived
+after a day's sources were compacted and deleted are few, and are read
+as JSON next to the parts.
+"""
+import datetime
+import importlib.util
+import time
+
+import archive_query
+
+UTC = datetime.timezone.utc
+SECONDS_PER_DAY = 86400
+DEFAULT_DAYS_TTL_SECONDS = 300
+DEFAULT_READ_WORKERS = 8
+HAVE_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+class ArchiveNotReady(Exception):
+    """A day needed for a cold page has not been compacted, or pyarrow is missing"""
+
+def expires_at(timestamp, retention_days):
+    """TTL epoch seconds for a transaction stored at ISO timestamp"""
+    return int(datetime.datetime.fromisoformat(timestamp).timestamp()) + retention_days * SECONDS_PER_DAY
+
+def hot_boundary(retention_days, now=None):
+    """ISO timestamp before which transactions may have left the table"""
+    now = now if now is not None else time.time()
+    return datetime.datetime.fromtimestamp(now - retention_days * SECONDS_PER_DAY, UTC).isoformat()
+
+def day_of(timestamp):
+    return datetime.datetime.fromisoformat(timestamp).astimezone(UTC).date()
+
+def day_start(day):
+    return datetime.datetime(day.year, day.month, day.day, tzinfo=UTC).isoformat()
+
+def pin_kwargs(transaction_id):
+    """UpdateItem arguments that keep a transaction in the table: it has no archived copy"""
+    return {'Key': {'transaction_id': transaction_id}, 'UpdateExpression': 'REMOVE expires_at'}
+
+def sort_key(record):
+    return (record.get('timestamp') or '', record.get('transaction_id') or '')
+
+def _normalize(record):
+    """Archived record in the shape the table returns: ISO timestamps, no empty Parquet columns"""
+    normalized = {}
+    for name, value in record.items():
+        if value is None:
+            continue
+        if isinstance(value, datetime.datetime):
+            value = value.astimezone(UTC).isoformat()
+        normalized[name] = value
+    return normalized
+
+class ArchiveDays:
+    """Days present in the archive, listed at most once per ttl seconds"""
+
+    def __init__(self, ttl=DEFAULT_DAYS_TTL_SECONDS):
+        self.ttl = ttl
+        self._days = None
+        self._listed_at = 0.0
+
+    def get(self, store):
+        if self._days is None or time.monotonic() - self._listed_at >= self.ttl:
+            self._days = archive_query.archive_days(store, archive_query.Query())
+            self._listed_at = time.monotonic()
+        return self._days
+
+class ColdReader:
+    """One user's archived transactions, read one day partition at a time"""
+
+    def __init__(self, store, user_id, workers=DEFAULT_READ_WORKERS):
+        self.store = store
+        self.query = archive_query.Query(user_ids=[user_id])
+        self.workers = workers
+        self.partitions_read = 0
+        self._partitions = {}
+
+    def _partition(self, day):
+        records = self._partitions.get(day)
+        if records is None:
+            part_keys, json_keys = archive_query.plan_day(self.store, day)
+            if json_keys and not part_keys:
+                raise ArchiveNotReady(f"Archive for {day} has not been compacted yet")
+            if part_keys and not HAVE_PYARROW:
+                raise ArchiveNotReady('Reading compacted archive days requires pyarrow')
+            records = [_normalize(record) for record in archive_query.read_records(
+                self.store, part_keys + json_keys, query=self.query, workers=self.workers, ranged=True)]
+            self._partitions[day] = records
+            self.partitions_read += 1
+        return records
+
+    def release(self, day):
+        """Drop a partition that no later read needs, when reading many days back"""
+        self._partitions.pop(day, None)
+
+    def records(self, day, start, end, archive_days=None):
+        """Archived records with start <= timestamp < end, from day's partition and the next"""
+        records = []
+        for partition in (day, day + datetime.timedelta(days=1)):
+            if archive_days is not None and partition not in archive_days:
+                continue
+            records.extend(record for record in self._partition(partition)
+                           if start <= (record.get('timestamp') or '') < end)
+        return records
+
+def merge(table_rows, archived):
+    """Rows from both tiers newest first, one per transaction_id; the table's copy wins"""
+    merged = {record['transaction_id']: record for record in archived if record.get('transaction_id')}
+    merged.update((row['transaction_id'], row) for row in table_rows)
+    return sorted(merged.values(), key=sort_key, reverse=True)
@@ -0,0 +1,113 @@
+"""Bounded TTL/LRU cache for per-key state in a warm Lambda container.
+
+Used for user profiles, the last written user stats and completed
+idempotency responses. Entries expire after ttl seconds.
+
+A cache built with version= (a function returning a value's version)
+refuses to replace a cached value with an older one. Profiles carry a
+numeric 'version' that every write increments, so an eventually
+consistent read racing a write made in this container cannot roll its
+cache back.
+
+With revalidate= (a function returning the stored version for a key) as
+well, a hit on an entry last checked revalidate_after seconds ago or more
+first compares versions, and an entry another container has since
+replaced is dropped and reported as a miss. For profiles that is a
+projected read of 'version', so revalidate_after rather than the TTL
+bounds cross-container staleness. If the check fails the entry is
+dropped too.
+"""
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 60
+DEFAULT_LOG_EVERY = 100
+
+def profile_version(profile):
+    try:
+        return int((profile or {}).get('version', 0))
+    except (ValueError, TypeError):
+        return 0
+
+class TTLCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS, log_every=DEFAULT_LOG_EVERY,
+                 version=None, revalidate=None, revalidate_after=None, name='Cache'):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.log_every = log_every
+        self.version = version
+        self.revalidate = revalidate
+        self.revalidate_after = revalidate_after
+        self.name = name
+        self._entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0,
+                      'revalidations': 0, 'stale': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return (found, value); value may be None, e.g. for users without a stored profile"""
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry[0] >= self.ttl:
+            del self._entries[key]
+            self.stats['expired'] += 1
+            entry = None
+        if entry is not None and self.revalidate is not None and now - entry[2] >= self.revalidate_after:
+            entry = self._revalidate(key, entry, now)
+        if entry is None:
+            self._record('misses')
+            return False, None
+        self._entries.move_to_end(key)
+        self._record('hits')
+        return True, entry[1]
+
+    def put(self, key, value):
+        entry = self._entries.get(key)
+        if entry is not None and self.version is not None and self.version(entry[1]) > self.version(value):
+            return
+        now = time.monotonic()
+        self._entries[key] = (now, value, now)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def invalidate(self, key):
+        if self._entries.pop(key, None) is not None:
+            self.stats['invalidations'] += 1
+
+    def _revalidate(self, key, entry, now):
+        """entry with its check time reset if the stored version still matches, otherwise None"""
+        self.stats['revalidations'] += 1
+        try:
+            current = self.revalidate(key) == self.version(entry[1])
+        except Exception as e:
+            logger.warning(f"{self.name}: version check failed for {key}: {str(e)}")
+            current = False
+        if not current:
+            del self._entries[key]
+            self.stats['stale'] += 1
+            return None
+        entry = (entry[0], entry[1], now)
+        self._entries[key] = entry
+        return entry
+
+    def hit_rate(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def _record(self, outcome):
+        self.stats[outcome] += 1
+        lookups = self.stats['hits'] + self.stats['misses']
+        if self.log_every and lookups % self.log_every == 0:
+            logger.info(f"{self.name}: {self.stats['hits']} hits, {self.stats['misses']} misses "
+                        f"({self.hit_rate():.1%} hit rate), {len(self._entries)} entries, "
+                        f"{self.stats['expired']} expired, {self.stats['evictions']} evicted, "
+                        f"{self.stats['invalidations']} invalidated, {self.stats['revalidations']} revalidated, "
+                        f"{self.stats['stale']} stale")
@@ -0,0 +1,230 @@
+"""Streaming per-user amount statistics for anomaly scoring.
+
+The user-stats table holds one small item per (user_id, stats_key):
+
+- 'user': all of the user's transactions
+- 'merchant#<name>': the user's transactions at one merchant
+
+Each item has txn_count, the Welford running mean and m2 (sum of squared
+deviations) of log(1 + USD amount), last_seen (epoch seconds) and gap_ewma,
+an exponentially weighted average of the seconds between transactions.
+Amounts are tracked on a log scale so one large purchase doesn't swamp the
+variance of a user who usually spends small amounts.
+
+Adding a transaction is read-modify-write. The write is conditional on the
+txn_count it was computed from, and every write raises txn_count. So when
+two requests race, one write fails and is recomputed from the item
+returned with the failure. A container remembers the last state it wrote
+for each key, so a warm container usually adds a transaction with one
+UpdateItem per item, whatever the length of the user's history.
+
+A transaction is added before it is stored, so its score sees the history
+up to it. If it then fails to store, forget() takes its amount back out of
+the count, mean and m2. last_seen and gap_ewma keep the attempt, since
+transactions added after it may already have folded it into theirs.
+"""
+import math
+from decimal import Decimal
+
+USER_KEY = 'user'
+MERCHANT_PREFIX = 'merchant#'
+MAX_MERCHANT_KEY_LENGTH = 200
+DEFAULT_GAP_ALPHA = 0.2
+# Fewer transactions than this and the amount z-score isn't reported
+MIN_HISTORY = 5
+# Floor on the log-scale standard deviation, so a user who always spends the same isn't flagged for cents
+MIN_STD = 0.1
+MAX_ATTEMPTS = 3
+_FIELDS = (('count', 'txn_count'), ('mean', 'mean'), ('m2', 'm2'), ('last_seen', 'last_seen'),
+           ('gap_ewma', 'gap_ewma'))
+
+def merchant_key(merchant):
+    return MERCHANT_PREFIX + str(merchant or '').strip().lower()[:MAX_MERCHANT_KEY_LENGTH]
+
+def amount_value(usd_amount):
+    return math.log1p(max(0.0, float(usd_amount)))
+
+def new_state():
+    return {'count': 0, 'mean': 0.0, 'm2': 0.0, 'last_seen': None, 'gap_ewma': None}
+
+def _number(value):
+    if isinstance(value, dict):
+        # Low-level attribute value, as in a ConditionalCheckFailed response
+        value = value.get('N')
+    return float(value) if value is not None else None
+
+def from_item(item):
+    """State from a table item (resource or low-level format); a new state if there is none"""
+    if not item or 'txn_count' not in item:
+        return new_state()
+    state = {name: _number(item.get(attr)) for name, attr in _FIELDS}
+    state['count'] = int(state['count'])
+    state['mean'] = state['mean'] or 0.0
+    state['m2'] = state['m2'] or 0.0
+    return state
+
+def observe(state, value, at, alpha=DEFAULT_GAP_ALPHA):
+    """New state with one more observation of value at epoch seconds at"""
+    count = state['count'] + 1
+    delta = value - state['mean']
+    mean = state['mean'] + delta / count
+    m2 = state['m2'] + delta * (value - mean)
+    last_seen, gap_ewma = state['last_seen'], state['gap_ewma']
+    if last_seen is not None:
+        gap = max(0.0, at - last_seen)
+        gap_ewma = gap if gap_ewma is None else alpha * gap + (1 - alpha) * gap_ewma
+    return {'count': count, 'mean': mean, 'm2': m2,
+            'last_seen': at if last_seen is None else max(at, last_seen), 'gap_ewma': gap_ewma}
+
+def unobserve(state, value):
+    """New state without one earlier observation of value (count, mean and m2 only)"""
+    if state['count'] <= 1:
+        return dict(state, count=0, mean=0.0, m2=0.0)
+    count = state['count'] - 1
+    mean = (state['mean'] * state['count'] - value) / count
+    m2 = max(0.0, state['m2'] - (value - mean) * (value - state['mean']))
+    return dict(state, count=count, mean=mean, m2=m2)
+
+def std(state):
+    return math.sqrt(state['m2'] / (state['count'] - 1)) if state['count'] > 1 else None
+
+def zscore(state, value, min_history=MIN_HISTORY):
+    if state['count'] < min_history:
+        return None
+    return (value - state['mean']) / max(std(state) or 0.0, MIN_STD)
+
+def signals(user_state, merchant_state, value, at):
+    """What the risk rules see: the user's history before this transaction"""
+    last_seen = user_state['last_seen']
+    return {
+        'history': user_state['count'],
+        'amount_z': zscore(user_state, value),
+        'merchant_history': merchant_state['count'],
+        'seconds_since_last': max(0.0, at - last_seen) if last_seen is not None else None,
+        'gap_ewma': user_state['gap_ewma']
+    }
+
+def to_item(user_id, stats_key, state):
+    item = {'user_id': user_id, 'stats_key': stats_key}
+    for name, attr in _FIELDS:
+        if state[name] is not None:
+            item[attr] = Decimal(str(state[name])) if name != 'count' else state['count']
+    return item
+
+def _update_kwargs(user_id, stats_key, before, after, conditions):
+    item = to_item(user_id, stats_key, after)
+    names, values, clauses = {}, {}, []
+    for i, (attr, value) in enumerate((attr, value) for attr, value in item.items()
+                                      if attr not in ('user_id', 'stats_key')):
+        names[f'#a{i}'] = attr
+        values[f':a{i}'] = value
+        clauses.append(f'#a{i} = :a{i}')
+    if before['count']:
+        condition = conditions.Attr('txn_count').eq(before['count'])
+    else:
+        # An item whose only transaction was forgotten is left with txn_count 0
+        condition = conditions.Attr('txn_count').not_exists() | conditions.Attr('txn_count').eq(0)
+    return {
+        'Key': {'user_id': user_id, 'stats_key': stats_key},
+        'UpdateExpression': 'SET ' + ', '.join(clauses),
+        'ConditionExpression': condition,
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values,
+        'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+    }
+
+def _read(table, user_id, stats_key):
+    return table.get_item(Key={'user_id': user_id, 'stats_key': stats_key}, ConsistentRead=True).get('Item')
+
+def load(table, user_id, stats_key, cache=None):
+    found, state = cache.get((user_id, stats_key)) if cache is not None else (False, None)
+    return state if found else from_item(_read(table, user_id, stats_key))
+
+def apply(table, conditions, user_id, stats_key, observations, cache=None, alpha=DEFAULT_GAP_ALPHA,
+          max_attempts=MAX_ATTEMPTS, state=None):
+    """Fold [(value, at)] into one stats item; returns the state they were added to.
+
+    The write is computed from state, else the cached state. Failing both,
+    it assumes a new item, so a user's first transaction costs one call and
+    a cold container's first write to an existing item costs two.
+    """
+    def fold(before):
+        after = before
+        for value, at in observations:
+            after = observe(after, value, at, alpha)
+        return after
+    return _update(table, conditions, user_id, stats_key, fold, cache, max_attempts, state)
+
+def _update(table, conditions, user_id, stats_key, transform, cache=None, max_attempts=MAX_ATTEMPTS, state=None):
+    """Conditionally write transform(state) to one stats item, recomputing on a conflict; returns the state used"""
+    cache_key = (user_id, stats_key)
+    if state is None:
+        found, state = cache.get(cache_key) if cache is not None else (False, None)
+        if not found:
+            state = new_state()
+    for attempt in range(max_attempts):
+        after = transform(state)
+        try:
+            table.update_item(**_update_kwargs(user_id, stats_key, state, after, conditions))
+        except Exception as e:
+            # botocore ClientError; matched by code so botocore isn't imported up front
+            response = getattr(e, 'response', {})
+            if response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException' \
+                    or attempt == max_attempts - 1:
+                raise
+            item = response.get('Item')
+            state = from_item(item if item is not None else _read(table, user_id, stats_key))
+            continue
+        if cache is not None:
+            cache.put(cache_key, after)
+        return state
+
+def record(table, conditions, user_id, merchant, usd_amount, at, cache=None, alpha=DEFAULT_GAP_ALPHA):
+    """Add one transaction to the user's and the merchant's stats; returns signals() before it"""
+    value = amount_value(usd_amount)
+    user_state = apply(table, conditions, user_id, USER_KEY, [(value, at)], cache, alpha)
+    merchant_state = apply(table, conditions, user_id, merchant_key(merchant), [(value, at)], cache, alpha)
+    return signals(user_state, merchant_state, value, at)
+
+def forget(table, conditions, user_id, merchant, usd_amount, cache=None):
+    """Undo record() for a transaction that wasn't stored"""
+    value = amount_value(usd_amount)
+    for stats_key in (USER_KEY, merchant_key(merchant)):
+        _update(table, conditions, user_id, stats_key, lambda state: unobserve(state, value), cache)
+
+class BatchStats:
+    """Stats for one user's batch: read once, advanced in memory while scoring, written once.
+
+    Reads and writes one item for the user and one per distinct merchant,
+    however many transactions the batch holds.
+    """
+
+    def __init__(self, table, conditions, user_id, merchants, cache=None, alpha=DEFAULT_GAP_ALPHA):
+        self.table = table
+        self.conditions = conditions
+        self.user_id = user_id
+        self.cache = cache
+        self.alpha = alpha
+        keys = [USER_KEY] + sorted({merchant_key(merchant) for merchant in merchants})
+        self.initial = {key: load(table, user_id, key, cache) for key in keys}
+        self.current = dict(self.initial)
+
+    def signals(self, merchant, usd_amount, at):
+        """signals() for the next transaction, which is then added to the in-memory state"""
+        value = amount_value(usd_amount)
+        key = merchant_key(merchant)
+        result = signals(self.current[USER_KEY], self.current[key], value, at)
+        self.current[USER_KEY] = observe(self.current[USER_KEY], value, at, self.alpha)
+        self.current[key] = observe(self.current[key], value, at, self.alpha)
+        return result
+
+    def save(self, entries):
+        """Write [(merchant, usd_amount, at)] for the transactions that were stored"""
+        observations = {}
+        for merchant, usd_amount, at in entries:
+            value = amount_value(usd_amount)
+            observations.setdefault(USER_KEY, []).append((value, at))
+            observations.setdefault(merchant_key(merchant), []).append((value, at))
+        for key, values in observations.items():
+            apply(self.table, self.conditions, self.user_id, key, values, self.cache, self.alpha,
+                  state=self.initial[key])
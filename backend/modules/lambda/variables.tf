@@ -44,3 +44,45 @@ variable "user_profiles_table_arn" {
   description = "ARN of the DynamoDB user profiles table"
   type        = string
 }
+
+variable "merchant_keywords_source" {
+  description = "Deny-list of merchant keywords, one per line (s3://bucket/key or a path in the package); empty uses the built-in list"
+  type        = string
+  default     = ""
+}
+
+variable "fx_rates_source" {
+  description = "Versioned exchange-rate snapshots as JSON (s3://bucket/key or a path in the package); empty uses the built-in rates"
+  type        = string
+  default     = ""
+}
+
+variable "risk_rules_source" {
+  description = "Risk rules document as JSON or YAML (s3://bucket/key or a path in the package); empty uses the risk_rules.json shipped with the function"
+  type        = string
+  default     = ""
+}
+
+variable "side_effects_mode" {
+  description = "How POST /transaction runs its S3 archive, SNS alert and rollup updates: sync (inline) or async (via the side-effects SQS queue)"
+  type        = string
+  default     = "sync"
+}
+
+variable "csrf_mode" {
+  description = "CSRF token backend: stateless (HMAC-signed, validated in-process) or table (stored in the csrf-tokens table)"
+  type        = string
+  default     = "stateless"
+}
+
+variable "compaction_layer_arn" {
+  description = "ARN of the AWS SDK for pandas (Python 3.11) layer that provides pyarrow to the archive compactor; empty disables compaction"
+  type        = string
+  default     = ""
+}
+
+variable "transaction_retention_days" {
+  description = "Days a transaction stays in DynamoDB before its TTL expires it, with older pages of GET /transactions read from the S3 archive; 0 keeps every row"
+  type        = number
+  default     = 0
+}
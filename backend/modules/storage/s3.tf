@@ -28,17 +28,68 @@ resource "aws_s3_bucket_server_side_encryption_configuration" "transaction_logs_
   }
 }
 
-# Lifecycle policy to delete objects after 30 days
+# Lifecycle policy: raw per-transaction objects and the compacted Parquet
+# partitions expire after raw_archive_expiration_days and
+# compacted_archive_expiration_days (0 = never), and exports (served
+# through short-lived presigned URLs) after a day.
+#
+# With transaction_retention_days > 0, DynamoDB's TTL removes rows once
+# they are in the archive, so the archive becomes the only copy of older
+# transactions. The compacted partitions are then kept by default, and the
+# preconditions refuse settings under which a row could expire from both.
+locals {
+  compacted_archive_expiration_days = (var.compacted_archive_expiration_days != null
+    ? var.compacted_archive_expiration_days
+  : (var.transaction_retention_days > 0 ? 0 : 365))
+}
+
 resource "aws_s3_bucket_lifecycle_configuration" "transaction_logs_lifecycle" {
   bucket = aws_s3_bucket.transaction_logs.id
   rule {
     id     = "delete_old_logs"
+    status = var.raw_archive_expiration_days > 0 ? "Enabled" : "Disabled"
+    filter {
+      prefix = "transactions/"
+    }
+    expiration {
+      days = max(var.raw_archive_expiration_days, 1)
+    }
+  }
+  rule {
+    id     = "delete_old_compacted"
+    status = local.compacted_archive_expiration_days > 0 ? "Enabled" : "Disabled"
+    filter {
+      prefix = "compacted/"
+    }
+    expiration {
+      days = max(local.compacted_archive_expiration_days, 1)
+    }
+  }
+  rule {
+    id     = "delete_old_exports"
     status = "Enabled"
     filter {
-      prefix = ""  # All objects
+      prefix = "exports/"
     }
     expiration {
-      days = 30
+      days = 1
+    }
+    abort_incomplete_multipart_upload {
+      days_after_initiation = 1
+    }
+  }
+
+  lifecycle {
+    # Raw objects may only expire once the compactor has copied them, with time for late objects to be recompacted
+    precondition {
+      condition = (var.transaction_retention_days == 0 || var.raw_archive_expiration_days == 0
+      || (var.compaction_enabled && var.raw_archive_expiration_days >= var.min_raw_archive_days_with_compaction))
+      error_message = "With transaction_retention_days > 0, the transactions/ prefix may only expire when compaction is enabled (compaction_layer_arn), and no sooner than min_raw_archive_days_with_compaction days; set raw_archive_expiration_days = 0 to keep it."
+    }
+    precondition {
+      condition = (var.transaction_retention_days == 0 || local.compacted_archive_expiration_days == 0
+      || local.compacted_archive_expiration_days > var.transaction_retention_days)
+      error_message = "With transaction_retention_days > 0, compacted_archive_expiration_days must be 0 (keep) or longer than the retention, or rows would be deleted from DynamoDB and the archive alike."
     }
   }
 }
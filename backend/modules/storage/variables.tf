@@ -6,4 +6,34 @@ variable "project_name" {
 variable "environment" {
   description = "Environment (dev, staging, prod)"
   type        = string
-}
\ No newline at end of file
+}
+
+variable "transaction_retention_days" {
+  description = "The lambda module's transaction_retention_days; above 0 the archive is the only copy of older transactions"
+  type        = number
+  default     = 0
+}
+
+variable "compaction_enabled" {
+  description = "Whether the archive compactor is deployed (the lambda module's compaction_layer_arn is set)"
+  type        = bool
+  default     = false
+}
+
+variable "raw_archive_expiration_days" {
+  description = "Days before raw transactions/ archive objects expire; 0 keeps them"
+  type        = number
+  default     = 30
+}
+
+variable "compacted_archive_expiration_days" {
+  description = "Days before compacted/ Parquet partitions expire; 0 keeps them. Defaults to 365, or to 0 with transaction_retention_days > 0"
+  type        = number
+  default     = null
+}
+
+variable "min_raw_archive_days_with_compaction" {
+  description = "Shortest raw archive expiry allowed with retention on: the compactor revisits the last few days for late objects"
+  type        = number
+  default     = 7
+}
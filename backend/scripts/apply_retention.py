@@ -0,0 +1,123 @@
+"""Give existing transactions the retention TTL once each is confirmed in the S3 archive.
+
+Rows stored before TRANSACTION_RETENTION_DAYS was set, and rows pinned after
+a failed archive write, have no expires_at and stay in the table forever.
+This scans the table and, for each such row whose transaction_id is
+archived under its day or the next, sets expires_at = timestamp + --days.
+Rows missing from the archive are left alone and counted; with
+--archive-missing they are first written to the archive (one NDJSON object
+per day) and then given the TTL as well.
+
+Rows whose expiry is already past are removed by DynamoDB's TTL sweep,
+usually within two days. Archived ids are read one day at a time (compacted
+Parquet where available).
+
+Usage:
+  python apply_retention.py --bucket BUCKET --table transaction-monitor-dev-transactions --days 90 --dry-run
+  python apply_retention.py --bucket BUCKET --table transaction-monitor-dev-transactions --days 90 --archive-missing
+"""
+import argparse
+import datetime
+import json
+import logging
+import sys
+import time
+import uuid
+from decimal import Decimal
+
+from local_stubs import LAMBDA_DIR
+
+sys.path.insert(0, LAMBDA_DIR)
+import archive_compaction  # noqa: E402
+import archive_query  # noqa: E402
+import transaction_tiers  # noqa: E402
+
+
+def unexpiring_rows(table):
+    """{day: [row]} for every row without expires_at"""
+    by_day = {}
+    kwargs = {}
+    while True:
+        response = table.scan(**kwargs)
+        for row in response.get('Items', []):
+            if 'expires_at' not in row and row.get('timestamp'):
+                by_day.setdefault(transaction_tiers.day_of(row['timestamp']), []).append(row)
+        if not response.get('LastEvaluatedKey'):
+            return by_day
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def archived_ids(store, day, cache):
+    if day not in cache:
+        cache[day] = {record.get('transaction_id')
+                      for record in archive_query.day_records(store, day, columns=['transaction_id'], workers=16)}
+    return cache[day]
+
+
+def archive_rows(store, day, rows):
+    lines = [json.dumps({k: float(v) if isinstance(v, Decimal) else v for k, v in row.items()}) for row in rows]
+    key = f"{archive_compaction.SOURCE_PREFIX}/{day}/retention-{uuid.uuid4()}.ndjson"
+    store.put(key, ('\n'.join(lines) + '\n').encode('utf-8'))
+    return key
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--bucket', help='S3 bucket holding transactions/ and compacted/')
+    source.add_argument('--root', help='Local directory laid out like the bucket')
+    parser.add_argument('--table', required=True, help='transactions DynamoDB table')
+    parser.add_argument('--days', type=int, required=True, help='Retention in days (TRANSACTION_RETENTION_DAYS)')
+    parser.add_argument('--archive-missing', action='store_true', help='Archive rows the archive lacks, then expire them')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+    args = parser.parse_args()
+    if args.days < 1:
+        parser.error('--days must be at least 1')
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    import boto3
+    if args.bucket:
+        store = archive_compaction.S3Store(boto3.client('s3'), args.bucket)
+    else:
+        store = archive_compaction.LocalStore(args.root)
+    table = boto3.resource('dynamodb').Table(args.table)
+    from boto3.dynamodb.conditions import Attr
+
+    start = time.perf_counter()
+    by_day = unexpiring_rows(table)
+    cache = {}
+    counts = {'expiring': 0, 'missing': 0, 'archived': 0}
+    for day in sorted(by_day):
+        ids = archived_ids(store, day, cache) | archived_ids(store, day + datetime.timedelta(days=1), cache)
+        rows = by_day[day]
+        missing = [row for row in rows if row['transaction_id'] not in ids]
+        if missing and args.archive_missing and not args.dry_run:
+            logging.info(f"{day}: archived {len(missing)} rows to {archive_rows(store, day, missing)}")
+            counts['archived'] += len(missing)
+            missing = []
+        counts['missing'] += len(missing)
+        skip = {row['transaction_id'] for row in missing}
+        for row in rows:
+            if row['transaction_id'] in skip:
+                continue
+            counts['expiring'] += 1
+            if args.dry_run:
+                continue
+            try:
+                table.update_item(
+                    Key={'transaction_id': row['transaction_id']},
+                    UpdateExpression='SET expires_at = :e',
+                    ConditionExpression=Attr('transaction_id').exists() & Attr('expires_at').not_exists(),
+                    ExpressionAttributeValues={':e': transaction_tiers.expires_at(row['timestamp'], args.days)}
+                )
+            except table.meta.client.exceptions.ConditionalCheckFailedException:
+                # Deleted or given a TTL since the scan
+                counts['expiring'] -= 1
+        logging.info(f"{day}: {len(rows)} rows without a TTL, {len(missing)} not in the archive")
+    print(f"{'would set' if args.dry_run else 'set'} expires_at on {counts['expiring']} rows; "
+          f"{counts['archived']} archived first, {counts['missing']} left without a TTL (not archived) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Rebuild the user-stats table from the transaction archive.
+
+Replays every archived transaction in timestamp order through the same
+Welford / EWMA updates the Lambda applies, then overwrites the table's
+items. Days are read one at a time (compacted Parquet where available), so
+memory holds one day of records plus one small state per (user, merchant).
+USD amounts use the exchange rates in effect at each transaction.
+
+Transactions stored while the backfill runs are not in the archive
+listing it read; run it before enabling anomaly scoring or at a quiet
+time. Containers holding older cached stats notice the overwrite on their
+next conditional write and reload.
+
+Usage:
+  python backfill_user_stats.py --bucket BUCKET --table transaction-monitor-dev-user-stats
+  python backfill_user_stats.py --root ./archive --output stats.json     # dry run to a file
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+from local_stubs import LAMBDA_DIR
+
+sys.path.insert(0, LAMBDA_DIR)
+import archive_compaction  # noqa: E402
+import archive_query  # noqa: E402
+import fx_rates  # noqa: E402
+import user_stats  # noqa: E402
+from risk_scoring import exchange_rates  # noqa: E402
+
+COLUMNS = ['user_id', 'merchant', 'amount', 'currency', 'timestamp']
+
+
+def replay(store, query, rates, alpha=user_stats.DEFAULT_GAP_ALPHA):
+    """{(user_id, stats_key): state} after every archived transaction in query's date range"""
+    states = {}
+    transactions = 0
+    for day in archive_query.archive_days(store, query):
+        records = []
+        for record in archive_query.day_records(store, day, columns=COLUMNS):
+            user_id, timestamp = record.get('user_id'), record.get('timestamp')
+            if not user_id or user_id == 'anonymous' or timestamp is None or record.get('amount') is None:
+                continue
+            records.append((fx_rates.to_epoch(timestamp), user_id, record))
+        records.sort(key=lambda entry: entry[0])
+        for at, user_id, record in records:
+            usd_amount = rates.to_usd_at(float(record['amount']), record.get('currency'), at)
+            value = user_stats.amount_value(usd_amount)
+            for stats_key in (user_stats.USER_KEY, user_stats.merchant_key(record.get('merchant'))):
+                state = states.get((user_id, stats_key)) or user_stats.new_state()
+                states[(user_id, stats_key)] = user_stats.observe(state, value, at, alpha)
+        transactions += len(records)
+        logging.info(f"{day}: {len(records)} transactions, {len(states)} stats items")
+    return states, transactions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--bucket', help='S3 bucket holding transactions/ and compacted/')
+    source.add_argument('--root', help='Local directory laid out like the bucket')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--table', help='user-stats DynamoDB table to overwrite')
+    target.add_argument('--output', help='Write the items to this JSON file instead')
+    parser.add_argument('--from', dest='start', help='First archived day to replay (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='end', help='Last archived day to replay (YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if args.bucket:
+        import boto3
+        store = archive_compaction.S3Store(boto3.client('s3'), args.bucket)
+    else:
+        store = archive_compaction.LocalStore(args.root)
+
+    start = time.perf_counter()
+    states, transactions = replay(store, archive_query.Query(start=args.start, end=args.end), exchange_rates.get())
+    items = [user_stats.to_item(user_id, stats_key, state) for (user_id, stats_key), state in sorted(states.items())]
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(items, f, indent=2, default=float)
+    else:
+        import boto3
+        with boto3.resource('dynamodb').Table(args.table).batch_writer() as writer:
+            for item in items:
+                writer.put_item(Item=item)
+    print(f"{transactions} transactions replayed into {len(items)} stats items for "
+          f"{len({user_id for user_id, _ in states})} users in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
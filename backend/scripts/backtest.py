@@ -0,0 +1,397 @@
+"""Replay archived transactions through the current scoring and candidate rule sets.
+
+Before changing the high-risk merchant keywords, the amount bands or the
+flag threshold, this shows how many archived transactions would flip
+between approved and flagged, which merchants they belong to and how the
+alert volume would change.
+
+Every transaction in transactions/<date>/ (or the compacted Parquet parts,
+read the way query_archive.py reads them) is scored twice:
+
+- baseline: calculate_risk_score with the keywords, bands and threshold
+  (DEFAULT_RISK_THRESHOLD) in the code
+- each --candidate: a rules document in the risk_rules.json format (JSON
+  or YAML), flagged above its own threshold. Keyword changes go in as an
+  inline list: {"merchant_keyword": ["casino", "crypto", "betting"]}. The
+  named list "high_risk" is the same matcher the baseline uses.
+
+Days are sharded over a process pool, one task per day. Each completed day
+is appended to --checkpoint. A rerun with the same candidates and source
+skips the days already there, so an interrupted multi-day replay resumes
+where it stopped.
+
+The archive holds transactions, not the context they were scored with, so
+both sides are scored without the user's profile (custom threshold,
+budgets, blocked and trusted merchants) and without their amount
+statistics. Spend is rebuilt from the day's own records: day_usd is the
+user's earlier USD total that day, and velocity_count counts the user's
+transactions in the last --velocity-window minutes. Rules that need a
+profile never fire on either side. Amounts use the current exchange rates.
+The baseline's flag count can therefore differ from the archived status,
+which the report shows as recorded_flagged.
+
+Alert volume is the number of SNS messages alerts.AlertAggregator would
+publish for each side's flagged transactions: the first alert in a quiet
+period goes out alone, and later ones within --alert-window seconds are
+sent as one digest. The simulation ignores the publish rate limit, and
+windows do not carry over midnight.
+
+Usage:
+  python backtest.py --bucket BUCKET --from 2026-07-01 --to 2026-09-30 --candidate strict.json --checkpoint bt.jsonl
+  python backtest.py --root ./archive --candidate more_keywords.yaml --candidate threshold_60.json --out report.json
+"""
+import argparse
+import collections
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from local_stubs import LAMBDA_DIR
+
+sys.path.insert(0, LAMBDA_DIR)
+import archive_compaction  # noqa: E402
+import archive_query  # noqa: E402
+import fx_rates  # noqa: E402
+import risk_rules  # noqa: E402
+import risk_scoring  # noqa: E402
+import spend_counters  # noqa: E402
+from alerts import AlertAggregator  # noqa: E402
+
+COLUMNS = ['transaction_id', 'user_id', 'timestamp', 'amount', 'currency', 'merchant', 'status']
+# Per-merchant counts for each candidate
+_ROWS, _BASELINE_FLAGGED, _FLAGGED, _TO_FLAGGED, _TO_APPROVED = range(5)
+DEFAULT_TOP_MERCHANTS = 20
+
+class BacktestError(Exception):
+    pass
+
+def load_candidate(path):
+    """(name, rules document) for a candidate file; raises BacktestError if it doesn't compile"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            document = risk_rules.parse_rules(f.read(), path.lower().endswith(('.yaml', '.yml')))
+        risk_rules.compile_rules(document, matchers={'high_risk': risk_scoring.merchant_keywords})
+    except (OSError, risk_rules.RulesError) as e:
+        raise BacktestError(f"{path}: {str(e)}")
+    return os.path.splitext(os.path.basename(path))[0], document
+
+def open_store(source):
+    """Store for a ('bucket', name) or ('root', path) source"""
+    kind, location = source
+    if kind == 'bucket':
+        import boto3
+        return archive_compaction.S3Store(boto3.client('s3'), location)
+    return archive_compaction.LocalStore(location)
+
+def run_fingerprint(source, candidates, settings):
+    """Identifies what a checkpoint line was computed with; lines with another fingerprint are ignored"""
+    document = {'source': list(source), 'candidates': candidates, 'settings': settings,
+                'baseline': {'keywords': risk_scoring.HIGH_RISK_MERCHANTS,
+                             'amount_bands': risk_scoring.AMOUNT_BANDS,
+                             'threshold': risk_scoring.DEFAULT_RISK_THRESHOLD}}
+    return hashlib.sha256(json.dumps(document, sort_keys=True).encode('utf-8')).hexdigest()
+
+# ------------------- PER-DAY REPLAY (runs in the worker processes) -------------------
+_worker = {}
+
+def init_worker(source, candidates, settings):
+    """Open the store and compile the candidates once per process"""
+    _worker['store'] = open_store(source)
+    _worker['rule_sets'] = [
+        (name, risk_rules.compile_rules(document, matchers={'high_risk': risk_scoring.merchant_keywords},
+                                        log_every=0))
+        for name, document in candidates
+    ]
+    _worker['settings'] = settings
+
+def _epoch(value):
+    try:
+        return fx_rates.to_epoch(value)
+    except (fx_rates.RatesError, TypeError):
+        return None
+
+def _alert_messages(flagged, window_seconds):
+    """SNS messages AlertAggregator sends for one day's flagged records, given in timestamp order"""
+    now = [0.0]
+    aggregator = AlertAggregator(lambda entries: set(), window_seconds=window_seconds, clock=lambda: now[0])
+    for at, record in flagged:
+        now[0] = at
+        aggregator.add(record)
+        aggregator.flush()
+    aggregator.flush(force=True)
+    return aggregator.stats['delivered_messages']
+
+def replay_day(day):
+    """Counts for one archive day: baseline vs each candidate"""
+    store, rule_sets, settings = _worker['store'], _worker['rule_sets'], _worker['settings']
+    window_seconds = settings['velocity_window_minutes'] * 60
+    started = time.perf_counter()
+
+    records = []
+    for record in archive_query.day_records(store, day, columns=COLUMNS, workers=settings['read_workers']):
+        at = _epoch(record.get('timestamp'))
+        records.append((at if at is not None else 0.0, record))
+    records.sort(key=lambda entry: entry[0])
+
+    baseline_threshold = risk_scoring.DEFAULT_RISK_THRESHOLD
+    result = {
+        'rows': len(records), 'recorded_flagged': 0, 'baseline_flagged': 0,
+        'candidates': {name: {'flagged': 0, 'to_flagged': 0, 'to_approved': 0, 'merchants': {},
+                              'rule_hits': {}} for name, _ in rule_sets}
+    }
+    baseline_alerts = []
+    candidate_alerts = {name: [] for name, _ in rule_sets}
+    hits_before = {name: list(rule_set.hits) for name, rule_set in rule_sets}
+    recent = collections.defaultdict(collections.deque)
+    day_usd = collections.defaultdict(float)
+
+    for at, record in records:
+        try:
+            amount = float(record.get('amount') or 0)
+        except (ValueError, TypeError):
+            amount = 0.0
+        currency = record.get('currency') or 'USD'
+        merchant = str(record.get('merchant') or '')
+        user_id = record.get('user_id') or 'unknown'
+        usd_amount = risk_scoring.to_usd(amount, currency)
+
+        window = recent[user_id]
+        window.append(at)
+        while window[0] <= at - window_seconds:
+            window.popleft()
+        spend = {'day_usd': day_usd[user_id], 'velocity_count': len(window)}
+        day_usd[user_id] += usd_amount
+
+        if record.get('status') == 'flagged':
+            result['recorded_flagged'] += 1
+        transaction = {'amount': amount, 'currency': currency, 'merchant': merchant}
+        baseline = risk_scoring.calculate_risk_score(transaction, amount, spend=spend) > baseline_threshold
+        if baseline:
+            result['baseline_flagged'] += 1
+            baseline_alerts.append((at, record))
+
+        merchant_lower = merchant.lower()
+        for name, rule_set in rule_sets:
+            score, _ = rule_set.evaluate(usd_amount, merchant_lower, currency, spend=spend, at=at)
+            flagged = score > rule_set.threshold
+            counts = result['candidates'][name]
+            row = counts['merchants'].get(merchant)
+            if row is None:
+                row = counts['merchants'][merchant] = [0, 0, 0, 0, 0]
+            row[_ROWS] += 1
+            row[_BASELINE_FLAGGED] += baseline
+            if flagged:
+                counts['flagged'] += 1
+                row[_FLAGGED] += 1
+                candidate_alerts[name].append((at, record))
+            if flagged and not baseline:
+                counts['to_flagged'] += 1
+                row[_TO_FLAGGED] += 1
+            elif baseline and not flagged:
+                counts['to_approved'] += 1
+                row[_TO_APPROVED] += 1
+
+    alert_window = settings['alert_window_seconds']
+    result['baseline_alerts'] = _alert_messages(baseline_alerts, alert_window)
+    for name, rule_set in rule_sets:
+        counts = result['candidates'][name]
+        counts['alerts'] = _alert_messages(candidate_alerts[name], alert_window)
+        counts['rule_hits'] = {rule.id: rule_set.hits[rule.index] - hits_before[name][rule.index]
+                               for rule in rule_set.rules}
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+# ------------------- CHECKPOINT AND REPORT -------------------
+def load_checkpoint(path, run_id):
+    """{day: result} of the days a checkpoint holds for this run; a torn last line is ignored"""
+    done = {}
+    if not path or not os.path.exists(path):
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('run') == run_id:
+                done[entry['day']] = entry['result']
+    return done
+
+def open_checkpoint(path):
+    """The checkpoint opened for appending, after ending a line torn by an interrupted write"""
+    torn = False
+    if os.path.exists(path) and os.path.getsize(path):
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            torn = f.read(1) != b'\n'
+    f = open(path, 'a', encoding='utf-8')
+    if torn:
+        f.write('\n')
+    return f
+
+def append_checkpoint(f, run_id, day, result):
+    f.write(json.dumps({'run': run_id, 'day': day, 'result': result}) + '\n')
+    f.flush()
+    os.fsync(f.fileno())
+
+def merge(results, candidate_names, top_merchants=DEFAULT_TOP_MERCHANTS):
+    """Diff report from per-day results, in day order"""
+    report = {'days': len(results), 'rows': 0, 'recorded_flagged': 0,
+              'baseline': {'flagged': 0, 'alerts': 0}, 'candidates': {}}
+    totals = {name: {'flagged': 0, 'alerts': 0, 'to_flagged': 0, 'to_approved': 0,
+                     'merchants': {}, 'rule_hits': collections.Counter()} for name in candidate_names}
+    for day in sorted(results):
+        result = results[day]
+        report['rows'] += result['rows']
+        report['recorded_flagged'] += result['recorded_flagged']
+        report['baseline']['flagged'] += result['baseline_flagged']
+        report['baseline']['alerts'] += result['baseline_alerts']
+        for name in candidate_names:
+            counts, total = result['candidates'][name], totals[name]
+            for key in ('flagged', 'alerts', 'to_flagged', 'to_approved'):
+                total[key] += counts[key]
+            total['rule_hits'].update(counts['rule_hits'])
+            for merchant, row in counts['merchants'].items():
+                merged = total['merchants'].get(merchant)
+                if merged is None:
+                    total['merchants'][merchant] = list(row)
+                else:
+                    for i, value in enumerate(row):
+                        merged[i] += value
+
+    baseline = report['baseline']
+    for name in candidate_names:
+        total = totals[name]
+        merchants = sorted(total['merchants'].items(),
+                           key=lambda item: (-(item[1][_TO_FLAGGED] + item[1][_TO_APPROVED]), item[0]))
+        report['candidates'][name] = {
+            'flagged': total['flagged'],
+            'flagged_change': total['flagged'] - baseline['flagged'],
+            'to_flagged': total['to_flagged'],
+            'to_approved': total['to_approved'],
+            'alerts': total['alerts'],
+            'alerts_change': total['alerts'] - baseline['alerts'],
+            'rule_hits': dict(sorted(total['rule_hits'].items())),
+            'merchants': [
+                {'merchant': merchant, 'rows': row[_ROWS], 'baseline_flagged': row[_BASELINE_FLAGGED],
+                 'flagged': row[_FLAGGED], 'to_flagged': row[_TO_FLAGGED], 'to_approved': row[_TO_APPROVED]}
+                for merchant, row in merchants[:top_merchants] if row[_TO_FLAGGED] or row[_TO_APPROVED]
+            ]
+        }
+    return report
+
+def run_backtest(source, candidates, days=None, start=None, end=None, workers=None, checkpoint=None,
+                 settings=None, top_merchants=DEFAULT_TOP_MERCHANTS, progress=None):
+    """Replay the archive days in [start, end] and return the diff report.
+
+    candidates is a list of (name, rules document). Completed days are
+    appended to checkpoint (a path) and skipped on a rerun. progress, if
+    given, is called with (day, result, completed, total) as days finish.
+    """
+    settings = dict({'velocity_window_minutes': spend_counters.DEFAULT_WINDOW_MINUTES,
+                     'alert_window_seconds': 60, 'read_workers': 4}, **(settings or {}))
+    names = [name for name, _ in candidates]
+    if len(set(names)) != len(names):
+        raise BacktestError('Candidate names (file names without the extension) must be unique')
+    if days is None:
+        try:
+            query = archive_query.Query(start=start, end=end)
+        except archive_query.QueryError as e:
+            raise BacktestError(str(e))
+        days = [str(day) for day in archive_query.archive_days(open_store(source), query)]
+    run_id = run_fingerprint(source, candidates, settings)
+    results = {day: result for day, result in load_checkpoint(checkpoint, run_id).items() if day in days}
+    pending = [day for day in days if day not in results]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(pending) or 1))
+
+    checkpoint_file = open_checkpoint(checkpoint) if checkpoint else None
+    try:
+        def finished(day, result):
+            results[day] = result
+            if checkpoint_file:
+                append_checkpoint(checkpoint_file, run_id, day, result)
+            if progress:
+                progress(day, result, len(results), len(days))
+
+        if workers == 1:
+            init_worker(source, candidates, settings)
+            for day in pending:
+                finished(day, replay_day(day))
+        elif pending:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                     initargs=(source, candidates, settings)) as pool:
+                futures = {pool.submit(replay_day, day): day for day in pending}
+                for future in as_completed(futures):
+                    finished(futures[future], future.result())
+    finally:
+        if checkpoint_file:
+            checkpoint_file.close()
+
+    report = merge(results, names, top_merchants)
+    report['resumed_days'] = len(days) - len(pending)
+    return report
+
+def print_report(report, out=sys.stdout):
+    baseline = report['baseline']
+    print(f"{report['days']} days, {report['rows']} transactions; archived status flagged {report['recorded_flagged']}, "
+          f"baseline flags {baseline['flagged']} ({baseline['alerts']} alert messages)", file=out)
+    for name, result in report['candidates'].items():
+        print(f"\n{name}: flagged {result['flagged']} ({result['flagged_change']:+d}), "
+              f"approved->flagged {result['to_flagged']}, flagged->approved {result['to_approved']}, "
+              f"alert messages {result['alerts']} ({result['alerts_change']:+d})", file=out)
+        if result['merchants']:
+            width = max(len('merchant'), max(len(row['merchant']) for row in result['merchants']))
+            print(f"  {'merchant'.ljust(width)}  {'rows':>8}  {'baseline':>8}  {'flagged':>8}  "
+                  f"{'->flag':>7}  {'->appr':>7}", file=out)
+            for row in result['merchants']:
+                print(f"  {row['merchant'].ljust(width)}  {row['rows']:8d}  {row['baseline_flagged']:8d}  "
+                      f"{row['flagged']:8d}  {row['to_flagged']:7d}  {row['to_approved']:7d}", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--bucket', help='S3 bucket holding transactions/ and compacted/')
+    source.add_argument('--root', help='Local directory laid out like the bucket')
+    parser.add_argument('--from', dest='start', help='First day (YYYY-MM-DD), inclusive')
+    parser.add_argument('--to', dest='end', help='Last day (YYYY-MM-DD), inclusive')
+    parser.add_argument('--candidate', action='append', required=True,
+                        help='Rules document (JSON or YAML) to compare with the baseline; repeatable')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes (default: one per core)')
+    parser.add_argument('--checkpoint', help='JSONL file of completed days; rerunning resumes from it')
+    parser.add_argument('--out', help='Write the report as JSON to this file')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP_MERCHANTS, help='Merchants listed per candidate')
+    parser.add_argument('--velocity-window', type=int, default=spend_counters.DEFAULT_WINDOW_MINUTES,
+                        help='Minutes counted for velocity_count')
+    parser.add_argument('--alert-window', type=float, default=60, help='Alert digest window in seconds')
+    args = parser.parse_args()
+
+    try:
+        candidates = [load_candidate(path) for path in args.candidate]
+        settings = {'velocity_window_minutes': args.velocity_window, 'alert_window_seconds': args.alert_window}
+        started = time.perf_counter()
+
+        def progress(day, result, completed, total):
+            print(f"{day}: {result['rows']} transactions in {result['seconds']:.2f}s ({completed}/{total} days)",
+                  file=sys.stderr)
+
+        report = run_backtest(('bucket', args.bucket) if args.bucket else ('root', args.root), candidates,
+                              start=args.start, end=args.end, workers=args.workers, checkpoint=args.checkpoint,
+                              settings=settings, top_merchants=args.top, progress=progress)
+    except BacktestError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - started
+
+    print_report(report)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    print(f"{report['rows']} transactions from {report['days']} days ({report['resumed_days']} from the checkpoint) "
+          f"in {elapsed:.2f}s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Time aggregate queries over a synthetic multi-million-row transaction archive.
+
+Writes --rows transactions spread over --days days as NDJSON batch objects
+(the layout log_batch_to_s3 produces), then answers each query three ways:
+
+- naive: read and parse every object, filter and group in Python
+- raw: archive_query over the same objects (date pruning, value search
+  before parsing, memory-mapped files, thread pool)
+- compacted: archive_query after compacting every day into Parquet
+
+and checks that all three agree.
+
+Usage: python bench_archive_query.py [--rows 2000000] [--days 90] [--batch-size 1000]
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+from local_stubs import LAMBDA_DIR
+
+sys.path.insert(0, LAMBDA_DIR)
+import archive_compaction  # noqa: E402
+import archive_query  # noqa: E402
+
+FIRST_DAY = datetime.date(2026, 7, 1)
+MERCHANTS = ['Amazon', 'Walmart', 'Target', 'Starbucks', 'Uber', 'Netflix', 'Shell', 'Apple Store',
+             'Lucky Casino', 'CryptoHub', 'Best Buy', 'Costco', 'Airbnb', 'Delta', 'Spotify', 'IKEA']
+CURRENCIES = ['USD', 'USD', 'USD', 'EUR', 'GBP', 'GHS', 'NGN', 'CAD']
+
+
+def write_archive(root, rows, days, batch_size, users):
+    rng = random.Random(7)
+    per_day = rows // days
+    for offset in range(days):
+        day = FIRST_DAY + datetime.timedelta(days=offset)
+        directory = os.path.join(root, archive_compaction.SOURCE_PREFIX, str(day))
+        os.makedirs(directory)
+        for start in range(0, per_day, batch_size):
+            lines = []
+            for index in range(start, min(per_day, start + batch_size)):
+                risk_score = float(min(100, int(rng.expovariate(1 / 25))))
+                lines.append(json.dumps({
+                    'transaction_id': f"{day}-{index:08d}",
+                    'user_id': f"user-{rng.randrange(users)}",
+                    'timestamp': f"{day}T{rng.randrange(24):02d}:{rng.randrange(60):02d}:00+00:00",
+                    'amount': round(rng.lognormvariate(3.5, 1.2), 2),
+                    'merchant': rng.choice(MERCHANTS),
+                    'currency': rng.choice(CURRENCIES),
+                    'risk_score': risk_score,
+                    'status': 'flagged' if risk_score > 70 else 'approved'
+                }))
+            with open(os.path.join(directory, f"batch-{start:08d}.ndjson"), 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+    return per_day * days
+
+
+def naive(root, query):
+    """Every object read and parsed, then filtered: the baseline without the query engine"""
+    totals = {}
+    base = os.path.join(root, archive_compaction.SOURCE_PREFIX)
+    for day in sorted(os.listdir(base)):
+        for name in sorted(os.listdir(os.path.join(base, day))):
+            with open(os.path.join(base, day, name), 'rb') as f:
+                for line in f.read().splitlines():
+                    record = json.loads(line)
+                    if query.includes_day(datetime.date.fromisoformat(day)) and query.matches(record):
+                        key = tuple(day if c == 'date' else record.get(c) for c in query.group_by)
+                        entry = totals.setdefault(key, [0, 0.0])
+                        entry[0] += 1
+                        entry[1] += record['amount']
+    return {key: entry[0] for key, entry in totals.items()}
+
+
+def counts(rows, query):
+    return {tuple(row[c] for c in query.group_by): row['transactions'] for row in rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--batch-size', type=int, default=1000, help='Transactions per NDJSON object')
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=archive_query.DEFAULT_WORKERS)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    last_month = (FIRST_DAY + datetime.timedelta(days=args.days - 30), FIRST_DAY + datetime.timedelta(days=args.days - 1))
+    queries = [
+        ('flagged volume per merchant, all days',
+         archive_query.Query(statuses=['flagged'], group_by=['merchant'])),
+        ('flagged volume per merchant, last 30 days',
+         archive_query.Query(start=last_month[0], end=last_month[1], statuses=['flagged'], group_by=['merchant'])),
+        ('one user per day, all days',
+         archive_query.Query(user_ids=['user-42'], group_by=['date'])),
+        ('GBP risk_score >= 90 per status',
+         archive_query.Query(currencies=['GBP'], min_risk_score=90, group_by=['status'])),
+    ]
+
+    with tempfile.TemporaryDirectory() as root:
+        start = time.perf_counter()
+        rows = write_archive(root, args.rows, args.days, args.batch_size, args.users)
+        print(f"rows={rows} days={args.days} objects={rows // args.batch_size} "
+              f"(written in {time.perf_counter() - start:.1f}s)")
+        store = archive_compaction.LocalStore(root)
+
+        results = []
+        for label, query in queries:
+            start = time.perf_counter()
+            expected = naive(root, query)
+            naive_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            raw = archive_query.run_query(store, query, workers=args.workers)
+            raw_seconds = time.perf_counter() - start
+            assert counts(raw, query) == expected, label
+            results.append([label, query, naive_seconds, raw_seconds, expected])
+
+        start = time.perf_counter()
+        for offset in range(args.days):
+            archive_compaction.compact_day(store, FIRST_DAY + datetime.timedelta(days=offset))
+        print(f"compacted {args.days} days in {time.perf_counter() - start:.1f}s")
+
+        print(f"{'query':<42} {'naive':>8} {'raw':>8} {'parquet':>8}  groups")
+        for label, query, naive_seconds, raw_seconds, expected in results:
+            stats = {}
+            start = time.perf_counter()
+            compacted = archive_query.run_query(store, query, workers=args.workers, stats=stats)
+            compacted_seconds = time.perf_counter() - start
+            assert stats['json_objects'] == 0 and counts(compacted, query) == expected, label
+            print(f"{label:<42} {naive_seconds:7.2f}s {raw_seconds:7.2f}s {compacted_seconds:7.3f}s  {len(expected)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Per-request routing and authentication overhead in lambda_handler.
+
+Times route lookup plus the Bearer token step for a GET /transactions
+event, without running the handler:
+- legacy: the old path.endswith() chain and an unverified base64 decode
+  of the JWT payload
+- verified: Router.match plus RS256 verification on every request (token cache cleared)
+- cached: Router.match plus a token-cache hit, as for repeat requests from one session
+
+Usage: python bench_auth.py [--iterations 20000]
+"""
+import argparse
+import base64
+import json
+import logging
+import time
+
+from local_stubs import bearer_token, install_stubs, load_lambda_module
+
+LEGACY_SUFFIXES = ['/transaction', '/transactions/batch', '/transactions', '/analytics', '/user-profile',
+                   '/signup', '/login', '/csrf-token', '/test']
+
+
+def legacy_dispatch(event):
+    path = event.get('path', '')
+    for suffix in LEGACY_SUFFIXES:
+        if path.endswith(suffix):
+            break
+    auth_header = event.get('headers', {}).get('Authorization', '')
+    payload = auth_header.split(' ')[1].split('.')[1]
+    payload += '=' * (4 - len(payload) % 4)
+    decoded = json.loads(base64.b64decode(payload))
+    return decoded.get('cognito:username', decoded.get('username', 'anonymous'))
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    lambda_code = load_lambda_module()
+    install_stubs(lambda_code)
+    logging.getLogger().setLevel(logging.WARNING)
+    event = {'path': '/dev/transactions', 'httpMethod': 'GET', 'headers': {'Authorization': bearer_token('bench-user')}}
+    router, verifier = lambda_code.router, lambda_code.jwt_verifier
+
+    def new_dispatch():
+        route, _ = router.match(event['path'], event['httpMethod'])
+        assert lambda_code.authenticate(event, route.auth) is None
+
+    def uncached_dispatch():
+        verifier.cache.clear()
+        new_dispatch()
+
+    legacy_dispatch(event)
+    new_dispatch()
+    results = [
+        ('legacy (unverified)', timed(lambda: legacy_dispatch(event), args.iterations)),
+        ('verified', timed(uncached_dispatch, max(1, args.iterations // 10))),
+        ('cached', timed(new_dispatch, args.iterations)),
+    ]
+    print(f"route lookup + auth per request, GET /transactions ({args.iterations} iterations)")
+    for label, micros in results:
+        print(f"{label:<20} {micros:8.2f}us")
+    print(f"match only           {timed(lambda: router.match(event['path'], event['httpMethod']), args.iterations):8.2f}us")
+    print(f"JWKS fetches: {verifier.jwks.fetches}, token cache: {verifier.cache.stats}")
+
+
+if __name__ == '__main__':
+    main()
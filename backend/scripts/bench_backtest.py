@@ -0,0 +1,115 @@
+"""Backtest throughput by worker count, and checks that sharding and resuming don't change the report.
+
+Writes --rows synthetic transactions over --days days as NDJSON (the
+bench_archive_query.py layout) and replays them through three candidates:
+
+- shipped: risk_rules.json as it is, which must agree with the baseline on
+  every transaction
+- threshold_35: the shipped rules flagging above 35
+- more_keywords: 'airbnb' and 'delta' added to the high-risk keywords,
+  and the bottom amount band raised from 10 to 40 points
+
+It then checks that:
+
+- the report is the same for every --workers count
+- a run interrupted after half the days (with a torn last checkpoint
+  line) and resumed from its checkpoint gives the same report, replaying
+  only the remaining days, and a rerun after that replays nothing
+
+Exits non-zero if any check fails.
+
+Usage: python bench_backtest.py [--rows 400000] [--days 20] [--workers 1,2,4]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from bench_archive_query import write_archive
+from local_stubs import LAMBDA_DIR
+
+import backtest
+
+sys.path.insert(0, LAMBDA_DIR)
+import risk_rules  # noqa: E402
+
+
+def candidate_documents():
+    with open(risk_rules.DEFAULT_RULES_PATH, 'r', encoding='utf-8') as f:
+        shipped = json.load(f)
+    threshold_35 = dict(shipped, version='threshold-35', threshold=35)
+    rules = []
+    for rule in shipped['rules']:
+        if rule['id'] == 'high_risk_merchant':
+            rule = dict(rule, when={'merchant_keyword': ['casino', 'crypto', 'gambling', 'airbnb', 'delta']})
+        elif rule['id'] == 'amount_over_1000':
+            rule = dict(rule, points=40)
+        rules.append(rule)
+    more_keywords = dict(shipped, version='more-keywords', rules=rules)
+    return [('shipped', shipped), ('threshold_35', threshold_35), ('more_keywords', more_keywords)]
+
+
+def comparable(report):
+    return {key: value for key, value in report.items() if key != 'resumed_days'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=400000)
+    parser.add_argument('--days', type=int, default=20)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--workers', default='1,2,4', help='Worker counts to measure')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    candidates = candidate_documents()
+    failures = []
+    with tempfile.TemporaryDirectory() as root:
+        rows = write_archive(root, args.rows, args.days, 1000, args.users)
+        source = ('root', root)
+        print(f"rows={rows} days={args.days} users={args.users} candidates={len(candidates)} cores={os.cpu_count()}")
+
+        reference = None
+        for workers in (int(value) for value in args.workers.split(',')):
+            start = time.perf_counter()
+            report = backtest.run_backtest(source, candidates, workers=workers)
+            elapsed = time.perf_counter() - start
+            print(f"workers={workers}  {elapsed:6.2f}s  {rows / elapsed:9.0f} transactions/s")
+            if reference is None:
+                reference = report
+            elif comparable(report) != comparable(reference):
+                failures.append(f"report with {workers} workers differs from the first run")
+
+        shipped = reference['candidates']['shipped']
+        if shipped['to_flagged'] or shipped['to_approved'] or shipped['alerts_change']:
+            failures.append(f"shipped rules disagree with calculate_risk_score: {shipped['to_flagged']} to flagged, "
+                            f"{shipped['to_approved']} to approved")
+
+        checkpoint = os.path.join(root, 'checkpoint.jsonl')
+        days = sorted(os.listdir(os.path.join(root, 'transactions')))
+        backtest.run_backtest(source, candidates, days=days[:len(days) // 2], workers=2, checkpoint=checkpoint)
+        with open(checkpoint, 'a') as f:
+            f.write('{"run": "torn')
+        start = time.perf_counter()
+        resumed = backtest.run_backtest(source, candidates, days=days, workers=2, checkpoint=checkpoint)
+        elapsed = time.perf_counter() - start
+        print(f"resumed: {resumed['resumed_days']} of {len(days)} days from the checkpoint, rest in {elapsed:.2f}s")
+        if resumed['resumed_days'] != len(days) // 2:
+            failures.append(f"resume skipped {resumed['resumed_days']} days, expected {len(days) // 2}")
+        if comparable(resumed) != comparable(reference):
+            failures.append('resumed report differs from the uninterrupted one')
+        rerun = backtest.run_backtest(source, candidates, days=days, workers=2, checkpoint=checkpoint)
+        if rerun['resumed_days'] != len(days) or comparable(rerun) != comparable(reference):
+            failures.append(f"rerun after the resume replayed {len(days) - rerun['resumed_days']} days again")
+
+    print()
+    backtest.print_report(reference)
+    print('\nall checks passed' if not failures else '\n' + '\n'.join(failures))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
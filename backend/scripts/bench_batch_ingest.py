@@ -0,0 +1,60 @@
+"""Compare POST /transaction (one item per call) with POST /transactions/batch.
+
+Usage: python bench_batch_ingest.py [--items 2000] [--latency-ms 5]
+"""
+import argparse
+import json
+import logging
+import random
+import time
+
+from local_stubs import bearer_token, install_stubs, load_lambda_module, total_calls
+
+MERCHANTS = ['Amazon', 'Walmart', 'Starbucks', 'Crypto Exchange', 'Lucky Casino', 'Shell', 'Uber']
+CURRENCIES = ['USD', 'EUR', 'GBP', 'GHS', 'JPY', 'NGN']
+
+
+def synthetic_transactions(count, seed=7):
+    rng = random.Random(seed)
+    return [{
+        'amount': round(rng.uniform(1, 20000), 2),
+        'merchant': rng.choice(MERCHANTS),
+        'currency': rng.choice(CURRENCIES)
+    } for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Injected latency per AWS call')
+    args = parser.parse_args()
+
+    lambda_code = load_lambda_module()
+    logging.getLogger().setLevel(logging.WARNING)
+    transactions = synthetic_transactions(args.items)
+    headers = {'Authorization': bearer_token('bench-user')}
+
+    stubs = install_stubs(lambda_code, latency=args.latency_ms / 1000.0)
+    start = time.perf_counter()
+    for transaction in transactions:
+        lambda_code.lambda_handler({'path': '/transaction', 'httpMethod': 'POST', 'headers': headers,
+                                    'body': json.dumps(transaction)}, None)
+    single_elapsed = time.perf_counter() - start
+    single_calls = total_calls(stubs)
+
+    stubs = install_stubs(lambda_code, latency=args.latency_ms / 1000.0)
+    start = time.perf_counter()
+    response = lambda_code.lambda_handler({'path': '/transactions/batch', 'httpMethod': 'POST', 'headers': headers,
+                                           'body': json.dumps({'transactions': transactions})}, None)
+    batch_elapsed = time.perf_counter() - start
+    batch_calls = total_calls(stubs)
+    processed = json.loads(response['body'])['processed']
+
+    print(f"items={args.items} injected latency={args.latency_ms}ms per AWS call")
+    print(f"single-item route: {single_elapsed:8.3f}s  {args.items / single_elapsed:10.1f} items/s  {single_calls} AWS calls")
+    print(f"batch route:       {batch_elapsed:8.3f}s  {processed / batch_elapsed:10.1f} items/s  {batch_calls} AWS calls")
+    print(f"speedup: {single_elapsed / batch_elapsed:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
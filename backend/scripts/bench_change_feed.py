@@ -0,0 +1,179 @@
+"""Change feed: stream batches of the transactions table fanned out to WebSocket connections.
+
+First an end-to-end check against the local stand-ins: a few users connect
+through websocket_handler ($connect with their ID token), submit
+transactions through lambda_handler, and the stream records the fake
+transactions table collected are drained through change_feed_handler.
+Each connection must receive exactly its own user's new rows, identical to
+what GET /transactions returns, and a connection that went away must be
+dropped from the registry.
+
+Then throughput for synthetic stream batches (inserts, visible and
+expires_at-only modifies, TTL deletions) across --users users, of whom
+--watched-pct have an open connection: records/s for grouping alone,
+for publish() with free sends, and with --latency-ms per post_to_connection.
+Bytes pushed are compared with re-fetching a 100-row page of
+GET /transactions for every update.
+
+Exits non-zero if the end-to-end check fails.
+
+Usage: python bench_change_feed.py [--batches 100,1000,10000] [--users 2000] [--watched-pct 5] [--latency-ms 20]
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+import uuid
+
+from local_stubs import bearer_token, install_stubs, load_lambda_module, stream_record
+
+MERCHANTS = ['Amazon', 'Walmart', 'Starbucks', 'Shell', 'Uber', 'Netflix', 'Target', 'Lucky Casino']
+PAGE_ROWS = 100
+
+
+def end_to_end(lambda_code):
+    """Failure messages from the connect / submit / stream / deliver round trip"""
+    stubs = install_stubs(lambda_code)
+    table = lambda_code.transactions_table
+    table.stream = []
+    users = ['feed-user-0', 'feed-user-1', 'feed-user-2']
+    tokens = {user: bearer_token(user) for user in users}
+    connections = {}
+    for user in users:
+        connection_id = str(uuid.uuid4())
+        response = lambda_code.websocket_handler({
+            'requestContext': {'routeKey': '$connect', 'connectionId': connection_id, 'eventType': 'CONNECT'},
+            'queryStringParameters': {'token': tokens[user][len('Bearer '):]}
+        }, None)
+        if response['statusCode'] != 200:
+            return [f"$connect for {user} returned {response['statusCode']}"]
+        connections[user] = connection_id
+    rejected = lambda_code.websocket_handler({
+        'requestContext': {'routeKey': '$connect', 'connectionId': 'no-token'}}, None)
+
+    rng = random.Random(7)
+    for i in range(60):
+        user = users[i % len(users)]
+        lambda_code.lambda_handler({'path': '/transaction', 'httpMethod': 'POST',
+                                    'headers': {'Authorization': tokens[user]},
+                                    'body': json.dumps({'amount': round(rng.uniform(1, 2000), 2),
+                                                        'merchant': rng.choice(MERCHANTS)})}, None)
+    # The third user closed the tab without a $disconnect reaching us
+    stubs['apigateway'].gone.add(connections['feed-user-2'])
+    while table.stream:
+        lambda_code.change_feed_handler(table.stream_event(100), None)
+
+    failures = []
+    if rejected['statusCode'] != 401:
+        failures.append(f"$connect without a token returned {rejected['statusCode']}")
+    for user in users[:2]:
+        received = {}
+        for data in stubs['apigateway'].messages.get(connections[user], []):
+            for row in json.loads(data)['upserts']:
+                received[row['transaction_id']] = row
+        response = lambda_code.lambda_handler({'path': '/transactions', 'httpMethod': 'GET',
+                                               'headers': {'Authorization': tokens[user]},
+                                               'queryStringParameters': {'limit': '1000'}}, None)
+        listed = {row['transaction_id']: row for row in json.loads(response['body'])['transactions']}
+        if received != listed:
+            failures.append(f"{user}: received {len(received)} rows, GET /transactions lists {len(listed)}"
+                            + ('' if len(received) != len(listed) else ' with different values'))
+    if lambda_code.change_feed_connections.for_users(['feed-user-2']):
+        failures.append('gone connection was not removed')
+    response = lambda_code.websocket_handler({
+        'requestContext': {'routeKey': '$disconnect', 'connectionId': connections['feed-user-0']}}, None)
+    if response['statusCode'] != 200 or lambda_code.change_feed_connections.for_users(['feed-user-0']):
+        failures.append('$disconnect did not remove the connection')
+    return failures
+
+
+def synthetic_batch(size, users, rng):
+    """Stream records: 70% inserts, 10% status changes, 10% expires_at-only modifies, 10% TTL deletions"""
+    records = []
+    for sequence in range(size):
+        user = rng.choice(users)
+        row = {'transaction_id': str(uuid.UUID(int=rng.getrandbits(128))), 'user_id': user,
+               'timestamp': f"2026-10-17T12:{sequence // 60 % 60:02d}:{sequence % 60:02d}Z",
+               'amount': round(rng.lognormvariate(3.5, 1.2), 2), 'merchant': rng.choice(MERCHANTS),
+               'currency': 'USD', 'risk_score': rng.randrange(0, 100), 'status': 'approved',
+               'risk_factors': ['new_merchant'], 'rules_version': '2026-10-17.1'}
+        key = {'transaction_id': row['transaction_id']}
+        kind = rng.random()
+        if kind < 0.7:
+            record = stream_record('INSERT', key, new=row, sequence=sequence)
+        elif kind < 0.8:
+            record = stream_record('MODIFY', key, old=row, new=dict(row, status='flagged'), sequence=sequence)
+        elif kind < 0.9:
+            record = stream_record('MODIFY', key, old=row, new=dict(row, expires_at=1792000000), sequence=sequence)
+        else:
+            record = stream_record('REMOVE', key, old=row, ttl=True, sequence=sequence)
+        records.append(record)
+    return records
+
+
+def timed(function, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = function()
+    return (time.perf_counter() - start) / rounds, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batches', default='100,1000,10000', help='Stream batch sizes to measure')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--watched-pct', type=float, default=5.0, help='Share of users with an open connection')
+    parser.add_argument('--connections-per-user', type=int, default=2)
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Injected latency per post_to_connection')
+    args = parser.parse_args()
+
+    lambda_code = load_lambda_module()
+    logging.getLogger().setLevel(logging.WARNING)
+    change_feed = lambda_code.change_feed
+    failures = end_to_end(lambda_code)
+    print(f"end-to-end: {'ok' if not failures else '; '.join(failures)}")
+
+    rng = random.Random(11)
+    users = [f"user-{i}" for i in range(args.users)]
+    registry = change_feed.MemoryConnections()
+    for user in rng.sample(users, int(args.users * args.watched_pct / 100)):
+        for _ in range(args.connections_per_user):
+            registry.add(str(uuid.uuid4()), user)
+    sent_bytes = [0]
+
+    def free_send(connection_id, data):
+        sent_bytes[0] += len(data)
+        return change_feed.SENT
+
+    def slow_send(connection_id, data):
+        time.sleep(args.latency_ms / 1000.0)
+        return change_feed.SENT
+
+    # Size of one GET /transactions page, which the dashboard re-downloaded on every update before
+    page = json.dumps({'transactions': [
+        change_feed.public_item(record['dynamodb'].get('NewImage') or record['dynamodb']['OldImage'])
+        for record in synthetic_batch(PAGE_ROWS, users, rng)]})
+
+    print(f"users={args.users} watched={args.watched_pct}% x{args.connections_per_user} connections, "
+          f"post_to_connection latency={args.latency_ms}ms")
+    for size in (int(value) for value in args.batches.split(',')):
+        records = synthetic_batch(size, users, rng)
+        rounds = max(1, 20000 // size)
+        group_elapsed, _ = timed(lambda: change_feed.group_changes(records), rounds)
+        sent_bytes[0] = 0
+        free_elapsed, stats = timed(lambda: change_feed.publish(records, registry, free_send), rounds)
+        pushed = sent_bytes[0] / rounds
+        slow_elapsed, _ = timed(lambda: change_feed.publish(records, registry, slow_send), 1)
+        refetch = stats['sent'] * len(page)
+        print(f"batch={size:6d}  group {size / group_elapsed:9.0f} rec/s  "
+              f"publish {size / free_elapsed:9.0f} rec/s ({free_elapsed * 1000:7.1f}ms)  "
+              f"with latency {size / slow_elapsed:9.0f} rec/s ({slow_elapsed * 1000:7.1f}ms)  "
+              f"{stats['skipped']} skipped, {stats['watched_users']}/{stats['users']} users watched, "
+              f"{stats['messages']} messages, {pushed / 1024:.0f} KiB pushed vs {refetch / 1024:.0f} KiB refetched")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Measure Lambda init cost per route: module import plus the first invocation.
+
+Each route runs in a fresh interpreter. AWS calls go to a local HTTP server
+(AWS_ENDPOINT_URL) that answers every request with an empty response,
+so network time is negligible and what remains is the cost of importing
+boto3 and building the clients the route touches. The same server serves
+the JWKS for the locally signed bearer tokens.
+
+Usage: python bench_cold_start.py [--runs 5] [--importtime]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from local_stubs import LAMBDA_DIR, bearer_token, local_jwks
+
+ROUTES = {
+    'OPTIONS /transaction': {'path': '/transaction', 'httpMethod': 'OPTIONS'},
+    'GET /test': {'path': '/test', 'httpMethod': 'GET'},
+    'POST /login': {'path': '/login', 'httpMethod': 'POST', 'body': json.dumps({'username': 'u', 'password': 'p'})},
+    'POST /transaction': {'path': '/transaction', 'httpMethod': 'POST',
+                          'headers': {'Authorization': bearer_token('bench-user')},
+                          'body': json.dumps({'amount': 10, 'merchant': 'Amazon'})},
+    'GET /transactions': {'path': '/transactions', 'httpMethod': 'GET',
+                          'headers': {'Authorization': bearer_token('bench-user')}},
+}
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import lambda_code
+imported = time.perf_counter()
+lambda_code.lambda_handler(json.loads(sys.argv[1]), None)
+first = time.perf_counter()
+lambda_code.lambda_handler(json.loads(sys.argv[1]), None)
+second = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'first_ms': (first - imported) * 1000,
+    'warm_ms': (second - first) * 1000,
+    'boto3_loaded': 'boto3' in sys.modules
+}))
+"""
+
+
+class EmptyResponseHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so S3 PUTs get their "100 Continue" instead of waiting it out
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    delay = 0.0
+
+    def _reply(self):
+        if self.delay:
+            time.sleep(self.delay)
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        # S3 treats any body on a PUT as an error document; the JSON APIs need an object
+        if self.path.endswith('/jwks.json'):
+            body = json.dumps(local_jwks()).encode()
+        else:
+            body = b'' if self.command == 'PUT' else b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-amz-json-1.0')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_HEAD = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+def start_endpoint(delay=0.0):
+    """Serve EmptyResponseHandler on a free port; delay adds latency (seconds) to every response"""
+    handler = type('DelayedHandler', (EmptyResponseHandler,), {'delay': delay})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def child_env(endpoint):
+    env = dict(os.environ)
+    env.update({
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        'AWS_ACCESS_KEY_ID': 'testing',
+        'AWS_SECRET_ACCESS_KEY': 'testing',
+        'AWS_ENDPOINT_URL': endpoint,
+        'JWKS_URL': f"{endpoint}/.well-known/jwks.json",
+        'AWS_MAX_ATTEMPTS': '1',
+        'S3_BUCKET': 'local-transaction-logs',
+        'PROJECT_NAME': 'transaction-monitor',
+        'ENVIRONMENT': 'local',
+        'DYNAMODB_TABLE_NAME': 'transaction-monitor-local-transactions',
+        'SNS_TOPIC_ARN': 'arn:aws:sns:us-east-1:000000000000:local-alerts',
+        'CSRF_SECRET': 'local-csrf-secret',
+        'PYTHONPATH': LAMBDA_DIR,
+        'PYTHONDONTWRITEBYTECODE': '',
+    })
+    return env
+
+
+def run_route(event, env):
+    output = subprocess.run([sys.executable, '-c', CHILD, json.dumps(event)], env=env, cwd=LAMBDA_DIR,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def show_importtime(env, top=12):
+    """Largest cumulative entries from python -X importtime for lambda_code"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import lambda_code'], env=env,
+                            cwd=LAMBDA_DIR, capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace('import time:', '|').split('|'))
+        rows.append((int(cumulative_us), int(self_us), name))
+    print(f"\npython -X importtime -c 'import lambda_code' (top {top} cumulative):")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:8.1f}ms cumulative  {self_us / 1000:7.1f}ms self  {name.strip()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per route')
+    parser.add_argument('--importtime', action='store_true', help='Also print the -X importtime breakdown')
+    args = parser.parse_args()
+
+    env = child_env(start_endpoint())
+    # Warm the filesystem and bytecode caches so the first route isn't penalized
+    run_route(ROUTES['GET /test'], env)
+
+    print(f"{'route':<22} {'import':>9} {'1st call':>9} {'init total':>11} {'warm call':>10}  boto3 loaded")
+    for name, event in ROUTES.items():
+        samples = [run_route(event, env) for _ in range(args.runs)]
+        import_ms = statistics.median(s['import_ms'] for s in samples)
+        first_ms = statistics.median(s['first_ms'] for s in samples)
+        warm_ms = statistics.median(s['warm_ms'] for s in samples)
+        print(f"{name:<22} {import_ms:7.1f}ms {first_ms:7.1f}ms {import_ms + first_ms:9.1f}ms {warm_ms:8.2f}ms  "
+              f"{samples[0]['boto3_loaded']}")
+
+    if args.importtime:
+        show_importtime(env)
+
+
+if __name__ == '__main__':
+    main()
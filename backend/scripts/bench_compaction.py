@@ -0,0 +1,119 @@
+"""Scan time for one day of the transaction archive before and after compaction.
+
+Writes a synthetic day to a local directory in the layout log_to_s3 and
+log_batch_to_s3 produce (one JSON object per transaction, plus some NDJSON
+batch objects), then times the same audit query (total amount and count
+per status) over the raw objects and over the compacted Parquet parts.
+Local file reads understate S3's per-object cost, so the raw scan is also
+projected at --get-latency-ms per GET with --read-workers parallel reads.
+
+Usage: python bench_compaction.py [--transactions 100000] [--batch-share 0.2] [--get-latency-ms 20]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_batch_ingest import synthetic_transactions
+from local_stubs import load_lambda_module
+
+DAY = '2026-10-16'
+
+
+def write_day(lambda_code, root, count, batch_share, batch_size=100):
+    rng = random.Random(11)
+    records = [lambda_code.build_transaction_record(t, float(t['amount']), f"user-{rng.randrange(500)}")
+               for t in synthetic_transactions(count)]
+    for record in records:
+        record['timestamp'] = f"{DAY}T{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}+00:00"
+    directory = os.path.join(root, 'transactions', DAY)
+    os.makedirs(directory)
+    batched = int(count * batch_share)
+    for start in range(0, batched, batch_size):
+        lines = [json.dumps({k: float(v) if isinstance(v, lambda_code.Decimal) else v for k, v in r.items()})
+                 for r in records[start:start + batch_size]]
+        with open(os.path.join(directory, f"batch-{start:08d}.ndjson"), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+    for record in records[batched:]:
+        with open(os.path.join(directory, f"{record['transaction_id']}.json"), 'w') as f:
+            json.dump({k: float(v) if isinstance(v, lambda_code.Decimal) else v for k, v in record.items()}, f)
+    return count
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(d, name)) for d, _, files in os.walk(path) for name in files)
+
+
+def scan_raw(compaction, store, workers):
+    keys = store.list(f"{compaction.SOURCE_PREFIX}/{DAY}")
+    totals = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for key, body in zip(keys, pool.map(store.get, keys)):
+            for record in compaction.parse_object(key, body):
+                entry = totals.setdefault(record['status'], [0, 0.0])
+                entry[0] += 1
+                entry[1] += record['amount']
+    return len(keys), totals
+
+
+def scan_compacted(compaction, store):
+    table = compaction.read_day(store, DAY, columns=['status', 'amount'])
+    grouped = table.group_by('status').aggregate([('amount', 'count'), ('amount', 'sum')]).to_pylist()
+    return {row['status']: [row['amount_count'], row['amount_sum']] for row in grouped}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--transactions', type=int, default=100000)
+    parser.add_argument('--batch-share', type=float, default=0.2, help='Fraction archived in 100-item NDJSON batches')
+    parser.add_argument('--objects-per-part', type=int, default=50000)
+    parser.add_argument('--read-workers', type=int, default=32)
+    parser.add_argument('--get-latency-ms', type=float, default=20.0, help='Assumed S3 GET latency for the projection')
+    args = parser.parse_args()
+
+    lambda_code = load_lambda_module()
+    logging.getLogger().setLevel(logging.WARNING)
+    sys.path.insert(0, os.path.dirname(lambda_code.__file__))
+    import archive_compaction as compaction
+
+    with tempfile.TemporaryDirectory() as root:
+        write_day(lambda_code, root, args.transactions, args.batch_share)
+        store = compaction.LocalStore(root)
+        raw_bytes = directory_size(os.path.join(root, compaction.SOURCE_PREFIX))
+
+        start = time.perf_counter()
+        objects, raw_totals = scan_raw(compaction, store, args.read_workers)
+        raw_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        manifest = compaction.compact_day(store, DAY, objects_per_part=args.objects_per_part,
+                                          read_workers=args.read_workers)
+        compact_seconds = time.perf_counter() - start
+        compacted_bytes = sum(os.path.getsize(os.path.join(root, part['key'])) for part in manifest['parts'])
+
+        start = time.perf_counter()
+        compacted_totals = scan_compacted(compaction, store)
+        compacted_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rerun = compaction.compact_day(store, DAY)
+        rerun_seconds = time.perf_counter() - start
+
+    assert {k: v[0] for k, v in raw_totals.items()} == {k: v[0] for k, v in compacted_totals.items()}
+    print(f"transactions={args.transactions} in {objects} objects ({raw_bytes / 1e6:.1f} MB)")
+    print(f"compaction: {compact_seconds:.2f}s -> {len(manifest['parts'])} Parquet parts "
+          f"({compacted_bytes / 1e6:.1f} MB), {manifest['rows']} rows verified; "
+          f"rerun skipped in {rerun_seconds * 1000:.1f}ms ({rerun['rows']} rows)")
+    print(f"scan raw objects:   {raw_seconds:8.3f}s local, "
+          f"~{objects * args.get_latency_ms / 1000 / args.read_workers:.1f}s projected on S3 "
+          f"({args.get_latency_ms}ms/GET, {args.read_workers} parallel)")
+    print(f"scan Parquet parts: {compacted_seconds:8.3f}s ({raw_seconds / compacted_seconds:.0f}x faster locally)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Compare CSRF token issue and validation cost: stateless HMAC vs. the csrf-tokens table.
+
+For each mode, issues tokens through GET /csrf-token and validates them
+the way a protected route does, with injected latency on every DynamoDB
+call.
+
+Usage: python bench_csrf.py [--requests 500] [--latency-ms 5]
+"""
+import argparse
+import json
+import logging
+import time
+
+from bench_side_effects import percentile
+from local_stubs import bearer_token, install_stubs, load_lambda_module, total_calls
+
+
+def run_mode(lambda_code, mode, requests, latency, headers, replay_entries=0):
+    lambda_code.CSRF_MODE = mode
+    lambda_code._csrf_replay_cache = lambda_code.csrf.ReplayCache(replay_entries) if replay_entries else None
+    stubs = install_stubs(lambda_code, latency=latency)
+    event = {'path': '/csrf-token', 'httpMethod': 'GET', 'headers': headers}
+    lambda_code.lambda_handler(event, None)
+    issue, validate = [], []
+    for _ in range(requests):
+        start = time.perf_counter()
+        token = json.loads(lambda_code.lambda_handler(event, None)['body'])['token']
+        issued = time.perf_counter()
+        assert lambda_code.validate_csrf_token(token, 'bench-user')
+        validate.append((time.perf_counter() - issued) * 1000)
+        issue.append((issued - start) * 1000)
+    return issue, validate, total_calls(stubs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Injected latency per DynamoDB call')
+    args = parser.parse_args()
+
+    lambda_code = load_lambda_module()
+    logging.getLogger().setLevel(logging.WARNING)
+    headers = {'Authorization': bearer_token('bench-user')}
+    latency = args.latency_ms / 1000.0
+
+    print(f"requests={args.requests} injected latency={args.latency_ms}ms per DynamoDB call")
+    for label, mode, replay_entries in (('table', 'table', 0), ('stateless', 'stateless', 0),
+                                        ('stateless+replay', 'stateless', 4096)):
+        issue, validate, calls = run_mode(lambda_code, mode, args.requests, latency, headers, replay_entries)
+        print(f"{label:<17} issue p50={percentile(issue, 50):7.3f}ms p99={percentile(issue, 99):7.3f}ms  "
+              f"validate p50={percentile(validate, 50):7.3f}ms p99={percentile(validate, 99):7.3f}ms  "
+              f"{calls / args.requests:4.2f} DynamoDB calls/token")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Response encoding for a large transaction list: Decimal conversion, JSON and gzip.
+
+Builds --rows transactions as DynamoDB returns them (Decimal amounts and
+scores) and times, per response:
+
+- before: the per-item float() loop get_transactions_handler used, then json.dumps
+- encoding.dumps with the standard library encoder, and with orjson if installed
+- gzip (at --levels) plus base64, as compress_response() returns it to API Gateway
+
+Every encoder must decode to the same document. It then runs
+GET /transactions?limit=1000 through lambda_handler with and without
+Accept-Encoding: gzip, and checks that the gzipped body decodes to the
+plain one.
+
+Exits non-zero if any output differs.
+
+Usage: python bench_encoding.py [--rows 10000] [--levels 1,5,9] [--rounds 20]
+"""
+import argparse
+import base64
+import gzip
+import json
+import random
+import sys
+import time
+import uuid
+from decimal import Decimal
+
+from local_stubs import LAMBDA_DIR, bearer_token, install_stubs, load_lambda_module
+
+sys.path.insert(0, LAMBDA_DIR)
+import encoding  # noqa: E402
+
+MERCHANTS = ['Amazon', 'Walmart', 'Starbucks', 'Shell', 'Uber', 'Netflix', 'Target', 'Lucky Casino']
+
+
+def synthetic_items(count, user_id='bench-user', seed=5):
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        items.append({
+            'transaction_id': str(uuid.UUID(int=rng.getrandbits(128))), 'user_id': user_id,
+            'timestamp': f"2026-10-{1 + i % 16:02d}T{i % 24:02d}:{i % 60:02d}:{i * 7 % 60:02d}.{i % 1000:03d}000",
+            'amount': Decimal(str(round(rng.lognormvariate(3.5, 1.2), 2))), 'merchant': rng.choice(MERCHANTS),
+            'currency': rng.choice(['USD', 'USD', 'EUR', 'GHS']), 'risk_score': Decimal(rng.randrange(0, 100)),
+            'status': rng.choice(['approved', 'approved', 'flagged']), 'merchant_keyword': None,
+            'blocked_merchant': None, 'trusted_merchant': None, 'risk_factors': ['new_merchant'],
+            'rules_version': '2026-10-17.1'
+        })
+    return items
+
+
+def before(items):
+    """What get_transactions_handler did: convert each item in place, then json.dumps"""
+    for transaction in items:
+        if 'amount' in transaction:
+            transaction['amount'] = float(transaction['amount'])
+        if 'risk_score' in transaction:
+            transaction['risk_score'] = float(transaction['risk_score'])
+    return json.dumps({'transactions': items, 'count': len(items), 'next_cursor': None})
+
+
+def timed(label, function, rounds, rows):
+    """Best-of-rounds CPU time of function(), printed per response and per row"""
+    best = None
+    result = None
+    for _ in range(rounds):
+        start = time.process_time()
+        result = function()
+        elapsed = time.process_time() - start
+        best = elapsed if best is None or elapsed < best else best
+    print(f"{label:<32} {best * 1000:8.2f}ms  {best / rows * 1e6:6.2f}us/row")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--levels', default='1,5,9', help='gzip levels to measure')
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    items = synthetic_items(args.rows)
+    document = {'transactions': items, 'count': len(items), 'next_cursor': None}
+    print(f"rows={args.rows}  encoder in use: {encoding.ENCODER}")
+
+    # The old path mutates its input, so each round gets fresh copies
+    copies = [[dict(item) for item in items] for _ in range(args.rounds)]
+    reference = timed('before (float loop + json.dumps)', lambda: before(copies.pop()), args.rounds, args.rows)
+    expected = json.loads(reference)
+    failures = []
+    outputs = {'encoding.dumps_json': timed('encoding.dumps_json', lambda: encoding.dumps_json(document),
+                                            args.rounds, args.rows)}
+    if encoding.orjson is not None:
+        outputs['encoding.dumps_orjson'] = timed('encoding.dumps_orjson', lambda: encoding.dumps_orjson(document),
+                                                 args.rounds, args.rows)
+    for label, body in outputs.items():
+        if json.loads(body) != expected:
+            failures.append(f"{label} differs from the reference")
+
+    body = encoding.dumps(document)
+    payload = body.encode('utf-8')
+    print(f"{'body':<32} {len(reference.encode('utf-8')) / 1024:8.0f} KiB before, {len(payload) / 1024:.0f} KiB now")
+    for level in (int(value) for value in args.levels.split(',')):
+        compressed = timed(f"gzip level {level} + base64",
+                           lambda: base64.b64encode(encoding.gzip_bytes(payload, level)), args.rounds, args.rows)
+        if gzip.decompress(base64.b64decode(compressed)) != payload:
+            failures.append(f"gzip level {level} does not round-trip")
+        print(f"{'':<32} {len(compressed) * 3 / 4 / 1024:8.0f} KiB gzipped, {len(compressed) / 1024:.0f} KiB as base64 "
+              f"({len(payload) / (len(compressed) * 3 / 4):.1f}x smaller on the wire)")
+
+    # Through the handler: one page of the maximum size
+    lambda_code = load_lambda_module()
+    install_stubs(lambda_code)
+    for item in synthetic_items(lambda_code.MAX_PAGE_SIZE):
+        lambda_code.transactions_table.items[item['transaction_id']] = item
+    headers = {'Authorization': bearer_token('bench-user')}
+    event = {'path': '/transactions', 'httpMethod': 'GET', 'queryStringParameters': {'limit': '1000'}}
+    plain = lambda_code.lambda_handler(dict(event, headers=headers), None)
+    gzipped = lambda_code.lambda_handler(dict(event, headers=dict(headers, **{'Accept-Encoding': 'gzip, br'})), None)
+    decoded = gzip.decompress(base64.b64decode(gzipped['body'])).decode('utf-8')
+    if not gzipped.get('isBase64Encoded') or json.loads(decoded) != json.loads(plain['body']):
+        failures.append('GET /transactions gzipped body differs from the plain one')
+    print(f"GET /transactions limit=1000: {len(plain['body']) / 1024:.0f} KiB plain, "
+          f"{len(gzipped['body']) / 1024:.0f} KiB gzipped as base64 (Content-Encoding: "
+          f"{gzipped['headers'].get('Content-Encoding')})")
+
+    print('all outputs match' if not failures else '\n'.join(failures))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
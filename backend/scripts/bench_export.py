@@ -0,0 +1,264 @@
+"""POST /transactions/export against the local stand-ins: correctness, then time and memory at 1M rows.
+
+The check runs --check-rows transactions for one user through
+lambda_handler with a 30-day retention. Rows older than that live only in
+the S3 archive, and the two days after the boundary are in both tiers. It
+checks that:
+
+- CSV and NDJSON exports hold exactly the user's rows, newest first, with
+  the stored values, in several multipart parts
+- since/until, min_risk/max_risk and status select the same rows as
+  filtering in Python
+- with no time budget, every request hands back a cursor after one page,
+  and following the cursors gives the same rows as one export
+
+The profile then loads --rows transactions for one user into the fake
+table and exports them with S3 uploads counted rather than kept. For each
+format it reports the time and the peak memory allocated during the export
+(tracemalloc, measured in a separate run). For comparison, "before" pages
+through GET /transactions 1,000 rows at a time and builds the CSV in
+memory, as the dashboard did.
+
+Exits non-zero if a check fails.
+
+Usage: python bench_export.py [--rows 1000000] [--check-rows 50000] [--latency-ms 0] [--skip-before]
+"""
+import argparse
+import csv
+import datetime
+import io
+import json
+import logging
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from decimal import Decimal
+
+from local_stubs import FakeS3, bearer_token, install_stubs, load_lambda_module
+
+USER = 'export-user'
+MERCHANTS = ['Amazon', 'Walmart', 'Starbucks', 'Shell', 'Uber', 'Netflix', 'Target', 'Lucky Casino',
+             'CryptoHub', 'Café "Le Coin", Paris']
+CURRENCIES = ['USD', 'USD', 'EUR', 'GBP', 'GHS']
+
+
+class CountingS3(FakeS3):
+    """Keeps the size and line count of uploaded objects instead of their bytes"""
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.sizes = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._call()
+        self.sizes[Key] = (len(Body), Body.count(b'\n'), 1)
+        return {'ETag': '"1"'}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._call()
+        self.uploads[UploadId]['parts'][PartNumber] = (len(Body), Body.count(b'\n'))
+        return {'ETag': f'"{UploadId}-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self._call()
+        parts = self.uploads.pop(UploadId)['parts']
+        sizes = [parts[part['PartNumber']] for part in MultipartUpload['Parts']]
+        if any(size < self.MIN_PART_BYTES for size, _ in sizes[:-1]):
+            raise ValueError('EntityTooSmall')
+        self.sizes[Key] = (sum(size for size, _ in sizes), sum(lines for _, lines in sizes), len(sizes))
+        return {'Bucket': Bucket, 'Key': Key}
+
+
+def synthetic_rows(count, user_id, newest, seed=3, spacing_seconds=None):
+    """count transactions for user_id, one every spacing_seconds back from newest (spread over a year by default)"""
+    rng = random.Random(seed)
+    spacing = spacing_seconds if spacing_seconds is not None else 365 * 86400 / max(count, 1)
+    rows = []
+    for i in range(count):
+        risk_score = min(100, int(rng.expovariate(1 / 25)))
+        row = {
+            'transaction_id': str(uuid.UUID(int=rng.getrandbits(128))), 'user_id': user_id,
+            'timestamp': (newest - datetime.timedelta(seconds=i * spacing)).isoformat(),
+            'amount': Decimal(str(round(rng.lognormvariate(3.5, 1.2), 2))), 'merchant': rng.choice(MERCHANTS),
+            'currency': rng.choice(CURRENCIES), 'risk_score': Decimal(risk_score),
+            'status': 'flagged' if risk_score > 70 else 'approved', 'rules_version': '2026-10-17.1'
+        }
+        if risk_score > 40:
+            row['risk_factors'] = ['velocity', 'new_merchant']
+        rows.append(row)
+    return rows
+
+
+def export(lambda_code, token, **body):
+    response = lambda_code.lambda_handler({'path': '/transactions/export', 'httpMethod': 'POST',
+                                           'headers': {'Authorization': token}, 'body': json.dumps(body)}, None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+def parse_export(export_format, body):
+    text = body.decode('utf-8')
+    if export_format == 'ndjson':
+        return [json.loads(line) for line in text.splitlines()]
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+def expected_rows(rows, since=None, until=None, min_risk=None, max_risk=None, status=None):
+    selected = [row for row in rows
+                if (since is None or row['timestamp'] >= since) and (until is None or row['timestamp'] <= until)
+                and (min_risk is None or row['risk_score'] >= min_risk)
+                and (max_risk is None or row['risk_score'] <= max_risk)
+                and (status is None or row['status'] == status)]
+    return sorted(selected, key=lambda row: (row['timestamp'], row['transaction_id']), reverse=True)
+
+
+def check(lambda_code, rows_count):
+    """Failure messages from the correctness checks"""
+    stubs = install_stubs(lambda_code)
+    s3, table = stubs['s3'], lambda_code.transactions_table
+    now = datetime.datetime.now(datetime.timezone.utc)
+    rows = synthetic_rows(rows_count, USER, now, spacing_seconds=60 * 86400 / rows_count)
+    lambda_code.TRANSACTION_RETENTION_DAYS = 30
+    lambda_code._archive_days = lambda_code.transaction_tiers.ArchiveDays()
+    boundary = lambda_code.transaction_tiers.hot_boundary(30)
+    both_until = (datetime.datetime.fromisoformat(boundary) + datetime.timedelta(days=2)).isoformat()
+    archived = {}
+    for row in rows:
+        if row['timestamp'] >= boundary:
+            table.items[row['transaction_id']] = row
+        if row['timestamp'] < both_until:
+            # Archived under the day it was written; the first days past the boundary are in both tiers
+            archived.setdefault(row['timestamp'][:10], []).append(row)
+    for day, day_rows in archived.items():
+        body = '\n'.join(json.dumps(row, default=str) for row in day_rows) + '\n'
+        s3.put_object(Bucket=lambda_code.S3_BUCKET, Key=f"transactions/{day}/batch-1.ndjson", Body=body)
+    for row in synthetic_rows(200, 'someone-else', now, seed=9):
+        table.items[row['transaction_id']] = row
+
+    token = bearer_token(USER)
+    failures = []
+    lambda_code.EXPORT_PART_BYTES = 5 * 1024 * 1024
+    for export_format in ('csv', 'ndjson'):
+        status_code, body = export(lambda_code, token, format=export_format)
+        if status_code != 200 or not body.get('complete'):
+            return [f"{export_format} export returned {status_code}: {body}"]
+        exported = parse_export(export_format, s3.objects[(lambda_code.S3_BUCKET, body['key'])])
+        expected = expected_rows(rows)
+        if [row['transaction_id'] for row in exported] != [row['transaction_id'] for row in expected]:
+            failures.append(f"{export_format}: {len(exported)} rows exported, expected {len(expected)} in order")
+        elif any(float(got['amount']) != float(want['amount']) or got['merchant'] != want['merchant']
+                 or float(got['risk_score']) != float(want['risk_score']) for got, want in zip(exported, expected)):
+            failures.append(f"{export_format}: exported values differ from the stored ones")
+        print(f"check {export_format}: {body['rows']} rows, {body['bytes'] / 1024 / 1024:.1f} MiB -> {body['url'][:72]}...")
+
+    since = (now - datetime.timedelta(days=45)).isoformat()
+    until = (now - datetime.timedelta(days=10)).isoformat()
+    for filters in ({'since': since, 'until': until}, {'min_risk': 40, 'max_risk': 80}, {'status': 'flagged'},
+                    {'since': since, 'min_risk': 70, 'status': 'flagged'}):
+        _, body = export(lambda_code, token, format='ndjson', **filters)
+        exported = parse_export('ndjson', s3.objects[(lambda_code.S3_BUCKET, body['key'])])
+        expected = expected_rows(rows, **filters)
+        if [row['transaction_id'] for row in exported] != [row['transaction_id'] for row in expected]:
+            failures.append(f"filters {filters}: {len(exported)} rows exported, expected {len(expected)}")
+
+    lambda_code.EXPORT_TIME_BUDGET_SECONDS = 0
+    cursor, pieces, exported = None, 0, []
+    while True:
+        _, body = export(lambda_code, token, format='ndjson', cursor=cursor)
+        exported.extend(parse_export('ndjson', s3.objects[(lambda_code.S3_BUCKET, body['key'])]))
+        pieces += 1
+        cursor = body['next_cursor']
+        if body['complete'] or pieces > rows_count:
+            break
+    lambda_code.EXPORT_TIME_BUDGET_SECONDS = 3600
+    if [row['transaction_id'] for row in exported] != [row['transaction_id'] for row in expected_rows(rows)]:
+        failures.append(f"following cursors over {pieces} requests exported {len(exported)} rows")
+    print(f"check cursor: {pieces} requests, {len(exported)} rows")
+
+    status_code, _ = export(lambda_code, token, format='xlsx')
+    if status_code != 400:
+        failures.append(f"unknown format returned {status_code}")
+    lambda_code.TRANSACTION_RETENTION_DAYS = 0
+    return failures
+
+
+def measure(label, function, rows):
+    """Runs function twice: once timed, once under tracemalloc for its peak allocation"""
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed:7.2f}s  {rows / elapsed:9.0f} rows/s  peak {peak / 1024 / 1024:8.1f} MiB")
+    return result
+
+
+def before(lambda_code, token):
+    """All pages of GET /transactions held in memory, then one CSV string, as the browser built it"""
+    transactions, cursor = [], None
+    while True:
+        params = {'limit': '1000'}
+        if cursor:
+            params['cursor'] = cursor
+        response = lambda_code.lambda_handler({'path': '/transactions', 'httpMethod': 'GET',
+                                               'headers': {'Authorization': token},
+                                               'queryStringParameters': params}, None)
+        page = json.loads(response['body'])
+        transactions.extend(page['transactions'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    lines = ['Transaction ID,Date,Amount,Currency,Merchant,Risk Score,Status']
+    lines.extend(f"{t['transaction_id']},{t['timestamp']},{t['amount']},{t['currency']},\"{t['merchant']}\","
+                 f"{t['risk_score']},{t['status']}" for t in transactions)
+    return len('\n'.join(lines))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--check-rows', type=int, default=50000)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Injected latency per AWS call')
+    parser.add_argument('--skip-before', action='store_true', help='Skip the GET /transactions comparison')
+    args = parser.parse_args()
+
+    lambda_code = load_lambda_module()
+    logging.getLogger().setLevel(logging.WARNING)
+    failures = check(lambda_code, args.check_rows)
+    print(f"checks: {'ok' if not failures else '; '.join(failures)}")
+
+    install_stubs(lambda_code, latency=args.latency_ms / 1000.0)
+    s3 = CountingS3(latency=args.latency_ms / 1000.0)
+    lambda_code.s3_client = s3
+    lambda_code.EXPORT_PART_BYTES = 8 * 1024 * 1024
+    # The profile measures throughput, so one request exports everything
+    lambda_code.EXPORT_TIME_BUDGET_SECONDS = 3600
+    table = lambda_code.transactions_table
+    for row in synthetic_rows(args.rows, USER, datetime.datetime.now(datetime.timezone.utc)):
+        table.items[row['transaction_id']] = row
+    token = bearer_token(USER)
+    print(f"rows={args.rows} latency={args.latency_ms}ms page={lambda_code.EXPORT_QUERY_PAGE_SIZE} "
+          f"part={lambda_code.EXPORT_PART_BYTES // 1024 // 1024} MiB")
+
+    # The stand-in sorts the partition on the first query of a listing; keep that out of the timings
+    export(lambda_code, token, format='ndjson', until='2000-01-01')
+    for export_format in ('csv', 'ndjson'):
+        body = measure(f"export {export_format}", lambda: export(lambda_code, token, format=export_format)[1],
+                       args.rows)
+        size, lines, parts = s3.sizes[body['key']]
+        header = 1 if export_format == 'csv' else 0
+        print(f"{'':<28} {size / 1024 / 1024:7.1f} MiB in {parts} parts")
+        if body['rows'] != args.rows or lines != args.rows + header:
+            failures.append(f"{export_format}: exported {body['rows']} rows ({lines} lines), expected {args.rows}")
+    if not args.skip_before:
+        measure('before (GET pages + CSV)', lambda: before(lambda_code, token), args.rows)
+
+    print('all checks passed' if not failures else '\n'.join(failures))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
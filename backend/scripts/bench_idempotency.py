@@ -0,0 +1,153 @@
+"""Replay concurrent duplicate submissions of POST /transaction against local stand-ins.
+
+Sends --duplicates copies of each of --keys flagged transactions from a
+thread pool, shuffled so copies of the same request overlap. Copies share
+an Idempotency-Key; a copy answered 409 (first attempt still running) is
+retried after a short pause, as a client honouring Retry-After would.
+Then checks that each key produced exactly one DynamoDB row, one S3
+archive object and one alert, that every copy got the same response, and
+that reusing a key for a different body is refused. The same traffic
+without the header is sent first, to show what the keys prevent.
+
+Exits non-zero if any check fails.
+
+Usage: python bench_idempotency.py [--keys 50] [--duplicates 8] [--latency-ms 5] [--workers 32]
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_side_effects import percentile
+from local_stubs import bearer_token, install_stubs, load_lambda_module
+
+USERS = 5
+RETRY_PAUSE = 0.02
+# Low enough that every submitted transaction is flagged and alerts
+RISK_THRESHOLD = 50
+
+
+def build_requests(keys, duplicates, use_keys):
+    tokens = [bearer_token(f"replay-user-{i}") for i in range(USERS)]
+    requests = []
+    for n in range(keys):
+        body = json.dumps({'amount': 9000 + n, 'merchant': 'Casino Royale', 'currency': 'USD'})
+        headers = {'Authorization': tokens[n % USERS]}
+        if use_keys:
+            headers['Idempotency-Key'] = str(uuid.uuid4())
+        event = {'path': '/transaction', 'httpMethod': 'POST', 'headers': headers, 'body': body}
+        requests.extend((n, event) for _ in range(duplicates))
+    random.Random(7).shuffle(requests)
+    return requests
+
+
+def submit(lambda_code, event):
+    """(response, conflicts, seconds); retries 409s like a client would"""
+    conflicts = 0
+    start = time.perf_counter()
+    while True:
+        response = lambda_code.lambda_handler(event, None)
+        if response['statusCode'] != 409:
+            return response, conflicts, time.perf_counter() - start
+        conflicts += 1
+        time.sleep(RETRY_PAUSE)
+
+
+def run(lambda_code, requests, latency, workers):
+    stubs = install_stubs(lambda_code, latency=latency)
+    for i in range(USERS):
+        lambda_code.user_profiles_table.items[f"replay-user-{i}"] = {'user_id': f"replay-user-{i}",
+                                                                     'customRiskThreshold': RISK_THRESHOLD}
+    lambda_code._profile_cache = lambda_code.TTLCache(log_every=0, version=lambda_code.profile_version)
+    alerted = []
+    add = lambda_code.alert_aggregator.add
+
+    def counting_add(record):
+        alerted.append(record['transaction_id'])
+        add(record)
+
+    lambda_code.alert_aggregator.add = counting_add
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda request: (request[0], *submit(lambda_code, request[1])), requests))
+    finally:
+        lambda_code.alert_aggregator.add = add
+    return stubs, results, alerted
+
+
+def summarize(lambda_code, stubs, results, alerted):
+    rows = len(lambda_code.transactions_table.items)
+    archived = len(stubs['s3'].objects)
+    return rows, archived, len(alerted), sum(conflicts for _, _, conflicts, _ in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--keys', type=int, default=50)
+    parser.add_argument('--duplicates', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Injected latency per AWS call')
+    parser.add_argument('--workers', type=int, default=32)
+    args = parser.parse_args()
+
+    lambda_code = load_lambda_module()
+    logging.getLogger().setLevel(logging.CRITICAL)
+    latency = args.latency_ms / 1000.0
+    total = args.keys * args.duplicates
+    print(f"{args.keys} requests x {args.duplicates} concurrent copies, {args.workers} workers, "
+          f"injected latency={args.latency_ms}ms per AWS call")
+    failures = []
+
+    def check(condition, message):
+        if not condition:
+            failures.append(message)
+
+    stubs, results, alerted = run(lambda_code, build_requests(args.keys, args.duplicates, False), latency,
+                                  args.workers)
+    rows, archived, alerts, _ = summarize(lambda_code, stubs, results, alerted)
+    print(f"without Idempotency-Key: {total} submissions -> {rows} rows, {archived} archive objects, {alerts} alerts")
+
+    stubs, results, alerted = run(lambda_code, build_requests(args.keys, args.duplicates, True), latency,
+                                  args.workers)
+    rows, archived, alerts, conflicts = summarize(lambda_code, stubs, results, alerted)
+    print(f"with Idempotency-Key:    {total} submissions -> {rows} rows, {archived} archive objects, {alerts} alerts "
+          f"({conflicts} 409s retried)")
+    check(rows == args.keys, f"expected {args.keys} rows, found {rows}")
+    check(archived == args.keys, f"expected {args.keys} archive objects, found {archived}")
+    check(alerts == args.keys and len(set(alerted)) == args.keys, f"expected {args.keys} alerts, found {alerts}")
+
+    bodies, first, replayed = {}, [], []
+    for n, response, _, seconds in results:
+        check(response['statusCode'] == 200, f"request {n}: status {response['statusCode']}")
+        bodies.setdefault(n, set()).add(response['body'])
+        (replayed if response['headers'].get('Idempotent-Replayed') else first).append(seconds * 1000)
+    check(all(len(copies) == 1 for copies in bodies.values()), 'copies of one request got different responses')
+    check(len(first) == args.keys, f"expected {args.keys} first attempts, found {len(first)}")
+    print(f"first attempts p50={percentile(first, 50):6.2f}ms   replays p50={percentile(replayed, 50):6.2f}ms "
+          f"p99={percentile(replayed, 99):6.2f}ms (including 409 retries)")
+
+    # A retry on a container that never saw the key reads the stored response from the table
+    event = next(event for _, event in build_requests(1, 1, True))
+    lambda_code.lambda_handler(event, None)
+    lambda_code._idempotency_cache = lambda_code.TTLCache(log_every=0)
+    table_calls = lambda_code.idempotency_table.calls
+    replay = lambda_code.lambda_handler(event, None)
+    check(replay['headers'].get('Idempotent-Replayed') == 'true', 'cold-container retry was not replayed')
+    print(f"cold-container replay: {lambda_code.idempotency_table.calls - table_calls} idempotency-table call(s)")
+
+    changed = dict(event, body=json.dumps({'amount': 1, 'merchant': 'Casino Royale', 'currency': 'USD'}))
+    status = lambda_code.lambda_handler(changed, None)['statusCode']
+    check(status == 422, f"key reused for a different body returned {status}, expected 422")
+    print(f"key reused for a different body: {status}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print('all checks passed' if not failures else f"{len(failures)} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
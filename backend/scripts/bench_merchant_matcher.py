@@ -0,0 +1,60 @@
+"""Per-transaction merchant matching latency as the keyword list grows.
+
+Compares the Aho-Corasick KeywordMatcher with the previous linear
+any(keyword in merchant) scan.
+
+Usage: python bench_merchant_matcher.py [--sizes 3,1000,10000,100000,500000]
+"""
+import argparse
+import random
+import sys
+import time
+
+from local_stubs import LAMBDA_DIR
+
+sys.path.insert(0, LAMBDA_DIR)
+from merchant_matcher import KeywordMatcher  # noqa: E402
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ra', 'su', 'to', 'vi', 'ze', 'ba', 'co', 'du', 'fe', 'gi', 'ho', 'ju']
+MERCHANTS = ['amazon marketplace us', 'lucky dragon casino', 'starbucks store 1234', 'shell oil 5521',
+             'uber trip help.uber.com', 'netflix.com', 'crypto exchange ltd', 'walmart supercenter']
+
+
+def synthetic_keywords(count, rng):
+    keywords = {'casino', 'crypto', 'gambling'}
+    while len(keywords) < count:
+        keywords.add(' '.join(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+                              for _ in range(rng.randint(1, 3))))
+    return list(keywords)
+
+
+def per_call_us(fn, merchants):
+    start = time.perf_counter()
+    for merchant in merchants:
+        fn(merchant)
+    return (time.perf_counter() - start) / len(merchants) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='3,1000,10000,100000,500000')
+    parser.add_argument('--lookups', type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    merchants = [rng.choice(MERCHANTS) for _ in range(args.lookups)]
+    print(f"{'keywords':>10} {'build s':>9} {'automaton us/txn':>17} {'linear us/txn':>14}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        keywords = synthetic_keywords(size, rng)
+        start = time.perf_counter()
+        matcher = KeywordMatcher(keywords)
+        build = time.perf_counter() - start
+        automaton = per_call_us(matcher.search, merchants)
+        # The linear scan gets slow quickly; time it on a sample
+        lowered = matcher.keywords
+        linear = per_call_us(lambda m: any(k in m for k in lowered), merchants[:max(10, 2_000_000 // size)])
+        print(f"{len(matcher):>10} {build:>9.2f} {automaton:>17.2f} {linear:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Throughput of the NumPy batch scorer against the scalar calculate_risk_score.
+
+Usage: python bench_risk_batch.py [--rows 1000000]
+"""
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from local_stubs import LAMBDA_DIR
+
+sys.path.insert(0, LAMBDA_DIR)
+from fx_rates import DEFAULT_RATES  # noqa: E402
+from risk_batch import score_batch  # noqa: E402
+from risk_scoring import calculate_risk_score  # noqa: E402
+
+MERCHANTS = ['Amazon', 'Walmart', 'Starbucks', 'Crypto Exchange', 'Lucky Casino', 'Shell', 'Uber',
+             'Online Gambling Ltd', 'Target', 'Netflix']
+
+
+def synthetic_rows(count, seed=11):
+    rng = random.Random(seed)
+    currencies = list(DEFAULT_RATES) + ['XYZ']
+    merchants = MERCHANTS + [f'Store #{i}' for i in range(5000)]
+    amounts = [round(rng.lognormvariate(5, 2), 2) for _ in range(count)]
+    return amounts, [rng.choice(currencies) for _ in range(count)], [rng.choice(merchants) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    amounts, currencies, merchants = synthetic_rows(args.rows)
+
+    start = time.perf_counter()
+    scalar = [calculate_risk_score({'currency': c, 'merchant': m}, a)
+              for a, c, m in zip(amounts, currencies, merchants)]
+    scalar_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = score_batch(amounts, currencies, merchants)
+    vector_elapsed = time.perf_counter() - start
+
+    mismatches = int(np.count_nonzero(np.asarray(scalar, dtype=np.int64) != vectorized))
+    print(f"rows={args.rows}")
+    print(f"scalar loop:  {scalar_elapsed:7.3f}s  {args.rows / scalar_elapsed:12.0f} rows/s")
+    print(f"score_batch:  {vector_elapsed:7.3f}s  {args.rows / vector_elapsed:12.0f} rows/s")
+    print(f"speedup: {scalar_elapsed / vector_elapsed:.1f}x  mismatches: {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Compiled risk rules (risk_rules.json) against the hand-written calculate_risk_score.
+
+Scores --rows synthetic transactions with both, a mix of anonymous ones and
+ones with a profile (budgets, limits, merchant lists, risk tolerance),
+spend counters and amount statistics, and checks that every score, risk
+factor and matched keyword agrees. Prints throughput, the compile time and
+the hit count of each rule.
+
+Exits non-zero if any result differs.
+
+Usage: python bench_risk_rules.py [--rows 200000]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from local_stubs import LAMBDA_DIR
+
+sys.path.insert(0, LAMBDA_DIR)
+import risk_rules  # noqa: E402
+from fx_rates import DEFAULT_RATES  # noqa: E402
+from risk_scoring import calculate_risk_score, rules, score_transaction  # noqa: E402
+
+MERCHANTS = ['Amazon', 'Walmart', 'Starbucks', 'Crypto Exchange', 'Lucky Casino', 'Shell', 'Uber',
+             'Online Gambling Ltd', 'Target', 'Netflix', 'Corner Shop']
+DETAIL_KEYS = ('merchant_keyword', 'blocked_merchant', 'trusted_merchant')
+
+
+def synthetic_profile(rng):
+    if rng.random() < 0.3:
+        return None
+    profile = {'monthlyBudget': rng.choice([0, 500, 2000, 5000]), 'dailyLimit': rng.choice([0, 100, 1000]),
+               'riskTolerance': rng.choice(['low', 'medium', 'high'])}
+    if rng.random() < 0.5:
+        profile['velocityLimit'] = rng.choice([2, 5, 10])
+    if rng.random() < 0.4:
+        profile['blockedMerchants'] = rng.sample(['shell', 'uber', 'casino'], 2)
+        profile['trustedMerchants'] = rng.sample(['amazon', 'target', 'crypto'], 2)
+    return profile
+
+
+def synthetic_rows(count, seed=13):
+    rng = random.Random(seed)
+    currencies = list(DEFAULT_RATES)
+    rows = []
+    for _ in range(count):
+        transaction = {'merchant': rng.choice(MERCHANTS), 'currency': rng.choice(currencies)}
+        amount = round(rng.lognormvariate(5, 2), 2)
+        spend = stats = None
+        if rng.random() < 0.7:
+            spend = {'day_usd': rng.uniform(0, 1500), 'month_usd': rng.uniform(0, 6000),
+                     'velocity_count': rng.randrange(1, 12)}
+        if rng.random() < 0.7:
+            stats = {'history': rng.randrange(0, 50), 'merchant_history': rng.randrange(0, 3),
+                     'amount_z': rng.choice([None, rng.gauss(0, 2.5)])}
+        rows.append((transaction, amount, synthetic_profile(rng), spend, stats))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200_000)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows)
+    with open(risk_rules.DEFAULT_RULES_PATH, encoding='utf-8') as f:
+        document = json.load(f)
+    start = time.perf_counter()
+    for _ in range(100):
+        risk_rules.compile_rules(document, matchers={'high_risk': rules.compile_options['matchers']['high_risk']})
+    compile_ms = (time.perf_counter() - start) * 10
+
+    # Warm both paths (keyword automata, rate table, per-profile matchers)
+    for transaction, amount, profile, spend, stats in rows[:1000]:
+        calculate_risk_score(transaction, amount, profile=profile, details={}, spend=spend, stats=stats)
+        score_transaction(transaction, amount, profile=profile, spend=spend, stats=stats)
+    rule_set = rules.get()
+    rule_set.log_every = 0
+    rule_set.hits = [0] * len(rule_set)
+
+    start = time.perf_counter()
+    expected = []
+    for transaction, amount, profile, spend, stats in rows:
+        details = {}
+        score = calculate_risk_score(transaction, amount, profile=profile, details=details, spend=spend, stats=stats)
+        expected.append((score, details))
+    reference_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = [score_transaction(transaction, amount, profile=profile, spend=spend, stats=stats)
+              for transaction, amount, profile, spend, stats in rows]
+    compiled_elapsed = time.perf_counter() - start
+
+    mismatches = 0
+    for (score, details), (rule_score, rule_details) in zip(expected, actual):
+        if score != rule_score or details['risk_factors'] != rule_details['risk_factors'] or any(
+                details[key] != rule_details[key] for key in DETAIL_KEYS):
+            mismatches += 1
+
+    print(f"rows={args.rows}  rules={len(rule_set)} (version {rule_set.version}), compiled in {compile_ms:.2f}ms")
+    print(f"calculate_risk_score: {reference_elapsed:7.3f}s  {args.rows / reference_elapsed:10.0f} rows/s  "
+          f"{reference_elapsed / args.rows * 1e6:6.2f}us/row")
+    print(f"compiled rules:       {compiled_elapsed:7.3f}s  {args.rows / compiled_elapsed:10.0f} rows/s  "
+          f"{compiled_elapsed / args.rows * 1e6:6.2f}us/row")
+    print('rule hits: ' + ', '.join(f"{rule_id}={count}" for rule_id, count in rule_set.hit_counts().items()))
+    print(f"mismatches: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Compare POST /transaction latency with side effects run inline vs. queued.
+
+In sync mode each request also performs the analytics rollup updates, the
+S3 archive write and (for flagged transactions) the SNS publish. In async
+mode those become one SQS send, and the queue is then drained through
+side_effects_handler in consumer-sized batches.
+
+Usage: python bench_side_effects.py [--requests 500] [--latency-ms 5] [--consumer-batch 100]
+"""
+import argparse
+import json
+import logging
+import time
+
+from bench_batch_ingest import synthetic_transactions
+from local_stubs import bearer_token, install_stubs, load_lambda_module, total_calls
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100.0 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def run_requests(lambda_code, transactions, headers):
+    latencies = []
+    for transaction in transactions:
+        start = time.perf_counter()
+        lambda_code.lambda_handler({'path': '/transaction', 'httpMethod': 'POST', 'headers': headers,
+                                    'body': json.dumps(transaction)}, None)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(label, latencies, calls, count):
+    print(f"{label:<6} p50={percentile(latencies, 50):7.2f}ms  p95={percentile(latencies, 95):7.2f}ms  "
+          f"p99={percentile(latencies, 99):7.2f}ms  {calls / count:5.2f} AWS calls/request")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Injected latency per AWS call')
+    parser.add_argument('--consumer-batch', type=int, default=100, help='SQS batch size for the consumer')
+    args = parser.parse_args()
+
+    lambda_code = load_lambda_module()
+    logging.getLogger().setLevel(logging.WARNING)
+    transactions = synthetic_transactions(args.requests)
+    headers = {'Authorization': bearer_token('bench-user')}
+    latency = args.latency_ms / 1000.0
+
+    lambda_code.SIDE_EFFECTS_MODE = 'sync'
+    stubs = install_stubs(lambda_code, latency=latency)
+    sync_latencies = run_requests(lambda_code, transactions, headers)
+    sync_calls = total_calls(stubs)
+
+    lambda_code.SIDE_EFFECTS_MODE = 'async'
+    lambda_code.SIDE_EFFECTS_QUEUE_URL = 'local://side-effects'
+    stubs = install_stubs(lambda_code, latency=latency)
+    async_latencies = run_requests(lambda_code, transactions, headers)
+    async_calls = total_calls(stubs)
+
+    sqs = stubs['sqs']
+    consumer_start = time.perf_counter()
+    invocations = 0
+    while sqs.messages:
+        lambda_code.side_effects_handler(sqs.receive_event(args.consumer_batch), None)
+        invocations += 1
+    consumer_elapsed = time.perf_counter() - consumer_start
+    consumer_calls = total_calls(stubs) - async_calls
+
+    print(f"requests={args.requests} injected latency={args.latency_ms}ms per AWS call")
+    report('sync', sync_latencies, sync_calls, args.requests)
+    report('async', async_latencies, async_calls, args.requests)
+    print(f"consumer: {invocations} invocations of up to {args.consumer_batch} messages, "
+          f"{consumer_elapsed:.3f}s, {consumer_calls / args.requests:.2f} AWS calls/transaction, "
+          f"{stubs['s3'].calls} S3 objects, {stubs['sns'].calls} SNS messages")
+    print(f"p99 reduction: {percentile(sync_latencies, 99) / percentile(async_latencies, 99):.1f}x")
+
+
+if __name__ == '__main__':
+    main()
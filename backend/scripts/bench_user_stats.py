@@ -0,0 +1,73 @@
+"""Per-transaction cost of the streaming user stats against the length of the user's history.
+
+Seeds the user-stats table with a user who already has --histories
+transactions, then times POST /transaction for that user with injected
+latency on every AWS call, and reports DynamoDB calls per transaction for
+the stats alone. A cold container (empty stats cache) is measured too.
+
+Usage: python bench_user_stats.py [--requests 200] [--latency-ms 5] [--histories 0,100,10000,1000000]
+"""
+import argparse
+import json
+import logging
+import random
+import time
+
+from bench_side_effects import percentile
+from local_stubs import bearer_token, install_stubs, load_lambda_module
+
+
+def seed(lambda_code, user_id, history, merchant):
+    stats = lambda_code.user_stats
+    rng = random.Random(3)
+    state = stats.new_state()
+    merchant_state = stats.new_state()
+    at = time.time() - history * 3600
+    for _ in range(history):
+        value = stats.amount_value(rng.lognormvariate(3, 0.5))
+        at += rng.expovariate(1 / 3600)
+        state = stats.observe(state, value, at)
+        merchant_state = stats.observe(merchant_state, value, at)
+    table = lambda_code.user_stats_table
+    if history:
+        table.put_item(Item=stats.to_item(user_id, stats.USER_KEY, state))
+        table.put_item(Item=stats.to_item(user_id, stats.merchant_key(merchant), merchant_state))
+
+
+def run(lambda_code, history, requests, latency, cold):
+    install_stubs(lambda_code, latency=latency)
+    seed(lambda_code, 'bench-user', history, 'Starbucks')
+    table = lambda_code.user_stats_table
+    event = {'path': '/transaction', 'httpMethod': 'POST', 'headers': {'Authorization': bearer_token('bench-user')},
+             'body': json.dumps({'amount': 25, 'merchant': 'Starbucks', 'currency': 'USD'})}
+    timings = []
+    calls_before = table.calls
+    for _ in range(requests):
+        if cold:
+            lambda_code._user_stats_cache = lambda_code.TTLCache(log_every=0)
+        start = time.perf_counter()
+        response = lambda_code.lambda_handler(event, None)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response['statusCode'] == 200, response
+    return timings, (table.calls - calls_before) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Injected latency per AWS call')
+    parser.add_argument('--histories', default='0,100,10000,1000000')
+    args = parser.parse_args()
+
+    lambda_code = load_lambda_module()
+    logging.getLogger().setLevel(logging.WARNING)
+    print(f"requests={args.requests} injected latency={args.latency_ms}ms per AWS call")
+    for history in (int(value) for value in args.histories.split(',')):
+        for label, cold in (('warm', False), ('cold', True)):
+            timings, calls = run(lambda_code, history, args.requests, args.latency_ms / 1000.0, cold)
+            print(f"history={history:<8} {label}  POST /transaction p50={percentile(timings, 50):6.2f}ms "
+                  f"p99={percentile(timings, 99):6.2f}ms  {calls:4.2f} user-stats calls/transaction")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Compact one or more days of the transaction archive into Parquet.
+
+Usage:
+  python compact_archive.py --bucket BUCKET --date 2026-10-16 [--date ...] [--delete-sources]
+  python compact_archive.py --root ./archive --date 2026-10-16     # local directory laid out like the bucket
+"""
+import argparse
+import json
+import logging
+import sys
+
+from local_stubs import LAMBDA_DIR
+
+sys.path.insert(0, LAMBDA_DIR)
+import archive_compaction  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--bucket', help='S3 bucket holding transactions/<date>/...')
+    source.add_argument('--root', help='Local directory holding transactions/<date>/...')
+    parser.add_argument('--date', action='append', required=True, help='Day to compact (YYYY-MM-DD); repeatable')
+    parser.add_argument('--objects-per-part', type=int, default=archive_compaction.DEFAULT_OBJECTS_PER_PART)
+    parser.add_argument('--row-group-rows', type=int, default=archive_compaction.DEFAULT_ROW_GROUP_ROWS)
+    parser.add_argument('--delete-sources', action='store_true', help='Delete the source objects once compacted')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if args.bucket:
+        import boto3
+        store = archive_compaction.S3Store(boto3.client('s3'), args.bucket)
+    else:
+        store = archive_compaction.LocalStore(args.root)
+    for day in args.date:
+        manifest = archive_compaction.compact_day(store, day, objects_per_part=args.objects_per_part,
+                                                  delete_sources=args.delete_sources,
+                                                  row_group_rows=args.row_group_rows)
+        print(json.dumps({'date': day, 'rows': manifest['rows'] if manifest else 0,
+                          'parts': len(manifest['parts']) if manifest else 0}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+"""Replay a mix of API requests against lambda_handler at a target rate, locally.
+
+Requests are built like the dashboard's (submit, list, profile get/put,
+login, plus optional batch and analytics calls) for --users seeded users,
+turned into API Gateway events by local_api.to_event and run against the
+local_stubs stand-ins with injected latency per AWS call. By default the
+handler is called in-process; --http sends real HTTP requests to a
+local_api server started on a free port.
+
+Arrivals are scheduled at a fixed rate (open loop). Latency is measured
+from each request's scheduled start, so time spent waiting for one of the
+--concurrency workers counts, as it would for a client. All workers share
+one interpreter, so CPU-bound work contends for the GIL where separate
+Lambda containers would not; injected latency does not.
+
+Reports throughput and p50/p95/p99 per route. --out writes the results as
+JSON; --baseline compares them with an earlier file and fails the run if
+a route's p95 or p99 grew by more than --tolerance (and by at least
+--min-delta-ms), or its error rate rose. p95 is only compared for routes
+with 200+ requests in both runs and p99 for 1,000+.
+
+Usage:
+  python load_test.py --rps 200 --duration 20 --out baselines/load_test.json
+  python load_test.py --rps 200 --duration 20 --baseline baselines/load_test.json
+  python load_test.py --mix submit=70,list=20,login=10 --latency s3=20 --http
+"""
+import argparse
+import datetime
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from bench_side_effects import percentile
+from local_api import from_response, parse_latencies, serve, to_event
+from local_stubs import bearer_token, install_stubs, load_lambda_module
+
+DEFAULT_MIX = 'submit=50,list=20,profile_get=15,profile_put=5,login=10'
+PASSWORD = 'load-test-password'
+MERCHANTS = ['Amazon', 'Walmart', 'Starbucks', 'Shell', 'Uber', 'Netflix', 'Target', 'Lucky Casino',
+             'Crypto Exchange', 'Corner Shop']
+CURRENCIES = ['USD', 'USD', 'USD', 'EUR', 'GBP', 'GHS']
+# A percentile is only compared when both runs have enough samples beyond it to be stable
+MIN_SAMPLES = {'p95_ms': 200, 'p99_ms': 1000}
+
+
+class Users:
+    """Seeded users with their tokens, as a signed-in dashboard would hold them"""
+
+    def __init__(self, lambda_code, stubs, count):
+        self.names = [f"load-user-{i}" for i in range(count)]
+        self.tokens = {}
+        self.csrf = {}
+        for name in self.names:
+            lambda_code.user_profiles_table.items[name] = {
+                'user_id': name, 'monthlyBudget': 5000, 'dailyLimit': 1000, 'riskTolerance': 'medium',
+                'trustedMerchants': ['Amazon'], 'blockedMerchants': ['Crypto Exchange'], 'version': 1
+            }
+            self.tokens[name] = bearer_token(name)
+            # Signed now, so logins during the run don't spend CPU on RSA in this process
+            stubs['cognito'].add_user(name, PASSWORD, token=self.tokens[name])
+            response = lambda_code.lambda_handler(
+                to_event('GET', '/csrf-token', {'Authorization': self.tokens[name]}), None)
+            self.csrf[name] = json.loads(response['body'])['token']
+        response = lambda_code.lambda_handler(to_event('GET', '/csrf-token'), None)
+        self.anonymous_csrf = json.loads(response['body'])['token']
+
+
+def transaction_body(rng):
+    return {'amount': round(rng.lognormvariate(3.5, 1.2), 2), 'merchant': rng.choice(MERCHANTS),
+            'currency': rng.choice(CURRENCIES)}
+
+
+def submit(users, rng):
+    user = rng.choice(users.names)
+    headers = {'Authorization': users.tokens[user], 'Content-Type': 'application/json',
+               'X-CSRF-Token': users.csrf[user], 'Idempotency-Key': str(uuid.uuid4())}
+    return 'POST', '/transaction', headers, json.dumps(transaction_body(rng))
+
+
+def batch(users, rng):
+    user = rng.choice(users.names)
+    headers = {'Authorization': users.tokens[user], 'Content-Type': 'application/json',
+               'Idempotency-Key': str(uuid.uuid4())}
+    return 'POST', '/transactions/batch', headers, json.dumps(
+        {'transactions': [transaction_body(rng) for _ in range(20)]})
+
+
+def list_transactions(users, rng):
+    return 'GET', '/transactions?limit=50', {'Authorization': users.tokens[rng.choice(users.names)]}, None
+
+
+def analytics(users, rng):
+    return 'GET', '/analytics?days=30', {'Authorization': users.tokens[rng.choice(users.names)]}, None
+
+
+def profile_get(users, rng):
+    return 'GET', '/user-profile', {'Authorization': users.tokens[rng.choice(users.names)]}, None
+
+
+def profile_put(users, rng):
+    headers = {'Authorization': users.tokens[rng.choice(users.names)], 'Content-Type': 'application/json'}
+    profile = {'monthlyBudget': rng.choice([2000, 5000, 8000]), 'dailyLimit': rng.choice([500, 1000]),
+               'riskTolerance': rng.choice(['low', 'medium', 'high']), 'trustedMerchants': ['Amazon'],
+               'blockedMerchants': ['Crypto Exchange']}
+    return 'PUT', '/user-profile', headers, json.dumps({'profile': profile})
+
+
+def login(users, rng):
+    headers = {'Content-Type': 'application/json', 'X-CSRF-Token': users.anonymous_csrf}
+    return 'POST', '/login', headers, json.dumps({'username': rng.choice(users.names), 'password': PASSWORD})
+
+
+SCENARIOS = {
+    'submit': submit, 'batch': batch, 'list': list_transactions, 'analytics': analytics,
+    'profile_get': profile_get, 'profile_put': profile_put, 'login': login,
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in filter(None, text.split(',')):
+        name, _, weight = part.partition('=')
+        if name.strip() not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name!r}; expected one of {', '.join(SCENARIOS)}")
+        mix[name.strip()] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError('The mix needs at least one scenario with a positive weight')
+    return mix
+
+
+def schedule(mix, count, seed):
+    """count (method, target, headers, body) builders drawn from the mix, in arrival order"""
+    rng = random.Random(seed)
+    names = list(mix)
+    return [SCENARIOS[name] for name in rng.choices(names, weights=[mix[name] for name in names], k=count)], rng
+
+
+class InProcessClient:
+    def __init__(self, lambda_handler):
+        self.lambda_handler = lambda_handler
+
+    def send(self, method, target, headers, body):
+        return from_response(self.lambda_handler(to_event(method, target, headers, body), None))[0]
+
+
+class HTTPClient:
+    """One keep-alive connection per worker thread to a local_api server"""
+
+    def __init__(self, port):
+        self.port = port
+        self._local = threading.local()
+
+    def send(self, method, target, headers, body):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection('127.0.0.1', self.port)
+        connection.request(method, target, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+
+
+def run(client, requests, rps, pool):
+    """[(route, status, latency_s)] with latency measured from each request's scheduled start"""
+    results = []
+    lock = threading.Lock()
+
+    def call(request, scheduled):
+        method, target, headers, body = request
+        try:
+            status = client.send(method, target, headers, body)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"{method} {target} failed: {str(e)}")
+            status = 599
+        elapsed = time.perf_counter() - scheduled
+        with lock:
+            results.append((f"{method} {target.split('?')[0]}", status, elapsed))
+
+    start = time.perf_counter()
+    futures = []
+    for index, request in enumerate(requests):
+        scheduled = start + index / rps
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        futures.append(pool.submit(call, request, scheduled))
+    wait(futures)
+    return results, time.perf_counter() - start
+
+
+def summarize(samples, elapsed):
+    latencies = [latency * 1000 for _, _, latency in samples]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, status, _ in samples if status >= 500),
+        'client_errors': sum(1 for _, status, _ in samples if 400 <= status < 500),
+        'throughput_rps': round(len(samples) / elapsed, 1),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'max_ms': round(max(latencies), 2),
+    }
+
+
+def report(results, elapsed):
+    by_route = {}
+    for sample in results:
+        by_route.setdefault(sample[0], []).append(sample)
+    return summarize(results, elapsed), {route: summarize(samples, elapsed) for route, samples in sorted(by_route.items())}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Regressions of results against baseline, as messages"""
+    regressions = []
+    for route, current in results['routes'].items():
+        previous = baseline.get('routes', {}).get(route)
+        if not previous:
+            continue
+        for metric, min_samples in (('p95_ms', MIN_SAMPLES['p95_ms']), ('p99_ms', MIN_SAMPLES['p99_ms'])):
+            if min(current['requests'], previous['requests']) < min_samples:
+                continue
+            limit = previous[metric] * (1 + tolerance)
+            if current[metric] > limit and current[metric] - previous[metric] >= min_delta_ms:
+                regressions.append(f"{route} {metric}: {current[metric]:.2f}ms vs {previous[metric]:.2f}ms baseline "
+                                   f"(+{(current[metric] / previous[metric] - 1) * 100:.0f}%)")
+        if current['errors'] / current['requests'] > previous['errors'] / previous['requests']:
+            regressions.append(f"{route} errors: {current['errors']}/{current['requests']} vs "
+                               f"{previous['errors']}/{previous['requests']} baseline")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rps', type=float, default=200.0, help='Target arrival rate')
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds of measured load')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Seconds of unmeasured load first')
+    parser.add_argument('--concurrency', type=int, default=64, help='Requests in flight at most')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"Scenario weights (default {DEFAULT_MIX}); "
+                                                            f"scenarios: {', '.join(SCENARIOS)}")
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Injected latency per AWS call')
+    parser.add_argument('--latency', help='Per-service overrides in ms, e.g. s3=20,cognito=40')
+    parser.add_argument('--http', action='store_true', help='Send real HTTP requests to a local_api server')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--out', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Compare with an earlier --out file; exits 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p95/p99 growth over the baseline')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='Ignore p95/p99 growth smaller than this')
+    args = parser.parse_args()
+    try:
+        mix = parse_mix(args.mix)
+        latency = parse_latencies(args.latency_ms, args.latency)
+    except ValueError as e:
+        parser.error(str(e))
+
+    lambda_code = load_lambda_module()
+    logging.getLogger().setLevel(logging.CRITICAL)
+    stubs = install_stubs(lambda_code, latency=latency)
+    users = Users(lambda_code, stubs, args.users)
+
+    server = None
+    if args.http:
+        server = serve(lambda_code.lambda_handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        client = HTTPClient(server.server_address[1])
+    else:
+        client = InProcessClient(lambda_code.lambda_handler)
+
+    warmup_count, count = int(args.warmup * args.rps), int(args.duration * args.rps)
+    builders, rng = schedule(mix, warmup_count + count, args.seed)
+    requests = [builder(users, rng) for builder in builders]
+    print(f"{'HTTP' if args.http else 'in-process'}: {args.rps:g} req/s for {args.duration:g}s "
+          f"(+{args.warmup:g}s warm-up), {args.concurrency} workers, {args.users} users, "
+          f"latency {', '.join(f'{k}={v * 1000:g}ms' for k, v in latency.items())}")
+    # One pool for both phases, so its threads exist before measuring starts
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        if warmup_count:
+            run(client, requests[:warmup_count], args.rps, pool)
+        results, elapsed = run(client, requests[warmup_count:], args.rps, pool)
+    if server:
+        server.shutdown()
+
+    overall, routes = report(results, elapsed)
+    print(f"{'route':<26}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for route, summary in [*routes.items(), ('all', overall)]:
+        print(f"{route:<26}{summary['requests']:>9}{summary['errors']:>8}{summary['throughput_rps']:>9.1f}"
+              f"{summary['p50_ms']:>8.2f}ms{summary['p95_ms']:>7.2f}ms{summary['p99_ms']:>7.2f}ms"
+              f"{summary['max_ms']:>7.1f}ms")
+    if overall['throughput_rps'] < args.rps * 0.95:
+        print(f"warning: reached {overall['throughput_rps']:.1f} of {args.rps:g} req/s; "
+              f"the harness or --concurrency is the bottleneck")
+
+    document = {
+        'recorded_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {'rps': args.rps, 'duration': args.duration, 'concurrency': args.concurrency, 'users': args.users,
+                   'mix': mix, 'latency_ms': {k: v * 1000 for k, v in latency.items()},
+                   'transport': 'http' if args.http else 'in-process', 'seed': args.seed},
+        'overall': overall,
+        'routes': routes,
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(document, f, indent=2)
+            f.write('\n')
+        print(f"results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config') != document['config']:
+            print('warning: the baseline was recorded with a different configuration')
+        regressions = compare(document, baseline, args.tolerance, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        print(f"{len(regressions)} regression(s) against {args.baseline} (recorded {baseline.get('recorded_at')}, "
+              f"commit {baseline.get('git_commit')})")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""Serve lambda_handler over HTTP on localhost, against the local_stubs stand-ins.
+
+Each HTTP request is turned into the API Gateway REST proxy event the
+deployed function receives (path, httpMethod, headers, query string
+parameters, body, requestContext), and the handler's response is written
+back as the HTTP response. load_test.py uses the same to_event() to call
+the handler in-process, or drives this server over real sockets with --http.
+
+AWS calls go to in-memory DynamoDB/S3/SNS/SQS/Cognito stand-ins that sleep
+--latency-ms per call; --latency overrides it per service.
+
+Usage:
+  python local_api.py --port 3000 --latency-ms 5
+  python local_api.py --port 3000 --latency-ms 5 --latency s3=20,cognito=40
+  curl -X POST localhost:3000/transaction -d '{"amount": 20, "merchant": "Amazon"}'
+"""
+import argparse
+import base64
+import logging
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from local_stubs import SERVICES, install_stubs, load_lambda_module
+
+STAGE = 'local'
+
+
+def to_event(method, target, headers=None, body=None, source_ip='127.0.0.1'):
+    """API Gateway REST proxy event for an HTTP request; target is the path plus query string"""
+    url = urlsplit(target)
+    query = parse_qs(url.query, keep_blank_values=True)
+    headers = dict(headers or {})
+    is_base64 = False
+    if isinstance(body, bytes):
+        try:
+            body = body.decode('utf-8')
+        except UnicodeDecodeError:
+            body, is_base64 = base64.b64encode(body).decode('ascii'), True
+    path = url.path or '/'
+    return {
+        'resource': '/{proxy+}',
+        'path': path,
+        'httpMethod': method,
+        'headers': headers or None,
+        'multiValueHeaders': {name: [value] for name, value in headers.items()} or None,
+        'queryStringParameters': {name: values[-1] for name, values in query.items()} or None,
+        'multiValueQueryStringParameters': query or None,
+        'pathParameters': {'proxy': path.lstrip('/')},
+        'stageVariables': None,
+        'requestContext': {
+            'resourcePath': '/{proxy+}',
+            'httpMethod': method,
+            'path': f"/{STAGE}{path}",
+            'stage': STAGE,
+            'requestId': str(uuid.uuid4()),
+            'requestTimeEpoch': int(time.time() * 1000),
+            'identity': {'sourceIp': source_ip, 'userAgent': headers.get('User-Agent')},
+        },
+        'body': body or None,
+        'isBase64Encoded': is_base64,
+    }
+
+
+def from_response(response):
+    """(status, headers, body bytes) from a proxy integration response"""
+    body = response.get('body') or ''
+    if response.get('isBase64Encoded'):
+        payload = base64.b64decode(body)
+    else:
+        payload = body.encode('utf-8')
+    headers = dict(response.get('headers') or {})
+    for name, values in (response.get('multiValueHeaders') or {}).items():
+        headers[name] = ', '.join(str(value) for value in values)
+    return response.get('statusCode', 502), headers, payload
+
+
+def handler_class(lambda_handler):
+    class LambdaHTTPHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def _handle(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else None
+            event = to_event(self.command, self.path, dict(self.headers.items()), body, self.client_address[0])
+            try:
+                status, headers, payload = from_response(lambda_handler(event, None))
+            except Exception:
+                # What API Gateway returns when the function itself fails
+                logging.exception('lambda_handler raised')
+                status, headers, payload = 502, {'Content-Type': 'application/json'}, b'{"message": "Internal server error"}'
+            self.send_response(status)
+            for name, value in headers.items():
+                if name.lower() not in ('content-length', 'connection'):
+                    self.send_header(name, str(value))
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = do_POST = do_PUT = do_DELETE = do_PATCH = do_OPTIONS = _handle
+
+        def log_message(self, format, *args):
+            pass
+
+    return LambdaHTTPHandler
+
+
+def serve(lambda_handler, host='127.0.0.1', port=0):
+    """Started-but-not-serving HTTP server for lambda_handler; port 0 picks a free port"""
+    server = ThreadingHTTPServer((host, port), handler_class(lambda_handler))
+    server.daemon_threads = True
+    return server
+
+
+def parse_latencies(latency_ms, overrides):
+    """install_stubs latency from --latency-ms and 'service=ms,...' overrides"""
+    latency = {'default': latency_ms / 1000.0}
+    for part in filter(None, (overrides or '').split(',')):
+        service, _, value = part.partition('=')
+        if service.strip() not in SERVICES:
+            raise ValueError(f"Unknown service {service!r}; expected one of {', '.join(SERVICES)}")
+        latency[service.strip()] = float(value) / 1000.0
+    return latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Injected latency per AWS call')
+    parser.add_argument('--latency', help='Per-service overrides in ms, e.g. s3=20,cognito=40')
+    args = parser.parse_args()
+    try:
+        latency = parse_latencies(args.latency_ms, args.latency)
+    except ValueError as e:
+        parser.error(str(e))
+
+    lambda_code = load_lambda_module()
+    install_stubs(lambda_code, latency=latency)
+    server = serve(lambda_code.lambda_handler, args.host, args.port)
+    print(f"lambda_handler on http://{args.host}:{server.server_address[1]} (stand-ins: {latency})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,722 @@
+"""In-memory stand-ins for the AWS clients used by lambda_code.py.
+
+Each stub sleeps for a configurable latency per call so benchmarks can
+approximate network round trips without deploying anything.
+"""
+import base64
+import io
+import os
+import re
+import sys
+import threading
+import time
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules', 'lambda')
+
+
+class _Stub:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def _call(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+def _evaluate(condition, item):
+    """Evaluate a boto3.dynamodb.conditions expression against a plain item."""
+    expression = condition.get_expression()
+    operator, values = expression['operator'], expression['values']
+    if operator == 'AND':
+        return _evaluate(values[0], item) and _evaluate(values[1], item)
+    if operator == 'OR':
+        return _evaluate(values[0], item) or _evaluate(values[1], item)
+    if operator == 'NOT':
+        return not _evaluate(values[0], item)
+    if operator == 'attribute_exists':
+        return values[0].name in item
+    if operator == 'attribute_not_exists':
+        return values[0].name not in item
+    value = item.get(values[0].name)
+    if value is None:
+        return False
+    if operator == '=':
+        return value == values[1]
+    if operator == '<>':
+        return value != values[1]
+    if operator == '<':
+        return value < values[1]
+    if operator == '<=':
+        return value <= values[1]
+    if operator == '>':
+        return value > values[1]
+    if operator == '>=':
+        return value >= values[1]
+    if operator == 'BETWEEN':
+        return values[1] <= value <= values[2]
+    if operator == 'begins_with':
+        return str(value).startswith(values[1])
+    raise NotImplementedError(operator)
+
+
+def _hash_equality(condition, attr):
+    """Value that a key condition requires attr to equal, if it has an attr = value term."""
+    expression = condition.get_expression()
+    operator, values = expression['operator'], expression['values']
+    if operator == 'AND':
+        found = _hash_equality(values[0], attr)
+        return found if found is not None else _hash_equality(values[1], attr)
+    if operator == '=' and getattr(values[0], 'name', None) == attr:
+        return values[1]
+    return None
+
+
+def attribute_value(value):
+    """Low-level DynamoDB attribute value for a plain Python value, as a stream record carries it."""
+    if value is None:
+        return {'NULL': True}
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if isinstance(value, str):
+        return {'S': value}
+    if isinstance(value, (bytes, bytearray)):
+        return {'B': base64.b64encode(bytes(value)).decode('ascii')}
+    if isinstance(value, dict):
+        return {'M': {name: attribute_value(item) for name, item in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {'L': [attribute_value(item) for item in value]}
+    if isinstance(value, (set, frozenset)):
+        if all(isinstance(item, str) for item in value):
+            return {'SS': sorted(value)}
+        return {'NS': sorted(str(item) for item in value)}
+    # int, float, Decimal
+    return {'N': str(value)}
+
+
+def stream_record(event_name, key, old=None, new=None, ttl=False, sequence=0):
+    """DynamoDB Streams record (NEW_AND_OLD_IMAGES) as Lambda receives it; ttl marks a TTL deletion."""
+    data = {'Keys': {name: attribute_value(value) for name, value in key.items()},
+            'SequenceNumber': str(sequence), 'StreamViewType': 'NEW_AND_OLD_IMAGES'}
+    if old is not None:
+        data['OldImage'] = {name: attribute_value(value) for name, value in old.items()}
+    if new is not None:
+        data['NewImage'] = {name: attribute_value(value) for name, value in new.items()}
+    record = {'eventID': str(sequence), 'eventName': event_name, 'eventSource': 'aws:dynamodb',
+              'awsRegion': 'us-east-1', 'dynamodb': data}
+    if ttl:
+        record['userIdentity'] = {'type': 'Service', 'principalId': 'dynamodb.amazonaws.com'}
+    return record
+
+
+def _condition_key(condition):
+    """Hashable form of a boto3.dynamodb.conditions expression, to recognise a repeated query."""
+    expression = condition.get_expression()
+    parts = [expression['operator']]
+    for value in expression['values']:
+        if hasattr(value, 'get_expression'):
+            parts.append(_condition_key(value))
+        elif hasattr(value, 'name'):
+            parts.append(('attr', value.name))
+        elif isinstance(value, (list, set)):
+            parts.append(tuple(value))
+        else:
+            parts.append(value)
+    return tuple(parts)
+
+
+def _project(item, kwargs):
+    projection = kwargs.get('ProjectionExpression')
+    if not projection:
+        return dict(item)
+    names = kwargs.get('ExpressionAttributeNames', {})
+    fields = [names.get(part.strip(), part.strip()) for part in projection.split(',')]
+    return {field: item[field] for field in fields if field in item}
+
+
+class FakeTable(_Stub):
+    """Table keyed by hash_key (and range_key); indexes maps index name to (hash, range) attributes."""
+
+    def __init__(self, name, hash_key='transaction_id', latency=0.0, indexes=None, range_key=None):
+        super().__init__(latency)
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.indexes = indexes if indexes is not None else {'UserTimestampIndex': ('user_id', 'timestamp')}
+        self.items = {}
+        # Conditional writes check and write atomically, as DynamoDB does, when called from several threads
+        self._lock = threading.Lock()
+        # A list here collects a stream record per write; see stream_event()
+        self.stream = None
+        # Bumped on every write; query() reuses its last result until then, so paging stays linear
+        self._version = 0
+        self._last_query = None
+
+    def _record_change(self, old, new):
+        self._version += 1
+        if self.stream is None or old == new:
+            return
+        event_name = 'REMOVE' if new is None else 'INSERT' if old is None else 'MODIFY'
+        image = new if new is not None else old
+        key = {attr: image[attr] for attr in (self.hash_key, self.range_key) if attr}
+        self.stream.append(stream_record(event_name, key, old, new, sequence=len(self.stream) + 1))
+
+    def stream_event(self, max_records=1000):
+        """Pop up to max_records stream records in the shape DynamoDB Streams delivers to Lambda."""
+        with self._lock:
+            batch, self.stream[:] = self.stream[:max_records], self.stream[max_records:]
+        return {'Records': batch}
+
+    def _key(self, item):
+        if self.range_key:
+            return (item[self.hash_key], item[self.range_key])
+        return item[self.hash_key]
+
+    def _page(self, rows, kwargs, key_attrs, positions=None):
+        start = kwargs.get('ExclusiveStartKey')
+        if start is not None:
+            marker = self._key(start)
+            if positions is not None:
+                position = positions.get(marker, len(rows) - 1)
+            else:
+                position = next((i for i, row in enumerate(rows) if self._key(row) == marker), len(rows) - 1)
+            rows = rows[position + 1:]
+        limit = kwargs.get('Limit')
+        page = rows[:limit] if limit else rows
+        response = {'Items': page, 'Count': len(page)}
+        if limit and len(rows) > limit:
+            response['LastEvaluatedKey'] = {attr: page[-1][attr] for attr in key_attrs if attr in page[-1]}
+        return response
+
+    def _condition_failed(self, current, operation, kwargs):
+        from botocore.exceptions import ClientError
+        error = {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'The conditional request failed'}}
+        if current is not None and kwargs.get('ReturnValuesOnConditionCheckFailure') == 'ALL_OLD':
+            error['Item'] = dict(current)
+        return ClientError(error, operation)
+
+    def put_item(self, Item, ConditionExpression=None, **kwargs):
+        self._call()
+        with self._lock:
+            current = self.items.get(self._key(Item))
+            if ConditionExpression is not None and not _evaluate(ConditionExpression, current or {}):
+                raise self._condition_failed(current, 'PutItem', kwargs)
+            self.items[self._key(Item)] = dict(Item)
+            self._record_change(current, self.items[self._key(Item)])
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        self._call()
+        item = self.items.get(self._key(Key))
+        return {'Item': _project(item, kwargs)} if item is not None else {}
+
+    def delete_item(self, Key, ConditionExpression=None, **kwargs):
+        self._call()
+        with self._lock:
+            current = self.items.get(self._key(Key))
+            if ConditionExpression is not None and not _evaluate(ConditionExpression, current or {}):
+                raise self._condition_failed(current, 'DeleteItem', kwargs)
+            self._record_change(self.items.pop(self._key(Key), None), None)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+                    ConditionExpression=None, **kwargs):
+        """Supports 'SET #a = :v, ...', 'ADD #a :v, ...' and 'REMOVE #a, ...' clauses."""
+        self._call()
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        with self._lock:
+            current = self.items.get(self._key(Key))
+            if ConditionExpression is not None and not _evaluate(ConditionExpression, current or {}):
+                raise self._condition_failed(current, 'UpdateItem', kwargs)
+            old = dict(current) if current is not None else None
+            item = self.items.setdefault(self._key(Key), dict(Key))
+            for action, body in re.findall(r'(SET|ADD|REMOVE)\s+(.*?)(?=\s+(?:SET|ADD|REMOVE)\s+|$)',
+                                           UpdateExpression):
+                for clause in body.split(','):
+                    if action == 'SET':
+                        name, value = (part.strip() for part in clause.split('='))
+                        item[names.get(name, name)] = values[value]
+                    elif action == 'REMOVE':
+                        item.pop(names.get(clause.strip(), clause.strip()), None)
+                    else:
+                        name, value = clause.split()
+                        attr = names.get(name, name)
+                        item[attr] = item.get(attr, 0) + values[value]
+            self._record_change(old, dict(item))
+            return {'Attributes': dict(item)} if kwargs.get('ReturnValues') == 'ALL_NEW' else {}
+
+    def query(self, KeyConditionExpression, IndexName=None, ScanIndexForward=True, FilterExpression=None,
+              **kwargs):
+        # Limit caps items evaluated before FilterExpression, as in DynamoDB
+        self._call()
+        hash_attr, range_key = self.indexes[IndexName] if IndexName else (self.hash_key, self.range_key)
+        query_key = (self._version, IndexName, ScanIndexForward, _condition_key(KeyConditionExpression))
+        if self._last_query is not None and self._last_query[0] == query_key:
+            rows, positions = self._last_query[1:]
+        else:
+            # Snapshot, since other threads may be writing; narrow to the partition before evaluating
+            rows = list(self.items.values())
+            partition = _hash_equality(KeyConditionExpression, hash_attr)
+            if partition is not None:
+                rows = [item for item in rows if item.get(hash_attr) == partition]
+            rows = [item for item in rows if _evaluate(KeyConditionExpression, item)]
+            if range_key:
+                rows.sort(key=lambda item: (item.get(range_key), str(self._key(item))), reverse=not ScanIndexForward)
+            positions = {self._key(row): i for i, row in enumerate(rows)}
+            self._last_query = (query_key, rows, positions)
+        key_attrs = {self.hash_key, *([self.range_key] if self.range_key else []),
+                     *(self.indexes[IndexName] if IndexName else ())}
+        response = self._page(rows, kwargs, key_attrs, positions)
+        if FilterExpression is not None:
+            response['Items'] = [item for item in response['Items'] if _evaluate(FilterExpression, item)]
+            response['Count'] = len(response['Items'])
+        response['Items'] = [_project(item, kwargs) for item in response['Items']]
+        return response
+
+    def scan(self, FilterExpression=None, **kwargs):
+        # Limit caps items evaluated before filtering, as in DynamoDB
+        self._call()
+        key_attrs = {self.hash_key, *([self.range_key] if self.range_key else [])}
+        response = self._page(list(self.items.values()), kwargs, key_attrs)
+        matched = [item for item in response['Items'] if FilterExpression is None or _evaluate(FilterExpression, item)]
+        response['Items'] = [_project(item, kwargs) for item in matched]
+        response['Count'] = len(matched)
+        return response
+
+
+class FakeDynamoResource(_Stub):
+    """Service-resource stand-in; unprocessed_every > 0 bounces every Nth put once."""
+
+    def __init__(self, latency=0.0, unprocessed_every=0):
+        super().__init__(latency)
+        self.tables = {}
+        self.unprocessed_every = unprocessed_every
+        self._bounced = set()
+
+    def Table(self, name, hash_key='transaction_id', range_key=None):
+        if name not in self.tables:
+            self.tables[name] = FakeTable(name, hash_key=hash_key, range_key=range_key, latency=self.latency)
+        return self.tables[name]
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self._call()
+        unprocessed = {}
+        for name, requests in RequestItems.items():
+            if len(requests) > 25:
+                raise ValueError('Too many items requested for the BatchWriteItem call')
+            table = self.Table(name)
+            for position, request in enumerate(requests):
+                item = request['PutRequest']['Item']
+                key = table._key(item)
+                if self.unprocessed_every and position % self.unprocessed_every == 0 and key not in self._bounced:
+                    self._bounced.add(key)
+                    unprocessed.setdefault(name, []).append(request)
+                    continue
+                with table._lock:
+                    old = table.items.get(key)
+                    table.items[key] = dict(item)
+                    table._record_change(old, table.items[key])
+        return {'UnprocessedItems': unprocessed}
+
+
+class FakeS3(_Stub):
+    """Objects in a dict keyed by (bucket, key); multipart uploads are assembled on completion."""
+
+    MIN_PART_BYTES = 5 * 1024 * 1024
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.objects = {}
+        self.uploads = {}
+        self.range_reads = 0
+        self.range_bytes = 0
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._call()
+        self.objects[(Bucket, Key)] = Body if isinstance(Body, bytes) else str(Body).encode('utf-8')
+        return {'ETag': f'"{len(self.objects)}"'}
+
+    def _object(self, Bucket, Key, operation):
+        if (Bucket, Key) not in self.objects:
+            from botocore.exceptions import ClientError
+            raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': 'The specified key does not exist.'}},
+                              operation)
+        return self.objects[(Bucket, Key)]
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        """The object, or with Range='bytes=first-last' only those bytes (the range_reads counter counts them)"""
+        self._call()
+        body = self._object(Bucket, Key, 'GetObject')
+        if Range:
+            first, last = Range[len('bytes='):].split('-')
+            body = body[int(first):int(last) + 1]
+            self.range_reads += 1
+            self.range_bytes += len(body)
+        return {'Body': io.BytesIO(body), 'ContentLength': len(body)}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._call()
+        return {'ContentLength': len(self._object(Bucket, Key, 'HeadObject'))}
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        self._call()
+        for entry in Delete['Objects']:
+            self.objects.pop((Bucket, entry['Key']), None)
+        return {}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._call()
+        upload_id = f"upload-{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {'Bucket': Bucket, 'Key': Key, 'parts': {}}
+        return {'Bucket': Bucket, 'Key': Key, 'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._call()
+        self.uploads[UploadId]['parts'][PartNumber] = Body
+        return {'ETag': f'"{UploadId}-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        """Assemble the listed parts; every part but the last must be at least 5 MiB, as in S3"""
+        self._call()
+        upload = self.uploads.pop(UploadId)
+        numbers = [part['PartNumber'] for part in MultipartUpload['Parts']]
+        if numbers != sorted(numbers) or any(number not in upload['parts'] for number in numbers):
+            raise ValueError('InvalidPart')
+        parts = [upload['parts'][number] for number in numbers]
+        if any(len(part) < self.MIN_PART_BYTES for part in parts[:-1]):
+            raise ValueError('EntityTooSmall')
+        self.objects[(Bucket, Key)] = b''.join(parts)
+        return {'Bucket': Bucket, 'Key': Key}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self._call()
+        self.uploads.pop(UploadId, None)
+        return {}
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600, **kwargs):
+        """A URL in the shape S3 signs; nothing serves it (presigning makes no AWS call)"""
+        from urllib.parse import quote
+        query = f"X-Amz-Expires={ExpiresIn}"
+        if Params.get('ResponseContentDisposition'):
+            query += f"&response-content-disposition={quote(Params['ResponseContentDisposition'])}"
+        return f"https://{Params['Bucket']}.s3.amazonaws.com/{quote(Params['Key'])}?{query}"
+
+    def list_objects_v2(self, Bucket, Prefix='', Delimiter=None, **kwargs):
+        """One unpaginated listing; with a Delimiter, keys below it are rolled up into CommonPrefixes"""
+        self._call()
+        contents, prefixes = [], set()
+        for bucket, key in sorted(self.objects):
+            if bucket != Bucket or not key.startswith(Prefix):
+                continue
+            rest = key[len(Prefix):]
+            if Delimiter and Delimiter in rest:
+                prefixes.add(Prefix + rest.split(Delimiter, 1)[0] + Delimiter)
+            else:
+                contents.append({'Key': key, 'Size': len(self.objects[(bucket, key)])})
+        return {'Contents': contents, 'CommonPrefixes': [{'Prefix': prefix} for prefix in sorted(prefixes)]}
+
+    def get_paginator(self, operation):
+        stub = self
+
+        class Paginator:
+            def paginate(self, **kwargs):
+                return [getattr(stub, operation)(**kwargs)]
+        return Paginator()
+
+
+class FakeSNS(_Stub):
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.messages = []
+
+    def publish(self, **kwargs):
+        self._call()
+        self.messages.append(kwargs)
+        return {'MessageId': str(len(self.messages))}
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries, **kwargs):
+        self._call()
+        if len(PublishBatchRequestEntries) > 10:
+            raise ValueError('Too many entries in the PublishBatch request')
+        successful = []
+        for entry in PublishBatchRequestEntries:
+            self.messages.append(dict(entry, TopicArn=TopicArn))
+            successful.append({'Id': entry['Id'], 'MessageId': str(len(self.messages))})
+        return {'Successful': successful, 'Failed': []}
+
+
+class FakeSQS(_Stub):
+    """In-memory queue; receive_event() pops messages in the shape SQS delivers to Lambda."""
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.messages = []
+        self._next_id = 0
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        self._call()
+        self._next_id += 1
+        self.messages.append({'messageId': str(self._next_id), 'body': MessageBody})
+        return {'MessageId': str(self._next_id)}
+
+    def receive_event(self, max_messages=10):
+        batch, self.messages = self.messages[:max_messages], self.messages[max_messages:]
+        return {'Records': batch}
+
+
+class FakeManagementApi(_Stub):
+    """apigatewaymanagementapi stand-in; connections in gone answer GoneException, as closed ones do."""
+
+    class exceptions:
+        class GoneException(Exception):
+            pass
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.gone = set()
+        self.messages = {}
+        self._lock = threading.Lock()
+
+    def post_to_connection(self, ConnectionId, Data, **kwargs):
+        self._call()
+        if ConnectionId in self.gone:
+            raise self.exceptions.GoneException(f'Connection {ConnectionId} is gone')
+        with self._lock:
+            self.messages.setdefault(ConnectionId, []).append(Data)
+        return {}
+
+
+class _CognitoError(Exception):
+    def __init__(self, message=''):
+        super().__init__(message)
+        self.response = {'Error': {'Code': type(self).__name__, 'Message': message}}
+
+
+class FakeCognito(_Stub):
+    """User pool stand-in for sign-up, admin confirmation and USER_PASSWORD_AUTH logins.
+
+    Logins return bearer_token() ID tokens, cached per user for half their
+    lifetime so that RSA signing in this process doesn't count as login latency.
+    """
+
+    class exceptions:
+        class UsernameExistsException(_CognitoError):
+            pass
+
+        class InvalidPasswordException(_CognitoError):
+            pass
+
+        class NotAuthorizedException(_CognitoError):
+            pass
+
+        class UserNotFoundException(_CognitoError):
+            pass
+
+        class UserNotConfirmedException(_CognitoError):
+            pass
+
+    def __init__(self, latency=0.0, token_ttl=3600):
+        super().__init__(latency)
+        self.users = {}
+        self.token_ttl = token_ttl
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def add_user(self, username, password, confirmed=True, token=None):
+        """Register a user directly; token (a bearer_token() value) is what their logins return"""
+        self.users[username] = {'password': password, 'confirmed': confirmed}
+        if token:
+            self._tokens[username] = (time.time() + self.token_ttl / 2, token[len('Bearer '):])
+
+    def sign_up(self, ClientId, Username, Password, UserAttributes=None, **kwargs):
+        self._call()
+        if len(Password) < 8:
+            raise self.exceptions.InvalidPasswordException('Password did not conform with policy')
+        with self._lock:
+            if Username in self.users:
+                raise self.exceptions.UsernameExistsException('User already exists')
+            self.add_user(Username, Password, confirmed=False)
+        return {'UserConfirmed': False, 'UserSub': Username}
+
+    def admin_confirm_sign_up(self, UserPoolId, Username, **kwargs):
+        self._call()
+        if Username not in self.users:
+            raise self.exceptions.UserNotFoundException('User does not exist.')
+        self.users[Username]['confirmed'] = True
+        return {}
+
+    def initiate_auth(self, ClientId, AuthFlow, AuthParameters, **kwargs):
+        self._call()
+        username, password = AuthParameters['USERNAME'], AuthParameters['PASSWORD']
+        user = self.users.get(username)
+        if user is None:
+            raise self.exceptions.UserNotFoundException('User does not exist.')
+        if user['password'] != password:
+            raise self.exceptions.NotAuthorizedException('Incorrect username or password.')
+        if not user['confirmed']:
+            raise self.exceptions.UserNotConfirmedException('User is not confirmed.')
+        issued = self._tokens.get(username)
+        if issued is None or time.time() > issued[0]:
+            issued = (time.time() + self.token_ttl / 2, bearer_token(username, self.token_ttl)[len('Bearer '):])
+            self._tokens[username] = issued
+        return {'AuthenticationResult': {'AccessToken': issued[1], 'IdToken': issued[1], 'TokenType': 'Bearer',
+                                         'ExpiresIn': self.token_ttl}}
+
+
+SERVICES = ('dynamodb', 's3', 'sns', 'sqs', 'cognito', 'apigateway')
+
+
+def service_latency(latency, service):
+    """Seconds per call for service; latency is one number or a {service: seconds} dict with optional 'default'."""
+    if isinstance(latency, dict):
+        return latency.get(service, latency.get('default', 0.0))
+    return latency
+
+
+def load_lambda_module():
+    """Import lambda_code with the env vars it requires at module load."""
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    os.environ.setdefault('S3_BUCKET', 'local-transaction-logs')
+    os.environ.setdefault('PROJECT_NAME', 'transaction-monitor')
+    os.environ.setdefault('ENVIRONMENT', 'local')
+    os.environ.setdefault('DYNAMODB_TABLE_NAME', 'transaction-monitor-local-transactions')
+    os.environ.setdefault('SNS_TOPIC_ARN', 'arn:aws:sns:us-east-1:000000000000:local-alerts')
+    os.environ.setdefault('CSRF_SECRET', 'local-csrf-secret')
+    if LAMBDA_DIR not in sys.path:
+        sys.path.insert(0, LAMBDA_DIR)
+    import lambda_code
+    return lambda_code
+
+
+def install_stubs(lambda_code, latency=0.0, unprocessed_every=0):
+    """Point the module-level clients of lambda_code at in-memory stubs.
+
+    latency is the injected delay per AWS call, either for every service or
+    per service as a dict (see service_latency).
+    """
+    dynamodb = FakeDynamoResource(latency=service_latency(latency, 'dynamodb'), unprocessed_every=unprocessed_every)
+    s3 = FakeS3(latency=service_latency(latency, 's3'))
+    sns = FakeSNS(latency=service_latency(latency, 'sns'))
+    sqs = FakeSQS(latency=service_latency(latency, 'sqs'))
+    cognito = FakeCognito(latency=service_latency(latency, 'cognito'))
+    apigateway = FakeManagementApi(latency=service_latency(latency, 'apigateway'))
+    lambda_code.dynamodb = dynamodb
+    lambda_code.transactions_table = dynamodb.Table(os.environ['DYNAMODB_TABLE_NAME'])
+    lambda_code.user_profiles_table = dynamodb.Table('transaction-monitor-dev-user-profiles', hash_key='user_id')
+    lambda_code.csrf_table = dynamodb.Table('csrf-tokens', hash_key='token')
+    lambda_code.analytics_table = dynamodb.Table('transaction-monitor-local-analytics-rollups',
+                                                 hash_key='user_id', range_key='bucket')
+    lambda_code.spend_counters_table = dynamodb.Table('transaction-monitor-local-spend-counters',
+                                                      hash_key='user_id', range_key='period')
+    lambda_code.user_stats_table = dynamodb.Table('transaction-monitor-local-user-stats',
+                                                  hash_key='user_id', range_key='stats_key')
+    lambda_code.idempotency_table = dynamodb.Table('transaction-monitor-local-idempotency-keys',
+                                                   hash_key='idempotency_key')
+    lambda_code.alert_windows_table = dynamodb.Table('transaction-monitor-local-alert-windows',
+                                                     hash_key='user_id', range_key='window_id')
+    lambda_code.alert_windows = lambda_code.alerts.TableWindows(lambda_code.alert_windows_table,
+                                                                lambda_code.aws_clients.dynamodb_conditions())
+    lambda_code.alert_aggregator.store = lambda_code.alert_windows
+    # Cached stats and responses belong to the previous set of tables
+    lambda_code._user_stats_cache = lambda_code.TTLCache(log_every=0)
+    lambda_code._idempotency_cache = lambda_code.TTLCache(log_every=0)
+    lambda_code._archive_days = lambda_code.transaction_tiers.ArchiveDays()
+    lambda_code.s3_client = s3
+    lambda_code.sns_client = sns
+    lambda_code.sqs_client = sqs
+    lambda_code.cognito_client = cognito
+    lambda_code.management_client = apigateway
+    lambda_code.change_feed_connections = lambda_code.change_feed.MemoryConnections()
+    # Tokens from bearer_token() verify against the local key instead of the user pool's JWKS
+    lambda_code.jwt_verifier.jwks.fetch = local_jwks
+    # Keep EMF metric lines out of benchmark output
+    lambda_code.metrics_recorder.emit = False
+    return {'dynamodb': dynamodb, 's3': s3, 'sns': sns, 'sqs': sqs, 'cognito': cognito, 'apigateway': apigateway}
+
+
+def total_calls(stubs):
+    """Number of AWS round trips recorded across all installed stubs."""
+    dynamodb = stubs['dynamodb']
+    return (dynamodb.calls + sum(table.calls for table in dynamodb.tables.values())
+            + stubs['s3'].calls + stubs['sns'].calls + stubs['sqs'].calls
+            + stubs['cognito'].calls + stubs['apigateway'].calls)
+
+
+# Must match get_cognito_resources() in lambda_code.py
+USER_POOL_ID = 'us-east-1_A0uNY4Q07'
+APP_CLIENT_ID = '6h56ikffem49ph32j830bvj7h'
+ISSUER = f"https://cognito-idp.us-east-1.amazonaws.com/{USER_POOL_ID}"
+SIGNING_KID = 'local-signing-key'
+_signing_key = {}
+
+
+def _is_probable_prime(candidate, rounds=16):
+    import secrets
+    d, r = candidate - 1, 0
+    while d % 2 == 0:
+        d, r = d // 2, r + 1
+    for _ in range(rounds):
+        x = pow(secrets.randbelow(candidate - 3) + 2, d, candidate)
+        if x in (1, candidate - 1):
+            continue
+        for _ in range(r - 1):
+            x = pow(x, 2, candidate)
+            if x == candidate - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _random_prime(bits, exponent):
+    import secrets
+    small_primes = [p for p in range(3, 1000, 2) if all(p % q for q in range(3, int(p ** 0.5) + 1, 2))]
+    while True:
+        candidate = secrets.randbits(bits) | (3 << (bits - 2)) | 1
+        if (all(candidate % p for p in small_primes) and (candidate - 1) % exponent
+                and _is_probable_prime(candidate)):
+            return candidate
+
+
+def signing_key(bits=2048):
+    """RSA test key (n, e, d) generated once per process; it stands in for the user pool's key."""
+    if not _signing_key:
+        exponent = 65537
+        p, q = _random_prime(bits // 2, exponent), _random_prime(bits // 2, exponent)
+        _signing_key.update(n=p * q, e=exponent, d=pow(exponent, -1, (p - 1) * (q - 1)))
+    return _signing_key
+
+
+def _b64url(data):
+    import base64
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def local_jwks(url=None):
+    """JWKS document for signing_key(), shaped like the one Cognito publishes."""
+    key = signing_key()
+    size = (key['n'].bit_length() + 7) // 8
+    return {'keys': [{'kid': SIGNING_KID, 'kty': 'RSA', 'alg': 'RS256', 'use': 'sig',
+                      'n': _b64url(key['n'].to_bytes(size, 'big')), 'e': _b64url(key['e'].to_bytes(3, 'big'))}]}
+
+
+def bearer_token(username, ttl=3600):
+    """Cognito-style ID token for username, RS256-signed with signing_key()."""
+    import hashlib
+    import json
+    import time
+    key = signing_key()
+    now = int(time.time())
+    header = _b64url(json.dumps({'kid': SIGNING_KID, 'alg': 'RS256'}).encode())
+    payload = _b64url(json.dumps({'sub': username, 'cognito:username': username, 'aud': APP_CLIENT_ID,
+                                  'iss': ISSUER, 'token_use': 'id', 'iat': now, 'exp': now + ttl}).encode())
+    size = (key['n'].bit_length() + 7) // 8
+    digest_info = bytes.fromhex('3031300d060960864801650304020105000420') + hashlib.sha256(
+        f"{header}.{payload}".encode()).digest()
+    encoded = b'\x00\x01' + b'\xff' * (size - len(digest_info) - 3) + b'\x00' + digest_info
+    signature = pow(int.from_bytes(encoded, 'big'), key['d'], key['n']).to_bytes(size, 'big')
+    return f"Bearer {header}.{payload}.{_b64url(signature)}"
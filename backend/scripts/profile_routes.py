@@ -0,0 +1,51 @@
+"""Latency breakdown per route and per AWS operation, from the metrics hooks.
+
+Runs requests through lambda_handler in-process with real boto3 clients
+pointed at bench_cold_start's local endpoint (optionally delayed), so the
+botocore hooks time every AWS operation as they do in Lambda. Prints
+p50/p95/p99 per route for Duration, AwsTime, ComputeTime and each
+operation. --emf also prints the EMF line of every sampled invocation.
+
+Usage: python profile_routes.py [--requests 200] [--latency-ms 5] [--sample-rate 1.0] [--emf]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+from bench_cold_start import ROUTES, child_env, start_endpoint
+from local_stubs import load_lambda_module
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per route')
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Latency added to every AWS response')
+    parser.add_argument('--sample-rate', type=float, default=1.0)
+    parser.add_argument('--emf', action='store_true', help='Print the EMF line of each sampled invocation')
+    args = parser.parse_args()
+
+    os.environ.update(child_env(start_endpoint(args.latency_ms / 1000.0)))
+    lambda_code = load_lambda_module()
+    logging.getLogger().setLevel(logging.WARNING)
+    recorder = lambda_code.metrics.Recorder(sample_rate=args.sample_rate, aggregate=True, emit=args.emf)
+    recorder.init_ms = lambda_code.metrics_recorder.init_ms
+    lambda_code.metrics_recorder = recorder
+    lambda_code.metrics.install(recorder)
+
+    routes = {name: event for name, event in ROUTES.items() if name not in ('OPTIONS /transaction', 'POST /login')}
+    for _ in range(args.requests):
+        for event in routes.values():
+            lambda_code.lambda_handler(json.loads(json.dumps(event)), None)
+
+    print(f"{'route':<22} {'metric':<26} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for (route, metric), stats in recorder.summary().items():
+        if metric in ('AwsCalls', 'ColdStart'):
+            continue
+        print(f"{route:<22} {metric:<26} {stats['count']:6d} {stats['p50']:7.2f}ms {stats['p95']:7.2f}ms "
+              f"{stats['p99']:7.2f}ms")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
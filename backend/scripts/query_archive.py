@@ -0,0 +1,81 @@
+"""Aggregate the transaction archive by date range, filters and grouping.
+
+Reads compacted Parquet parts where a day has been compacted and the raw
+JSON/NDJSON objects otherwise; see archive_query for the details.
+
+Usage:
+  python query_archive.py --bucket BUCKET --from 2026-07-01 --to 2026-09-30 --status flagged --group-by merchant
+  python query_archive.py --root ./archive --user alice --min-risk 70 --group-by date --format csv
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+
+from local_stubs import LAMBDA_DIR
+
+sys.path.insert(0, LAMBDA_DIR)
+import archive_compaction  # noqa: E402
+import archive_query  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--bucket', help='S3 bucket holding transactions/ and compacted/')
+    source.add_argument('--root', help='Local directory laid out like the bucket')
+    parser.add_argument('--from', dest='start', help='First day (YYYY-MM-DD), inclusive')
+    parser.add_argument('--to', dest='end', help='Last day (YYYY-MM-DD), inclusive')
+    parser.add_argument('--user', action='append', help='user_id to include; repeatable')
+    parser.add_argument('--merchant', action='append', help='Merchant to include; repeatable')
+    parser.add_argument('--currency', action='append', help='Currency to include; repeatable')
+    parser.add_argument('--status', action='append', choices=['approved', 'flagged'])
+    parser.add_argument('--min-risk', type=float, help='Lowest risk_score to include')
+    parser.add_argument('--max-risk', type=float, help='Highest risk_score to include')
+    parser.add_argument('--group-by', action='append', default=[], choices=archive_query.GROUP_COLUMNS)
+    parser.add_argument('--order-by', choices=archive_query.RESULT_COLUMNS, help='Sort descending by this column')
+    parser.add_argument('--limit', type=int)
+    parser.add_argument('--workers', type=int, default=archive_query.DEFAULT_WORKERS)
+    parser.add_argument('--format', choices=['table', 'json', 'csv'], default='table')
+    args = parser.parse_args()
+
+    try:
+        query = archive_query.Query(start=args.start, end=args.end, user_ids=args.user, merchants=args.merchant,
+                                    currencies=args.currency, statuses=args.status, min_risk_score=args.min_risk,
+                                    max_risk_score=args.max_risk, group_by=args.group_by)
+    except archive_query.QueryError as e:
+        parser.error(str(e))
+    if args.bucket:
+        import boto3
+        store = archive_compaction.S3Store(boto3.client('s3'), args.bucket)
+    else:
+        store = archive_compaction.LocalStore(args.root)
+
+    stats = {}
+    start = time.perf_counter()
+    rows = archive_query.run_query(store, query, workers=args.workers, stats=stats)
+    elapsed = time.perf_counter() - start
+    if args.order_by:
+        rows.sort(key=lambda row: row[args.order_by] or 0, reverse=True)
+    if args.limit:
+        rows = rows[:args.limit]
+
+    columns = list(query.group_by) + list(archive_query.RESULT_COLUMNS)
+    if args.format == 'json':
+        print(json.dumps(rows, indent=2))
+    elif args.format == 'csv':
+        writer = csv.DictWriter(sys.stdout, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        widths = {c: max([len(c)] + [len(str(row[c])) for row in rows]) for c in columns}
+        print('  '.join(c.ljust(widths[c]) for c in columns))
+        for row in rows:
+            print('  '.join(str(row[c]).ljust(widths[c]) for c in columns))
+    print(f"{len(rows)} groups from {stats['days']} days ({stats['parquet_parts']} Parquet parts, "
+          f"{stats['json_objects']} JSON objects) in {elapsed:.2f}s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+"""Puts the Lambda modules and the local stand-ins in scripts/ on sys.path."""
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+for directory in ('scripts', os.path.join('modules', 'lambda')):
+    path = os.path.normpath(os.path.join(BACKEND_DIR, directory))
+    if path not in sys.path:
+        sys.path.insert(0, path)
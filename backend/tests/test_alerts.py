@@ -0,0 +1,125 @@
+"""Held alert windows are saved, swept once and never sent twice."""
+import pytest
+
+pytest.importorskip('boto3')
+
+from boto3.dynamodb import conditions  # noqa: E402
+
+import alerts  # noqa: E402
+from local_stubs import FakeTable  # noqa: E402
+
+
+class Publisher:
+    def __init__(self):
+        self.messages = []
+        self.fail = False
+
+    def __call__(self, entries):
+        if self.fail:
+            return {entry['Id'] for entry in entries}
+        self.messages.extend(entries)
+        return set()
+
+
+def record(transaction_id, user_id='alice'):
+    return {'transaction_id': transaction_id, 'user_id': user_id, 'merchant': 'Lucky Casino',
+            'amount': '900', 'currency': 'USD', 'risk_score': 80, 'status': 'flagged'}
+
+
+@pytest.fixture
+def setup():
+    clock = {'mono': 0.0, 'wall': 1_000_000.0}
+    store = alerts.TableWindows(FakeTable('alert-windows', hash_key='user_id', range_key='window_id'), conditions)
+    publisher = Publisher()
+    aggregator = alerts.AlertAggregator(publisher, window_seconds=60, store=store,
+                                        clock=lambda: clock['mono'], wall_clock=lambda: clock['wall'])
+
+    def advance(seconds):
+        clock['mono'] += seconds
+        clock['wall'] += seconds
+
+    return aggregator, store, publisher, clock, advance
+
+
+def test_first_alert_is_sent_without_touching_the_store(setup):
+    aggregator, store, publisher, _, _ = setup
+    aggregator.add(record('t1'))
+    assert aggregator.flush() == 1
+    assert len(publisher.messages) == 1
+    assert store.table.items == {}
+
+
+def test_sweep_sends_a_window_the_container_never_flushed(setup):
+    aggregator, store, publisher, clock, advance = setup
+    aggregator.add(record('t1'))
+    aggregator.flush()
+    advance(5)
+    aggregator.add(record('t2'))
+    aggregator.add(record('t3'))
+    aggregator.flush()
+    assert len(publisher.messages) == 1
+    assert len(store.table.items) == 1
+
+    # Not yet overdue by the grace period
+    advance(60)
+    assert alerts.sweep(store, publisher, grace_seconds=60, now=clock['wall']) == 0
+
+    advance(60)
+    assert alerts.sweep(store, publisher, grace_seconds=60, now=clock['wall']) == 1
+    assert 'Flagged transactions: 2' in publisher.messages[-1]['Message']
+    assert store.table.items == {}
+
+    # The container wakes up: what the sweep sent is dropped, the new alert is held in a new window
+    aggregator.add(record('t2'))
+    aggregator.add(record('t4'))
+    assert aggregator.flush() == 0
+    assert aggregator.stats['taken_by_sweep'] == 2
+    assert aggregator.stats['suppressed_duplicates'] == 1
+    advance(60)
+    assert aggregator.flush() == 1
+    assert 't4' in publisher.messages[-1]['Message']
+    assert len(publisher.messages) == 3
+    assert store.table.items == {}
+
+
+def test_container_flush_claims_the_window_from_the_sweep(setup):
+    aggregator, store, publisher, clock, advance = setup
+    aggregator.add(record('t1'))
+    aggregator.flush()
+    advance(5)
+    aggregator.add(record('t2'))
+    aggregator.flush()
+    advance(60)
+    assert aggregator.flush() == 1
+    assert store.table.items == {}
+    advance(600)
+    assert alerts.sweep(store, publisher, grace_seconds=60, now=clock['wall']) == 0
+    assert len(publisher.messages) == 2
+
+
+def test_failed_sweep_publish_is_saved_again(setup):
+    aggregator, store, publisher, clock, advance = setup
+    aggregator.add(record('t1'))
+    aggregator.flush()
+    aggregator.add(record('t2'))
+    aggregator.flush()
+    advance(600)
+    publisher.fail = True
+    assert alerts.sweep(store, publisher, grace_seconds=60, now=clock['wall']) == 0
+    assert len(store.table.items) == 1
+    publisher.fail = False
+    assert alerts.sweep(store, publisher, grace_seconds=60, now=clock['wall']) == 1
+    assert store.table.items == {}
+
+
+def test_without_a_store_windows_stay_in_memory():
+    publisher = Publisher()
+    now = [0.0]
+    aggregator = alerts.AlertAggregator(publisher, window_seconds=60, clock=lambda: now[0])
+    aggregator.add(record('t1'))
+    aggregator.flush()
+    aggregator.add(record('t2'))
+    assert aggregator.flush() == 0
+    now[0] = 61
+    assert aggregator.flush() == 1
+    assert len(publisher.messages) == 2
@@ -0,0 +1,197 @@
+"""Archive queries find the same records a plain filter over the archived records does."""
+import datetime
+import json
+import os
+
+import pytest
+
+import archive_compaction
+import archive_query
+import encoding
+import fx_rates
+import transaction_tiers
+from archive_compaction import SOURCE_PREFIX, LocalStore
+
+DAY = datetime.date(2026, 9, 1)
+USER = 'jörg-müller'
+MERCHANT = 'Café Zürich'
+
+
+def transaction(transaction_id, user_id, merchant, hour=12):
+    return {'transaction_id': transaction_id, 'user_id': user_id, 'merchant': merchant,
+            'amount': 25.0, 'currency': 'EUR', 'risk_score': 10.0, 'status': 'approved',
+            'timestamp': f"{DAY}T{hour:02d}:00:00+00:00"}
+
+
+def write(store, key, body):
+    path = store.path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(body)
+
+
+@pytest.fixture
+def non_ascii_archive(tmp_path):
+    """Objects as lambda_code writes them (raw UTF-8) and as it wrote them before (\\u escapes)"""
+    store = LocalStore(str(tmp_path))
+    prefix = f"{SOURCE_PREFIX}/{DAY}"
+    write(store, f"{prefix}/t1.json", encoding.dumps(transaction('t1', USER, MERCHANT, hour=9)))
+    write(store, f"{prefix}/batch-1.ndjson", '\n'.join([
+        encoding.dumps(transaction('t2', USER, MERCHANT, hour=10)),
+        encoding.dumps(transaction('t3', 'alice', MERCHANT, hour=11)),
+        encoding.dumps(transaction('t4', USER, 'Corner Shop', hour=12)),
+    ]) + '\n')
+    write(store, f"{prefix}/t5.json", json.dumps(transaction('t5', USER, MERCHANT, hour=13)))
+    return store
+
+
+def test_non_ascii_values_match_both_encodings(non_ascii_archive):
+    store = non_ascii_archive
+    assert MERCHANT.encode('utf-8') in store.get(f"{SOURCE_PREFIX}/{DAY}/t1.json")
+    assert b'\\u00e9' in store.get(f"{SOURCE_PREFIX}/{DAY}/t5.json")
+
+    query = archive_query.Query(user_ids=[USER], merchants=[MERCHANT], group_by=['user_id', 'merchant'])
+    rows = archive_query.run_query(store, query, workers=2, rates=fx_rates.default_table())
+    assert [(row['user_id'], row['merchant'], row['transactions']) for row in rows] == [(USER, MERCHANT, 3)]
+
+    records = archive_query.day_records(store, DAY, query=archive_query.Query(user_ids=[USER]))
+    assert sorted(record['transaction_id'] for record in records) == ['t1', 't2', 't4', 't5']
+
+
+def test_cold_reader_finds_a_non_ascii_user(non_ascii_archive):
+    pytest.importorskip('pyarrow')
+    archive_compaction.compact_day(non_ascii_archive, DAY)
+    reader = transaction_tiers.ColdReader(non_ascii_archive, USER, workers=1)
+    start = transaction_tiers.day_start(DAY)
+    end = transaction_tiers.day_start(DAY + datetime.timedelta(days=1))
+    records = reader.records(DAY, start, end)
+    assert sorted(record['transaction_id'] for record in records) == ['t1', 't2', 't4', 't5']
+
+
+def plain_totals(records, query_filter, group_by, rates):
+    """The result rows run_query should return, computed record by record in plain Python"""
+    groups = {}
+    for day, record in records:
+        if not query_filter(day, record):
+            continue
+        key = tuple(str(day) if column == 'date' else record.get(column) for column in group_by)
+        entry = groups.setdefault(key, {'transactions': 0, 'amount': 0.0, 'amount_usd': 0.0, 'risk': [],
+                                        'flagged': 0})
+        entry['transactions'] += 1
+        entry['amount'] += record['amount']
+        entry['amount_usd'] += rates.to_usd_at(record['amount'], record['currency'], record['timestamp'])
+        if record.get('risk_score') is not None:
+            entry['risk'].append(record['risk_score'])
+        entry['flagged'] += record['status'] == 'flagged'
+    return {key: {'transactions': entry['transactions'], 'amount': entry['amount'],
+                  'amount_usd': entry['amount_usd'], 'flagged': entry['flagged'],
+                  'max_risk_score': max(entry['risk']) if entry['risk'] else None,
+                  'avg_risk_score': sum(entry['risk']) / len(entry['risk']) if entry['risk'] else None}
+            for key, entry in groups.items()}
+
+
+def assert_same_totals(rows, expected, group_by):
+    assert sorted(tuple(row[column] for column in group_by) for row in rows) == sorted(expected)
+    for row in rows:
+        want = expected[tuple(row[column] for column in group_by)]
+        assert row['transactions'] == want['transactions']
+        assert row['flagged'] == want['flagged']
+        assert row['max_risk_score'] == want['max_risk_score']
+        assert row['amount'] == pytest.approx(want['amount'], abs=0.01)
+        assert row['amount_usd'] == pytest.approx(want['amount_usd'], abs=0.01)
+        if want['avg_risk_score'] is None:
+            assert row['avg_risk_score'] is None
+        else:
+            assert row['avg_risk_score'] == pytest.approx(want['avg_risk_score'], abs=0.01)
+
+
+ARCHIVE_DAYS = 4
+
+
+@pytest.fixture(scope='module')
+def synthetic_archive(tmp_path_factory):
+    """NDJSON batches as bench_archive_query writes them, plus single objects without a risk_score"""
+    from bench_archive_query import FIRST_DAY, write_archive
+    root = str(tmp_path_factory.mktemp('archive'))
+    write_archive(root, rows=2400, days=ARCHIVE_DAYS, batch_size=150, users=12)
+    store = LocalStore(root)
+    for offset in range(ARCHIVE_DAYS):
+        day = FIRST_DAY + datetime.timedelta(days=offset)
+        for index in range(3):
+            record = transaction(f"unscored-{day}-{index}", f"user-{index}", 'Amazon')
+            record.update(timestamp=f"{day}T05:00:00+00:00", risk_score=None, currency='GBP')
+            write(store, f"{SOURCE_PREFIX}/{day}/unscored-{index}.json", json.dumps(record))
+    records = []
+    for offset in range(ARCHIVE_DAYS):
+        day = FIRST_DAY + datetime.timedelta(days=offset)
+        for key in store.list(f"{SOURCE_PREFIX}/{day}"):
+            records.extend((day, record) for record in archive_compaction.parse_object(key, store.get(key)))
+    return store, records, FIRST_DAY
+
+
+def queries(first_day):
+    second, third = first_day + datetime.timedelta(days=1), first_day + datetime.timedelta(days=2)
+    return [
+        (archive_query.Query(statuses=['flagged'], group_by=['merchant']),
+         lambda day, r: r['status'] == 'flagged'),
+        (archive_query.Query(start=second, end=third, group_by=['date', 'currency']),
+         lambda day, r: second <= day <= third),
+        (archive_query.Query(user_ids=['user-3', 'user-7'], merchants=['Amazon', 'Uber'], group_by=['user_id']),
+         lambda day, r: r['user_id'] in ('user-3', 'user-7') and r['merchant'] in ('Amazon', 'Uber')),
+        (archive_query.Query(currencies=['GBP'], min_risk_score=20, max_risk_score=60, group_by=['status']),
+         lambda day, r: r['currency'] == 'GBP' and r['risk_score'] is not None and 20 <= r['risk_score'] <= 60),
+        (archive_query.Query(currencies=['GBP'], group_by=['merchant', 'status']),
+         lambda day, r: r['currency'] == 'GBP'),
+        (archive_query.Query(), lambda day, r: True),
+    ]
+
+
+def test_run_query_matches_a_plain_filter_on_json_and_parquet(synthetic_archive):
+    store, records, first_day = synthetic_archive
+    rates = fx_rates.default_table()
+    cases = queries(first_day)
+    for query, query_filter in cases:
+        stats = {}
+        rows = archive_query.run_query(store, query, workers=4, stats=stats, rates=rates)
+        assert stats['parquet_parts'] == 0 and stats['json_objects'] > 0
+        assert_same_totals(rows, plain_totals(records, query_filter, query.group_by, rates), query.group_by)
+
+    pytest.importorskip('pyarrow')
+    for offset in range(ARCHIVE_DAYS):
+        archive_compaction.compact_day(store, first_day + datetime.timedelta(days=offset))
+    for query, query_filter in cases:
+        stats = {}
+        rows = archive_query.run_query(store, query, workers=4, stats=stats, rates=rates)
+        assert stats['json_objects'] == 0 and stats['parquet_parts'] > 0
+        assert_same_totals(rows, plain_totals(records, query_filter, query.group_by, rates), query.group_by)
+
+
+def test_scan_json_and_scan_parquet_agree_for_one_day(tmp_path):
+    pytest.importorskip('pyarrow')
+    from bench_archive_query import FIRST_DAY, write_archive
+    write_archive(str(tmp_path), rows=600, days=1, batch_size=100, users=5)
+    store = LocalStore(str(tmp_path))
+    rates = fx_rates.default_table()
+    query = archive_query.Query(min_risk_score=10, group_by=['user_id', 'status'])
+    json_totals = {}
+    for key in store.list(f"{SOURCE_PREFIX}/{FIRST_DAY}"):
+        for group, entry in archive_query.scan_json(store, query, rates, FIRST_DAY, key).items():
+            archive_query._add(json_totals, group, *entry)
+
+    manifest = archive_compaction.compact_day(store, FIRST_DAY)
+    parquet_totals = {}
+    for part in manifest['parts']:
+        for group, entry in archive_query.scan_parquet(store, query, rates, FIRST_DAY, part['key']).items():
+            archive_query._add(parquet_totals, group, *entry)
+
+    records = [record for key in store.list(f"{SOURCE_PREFIX}/{FIRST_DAY}")
+               for record in archive_compaction.parse_object(key, store.get(key))]
+    expected = {}
+    for record in records:
+        if record['risk_score'] >= 10:
+            key = (record['user_id'], record['status'])
+            expected[key] = expected.get(key, 0) + 1
+    assert {group: entry[0] for group, entry in json_totals.items()} == expected
+    assert {group: entry[0] for group, entry in parquet_totals.items()} == expected
+    for group, entry in json_totals.items():
+        assert parquet_totals[group][1] == pytest.approx(entry[1])
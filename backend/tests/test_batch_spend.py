@@ -0,0 +1,95 @@
+"""A batch moves the spend counters once and is scored like the same transactions submitted one at a time."""
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip('boto3')
+
+from local_stubs import bearer_token, install_stubs, load_lambda_module  # noqa: E402
+
+PROFILE = {'monthlyBudget': 2000, 'dailyLimit': 600, 'velocityLimit': 3, 'riskTolerance': 'medium'}
+AMOUNTS = [120, 80, 250, 40, 300, 15, 90]
+
+
+@pytest.fixture
+def lambda_code():
+    module = load_lambda_module()
+    install_stubs(module)
+    for user_id in ('single', 'batch', 'racer'):
+        module.user_profiles_table.items[user_id] = dict(PROFILE, user_id=user_id)
+    return module
+
+
+def post(lambda_code, user_id, path, document):
+    event = {'path': path, 'httpMethod': 'POST', 'headers': {'Authorization': bearer_token(user_id)},
+             'body': json.dumps(document)}
+    response = lambda_code.lambda_handler(event, None)
+    assert response['statusCode'] == 200, response['body']
+    return json.loads(response['body'])
+
+
+def transaction(amount):
+    return {'amount': amount, 'merchant': 'Corner Shop', 'currency': 'USD'}
+
+
+def counters(lambda_code, user_id):
+    return {period: (float(item['usd_sum']), int(item['txn_count']))
+            for (owner, period), item in lambda_code.spend_counters_table.items.items() if owner == user_id}
+
+
+def stored(lambda_code, user_id):
+    return [item for item in lambda_code.transactions_table.items.values() if item['user_id'] == user_id]
+
+
+def test_batch_is_scored_like_single_submissions(lambda_code):
+    singles = [post(lambda_code, 'single', '/transaction', transaction(amount)) for amount in AMOUNTS]
+    batch = post(lambda_code, 'batch', '/transactions/batch', {'transactions': [transaction(a) for a in AMOUNTS]})
+    assert [result['risk_score'] for result in batch['results']] == [result['risk_score'] for result in singles]
+    assert [result['status'] for result in batch['results']] == [result['status'] for result in singles]
+
+    factors = {user_id: sorted((float(item['amount']), tuple(item.get('risk_factors', ())))
+                               for item in stored(lambda_code, user_id)) for user_id in ('single', 'batch')}
+    assert factors['batch'] == factors['single']
+    # Velocity and the daily limit both fire part-way through
+    assert any('velocity' in str(names) for _, names in factors['batch'])
+    assert counters(lambda_code, 'batch') == counters(lambda_code, 'single')
+    window = {name: value for key, item in lambda_code.spend_counters_table.items.items() if key[0] == 'batch'
+              for name, value in item.items() if name.startswith('v')}
+    assert sum(window.values()) == len(AMOUNTS)
+
+
+def test_invalid_items_are_not_counted(lambda_code):
+    body = post(lambda_code, 'batch', '/transactions/batch',
+                {'transactions': [transaction(100), {'amount': -5, 'merchant': 'x'}, transaction(50)]})
+    assert body['processed'] == 2 and 'error' in body['results'][1]
+    assert {count for _, count in counters(lambda_code, 'batch').values()} == {2}
+    assert {usd for usd, _ in counters(lambda_code, 'batch').values()} == {150.0}
+
+
+def test_unsaved_items_are_taken_back_out(lambda_code, monkeypatch):
+    batch_put_items = lambda_code.batch_put_items
+
+    def failing_put(table, items, **kwargs):
+        batch_put_items(table, items[1:], **kwargs)
+        return [items[0]['transaction_id']]
+
+    monkeypatch.setattr(lambda_code, 'batch_put_items', failing_put)
+    body = post(lambda_code, 'batch', '/transactions/batch', {'transactions': [transaction(a) for a in AMOUNTS]})
+    assert body['processed'] == len(AMOUNTS) - 1
+    assert set(counters(lambda_code, 'batch').values()) == {(float(sum(AMOUNTS[1:])), len(AMOUNTS) - 1)}
+    window = [value for key, item in lambda_code.spend_counters_table.items.items() if key[0] == 'batch'
+              for name, value in item.items() if name.startswith('v')]
+    assert sum(window) == len(AMOUNTS) - 1
+
+
+def test_concurrent_batches_and_singles_all_count(lambda_code):
+    def submit(index):
+        if index % 2:
+            return post(lambda_code, 'racer', '/transactions/batch', {'transactions': [transaction(10)] * 5})
+        return post(lambda_code, 'racer', '/transaction', transaction(10))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(submit, range(16)))
+    assert len(stored(lambda_code, 'racer')) == 8 * 5 + 8
+    assert set(counters(lambda_code, 'racer').values()) == {(480.0, 48)}
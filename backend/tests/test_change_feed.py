@@ -0,0 +1,73 @@
+"""Stream records reach each connected user as exactly the rows GET /transactions lists."""
+import json
+
+import pytest
+
+pytest.importorskip('boto3')
+
+import change_feed  # noqa: E402
+from bench_change_feed import end_to_end  # noqa: E402
+from local_stubs import load_lambda_module, stream_record  # noqa: E402
+
+ROW = {'transaction_id': 't1', 'user_id': 'alice', 'timestamp': '2026-10-17T12:00:00Z', 'amount': 12.5,
+       'merchant': 'Shell', 'currency': 'USD', 'risk_score': 10, 'status': 'approved'}
+
+
+def test_end_to_end():
+    assert end_to_end(load_lambda_module()) == []
+
+
+def publish(records, registry):
+    sent = {}
+
+    def send(connection_id, data):
+        sent.setdefault(connection_id, []).append(json.loads(data))
+        return change_feed.SENT
+
+    return change_feed.publish(records, registry, send), sent
+
+
+def test_invisible_changes_and_ttl_deletes_are_skipped():
+    registry = change_feed.MemoryConnections()
+    registry.add('c1', 'alice')
+    key = {'transaction_id': 't1'}
+    stats, sent = publish([
+        stream_record('MODIFY', key, old=ROW, new=dict(ROW, expires_at=1792000000), sequence=1),
+        stream_record('REMOVE', key, old=ROW, ttl=True, sequence=2),
+    ], registry)
+    assert stats['skipped'] == 2
+    assert sent == {}
+
+
+def test_changes_to_one_row_collapse_into_the_last():
+    registry = change_feed.MemoryConnections()
+    registry.add('c1', 'alice')
+    registry.add('c2', 'bob')
+    key = {'transaction_id': 't1'}
+    stats, sent = publish([
+        stream_record('INSERT', key, new=ROW, sequence=1),
+        stream_record('MODIFY', key, old=ROW, new=dict(ROW, status='flagged'), sequence=2),
+        stream_record('INSERT', {'transaction_id': 't2'}, new=dict(ROW, transaction_id='t2'), sequence=3),
+        stream_record('REMOVE', {'transaction_id': 't2'}, old=dict(ROW, transaction_id='t2'), sequence=4),
+    ], registry)
+    assert list(sent) == ['c1']
+    [message] = sent['c1']
+    assert message['type'] == change_feed.MESSAGE_TYPE
+    assert [row['status'] for row in message['upserts']] == ['flagged']
+    assert message['removed'] == ['t2']
+    assert stats['watched_users'] == 1
+
+
+def test_large_batches_are_split_and_gone_connections_removed():
+    registry = change_feed.MemoryConnections()
+    registry.add('c1', 'alice')
+    records = [stream_record('INSERT', {'transaction_id': f't{i}'}, new=dict(ROW, transaction_id=f't{i}'),
+                             sequence=i) for i in range(200)]
+    payloads = change_feed.messages(change_feed.group_changes(records)['alice'], max_bytes=4000)
+    assert len(payloads) > 1
+    assert all(len(payload.encode('utf-8')) <= 4000 for payload in payloads)
+    assert sum(len(json.loads(payload)['upserts']) for payload in payloads) == 200
+
+    stats = change_feed.publish(records, registry, lambda connection_id, data: change_feed.GONE)
+    assert stats['gone'] == 1
+    assert registry.for_users(['alice']) == {}
@@ -0,0 +1,130 @@
+"""Compaction resumes, keeps parts whose sources are gone, cleans up after itself and checks row counts."""
+import json
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import archive_compaction  # noqa: E402
+from archive_compaction import COMPACTED_PREFIX, MANIFEST_NAME, PROGRESS_NAME, SOURCE_PREFIX  # noqa: E402
+
+DAY = '2026-09-01'
+PREFIX = f"{COMPACTED_PREFIX}/date={DAY}"
+
+
+def transaction(index, user_id=None):
+    return {'transaction_id': f"t{index:04d}", 'user_id': user_id or f"user-{index % 3}",
+            'timestamp': f"{DAY}T{index % 24:02d}:00:00+00:00", 'amount': 10.0 + index, 'merchant': 'Corner Shop',
+            'currency': 'USD', 'risk_score': float(index % 100), 'status': 'approved'}
+
+
+def add_objects(store, first, count):
+    """count single-transaction objects, plus one NDJSON batch of two, starting at index first"""
+    for index in range(first, first + count):
+        store.put(f"{SOURCE_PREFIX}/{DAY}/{index:04d}.json", json.dumps(transaction(index)).encode('utf-8'))
+    batch = [transaction(index) for index in (first + 1000, first + 1001)]
+    store.put(f"{SOURCE_PREFIX}/{DAY}/batch-{first:04d}.ndjson",
+              '\n'.join(json.dumps(record) for record in batch).encode('utf-8'))
+    return count + 2
+
+
+@pytest.fixture
+def store(tmp_path):
+    return archive_compaction.LocalStore(str(tmp_path))
+
+
+def transaction_ids(store):
+    return sorted(archive_compaction.read_day(store, DAY, columns=['transaction_id'])['transaction_id'].to_pylist())
+
+
+def test_day_is_compacted_once_and_sorted_by_user(store):
+    rows = add_objects(store, 0, 9)
+    manifest = archive_compaction.compact_day(store, DAY, objects_per_part=4, row_group_rows=2)
+    assert manifest['rows'] == rows
+    assert [part['key'] for part in manifest['parts']] == [f"{PREFIX}/part-0000{index}.parquet" for index in range(3)]
+    assert store.get(f"{PREFIX}/{PROGRESS_NAME}") is None
+    assert len(transaction_ids(store)) == rows
+
+    import pyarrow.parquet as pq
+    part = pq.ParquetFile(store.path(manifest['parts'][0]['key']))
+    assert part.metadata.num_row_groups == 2
+    users = part.read(columns=['user_id'])['user_id'].to_pylist()
+    assert users == sorted(users)
+
+    assert archive_compaction.compact_day(store, DAY, objects_per_part=4) == manifest
+
+
+def test_interrupted_run_resumes_at_the_first_unfinished_part(store, monkeypatch):
+    rows = add_objects(store, 0, 9)
+    write_part = archive_compaction.write_part
+    written = []
+
+    def failing_write(store, key, table, row_group_rows=archive_compaction.DEFAULT_ROW_GROUP_ROWS):
+        if len(written) == 2:
+            raise OSError('disk full')
+        written.append(key)
+        return write_part(store, key, table, row_group_rows)
+
+    monkeypatch.setattr(archive_compaction, 'write_part', failing_write)
+    with pytest.raises(OSError):
+        archive_compaction.compact_day(store, DAY, objects_per_part=4)
+    progress = json.loads(store.get(f"{PREFIX}/{PROGRESS_NAME}"))
+    assert [part['key'] for part in progress['parts']] == written
+    assert store.get(f"{PREFIX}/{MANIFEST_NAME}") is None
+
+    monkeypatch.setattr(archive_compaction, 'write_part', lambda *args: written.append(args[1]) or write_part(*args))
+    manifest = archive_compaction.compact_day(store, DAY, objects_per_part=4)
+    # Only the third part is written by the second run
+    assert written == [f"{PREFIX}/part-0000{index}.parquet" for index in range(3)]
+    assert manifest['rows'] == rows
+    assert len(transaction_ids(store)) == rows
+
+
+def test_late_objects_after_sources_were_deleted_get_new_parts(store):
+    first_rows = add_objects(store, 0, 5)
+    first = archive_compaction.compact_day(store, DAY, objects_per_part=4, delete_sources=True)
+    assert store.list(f"{SOURCE_PREFIX}/{DAY}") == []
+    assert first['sources_deleted']
+
+    late_rows = add_objects(store, 100, 3)
+    manifest = archive_compaction.compact_day(store, DAY, objects_per_part=4)
+    assert manifest['parts'][:len(first['parts'])] == first['parts']
+    assert [part['key'] for part in manifest['parts'][len(first['parts']):]] == [f"{PREFIX}/part-00002.parquet"]
+    assert manifest['rows'] == first_rows + late_rows
+    assert manifest['source_objects'] == first['source_objects'] + 4
+    # The late sources weren't asked to be deleted, but the day stays marked so later arrivals carry the parts too
+    assert manifest['sources_deleted']
+    assert len(store.list(f"{SOURCE_PREFIX}/{DAY}")) == 4
+    assert len(transaction_ids(store)) == first_rows + late_rows
+
+
+def test_parts_left_from_a_longer_listing_are_deleted(store):
+    add_objects(store, 0, 9)
+    archive_compaction.compact_day(store, DAY, objects_per_part=4)
+    assert len([key for key in store.list(PREFIX) if key.endswith('.parquet')]) == 3
+
+    store.delete([f"{SOURCE_PREFIX}/{DAY}/{index:04d}.json" for index in range(4, 9)])
+    manifest = archive_compaction.compact_day(store, DAY, objects_per_part=4)
+    assert manifest['rows'] == 6
+    assert [key for key in store.list(PREFIX) if key.endswith('.parquet')] == [
+        f"{PREFIX}/part-00000.parquet", f"{PREFIX}/part-00001.parquet"]
+    assert len(transaction_ids(store)) == 6
+
+
+def test_part_with_the_wrong_row_count_stops_compaction(store, monkeypatch):
+    add_objects(store, 0, 5)
+    monkeypatch.setattr(archive_compaction, 'write_part', lambda store, key, table, row_group_rows: table.num_rows - 1)
+    with pytest.raises(archive_compaction.CompactionError, match='expected'):
+        archive_compaction.compact_day(store, DAY)
+    assert store.get(f"{PREFIX}/{MANIFEST_NAME}") is None
+
+
+def test_read_day_checks_rows_against_the_manifest(store):
+    add_objects(store, 0, 5)
+    manifest = archive_compaction.compact_day(store, DAY)
+    manifest['rows'] += 1
+    store.put(f"{PREFIX}/{MANIFEST_NAME}", json.dumps(manifest).encode('utf-8'))
+    with pytest.raises(archive_compaction.CompactionError, match='manifest lists'):
+        archive_compaction.read_day(store, DAY)
+    with pytest.raises(archive_compaction.CompactionError, match='not been compacted'):
+        archive_compaction.read_day(store, '2026-09-02')
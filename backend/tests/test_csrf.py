@@ -0,0 +1,73 @@
+"""Stateless CSRF tokens validate only for their subject, until they expire, and once with a replay cache."""
+import pytest
+
+import csrf
+
+SECRET = b'test-secret'
+NOW = 1_800_000_000
+
+
+def test_round_trip():
+    token, expires = csrf.issue_token(SECRET, 'alice', ttl=600, now=NOW)
+    assert expires == NOW + 600
+    nonce, parsed_expires = csrf.parse_token(SECRET, token, 'alice', now=NOW + 1)
+    assert parsed_expires == expires
+    assert token.split('.')[2] == nonce
+
+
+def test_tokens_are_unique():
+    assert csrf.issue_token(SECRET, 'alice', now=NOW)[0] != csrf.issue_token(SECRET, 'alice', now=NOW)[0]
+
+
+def test_expired_token_is_rejected():
+    token, expires = csrf.issue_token(SECRET, 'alice', ttl=600, now=NOW)
+    assert csrf.parse_token(SECRET, token, 'alice', now=expires - 1) is not None
+    assert csrf.parse_token(SECRET, token, 'alice', now=expires) is None
+
+
+def test_token_is_bound_to_subject_and_secret():
+    token, _ = csrf.issue_token(SECRET, 'alice', now=NOW)
+    assert csrf.parse_token(SECRET, token, 'bob', now=NOW) is None
+    assert csrf.parse_token(SECRET, token, 'anonymous', now=NOW) is None
+    assert csrf.parse_token(b'another-secret', token, 'alice', now=NOW) is None
+
+
+def test_tampered_token_is_rejected():
+    token, expires = csrf.issue_token(SECRET, 'alice', ttl=600, now=NOW)
+    version, _, nonce, signature = token.split('.')
+    # A later expiry, another nonce or a changed signature breaks the HMAC
+    assert csrf.parse_token(SECRET, f"{version}.{expires + 3600}.{nonce}.{signature}", 'alice', now=NOW) is None
+    assert csrf.parse_token(SECRET, f"{version}.{expires}.{nonce}x.{signature}", 'alice', now=NOW) is None
+    flipped = ('A' if signature[0] != 'A' else 'B') + signature[1:]
+    assert csrf.parse_token(SECRET, f"{version}.{expires}.{nonce}.{flipped}", 'alice', now=NOW) is None
+    assert csrf.parse_token(SECRET, f"v0.{expires}.{nonce}.{signature}", 'alice', now=NOW) is None
+
+
+@pytest.mark.parametrize('token', ['', 'v1', 'v1.abc.nonce.sig', 'v1.1.2.3.4', None, 42])
+def test_malformed_token_is_rejected(token):
+    assert csrf.parse_token(SECRET, token, 'alice', now=NOW) is None
+
+
+def test_replay_cache_spends_each_nonce_once():
+    cache = csrf.ReplayCache()
+    token, _ = csrf.issue_token(SECRET, 'alice', ttl=600, now=NOW)
+    parsed = csrf.parse_token(SECRET, token, 'alice', now=NOW)
+    assert cache.spend(*parsed, now=NOW) is True
+    assert cache.spend(*parsed, now=NOW + 1) is False
+    other = csrf.parse_token(SECRET, csrf.issue_token(SECRET, 'alice', ttl=600, now=NOW)[0], 'alice', now=NOW)
+    assert cache.spend(*other, now=NOW + 1) is True
+
+
+def test_replay_cache_forgets_expired_nonces_and_stays_bounded():
+    cache = csrf.ReplayCache(max_entries=3)
+    for index in range(3):
+        assert cache.spend(f"n{index}", NOW + 10 + index, now=NOW)
+    # Full: a replay is still refused, and a new nonce pushes out the oldest
+    assert cache.spend('n0', NOW + 10, now=NOW) is False
+    assert cache.spend('n3', NOW + 100, now=NOW)
+    assert len(cache) == 3
+    assert cache.spend('n0', NOW + 10, now=NOW)
+    # Expired nonces are dropped as time passes
+    assert cache.spend('n4', NOW + 200, now=NOW + 50)
+    assert len(cache) == 3
+    assert cache.spend('n3', NOW + 100, now=NOW + 50) is False
@@ -0,0 +1,129 @@
+"""GET /transactions cursors page without gaps or repeats, and a bad or foreign cursor is a 400."""
+import base64
+import json
+
+import pytest
+
+pytest.importorskip('boto3')
+
+from local_stubs import bearer_token, install_stubs, load_lambda_module  # noqa: E402
+
+ROWS = 57
+
+
+@pytest.fixture
+def lambda_code(monkeypatch):
+    module = load_lambda_module()
+    monkeypatch.setattr(module, 'TRANSACTION_RETENTION_DAYS', 0)
+    install_stubs(module)
+    # Pairs of transactions share a timestamp, so pages also split between equal sort keys
+    for user_id in ('alice', 'bob'):
+        for index in range(ROWS):
+            module.transactions_table.put_item(Item={
+                'transaction_id': f"{user_id}-{index:03d}", 'user_id': user_id,
+                'timestamp': f"2026-09-01T10:{index // 2:02d}:00+00:00", 'amount': 10, 'status': 'approved'})
+    return module
+
+
+def get(lambda_code, user_id='alice', **params):
+    event = {'path': '/transactions', 'httpMethod': 'GET', 'headers': {'Authorization': bearer_token(user_id)},
+             'queryStringParameters': params}
+    response = lambda_code.lambda_handler(event, None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+def page_through(lambda_code, **params):
+    listed, cursor, pages = [], None, 0
+    while True:
+        status, body = get(lambda_code, **params, **({'cursor': cursor} if cursor else {}))
+        assert status == 200, body
+        listed.extend(body['transactions'])
+        pages += 1
+        cursor = body['next_cursor']
+        if not cursor:
+            return listed, pages
+        assert pages < 100
+
+
+def raw_cursor(document):
+    raw = document if isinstance(document, bytes) else json.dumps(document).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def test_cursor_round_trip(lambda_code):
+    key = {'transaction_id': 'alice-001', 'user_id': 'alice', 'timestamp': '2026-09-01T10:00:00+00:00'}
+    cursor = lambda_code.encode_cursor('query', key, 'alice', '2026-08-01T00:00:00+00:00')
+    assert '=' not in cursor
+    assert lambda_code.decode_cursor(cursor) == ('query', key, 'alice', '2026-08-01T00:00:00+00:00')
+    position = {'day': '2026-07-31', 'after': ['2026-07-31T12:00:00+00:00', 'alice-000']}
+    assert lambda_code.decode_cursor(lambda_code.encode_cursor('archive', position, 'alice', 'b')) == (
+        'archive', position, 'alice', 'b')
+
+
+@pytest.mark.parametrize('limit', [1, 2, 10, 56, 57, 1000])
+def test_pages_neither_skip_nor_repeat_rows(lambda_code, limit):
+    listed, pages = page_through(lambda_code, limit=str(limit))
+    expected = sorted((row for row in lambda_code.transactions_table.items.values() if row['user_id'] == 'alice'),
+                      key=lambda row: row['timestamp'], reverse=True)
+    assert sorted(row['transaction_id'] for row in listed) == sorted(row['transaction_id'] for row in expected)
+    assert [row['timestamp'] for row in listed] == [row['timestamp'] for row in expected]
+    assert pages >= -(-ROWS // limit)
+
+
+def test_query_page_hands_back_the_last_key_it_served(lambda_code):
+    options, error = lambda_code.parse_page_params({'limit': '5'})
+    assert error is None
+    items, cursor = lambda_code.query_transactions_page('alice', options, {})
+    assert len(items) == 5
+    mode, key, user_id, boundary = lambda_code.decode_cursor(cursor)
+    assert (mode, user_id, boundary) == ('query', 'alice', None)
+    assert key == {name: items[-1][name] for name in ('transaction_id', 'user_id', 'timestamp')}
+
+
+def test_scan_fallback_pages_neither_skip_nor_repeat_rows(lambda_code, monkeypatch):
+    def failing_query(**kwargs):
+        raise RuntimeError('index unavailable')
+
+    monkeypatch.setattr(lambda_code.transactions_table, 'query', failing_query)
+    monkeypatch.setattr(lambda_code, 'SCAN_FALLBACK_MAX_PAGES', 1)
+    listed, pages = page_through(lambda_code, limit='10')
+    assert pages > 1
+    assert sorted(row['transaction_id'] for row in listed) == [f"alice-{index:03d}" for index in range(ROWS)]
+
+
+def test_cursor_from_another_user_is_rejected(lambda_code):
+    status, body = get(lambda_code, 'bob', limit='10')
+    assert status == 200 and body['next_cursor']
+    status, body = get(lambda_code, 'alice', limit='10', cursor=body['next_cursor'])
+    assert status == 400
+    assert body['error'] == 'Invalid cursor'
+
+
+QUERY_KEY = {'transaction_id': 'alice-010', 'user_id': 'alice', 'timestamp': '2026-09-01T10:05:00+00:00'}
+
+
+@pytest.mark.parametrize('cursor', [
+    'not a cursor!',
+    raw_cursor(b'not json'),
+    raw_cursor(b'\xff\xfe'),
+    raw_cursor([1, 2]),
+    raw_cursor({'m': 'query', 'u': 'alice'}),
+    raw_cursor({'m': 'index', 'k': QUERY_KEY, 'u': 'alice'}),
+    raw_cursor({'m': 'query', 'k': 'alice-010', 'u': 'alice'}),
+    raw_cursor({'m': 'query', 'k': {'transaction_id': 'alice-010'}, 'u': 'alice'}),
+    raw_cursor({'m': 'query', 'k': dict(QUERY_KEY, timestamp=5), 'u': 'alice'}),
+    raw_cursor({'m': 'query', 'k': dict(QUERY_KEY, user_id='bob'), 'u': 'alice'}),
+    raw_cursor({'m': 'query', 'k': dict(QUERY_KEY, extra='x'), 'u': 'alice'}),
+    raw_cursor({'m': 'query', 'k': QUERY_KEY, 'u': 'alice', 'b': 7}),
+    raw_cursor({'m': 'scan', 'k': {'transaction_id': ['alice-010']}, 'u': 'alice'}),
+    raw_cursor({'m': 'archive', 'k': {'day': 20260901, 'after': None}, 'u': 'alice', 'b': 'x'}),
+    raw_cursor({'m': 'archive', 'k': {'day': '2026-09-01', 'after': ['only-one']}, 'u': 'alice', 'b': 'x'}),
+    raw_cursor({'m': 'archive', 'k': {'day': 'yesterday', 'after': None}, 'u': 'alice',
+                'b': '2026-09-01T00:00:00+00:00'}),
+    # An archive position needs the boundary it was issued with
+    raw_cursor({'m': 'archive', 'k': {'day': '2026-09-01', 'after': None}, 'u': 'alice'}),
+])
+def test_malformed_cursor_is_a_bad_request(lambda_code, cursor):
+    status, body = get(lambda_code, limit='10', cursor=cursor)
+    assert status == 400
+    assert body['error'] == 'Invalid cursor'
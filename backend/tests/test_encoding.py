@@ -0,0 +1,152 @@
+"""Large responses are gzipped only for clients that accept it, and base64 request bodies are decoded."""
+import base64
+import gzip
+import json
+from decimal import Decimal
+
+import pytest
+
+import encoding
+
+LARGE = {'transactions': [{'transaction_id': f"t{index}", 'merchant': 'Café Zürich', 'amount': Decimal('12.5')}
+                          for index in range(400)]}
+
+
+def response(body, **headers):
+    return {'statusCode': 200, 'headers': {'Access-Control-Allow-Origin': '*', **headers}, 'body': body}
+
+
+def decompressed(compressed):
+    return gzip.decompress(base64.b64decode(compressed['body'])).decode('utf-8')
+
+
+@pytest.mark.parametrize('accept_encoding, accepted', [
+    ('gzip', True),
+    ('gzip, deflate, br', True),
+    ('br;q=1.0, GZIP;q=0.5', True),
+    ('*', True),
+    ('gzip; q=0', False),
+    ('gzip;q=0, *', False),
+    ('*;q=1, gzip;q=0', False),
+    ('*;q=0', False),
+    ('gzip;q=nope', False),
+    ('deflate, br', False),
+    ('identity', False),
+    ('', False),
+    (None, False),
+])
+def test_accepts_gzip(accept_encoding, accepted):
+    assert encoding.accepts_gzip(accept_encoding) is accepted
+
+
+def test_large_body_round_trips_through_gzip():
+    body = encoding.dumps(LARGE)
+    assert len(body) >= encoding.GZIP_MIN_BYTES
+    original = response(body)
+    compressed = encoding.compress_response(original, 'gzip, deflate')
+    assert compressed['isBase64Encoded'] is True
+    assert compressed['headers'] == {'Access-Control-Allow-Origin': '*', 'Content-Encoding': 'gzip',
+                                     'Vary': 'Accept-Encoding'}
+    assert len(compressed['body']) < len(body)
+    assert decompressed(compressed) == body
+    assert json.loads(decompressed(compressed))['transactions'][0]['merchant'] == 'Café Zürich'
+    # The response passed in is left as it was
+    assert original == response(body)
+
+
+@pytest.mark.parametrize('body, accept_encoding, headers', [
+    (encoding.dumps(LARGE), None, {}),
+    (encoding.dumps(LARGE), 'br', {}),
+    (encoding.dumps({'status': 'ok'}), 'gzip', {}),
+    (encoding.dumps(LARGE), 'gzip', {'Content-Encoding': 'identity'}),
+    ('', 'gzip', {}),
+])
+def test_body_is_left_uncompressed(body, accept_encoding, headers):
+    original = response(body, **headers)
+    assert encoding.compress_response(original, accept_encoding) is original
+
+
+def test_base64_body_is_not_encoded_twice():
+    original = dict(response(base64.b64encode(b'x' * encoding.GZIP_MIN_BYTES).decode('ascii')),
+                    isBase64Encoded=True)
+    assert encoding.compress_response(original, 'gzip') is original
+
+
+def test_request_body_decodes_base64():
+    text = json.dumps({'amount': 12.5, 'merchant': 'Café Zürich'}, ensure_ascii=False)
+    event = {'body': base64.b64encode(text.encode('utf-8')).decode('ascii'), 'isBase64Encoded': True}
+    assert encoding.request_body(event) == text
+    assert encoding.request_body({'body': text, 'isBase64Encoded': False}) == text
+    assert encoding.request_body({'body': text}) == text
+    assert encoding.request_body({'body': None, 'isBase64Encoded': True}) is None
+
+
+@pytest.mark.parametrize('body', ['not base64!', base64.b64encode(b'\xff\xfe{}').decode('ascii')])
+def test_request_body_that_is_not_base64_utf8_is_a_value_error(body):
+    with pytest.raises(ValueError, match='could not be decoded'):
+        encoding.request_body({'body': body, 'isBase64Encoded': True})
+
+
+def test_header_is_matched_case_insensitively():
+    assert encoding.header({'accept-encoding': 'gzip'}, 'Accept-Encoding') == 'gzip'
+    assert encoding.header({'Accept-Encoding': 'br'}, 'Accept-Encoding') == 'br'
+    assert encoding.header(None, 'Accept-Encoding') is None
+
+
+def test_dumps_writes_decimals_and_sets_compactly():
+    assert encoding.dumps({'amount': Decimal('12.5'), 'tags': {'b', 'a'}, 'merchant': 'Café'}) == (
+        '{"amount":12.5,"tags":["a","b"],"merchant":"Café"}')
+    assert encoding.dumps_json(LARGE) == encoding.dumps(LARGE)
+
+
+@pytest.fixture
+def lambda_code():
+    pytest.importorskip('boto3')
+    from local_stubs import install_stubs, load_lambda_module
+
+    module = load_lambda_module()
+    install_stubs(module)
+    for index in range(200):
+        module.transactions_table.put_item(Item={
+            'transaction_id': f"t{index:03d}", 'user_id': 'alice', 'timestamp': f"2026-09-01T10:{index // 60:02d}:"
+            f"{index % 60:02d}+00:00", 'amount': Decimal('10'), 'merchant': 'Corner Shop', 'status': 'approved'})
+    return module
+
+
+def handle(lambda_code, method, path, headers=None, **event):
+    from local_stubs import bearer_token
+
+    event = {'path': path, 'httpMethod': method,
+             'headers': {'Authorization': bearer_token('alice'), **(headers or {})}, **event}
+    return lambda_code.lambda_handler(event, None)
+
+
+def test_handler_gzips_large_responses_for_clients_that_accept_it(lambda_code):
+    plain = handle(lambda_code, 'GET', '/transactions', queryStringParameters={'limit': '200'})
+    assert len(plain['body']) >= lambda_code.RESPONSE_GZIP_MIN_BYTES
+    assert not plain.get('isBase64Encoded') and 'Content-Encoding' not in plain['headers']
+
+    compressed = handle(lambda_code, 'GET', '/transactions', {'accept-encoding': 'gzip'},
+                        queryStringParameters={'limit': '200'})
+    assert compressed['statusCode'] == 200
+    assert compressed['isBase64Encoded'] is True
+    assert compressed['headers']['Content-Encoding'] == 'gzip'
+    assert json.loads(decompressed(compressed)) == json.loads(plain['body'])
+
+    small = handle(lambda_code, 'GET', '/transactions', {'Accept-Encoding': 'gzip'},
+                   queryStringParameters={'limit': '1'})
+    assert not small.get('isBase64Encoded')
+    assert len(json.loads(small['body'])['transactions']) == 1
+
+
+def test_handler_decodes_base64_request_bodies(lambda_code):
+    body = json.dumps({'amount': 25, 'merchant': 'Café Zürich', 'currency': 'USD'}, ensure_ascii=False)
+    response = handle(lambda_code, 'POST', '/transaction', isBase64Encoded=True,
+                      body=base64.b64encode(body.encode('utf-8')).decode('ascii'))
+    assert response['statusCode'] == 200, response['body']
+    stored = [item for item in lambda_code.transactions_table.items.values() if item['merchant'] == 'Café Zürich']
+    assert len(stored) == 1
+
+    response = handle(lambda_code, 'POST', '/transaction', isBase64Encoded=True, body='{not base64')
+    assert response['statusCode'] == 400
+    assert 'could not be decoded' in json.loads(response['body'])['error']
@@ -0,0 +1,172 @@
+"""Exports are written in valid multipart parts, aborted on failure and resumable by cursor."""
+import csv
+import datetime
+import io
+import json
+
+import pytest
+
+import transaction_export
+from bench_export import parse_export, synthetic_rows
+from local_stubs import FakeS3
+
+BUCKET = 'exports-bucket'
+KEY = 'exports/alice/test.csv'
+NEWEST = datetime.datetime(2026, 10, 1, tzinfo=datetime.timezone.utc)
+
+
+class RecordingS3(FakeS3):
+    """FakeS3 that keeps the size of every part uploaded and counts the calls that matter here"""
+
+    def __init__(self):
+        super().__init__()
+        self.part_sizes = []
+        self.operations = []
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.operations.append('put_object')
+        return super().put_object(Bucket=Bucket, Key=Key, Body=Body, **kwargs)
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.operations.append('create_multipart_upload')
+        return super().create_multipart_upload(Bucket=Bucket, Key=Key, **kwargs)
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self.part_sizes.append(len(Body))
+        return super().upload_part(Bucket=Bucket, Key=Key, UploadId=UploadId, PartNumber=PartNumber, Body=Body,
+                                   **kwargs)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self.operations.append('abort_multipart_upload')
+        return super().abort_multipart_upload(Bucket=Bucket, Key=Key, UploadId=UploadId, **kwargs)
+
+
+def pages_of(rows, size, state):
+    for start in range(0, len(rows), size):
+        state['cursor'] = str(start + size) if start + size < len(rows) else None
+        yield rows[start:start + size]
+
+
+def export(s3, rows, page_size=1000, part_bytes=transaction_export.MIN_PART_BYTES, **kwargs):
+    state = {}
+    writer = transaction_export.MultipartWriter(s3, BUCKET, KEY, 'text/csv', part_bytes)
+    return transaction_export.write_export(pages_of(rows, page_size, state), writer, 'csv', state, **kwargs)
+
+
+def test_large_export_uploads_parts_of_at_least_5_mib():
+    s3 = RecordingS3()
+    rows = synthetic_rows(60000, 'alice', NEWEST)
+    result = export(s3, rows)
+    assert result['parts'] == len(s3.part_sizes) > 1
+    assert all(size >= transaction_export.MIN_PART_BYTES for size in s3.part_sizes[:-1])
+    assert s3.uploads == {}
+    body = s3.objects[(BUCKET, KEY)]
+    assert len(body) == result['bytes'] == sum(s3.part_sizes)
+    assert [row['transaction_id'] for row in parse_export('csv', body)] == [row['transaction_id'] for row in rows]
+    assert result['complete'] and result['next_cursor'] is None
+
+
+def test_part_size_below_the_s3_minimum_is_raised_to_it():
+    writer = transaction_export.MultipartWriter(RecordingS3(), BUCKET, KEY, 'text/csv', part_bytes=1024)
+    assert writer.part_bytes == transaction_export.MIN_PART_BYTES
+
+
+def test_export_within_one_part_is_a_single_put():
+    s3 = RecordingS3()
+    rows = synthetic_rows(500, 'alice', NEWEST)
+    result = export(s3, rows, page_size=100)
+    assert s3.operations == ['put_object']
+    assert result['parts'] == 1 and result['rows'] == 500
+    assert len(parse_export('csv', s3.objects[(BUCKET, KEY)])) == 500
+
+
+def test_failing_page_source_aborts_the_upload():
+    s3 = RecordingS3()
+    rows = synthetic_rows(60000, 'alice', NEWEST)
+
+    def failing_pages(state):
+        yield from pages_of(rows, 1000, state)
+        raise RuntimeError('ProvisionedThroughputExceededException')
+
+    state = {}
+    writer = transaction_export.MultipartWriter(s3, BUCKET, KEY, 'text/csv', transaction_export.MIN_PART_BYTES)
+    with pytest.raises(RuntimeError):
+        transaction_export.write_export(failing_pages(state), writer, 'csv', state)
+    assert s3.part_sizes
+    assert s3.operations == ['create_multipart_upload', 'abort_multipart_upload']
+    assert s3.uploads == {}
+    assert (BUCKET, KEY) not in s3.objects
+
+
+def test_failing_part_upload_aborts_the_upload(monkeypatch):
+    s3 = RecordingS3()
+
+    def failing_upload(**kwargs):
+        raise RuntimeError('SlowDown')
+
+    monkeypatch.setattr(s3, 'upload_part', failing_upload)
+    with pytest.raises(RuntimeError):
+        export(s3, synthetic_rows(60000, 'alice', NEWEST))
+    assert s3.operations[-1] == 'abort_multipart_upload'
+    assert s3.uploads == {}
+    assert (BUCKET, KEY) not in s3.objects
+
+
+def test_deadline_completes_the_file_and_returns_the_cursor():
+    rows = synthetic_rows(5000, 'alice', NEWEST)
+    clock = iter(range(100))
+    s3 = RecordingS3()
+    result = export(s3, rows, deadline=3, clock=lambda: next(clock))
+    # The clock reads 0, 1, 2, 3 after the first four pages
+    assert result['rows'] == 4000
+    assert not result['complete'] and result['next_cursor'] == '4000'
+    assert len(parse_export('csv', s3.objects[(BUCKET, KEY)])) == 4000
+
+
+def test_formula_cells_are_escaped():
+    rows = [{'transaction_id': 't1', 'merchant': '=HYPERLINK("http://evil.example","x")', 'amount': -5,
+             'currency': 'USD', 'status': 'approved', 'risk_factors': ['@SUM(A1)', 'velocity']},
+            {'transaction_id': '+t2', 'merchant': '-2+3', 'rules_version': '\tcmd'},
+            {'transaction_id': 't3', 'merchant': 'Café "Le Coin", Paris', 'merchant_keyword': 'a=b'}]
+    parsed = list(csv.DictReader(io.StringIO(transaction_export.csv_header().decode()
+                                             + transaction_export.encode_csv(rows).decode())))
+    assert parsed[0]['merchant'] == '\'=HYPERLINK("http://evil.example","x")'
+    assert parsed[0]['amount'] == '-5'
+    assert parsed[0]['risk_factors'] == "'@SUM(A1);velocity"
+    assert parsed[1]['transaction_id'] == "'+t2"
+    assert parsed[1]['merchant'] == "'-2+3"
+    assert parsed[1]['rules_version'] == "'\tcmd"
+    assert parsed[2]['merchant'] == 'Café "Le Coin", Paris'
+    assert parsed[2]['merchant_keyword'] == 'a=b'
+
+
+def test_export_resumes_through_next_cursor_without_gaps_or_repeats(monkeypatch):
+    pytest.importorskip('boto3')
+    from bench_export import export as post_export
+    from local_stubs import bearer_token, install_stubs, load_lambda_module
+
+    lambda_code = load_lambda_module()
+    stubs = install_stubs(lambda_code)
+    rows = synthetic_rows(2500, 'exporter', NEWEST)
+    for row in rows:
+        lambda_code.transactions_table.put_item(Item=row)
+    monkeypatch.setattr(lambda_code, 'EXPORT_QUERY_PAGE_SIZE', 300)
+    # No time budget: each request writes one page and hands back a cursor
+    monkeypatch.setattr(lambda_code, 'EXPORT_TIME_BUDGET_SECONDS', 0)
+
+    token = bearer_token('exporter')
+    exported, cursor, requests = [], None, 0
+    while True:
+        status, body = post_export(lambda_code, token, format='ndjson', **({'cursor': cursor} if cursor else {}))
+        assert status == 200, body
+        requests += 1
+        exported.extend(parse_export('ndjson', stubs['s3'].objects[(lambda_code.S3_BUCKET, body['key'])]))
+        if body['complete']:
+            break
+        cursor = body['next_cursor']
+    assert requests == 9
+    assert [row['transaction_id'] for row in exported] == [
+        row['transaction_id'] for row in sorted(rows, key=lambda row: row['timestamp'], reverse=True)]
+
+    status, body = post_export(lambda_code, token, cursor=json.dumps({'not': 'a cursor'}))
+    assert status == 400
@@ -0,0 +1,115 @@
+"""POST /transaction with an Idempotency-Key runs once; retries replay, conflict or are refused."""
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip('boto3')
+
+from local_stubs import bearer_token, install_stubs, load_lambda_module  # noqa: E402
+
+# Low enough that every submitted transaction is flagged and alerts
+RISK_THRESHOLD = 50
+
+
+@pytest.fixture
+def lambda_code():
+    return load_lambda_module()
+
+
+@pytest.fixture
+def stubs(lambda_code):
+    installed = install_stubs(lambda_code, latency=0.002)
+    lambda_code._profile_cache = lambda_code.TTLCache(log_every=0, version=lambda_code.profile_version)
+    return installed
+
+
+@pytest.fixture
+def event(lambda_code, stubs):
+    # A user per test, so alert windows left in the module's aggregator by other tests don't apply
+    user_id = f"replay-{uuid.uuid4().hex[:8]}"
+    lambda_code.user_profiles_table.items[user_id] = {'user_id': user_id, 'customRiskThreshold': RISK_THRESHOLD}
+    token = bearer_token(user_id)
+
+    def build(key, amount=9000):
+        return {'path': '/transaction', 'httpMethod': 'POST',
+                'headers': {'Authorization': token, 'Idempotency-Key': key},
+                'body': json.dumps({'amount': amount, 'merchant': 'Casino Royale', 'currency': 'USD'})}
+    return build
+
+
+def test_concurrent_duplicates_run_once(lambda_code, stubs, event):
+    request = event(str(uuid.uuid4()))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(lambda _: lambda_code.lambda_handler(request, None), range(8)))
+
+    first = [r for r in responses if r['statusCode'] == 200 and 'Idempotent-Replayed' not in r['headers']]
+    replayed = [r for r in responses if r['headers'].get('Idempotent-Replayed') == 'true']
+    conflicts = [r for r in responses if r['statusCode'] == 409]
+    assert len(first) == 1
+    assert len(replayed) + len(conflicts) == len(responses) - 1
+    assert all(r['headers'].get('Retry-After') == '1' for r in conflicts)
+    assert all(r['body'] == first[0]['body'] for r in replayed)
+    assert len(lambda_code.transactions_table.items) == 1
+    assert len(stubs['s3'].objects) == 1
+
+
+def test_replay_returns_the_stored_response(lambda_code, stubs, event):
+    request = event(str(uuid.uuid4()))
+    original = lambda_code.lambda_handler(request, None)
+    assert original['statusCode'] == 200
+
+    # Same container: from the LRU; another container: from the table
+    for cold in (False, True):
+        if cold:
+            lambda_code._idempotency_cache = lambda_code.TTLCache(log_every=0)
+        replay = lambda_code.lambda_handler(request, None)
+        assert replay['statusCode'] == 200
+        assert replay['headers']['Idempotent-Replayed'] == 'true'
+        assert replay['body'] == original['body']
+    assert len(lambda_code.transactions_table.items) == 1
+    assert len(stubs['s3'].objects) == 1
+    assert len(stubs['sns'].messages) == 1
+
+
+def test_key_reused_for_a_different_body(lambda_code, stubs, event):
+    key = str(uuid.uuid4())
+    assert lambda_code.lambda_handler(event(key), None)['statusCode'] == 200
+    response = lambda_code.lambda_handler(event(key, amount=1), None)
+    assert response['statusCode'] == 422
+    assert len(lambda_code.transactions_table.items) == 1
+
+
+def test_failed_write_releases_the_key(lambda_code, stubs, event, monkeypatch):
+    table = lambda_code.transactions_table
+    put_item = table.put_item
+
+    def failing_put(**kwargs):
+        raise RuntimeError('ProvisionedThroughputExceededException')
+
+    monkeypatch.setattr(table, 'put_item', failing_put)
+    request = event(str(uuid.uuid4()))
+    response = lambda_code.lambda_handler(request, None)
+    assert response['statusCode'] == 503
+    assert response['headers']['Retry-After'] == '1'
+    assert lambda_code.idempotency_table.items == {}
+    # Not stored, so not archived, alerted or counted
+    assert stubs['s3'].objects == {}
+    assert stubs['sns'].messages == []
+    assert all(not item.get('txn_count') for item in lambda_code.spend_counters_table.items.values())
+
+    monkeypatch.setattr(table, 'put_item', put_item)
+    retry = lambda_code.lambda_handler(request, None)
+    assert retry['statusCode'] == 200
+    assert 'Idempotent-Replayed' not in retry['headers']
+    assert len(table.items) == 1
+    assert len(stubs['s3'].objects) == 1
+
+
+def test_no_table_is_a_server_error(lambda_code, stubs, event, monkeypatch):
+    monkeypatch.setattr(lambda_code, 'transactions_table', None)
+    request = event(str(uuid.uuid4()))
+    assert lambda_code.lambda_handler(request, None)['statusCode'] == 500
+    assert lambda_code.idempotency_table.items == {}
+    assert stubs['s3'].objects == {}
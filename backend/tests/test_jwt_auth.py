@@ -0,0 +1,73 @@
+"""Malformed tokens and JWKS documents are rejected with AuthError, never an unhandled exception."""
+import base64
+import json
+
+import pytest
+
+from jwt_auth import AuthError, Jwks, JwtVerifier
+from local_stubs import APP_CLIENT_ID, ISSUER, SIGNING_KID, bearer_token, local_jwks
+
+
+def segment(value):
+    data = value if isinstance(value, bytes) else json.dumps(value).encode()
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+@pytest.fixture
+def verifier():
+    return JwtVerifier(Jwks('https://example.invalid/jwks', fetch=local_jwks), ISSUER, APP_CLIENT_ID)
+
+
+def test_valid_token(verifier):
+    claims = verifier.verify(bearer_token('alice')[len('Bearer '):])
+    assert claims['cognito:username'] == 'alice'
+
+
+@pytest.mark.parametrize('header', [
+    ['RS256'],                                  # JSON, but not an object
+    'RS256',
+    42,
+    None,
+    {'alg': 'RS256'},                           # no kid
+    {'alg': 'RS256', 'kid': ['a', 'b']},        # unhashable kid
+    {'alg': 'HS256', 'kid': SIGNING_KID},
+])
+def test_malformed_header(verifier, header):
+    token = bearer_token('alice')[len('Bearer '):]
+    _, payload, signature = token.split('.')
+    with pytest.raises(AuthError) as raised:
+        verifier.verify(f"{segment(header)}.{payload}.{signature}")
+    assert raised.value.status_code == 401
+
+
+@pytest.mark.parametrize('token', [
+    '',
+    'a.b',
+    'a.b.c.d',
+    '!!!.@@@.###',
+    f"{segment(b'not json')}.e30.e30",
+    f"{segment(bytes([0xff, 0xfe]))}.e30.e30",
+    'é.é.é',
+    None,
+    42,
+])
+def test_malformed_token(verifier, token):
+    with pytest.raises(AuthError) as raised:
+        verifier.verify(token)
+    assert raised.value.status_code == 401
+
+
+def test_jwks_keys_without_kid_or_key_material_are_skipped():
+    document = local_jwks()
+    good = document['keys'][0]
+    document['keys'] = [
+        {k: v for k, v in good.items() if k != 'kid'},
+        {**good, 'kid': 'no-modulus', 'n': None},
+        {**good, 'kid': 'bad-base64', 'e': '!!'},
+        'not a key',
+        good,
+    ]
+    jwks = Jwks('https://example.invalid/jwks', fetch=lambda url: document)
+    verifier = JwtVerifier(jwks, ISSUER, APP_CLIENT_ID)
+    assert verifier.verify(bearer_token('alice')[len('Bearer '):])['sub'] == 'alice'
+    assert set(jwks._keys) == {SIGNING_KID}
@@ -0,0 +1,67 @@
+"""score_batch must give the same score as calculate_risk_score on every row."""
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from fx_rates import DEFAULT_RATES  # noqa: E402
+from risk_batch import factorize, score_batch  # noqa: E402
+from risk_scoring import AMOUNT_BANDS, calculate_risk_score  # noqa: E402
+
+MERCHANTS = ['Amazon', 'Walmart', 'Starbucks', 'Crypto Exchange', 'Lucky Casino', 'Shell', 'Uber',
+             'Online Gambling Ltd', 'Target', 'Netflix']
+
+
+def scalar_scores(amounts, currencies, merchants):
+    return np.array([calculate_risk_score({'currency': c, 'merchant': m}, a)
+                     for a, c, m in zip(amounts, currencies, merchants)], dtype=np.int64)
+
+
+def test_matches_scalar_on_synthetic_rows():
+    rng = random.Random(11)
+    currencies = list(DEFAULT_RATES) + ['XYZ']
+    merchants = MERCHANTS + [f'Store #{i}' for i in range(500)]
+    count = 20000
+    amounts = [round(rng.lognormvariate(5, 2), 2) for _ in range(count)]
+    currencies = [rng.choice(currencies) for _ in range(count)]
+    merchants = [rng.choice(merchants) for _ in range(count)]
+
+    np.testing.assert_array_equal(score_batch(amounts, currencies, merchants),
+                                  scalar_scores(amounts, currencies, merchants))
+
+
+def test_matches_scalar_at_band_thresholds():
+    amounts = []
+    for threshold, _ in AMOUNT_BANDS:
+        amounts.extend([threshold - 0.01, threshold, threshold + 0.01])
+    currencies = ['USD'] * len(amounts)
+    merchants = ['Lucky Casino' if i % 2 else 'Target' for i in range(len(amounts))]
+
+    np.testing.assert_array_equal(score_batch(amounts, currencies, merchants),
+                                  scalar_scores(amounts, currencies, merchants))
+
+
+def test_empty_batch():
+    assert score_batch([], [], []).tolist() == []
+
+
+def test_mismatched_columns():
+    with pytest.raises(ValueError):
+        score_batch([1.0, 2.0], ['USD'], ['Target', 'Uber'])
+
+
+def test_factorize():
+    values = ['EUR', 'USD', None, 'EUR', 'GBP', 'USD']
+    uniques, inverse = factorize(values)
+    assert sorted(uniques) == ['EUR', 'GBP', 'None', 'USD']
+    assert [uniques[i] for i in inverse] == ['EUR', 'USD', 'None', 'EUR', 'GBP', 'USD']
+
+
+def test_missing_merchant_and_currency():
+    amounts = [50.0, 5000.0, 150.0]
+    currencies = [None, 'EUR', 'XYZ']
+    merchants = [None, None, 'Crypto Exchange']
+
+    np.testing.assert_array_equal(score_batch(amounts, currencies, merchants),
+                                  scalar_scores(amounts, currencies, merchants))
@@ -0,0 +1,51 @@
+"""The compiled rules in risk_rules.json must agree with calculate_risk_score."""
+import pytest
+
+import risk_rules
+from bench_risk_rules import DETAIL_KEYS, synthetic_rows
+from risk_scoring import calculate_risk_score, score_transaction
+
+
+@pytest.mark.parametrize('seed', [13, 29])
+def test_matches_calculate_risk_score(seed):
+    for transaction, amount, profile, spend, stats in synthetic_rows(5000, seed=seed):
+        details = {}
+        score = calculate_risk_score(transaction, amount, profile=profile, details=details, spend=spend, stats=stats)
+        rule_score, rule_details = score_transaction(transaction, amount, profile=profile, spend=spend, stats=stats)
+        assert rule_score == score, (transaction, amount, profile, spend, stats)
+        assert rule_details['risk_factors'] == details['risk_factors']
+        for key in DETAIL_KEYS:
+            assert rule_details[key] == details[key]
+
+
+def test_result_carries_the_rules_version():
+    _, details = score_transaction({'merchant': 'Lucky Casino', 'currency': 'USD'}, 50)
+    assert details['rules_version']
+    assert details['threshold'] == risk_rules.DEFAULT_THRESHOLD
+
+
+def test_group_fires_its_first_rule_only():
+    rule_set = risk_rules.compile_rules({'version': 't', 'rules': [
+        {'id': 'over_100', 'group': 'amount', 'points': 30, 'when': {'amount_usd_gt': 100}},
+        {'id': 'over_10', 'group': 'amount', 'points': 10, 'when': {'amount_usd_gt': 10}},
+        {'id': 'gbp', 'points': 5, 'factor': 'gbp', 'when': {'currency_in': ['GBP']}},
+    ]}, log_every=0)
+    assert rule_set.evaluate(500, 'shop', 'GBP')[0] == 35
+    assert rule_set.evaluate(50, 'shop', 'USD')[0] == 10
+    assert rule_set.evaluate(5, 'shop', 'USD')[0] == 0
+    assert rule_set.hit_counts() == {'over_100': 1, 'over_10': 1, 'gbp': 1}
+
+
+@pytest.mark.parametrize('document', [
+    [],
+    {'rules': [{'id': 'a', 'points': 1, 'when': {'amount_usd_gt': 1}}]},
+    {'version': '1', 'rules': []},
+    {'version': '1', 'rules': [{'id': 'a', 'points': 1, 'when': {'no_such_condition': 1}}]},
+    {'version': '1', 'rules': [{'id': 'a', 'points': 'many', 'when': {'amount_usd_gt': 1}}]},
+    {'version': '1', 'rules': [{'id': 'a', 'points': 1, 'when': {}}]},
+    {'version': '1', 'rules': [{'id': 'a', 'points': 1, 'when': {'amount_usd_gt': 1}},
+                               {'id': 'a', 'points': 2, 'when': {'amount_usd_gt': 2}}]},
+])
+def test_invalid_documents_are_refused(document):
+    with pytest.raises(risk_rules.RulesError):
+        risk_rules.compile_rules(document)
@@ -0,0 +1,168 @@
+"""GET /transactions pages through the table and the compacted archive without skipping or repeating rows."""
+import datetime
+import json
+
+import pytest
+
+pytest.importorskip('boto3')
+pytest.importorskip('pyarrow')
+
+import archive_compaction  # noqa: E402
+import encoding  # noqa: E402
+import transaction_tiers  # noqa: E402
+from local_stubs import bearer_token, install_stubs, load_lambda_module  # noqa: E402
+
+BOUNDARY = '2026-03-10T12:00:00+00:00'
+# TTL deletion lags expiry: the table still holds the cold rows from here to the boundary
+TABLE_FROM = '2026-03-08T00:00:00+00:00'
+UNTIL = '2026-03-09T00:00:00+00:00'
+FIRST_DAY = datetime.date(2026, 3, 1)
+DAYS = 14
+USER = 'alice'
+
+
+def timestamp(day, hour, minute=0, second=0):
+    return datetime.datetime(day.year, day.month, day.day, hour, minute, second,
+                             tzinfo=datetime.timezone.utc).isoformat()
+
+
+def transaction(transaction_id, ts, user_id=USER, status='approved'):
+    return {'transaction_id': transaction_id, 'user_id': user_id, 'timestamp': ts, 'amount': 10.0,
+            'merchant': 'Corner Shop', 'currency': 'USD', 'risk_score': 5.0, 'status': status}
+
+
+@pytest.fixture
+def lambda_code(monkeypatch):
+    module = load_lambda_module()
+    monkeypatch.setattr(module, 'TRANSACTION_RETENTION_DAYS', 30)
+    monkeypatch.setattr(module.transaction_tiers, 'hot_boundary', lambda retention_days, now=None: BOUNDARY)
+    return module
+
+
+@pytest.fixture
+def tiers(lambda_code):
+    """Four transactions a day for alice (and one for bob); the archive holds every day before the
+    boundary, the table everything from TABLE_FROM. Returns alice's rows, newest first"""
+    stubs = install_stubs(lambda_code)
+    s3, table = stubs['s3'], lambda_code.transactions_table
+    expected = []
+    for offset in range(DAYS):
+        day = FIRST_DAY + datetime.timedelta(days=offset)
+        rows = [transaction(f"{day}-{hour:02d}", timestamp(day, hour)) for hour in (3, 9, 15, 21)]
+        rows.append(transaction(f"{day}-bob", timestamp(day, 12), user_id='bob'))
+        for row in rows:
+            if row['timestamp'] < BOUNDARY:
+                s3.put_object(Bucket=lambda_code.S3_BUCKET, Key=f"transactions/{day}/{row['transaction_id']}.json",
+                              Body=encoding.dumps(row))
+            if row['timestamp'] >= TABLE_FROM:
+                table.put_item(Item=dict(row, status='flagged' if row['timestamp'] < BOUNDARY else 'approved'))
+        expected.extend(row for row in rows if row['user_id'] == USER)
+
+    # Stored a second before midnight and archived after it, under the next day's prefix
+    day = FIRST_DAY + datetime.timedelta(days=3)
+    late = transaction('late', timestamp(day, 23, 59, 59))
+    s3.put_object(Bucket=lambda_code.S3_BUCKET, Key=f"transactions/{day + datetime.timedelta(days=1)}/late.json",
+                  Body=encoding.dumps(late))
+    expected.append(late)
+
+    store = archive_compaction.S3Store(s3, lambda_code.S3_BUCKET)
+    for offset in range(DAYS):
+        archive_compaction.compact_day(store, FIRST_DAY + datetime.timedelta(days=offset), row_group_rows=4)
+    expected.sort(key=transaction_tiers.sort_key, reverse=True)
+    return stubs, expected
+
+
+def get(lambda_code, **params):
+    event = {'path': '/transactions', 'httpMethod': 'GET', 'headers': {'Authorization': bearer_token(USER)},
+             'queryStringParameters': params}
+    response = lambda_code.lambda_handler(event, None)
+    assert response['statusCode'] == 200, response['body']
+    return json.loads(response['body'])
+
+
+def ids(rows):
+    return [row['transaction_id'] for row in rows]
+
+
+def page_through(lambda_code, cursor=None, **params):
+    pages = []
+    while True:
+        body = get(lambda_code, **params, **({'cursor': cursor} if cursor else {}))
+        pages.append(body['transactions'])
+        cursor = body['next_cursor']
+        if not cursor:
+            return pages
+        assert len(pages) < 100
+
+
+@pytest.mark.parametrize('limit', [1, 3, 4, 7, 50])
+def test_listing_crosses_into_the_archive_without_gaps_or_repeats(lambda_code, tiers, limit):
+    _, expected = tiers
+    pages = page_through(lambda_code, limit=str(limit))
+    assert ids(row for page in pages for row in page) == ids(expected)
+    assert all(len(page) <= limit for page in pages)
+
+
+def test_cursor_resumes_inside_an_archive_day(lambda_code, tiers):
+    _, expected = tiers
+    first = get(lambda_code, limit='10', until=UNTIL)
+    mode, position, user_id, boundary = lambda_code.decode_cursor(first['next_cursor'])
+    assert (mode, user_id, boundary) == ('archive', USER, BOUNDARY)
+    # Ten rows are two and a half days back from UNTIL: the cursor stops part-way through 2026-03-06
+    assert position['day'] == '2026-03-06'
+    last = first['transactions'][-1]
+    assert position['after'] == [last['timestamp'], last['transaction_id']]
+    rest = page_through(lambda_code, limit='10', until=UNTIL, cursor=first['next_cursor'])
+    listed = first['transactions'] + [row for page in rest for row in page]
+    assert ids(listed) == ids(row for row in expected if row['timestamp'] <= UNTIL)
+
+
+def test_page_with_since_fills_from_both_tiers(lambda_code, tiers):
+    _, expected = tiers
+    since = '2026-03-07T00:00:00+00:00'
+    body = get(lambda_code, limit='1000', since=since)
+    assert ids(body['transactions']) == ids(row for row in expected if row['timestamp'] >= since)
+    assert body['next_cursor'] is None
+    timestamps = [row['timestamp'] for row in body['transactions']]
+    assert timestamps[0] >= BOUNDARY > timestamps[-1]
+    # Rows the table still holds win over their archived copies
+    statuses = {row['transaction_id']: row['status'] for row in body['transactions']}
+    cold = [row for row in expected if since <= row['timestamp'] < BOUNDARY]
+    assert {statuses[row['transaction_id']] for row in cold if row['timestamp'] >= TABLE_FROM} == {'flagged'}
+    assert {statuses[row['transaction_id']] for row in cold if row['timestamp'] < TABLE_FROM} == {'approved'}
+
+
+def test_archive_day_cap_per_page(lambda_code, tiers, monkeypatch):
+    monkeypatch.setattr(lambda_code, 'ARCHIVE_MAX_DAYS_PER_PAGE', 2)
+    options, error = lambda_code.parse_page_params({'limit': '1000', 'until': UNTIL})
+    assert error is None
+    served = {}
+    items, cursor = lambda_code.query_transactions_page(USER, options, served)
+    # 2026-03-09 is visited (for the transactions up to UNTIL) and 2026-03-08 served
+    assert served['days'] == 2
+    assert {row['timestamp'][:10] for row in items} == {'2026-03-08'}
+    mode, position, _, _ = lambda_code.decode_cursor(cursor)
+    assert mode == 'archive' and position == {'day': '2026-03-07', 'after': None}
+
+
+def test_day_not_compacted_is_deferred(lambda_code, tiers):
+    stubs, _ = tiers
+    day = FIRST_DAY + datetime.timedelta(days=5)
+    stubs['s3'].put_object(Bucket=lambda_code.S3_BUCKET, Key=f"transactions/{day}/retried.json",
+                           Body=encoding.dumps(transaction('retried', timestamp(day, 6))))
+    event = {'path': '/transactions', 'httpMethod': 'GET', 'headers': {'Authorization': bearer_token(USER)},
+             'queryStringParameters': {'limit': '1000', 'since': '2026-03-01T00:00:00+00:00'}}
+    response = lambda_code.lambda_handler(event, None)
+    assert response['statusCode'] == 503
+    assert response['headers']['Retry-After'] == lambda_code.ARCHIVE_NOT_READY_RETRY_AFTER
+
+
+def test_merge_keeps_the_table_copy_newest_first():
+    archived = [{'transaction_id': 'a', 'timestamp': '2026-03-01T01:00:00+00:00', 'status': 'approved'},
+                {'transaction_id': 'b', 'timestamp': '2026-03-01T03:00:00+00:00', 'status': 'approved'},
+                {'timestamp': '2026-03-01T04:00:00+00:00'}]
+    table_rows = [{'transaction_id': 'b', 'timestamp': '2026-03-01T03:00:00+00:00', 'status': 'flagged'},
+                  {'transaction_id': 'c', 'timestamp': '2026-03-01T02:00:00+00:00', 'status': 'approved'}]
+    merged = transaction_tiers.merge(table_rows, archived)
+    assert [(row['transaction_id'], row['status']) for row in merged] == [
+        ('b', 'flagged'), ('c', 'approved'), ('a', 'approved')]
@@ -0,0 +1,95 @@
+"""TTLCache expires and evicts entries, and with revalidate= drops a hit whose stored version has moved on."""
+import pytest
+
+import ttl_cache
+from ttl_cache import TTLCache, profile_version
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ttl_cache.time, 'monotonic', clock)
+    return clock
+
+
+def test_entries_expire_and_the_oldest_is_evicted(clock):
+    cache = TTLCache(max_entries=2, ttl=60, log_every=0)
+    cache.put('a', 1)
+    cache.put('b', None)
+    assert cache.get('b') == (True, None)
+    cache.put('c', 3)
+    assert cache.get('a') == (False, None)
+    clock.now += 60
+    assert cache.get('c') == (False, None)
+    assert cache.stats['evictions'] == 1 and cache.stats['expired'] == 1
+
+
+def test_older_version_does_not_replace_the_cached_one(clock):
+    cache = TTLCache(log_every=0, version=profile_version)
+    cache.put('alice', {'version': 3})
+    cache.put('alice', {'version': 2})
+    assert cache.get('alice') == (True, {'version': 3})
+
+
+def test_hit_is_checked_against_the_stored_version(clock):
+    stored = {'alice': 1}
+    checks = []
+
+    def revalidate(key):
+        checks.append(key)
+        return stored[key]
+
+    cache = TTLCache(ttl=60, log_every=0, version=profile_version, revalidate=revalidate, revalidate_after=5)
+    cache.put('alice', {'version': 1})
+    clock.now += 4
+    assert cache.get('alice')[0] and checks == []
+    clock.now += 1
+    assert cache.get('alice')[0] and checks == ['alice']
+    # The check time is reset, not the TTL
+    clock.now += 4
+    assert cache.get('alice')[0] and checks == ['alice']
+
+    stored['alice'] = 2
+    clock.now += 1
+    assert cache.get('alice') == (False, None)
+    assert cache.stats['revalidations'] == 2 and cache.stats['stale'] == 1
+    assert len(cache) == 0
+
+
+def test_failed_check_drops_the_entry(clock):
+    def revalidate(key):
+        raise RuntimeError('ProvisionedThroughputExceededException')
+
+    cache = TTLCache(log_every=0, version=profile_version, revalidate=revalidate, revalidate_after=0)
+    cache.put('alice', {'version': 1})
+    assert cache.get('alice') == (False, None)
+
+
+def test_profile_written_by_another_container_is_picked_up(clock, monkeypatch):
+    pytest.importorskip('boto3')
+    from local_stubs import install_stubs, load_lambda_module
+
+    lambda_code = load_lambda_module()
+    install_stubs(lambda_code)
+    monkeypatch.setattr(lambda_code, '_profile_cache', TTLCache(
+        ttl=60, log_every=0, version=profile_version, revalidate=lambda_code.stored_profile_version,
+        revalidate_after=5))
+    table = lambda_code.user_profiles_table
+    assert lambda_code.load_profile('alice') is None
+    lambda_code.save_profile('alice', {'user_id': 'alice', 'customRiskThreshold': 70})
+    assert lambda_code.load_profile('alice')['version'] == 1
+
+    # Another container's save, which this container's cache never saw
+    table.put_item(Item={'user_id': 'alice', 'customRiskThreshold': 40, 'version': 2})
+    assert lambda_code.load_profile('alice')['customRiskThreshold'] == 70
+    clock.now += 5
+    assert lambda_code.load_profile('alice')['customRiskThreshold'] == 40
+    assert lambda_code.stored_profile_version('bob') == 0
@@ -0,0 +1,46 @@
+"""Transactions in a currency without an exchange rate are rejected, not scored as USD."""
+import json
+
+import pytest
+
+pytest.importorskip('boto3')
+
+from local_stubs import bearer_token, install_stubs, load_lambda_module  # noqa: E402
+
+
+@pytest.fixture
+def lambda_code():
+    module = load_lambda_module()
+    install_stubs(module)
+    return module
+
+
+def post(lambda_code, path, body):
+    event = {'path': path, 'httpMethod': 'POST', 'headers': {'Authorization': bearer_token('alice')},
+             'body': json.dumps(body)}
+    response = lambda_code.lambda_handler(event, None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+@pytest.mark.parametrize('currency', ['XYZ', 'eur', '', None, 7, ['USD']])
+def test_unknown_currency_is_rejected(lambda_code, currency):
+    status, body = post(lambda_code, '/transaction', {'amount': 10, 'merchant': 'Shell', 'currency': currency})
+    assert status == 400
+    assert body['error'].startswith('Unsupported currency')
+    assert lambda_code.transactions_table.items == {}
+
+
+def test_known_and_default_currency_are_accepted(lambda_code):
+    assert post(lambda_code, '/transaction', {'amount': 10, 'merchant': 'Shell', 'currency': 'GHS'})[0] == 200
+    assert post(lambda_code, '/transaction', {'amount': 10, 'merchant': 'Shell'})[0] == 200
+    assert len(lambda_code.transactions_table.items) == 2
+
+
+def test_batch_rejects_the_row(lambda_code):
+    status, body = post(lambda_code, '/transactions/batch', {'transactions': [
+        {'amount': 10, 'merchant': 'Shell', 'currency': 'EUR'},
+        {'amount': 10, 'merchant': 'Shell', 'currency': 'XYZ'},
+    ]})
+    assert body['processed'] == 1
+    assert len(lambda_code.transactions_table.items) == 1
+    assert 'Unsupported currency: XYZ' in json.dumps(body)
@@ -3,6 +3,7 @@ import { CommonModule } from '@angular/common';
 import { BaseChartDirective } from 'ng2-charts';
 import { Chart, ChartConfiguration, ChartData, ChartType, registerables } from 'chart.js';
 import { formatCurrency } from '../../utils/currency';
+import { AnalyticsRollups, riskLevel } from '../../utils/analytics';
 
 Chart.register(...registerables);
 
@@ -26,81 +27,81 @@ interface Transaction {
 export class AnalyticsComponent implements OnInit, OnChanges {
   @Input() transactions: Transaction[] = [];
   
-  get spendingInsights() {
-    if (this.transactions.length === 0) return [];
-    
-    const insights = [];
-    
+  // Server-side rollups from GET /analytics; null falls back to the loaded page
+  @Input() rollups: AnalyticsRollups | null = null;
+
+  spendingInsights: string[] = [];
+  merchantRiskProfiles: { merchant: string; count: number; totalAmount: number; avgRisk: number; riskLevel: string }[] = [];
+
+  get hasData(): boolean {
+    return this.transactions.length > 0 || (this.rollups?.summary.count ?? 0) > 0;
+  }
+
+  calculateSpendingInsights() {
+    const insights: string[] = [];
+    const daySpending: Record<string, number> = {};
+    const periodSpending: Record<string, number> = {};
+    const addPeriod = (hour: number, amount: number) => {
+      let period = 'Morning';
+      if (hour >= 12 && hour < 17) period = 'Afternoon';
+      else if (hour >= 17 && hour < 21) period = 'Evening';
+      else if (hour >= 21 || hour < 6) period = 'Night';
+      periodSpending[period] = (periodSpending[period] || 0) + amount;
+    };
+
+    let avgRisk: number;
+    let merchantDiversity: number;
+    if (this.rollups) {
+      // Rollup buckets are UTC; shift hours into the browser's timezone
+      const offsetHours = Math.round(new Date().getTimezoneOffset() / 60);
+      this.rollups.weekday.forEach(d => daySpending[d.day] = d.amount);
+      this.rollups.hourly.forEach(h => addPeriod((h.hour - offsetHours + 24) % 24, h.amount));
+      avgRisk = this.rollups.summary.avg_risk;
+      merchantDiversity = this.rollups.summary.count > 0 ? this.rollups.merchants.length / this.rollups.summary.count : 0;
+    } else {
+      const dayNames = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday'];
+      let riskSum = 0;
+      const merchants = new Set<string>();
+      this.transactions.forEach(t => {
+        const date = new Date(t.timestamp || Date.now());
+        const dayName = dayNames[date.getDay()];
+        daySpending[dayName] = (daySpending[dayName] || 0) + t.amount;
+        addPeriod(date.getHours(), t.amount);
+        riskSum += t.risk_score || 0;
+        merchants.add(t.merchant);
+      });
+      avgRisk = this.transactions.length > 0 ? riskSum / this.transactions.length : 0;
+      merchantDiversity = this.transactions.length > 0 ? merchants.size / this.transactions.length : 0;
+    }
+
     // Day of week analysis
-    const daySpending = this.transactions.reduce((acc, t) => {
-      const day = new Date(t.timestamp || Date.now()).getDay();
-      const dayName = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday'][day];
-      acc[dayName] = (acc[dayName] || 0) + t.amount;
-      return acc;
-    }, {} as Record<string, number>);
-    
-    const topDay = Object.entries(daySpending).sort(([,a], [,b]) => b - a)[0];
+    const topDay = Object.entries(daySpending).filter(([, v]) => v > 0).sort(([,a], [,b]) => b - a)[0];
     if (topDay) {
       const isWeekend = topDay[0] === 'Saturday' || topDay[0] === 'Sunday';
       insights.push(`You spend most on ${topDay[0]}s ${isWeekend ? '(weekends)' : '(weekdays)'}`);
     }
-    
+
     // Time of day analysis
-    const hourSpending = this.transactions.reduce((acc, t) => {
-      const hour = new Date(t.timestamp || Date.now()).getHours();
-      let period = 'Morning';
-      if (hour >= 12 && hour < 17) period = 'Afternoon';
-      else if (hour >= 17 && hour < 21) period = 'Evening';
-      else if (hour >= 21 || hour < 6) period = 'Night';
-      acc[period] = (acc[period] || 0) + t.amount;
-      return acc;
-    }, {} as Record<string, number>);
-    
-    const topTime = Object.entries(hourSpending).sort(([,a], [,b]) => b - a)[0];
+    const topTime = Object.entries(periodSpending).filter(([, v]) => v > 0).sort(([,a], [,b]) => b - a)[0];
     if (topTime) {
       insights.push(`Most active during ${topTime[0].toLowerCase()} hours`);
     }
-    
+
     // Risk behavior
-    const avgRisk = this.transactions.reduce((sum, t) => sum + (t.risk_score || 0), 0) / this.transactions.length;
     if (avgRisk > 50) {
       insights.push('⚠️ Higher than average risk profile');
     } else if (avgRisk < 20) {
       insights.push('✅ Very conservative spending pattern');
     }
-    
+
     // Merchant diversity
-    const uniqueMerchants = new Set(this.transactions.map(t => t.merchant)).size;
-    const merchantDiversity = uniqueMerchants / this.transactions.length;
     if (merchantDiversity > 0.7) {
       insights.push('🌟 High merchant diversity - you shop around!');
     } else if (merchantDiversity < 0.3) {
       insights.push('🔄 You tend to stick to familiar merchants');
     }
-    
-    return insights;
-  }
-  
-  get merchantRiskProfiles() {
-    const merchantData = this.transactions.reduce((acc, t) => {
-      if (!acc[t.merchant]) {
-        acc[t.merchant] = { transactions: [], totalAmount: 0, avgRisk: 0 };
-      }
-      acc[t.merchant].transactions.push(t);
-      acc[t.merchant].totalAmount += t.amount;
-      return acc;
-    }, {} as Record<string, any>);
-    
-    return Object.entries(merchantData).map(([merchant, data]) => {
-      const avgRisk = data.transactions.reduce((sum: number, t: Transaction) => sum + (t.risk_score || 0), 0) / data.transactions.length;
-      return {
-        merchant,
-        count: data.transactions.length,
-        totalAmount: data.totalAmount,
-        avgRisk: Math.round(avgRisk),
-        riskLevel: avgRisk > 70 ? 'High' : avgRisk > 30 ? 'Medium' : 'Low'
-      };
-    }).sort((a, b) => b.totalAmount - a.totalAmount);
+
+    this.spendingInsights = this.hasData ? insights : [];
   }
 
   // Detailed metrics
@@ -163,45 +164,66 @@ export class AnalyticsComponent implements OnInit, OnChanges {
 
   updateAnalytics() {
     this.calculateDetailedMetrics();
+    this.calculateSpendingInsights();
     this.updateAllCharts();
   }
 
   calculateDetailedMetrics() {
-    const total = this.transactions.length;
     const amounts = this.transactions.map(t => t.amount || 0);
-    const volume = amounts.reduce((sum, amount) => sum + amount, 0);
-    const avgRisk = total > 0 ? this.transactions.reduce((sum, t) => sum + (t.risk_score || 0), 0) / total : 0;
-    
-    const highRisk = this.transactions.filter(t => (t.risk_score || 0) > 70).length;
-    const mediumRisk = this.transactions.filter(t => (t.risk_score || 0) >= 30 && (t.risk_score || 0) <= 70).length;
-    const lowRisk = this.transactions.filter(t => (t.risk_score || 0) < 30).length;
 
-    // Currency breakdown
+    // Single pass over the loaded page; used when rollups are unavailable
     const currencyBreakdown: {[key: string]: {count: number, volume: number}} = {};
-    this.transactions.forEach(t => {
-      if (!currencyBreakdown[t.currency]) {
-        currencyBreakdown[t.currency] = { count: 0, volume: 0 };
-      }
-      currencyBreakdown[t.currency].count++;
-      currencyBreakdown[t.currency].volume += t.amount || 0;
-    });
-
-    // Merchant breakdown
     const merchantBreakdown: {[key: string]: {count: number, volume: number, avgRisk: number}} = {};
-    this.transactions.forEach(t => {
-      if (!merchantBreakdown[t.merchant]) {
-        merchantBreakdown[t.merchant] = { count: 0, volume: 0, avgRisk: 0 };
-      }
-      merchantBreakdown[t.merchant].count++;
-      merchantBreakdown[t.merchant].volume += t.amount || 0;
-    });
+    const merchantRiskSums: {[key: string]: number} = {};
+    let volume = 0;
+    let riskSum = 0;
+    let highRisk = 0;
+    let mediumRisk = 0;
+    let lowRisk = 0;
+    if (!this.rollups) {
+      this.transactions.forEach(t => {
+        const amount = t.amount || 0;
+        const risk = t.risk_score || 0;
+        volume += amount;
+        riskSum += risk;
+        if (risk > 70) highRisk++;
+        else if (risk >= 30) mediumRisk++;
+        else lowRisk++;
 
-    // Calculate average risk per merchant
-    Object.keys(merchantBreakdown).forEach(merchant => {
-      const merchantTransactions = this.transactions.filter(t => t.merchant === merchant);
-      const totalRisk = merchantTransactions.reduce((sum, t) => sum + (t.risk_score || 0), 0);
-      merchantBreakdown[merchant].avgRisk = merchantTransactions.length > 0 ? totalRisk / merchantTransactions.length : 0;
-    });
+        if (!currencyBreakdown[t.currency]) {
+          currencyBreakdown[t.currency] = { count: 0, volume: 0 };
+        }
+        currencyBreakdown[t.currency].count++;
+        currencyBreakdown[t.currency].volume += amount;
+
+        if (!merchantBreakdown[t.merchant]) {
+          merchantBreakdown[t.merchant] = { count: 0, volume: 0, avgRisk: 0 };
+          merchantRiskSums[t.merchant] = 0;
+        }
+        merchantBreakdown[t.merchant].count++;
+        merchantBreakdown[t.merchant].volume += amount;
+        merchantRiskSums[t.merchant] += risk;
+      });
+      Object.keys(merchantBreakdown).forEach(merchant => {
+        merchantBreakdown[merchant].avgRisk = merchantRiskSums[merchant] / merchantBreakdown[merchant].count;
+      });
+    }
+
+    let total = this.transactions.length;
+    let avgRisk = total > 0 ? riskSum / total : 0;
+    if (this.rollups) {
+      const summary = this.rollups.summary;
+      total = summary.count;
+      volume = summary.amount_sum;
+      avgRisk = summary.avg_risk;
+      highRisk = summary.risk_bands.high;
+      mediumRisk = summary.risk_bands.medium;
+      lowRisk = summary.risk_bands.low;
+      Object.assign(currencyBreakdown, summary.currencies);
+      this.rollups.merchants.forEach(m => {
+        merchantBreakdown[m.merchant] = { count: m.count, volume: m.amount, avgRisk: m.avg_risk };
+      });
+    }
 
     this.detailedMetrics = {
       totalTransactions: total,
@@ -217,6 +239,16 @@ export class AnalyticsComponent implements OnInit, OnChanges {
       currencyBreakdown,
       merchantBreakdown
     };
+
+    this.merchantRiskProfiles = Object.entries(merchantBreakdown)
+      .map(([merchant, data]) => ({
+        merchant,
+        count: data.count,
+        totalAmount: data.volume,
+        avgRisk: Math.round(data.avgRisk),
+        riskLevel: riskLevel(data.avgRisk)
+      }))
+      .sort((a, b) => b.totalAmount - a.totalAmount);
   }
 
   updateAllCharts() {
@@ -1,10 +1,12 @@
-import { Component, Input, Output, EventEmitter, OnInit } from '@angular/core';
+import { Component, Input, Output, EventEmitter, OnInit, OnDestroy } from '@angular/core';
 import { CommonModule } from '@angular/common';
 import { FormsModule } from '@angular/forms';
 import { MonitoringDashboardComponent } from '../monitoring-dashboard/monitoring-dashboard.component';
 import { TabNavigationComponent } from '../tab-navigation/tab-navigation.component';
 import { TransactionHistoryComponent } from '../transaction-history/transaction-history.component';
 import { AnalyticsComponent } from '../analytics/analytics.component';
+import { AnalyticsRollups } from '../../utils/analytics';
+import { EXCHANGE_RATES, loadExchangeRates } from '../../utils/currency';
 
 interface Transaction {
   transaction_id: string;
@@ -23,13 +25,15 @@ interface Transaction {
   templateUrl: './dashboard.component.html',
   styleUrls: ['./dashboard.component.css']
 })
-export class DashboardComponent implements OnInit {
+export class DashboardComponent implements OnInit, OnDestroy {
   @Input() token: string | null = null;
   @Output() logout = new EventEmitter<void>();
 
   transaction = { amount: '', merchant: '', currency: 'USD' };
   result: any = null;
   loading = false;
+  // Reused when the same transaction is resubmitted, so the API stores it only once
+  private pendingSubmission: { payload: string; key: string } | null = null;
   liveRiskScore = 0;
   liveRiskStatus = 'approved';
   
@@ -68,6 +72,16 @@ export class DashboardComponent implements OnInit {
   transactions: Transaction[] = [];
   activeTab = 'dashboard';
   loadingTransactions = false;
+  loadingMoreTransactions = false;
+  nextCursor: string | null = null;
+  pageSize = 100;
+  analyticsRollups: AnalyticsRollups | null = null;
+  // Real-time change feed: the API pushes new and changed transactions over this WebSocket
+  feedConnected = false;
+  private feed: WebSocket | null = null;
+  private feedPing: any = null;
+  private feedRetry: any = null;
+  private feedRetryDelay = 5000;
   selectedCurrency = 'USD';
   showCurrencyTip = false;
   
@@ -84,13 +98,11 @@ export class DashboardComponent implements OnInit {
     { code: 'ZAR', symbol: 'R', name: 'South African Rand' }
   ];
   
-  exchangeRates = {
-    'USD': 1.0, 'EUR': 0.92, 'GBP': 0.79, 'GHS': 12.05,
-    'JPY': 149.50, 'INR': 83.25, 'NGN': 775.00, 'ZAR': 18.75,
-    'KES': 129.50, 'CAD': 1.36
-  };
+  // Shared with utils/currency and refreshed from GET /fx-rates
+  exchangeRates = EXCHANGE_RATES;
 
   ngOnInit() {
+    loadExchangeRates();
     this.loadUserPreferences();
     this.loadUserRiskProfile();
     this.fetchTransactions();
@@ -105,6 +117,10 @@ export class DashboardComponent implements OnInit {
     document.addEventListener('openSettings', this.handleOpenSettings.bind(this));
   }
   
+  ngOnDestroy() {
+    this.closeChangeFeed();
+  }
+
   private handleOpenSettings() {
     this.activeTab = 'transactions';
     this.showRiskSettings = true;
@@ -128,35 +144,23 @@ export class DashboardComponent implements OnInit {
     
     console.log('Fetching transactions from database...');
     this.loadingTransactions = true;
+    this.fetchAnalytics();
     
     try {
-      const response = await fetch('https://lpf1gn8aia.execute-api.us-east-1.amazonaws.com/dev/transactions', {
-        method: 'GET',
-        headers: {
-          'Authorization': `Bearer ${this.token}`,
-          'Content-Type': 'application/json',
-          'Cache-Control': 'no-cache',
-          'Pragma': 'no-cache'
-        }
-      });
-      
-      const responseText = await response.text();
-      console.log('Fetch response status:', response.status);
-      console.log('Fetch response text:', responseText);
-      
-      if (response.ok) {
-        const data = JSON.parse(responseText);
+      const data = await this.fetchTransactionPage(null);
+      if (data) {
         const fetchedTransactions = data.transactions || [];
         console.log('Fetched', fetchedTransactions.length, 'transactions from database');
+        this.nextCursor = data.next_cursor || null;
+        if (data.change_feed_url) {
+          this.connectChangeFeed(data.change_feed_url);
+        }
         
         if (fetchedTransactions.length > 0) {
           this.transactions = [...fetchedTransactions];
           localStorage.setItem('transactions', JSON.stringify(this.transactions));
           console.log('Updated transactions array. Current count:', this.transactions.length);
         }
-      } else {
-        console.error('Failed to fetch transactions:', response.status, response.statusText);
-        console.error('Error response:', responseText);
       }
     } catch (error) {
       console.error('Error fetching transactions:', error);
@@ -165,6 +169,140 @@ export class DashboardComponent implements OnInit {
     }
   }
 
+  private connectChangeFeed(url: string) {
+    if (this.feed || !this.token) {
+      return;
+    }
+    // Browsers can't send an Authorization header on a WebSocket handshake
+    const feed = new WebSocket(`${url}?token=${encodeURIComponent(this.token)}`);
+    this.feed = feed;
+    feed.onopen = () => {
+      this.feedConnected = true;
+      this.feedRetryDelay = 5000;
+      // API Gateway drops connections that are idle for 10 minutes
+      this.feedPing = setInterval(() => feed.send(JSON.stringify({ action: 'ping' })), 5 * 60 * 1000);
+    };
+    feed.onmessage = (message) => {
+      try {
+        const data = JSON.parse(message.data);
+        if (data.type === 'transactions') {
+          this.applyTransactionChanges(data.upserts || [], data.removed || []);
+        }
+      } catch (error) {
+        console.error('Invalid change feed message:', error);
+      }
+    };
+    feed.onclose = () => {
+      const wasConnected = this.feedConnected;
+      this.closeChangeFeed();
+      if (!this.token) {
+        return;
+      }
+      // Changes made while disconnected aren't replayed, so catch up with a fresh first page
+      this.feedRetry = setTimeout(() => this.fetchTransactions(), wasConnected ? 0 : this.feedRetryDelay);
+      this.feedRetryDelay = Math.min(this.feedRetryDelay * 2, 60000);
+    };
+  }
+
+  private closeChangeFeed() {
+    clearInterval(this.feedPing);
+    clearTimeout(this.feedRetry);
+    this.feedPing = this.feedRetry = null;
+    this.feedConnected = false;
+    if (this.feed) {
+      this.feed.onclose = null;
+      this.feed.close();
+      this.feed = null;
+    }
+  }
+
+  private applyTransactionChanges(upserts: Transaction[], removed: string[]) {
+    const changed = new Map(upserts.map(t => [t.transaction_id, t] as [string, Transaction]));
+    const gone = new Set(removed);
+    const updated = this.transactions
+      .filter(t => !gone.has(t.transaction_id))
+      .map(t => {
+        const change = changed.get(t.transaction_id);
+        changed.delete(t.transaction_id);
+        return change || t;
+      });
+    // Whatever is left is new; newest first, like GET /transactions
+    const added = [...changed.values()].sort((a, b) => (b.timestamp || '').localeCompare(a.timestamp || ''));
+    this.transactions = [...added, ...updated];
+    localStorage.setItem('transactions', JSON.stringify(this.transactions));
+  }
+
+  async loadMoreTransactions() {
+    if (!this.token || !this.nextCursor || this.loadingMoreTransactions) {
+      return;
+    }
+    
+    this.loadingMoreTransactions = true;
+    try {
+      const data = await this.fetchTransactionPage(this.nextCursor);
+      if (data) {
+        const known = new Set(this.transactions.map(t => t.transaction_id));
+        const olderTransactions = (data.transactions || []).filter((t: Transaction) => !known.has(t.transaction_id));
+        this.transactions = [...this.transactions, ...olderTransactions];
+        this.nextCursor = data.next_cursor || null;
+      }
+    } catch (error) {
+      console.error('Error loading more transactions:', error);
+    } finally {
+      this.loadingMoreTransactions = false;
+    }
+  }
+
+  async fetchAnalytics() {
+    if (!this.token) return;
+    
+    try {
+      const response = await fetch('https://lpf1gn8aia.execute-api.us-east-1.amazonaws.com/dev/analytics', {
+        method: 'GET',
+        headers: {
+          'Authorization': `Bearer ${this.token}`,
+          'Content-Type': 'application/json',
+          'Cache-Control': 'no-cache'
+        }
+      });
+      
+      if (response.ok) {
+        this.analyticsRollups = await response.json();
+      } else {
+        console.error('Failed to fetch analytics:', response.status, response.statusText);
+      }
+    } catch (error) {
+      console.error('Error fetching analytics:', error);
+    }
+  }
+
+  private async fetchTransactionPage(cursor: string | null): Promise<any> {
+    const params = new URLSearchParams({ limit: String(this.pageSize) });
+    if (cursor) {
+      params.set('cursor', cursor);
+    }
+    
+    const response = await fetch(`https://lpf1gn8aia.execute-api.us-east-1.amazonaws.com/dev/transactions?${params}`, {
+      method: 'GET',
+      headers: {
+        'Authorization': `Bearer ${this.token}`,
+        'Content-Type': 'application/json',
+        'Cache-Control': 'no-cache',
+        'Pragma': 'no-cache'
+      }
+    });
+    
+    const responseText = await response.text();
+    console.log('Fetch response status:', response.status);
+    
+    if (!response.ok) {
+      console.error('Failed to fetch transactions:', response.status, response.statusText);
+      console.error('Error response:', responseText);
+      return null;
+    }
+    return JSON.parse(responseText);
+  }
+
   async handleSubmit() {
     this.loading = true;
     this.result = null;
@@ -186,22 +324,33 @@ export class DashboardComponent implements OnInit {
       
       console.log('Submitting transaction:', this.transaction);
       
+      const payload = JSON.stringify({
+        amount: amount,
+        merchant: this.transaction.merchant.trim(),
+        currency: this.transaction.currency
+      });
+      if (this.pendingSubmission?.payload !== payload) {
+        this.pendingSubmission = { payload, key: crypto.randomUUID() };
+      }
+      
       const response = await fetch('https://lpf1gn8aia.execute-api.us-east-1.amazonaws.com/dev/transaction', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          'Authorization': `Bearer ${this.token}`
+          'Authorization': `Bearer ${this.token}`,
+          'Idempotency-Key': this.pendingSubmission.key
         },
-        body: JSON.stringify({
-          amount: amount,
-          merchant: this.transaction.merchant.trim(),
-          currency: this.transaction.currency
-        })
+        body: payload
       });
       
       const responseText = await response.text();
       console.log('Raw response:', responseText);
       
+      // A 409 (still processing) or 5xx can be retried with the same key; anything else is final
+      if (response.status !== 409 && response.status < 500) {
+        this.pendingSubmission = null;
+      }
+      
       if (!response.ok) {
         let errorMessage = `Server error (${response.status})`;
         try {
@@ -250,10 +399,12 @@ export class DashboardComponent implements OnInit {
         this.liveRiskScore = 0;
         this.liveRiskStatus = 'approved';
         
-        // Sync with database after a short delay
-        setTimeout(() => {
-          this.fetchTransactions();
-        }, 1000);
+        // Sync with database after a short delay, unless the change feed delivers the stored row
+        if (!this.feedConnected) {
+          setTimeout(() => {
+            this.fetchTransactions();
+          }, 1000);
+        }
         
       } else {
         throw new Error('Invalid response from server');
@@ -302,6 +453,12 @@ export class DashboardComponent implements OnInit {
   }
   
   getTotalVolumeInSelectedCurrency(): number {
+    if (this.analyticsRollups) {
+      const currencies = this.analyticsRollups.summary.currencies;
+      return Object.keys(currencies).reduce((total, code) => {
+        return total + this.convertToSelectedCurrency(currencies[code].volume, code);
+      }, 0);
+    }
     return this.transactions.reduce((total, t) => {
       return total + this.convertToSelectedCurrency(t.amount, t.currency);
     }, 0);
@@ -568,47 +725,96 @@ export class DashboardComponent implements OnInit {
   
   async submitBulkTransactions() {
     this.loading = true;
-    const results = [];
+    const pending = this.bulkTransactions.filter(t => t.amount && t.merchant);
+    let processed = 0;
     
-    for (const transaction of this.bulkTransactions) {
-      if (transaction.amount && transaction.merchant) {
-        try {
-          const response = await fetch('https://lpf1gn8aia.execute-api.us-east-1.amazonaws.com/dev/transaction', {
-            method: 'POST',
-            headers: {
-              'Content-Type': 'application/json',
-              'Authorization': `Bearer ${this.token}`
-            },
-            body: JSON.stringify(transaction)
-          });
-          
-          if (response.ok) {
-            const data = await response.json();
-            results.push(data);
-            
-            // Add to transactions array immediately
-            const newTransaction = {
-              transaction_id: data.transaction_id,
-              amount: parseFloat(transaction.amount),
-              merchant: transaction.merchant,
-              currency: transaction.currency,
-              risk_score: data.risk_score,
-              status: data.status,
-              timestamp: new Date().toISOString()
-            };
-            this.transactions = [newTransaction, ...this.transactions];
-            this.updatePreferences(transaction);
+    try {
+      // Submit the whole list in one request; the backend validates, scores and stores it in bulk
+      const response = await fetch('https://lpf1gn8aia.execute-api.us-east-1.amazonaws.com/dev/transactions/batch', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${this.token}`
+        },
+        body: JSON.stringify({ transactions: pending })
+      });
+      
+      if (response.ok) {
+        const data = await response.json();
+        const timestamp = new Date().toISOString();
+        const newTransactions: Transaction[] = [];
+        
+        for (const result of data.results || []) {
+          if (!result.transaction_id) {
+            console.error('Bulk transaction rejected:', result.index, result.error);
+            continue;
           }
-        } catch (error) {
-          console.error('Bulk transaction error:', error);
+          const transaction = pending[result.index];
+          newTransactions.push({
+            transaction_id: result.transaction_id,
+            amount: parseFloat(transaction.amount),
+            merchant: transaction.merchant,
+            currency: transaction.currency,
+            risk_score: result.risk_score,
+            status: result.status,
+            timestamp: timestamp
+          });
+          this.updatePreferences(transaction);
         }
+        
+        // Add to transactions array immediately
+        this.transactions = [...newTransactions.reverse(), ...this.transactions];
+        processed = data.processed || newTransactions.length;
+      } else {
+        console.error('Bulk transaction error:', response.status, await response.text());
       }
+    } catch (error) {
+      console.error('Bulk transaction error:', error);
     }
     
     this.loading = false;
     this.showBulkEntry = false;
     this.bulkTransactions = [{ amount: '', merchant: '', currency: this.userPreferences.defaultCurrency }];
-    this.result = { message: `${results.length} transactions processed successfully` };
+    this.result = { message: `${processed} transactions processed successfully` };
+  }
+  
+  // Transaction Export
+  async exportTransactions() {
+    if (!this.token) return;
+    
+    let cursor: string | null = null;
+    let rows = 0;
+    try {
+      // The backend writes the file to S3; a long history comes back as several files, one per request
+      do {
+        const response: Response = await fetch('https://lpf1gn8aia.execute-api.us-east-1.amazonaws.com/dev/transactions/export', {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+            'Authorization': `Bearer ${this.token}`
+          },
+          body: JSON.stringify({ format: 'csv', status: 'flagged', ...(cursor ? { cursor } : {}) })
+        });
+        if (!response.ok) {
+          console.error('Export error:', response.status, await response.text());
+          break;
+        }
+        const data = await response.json();
+        rows += data.rows;
+        if (data.rows > 0) {
+          const a = document.createElement('a');
+          a.href = data.url;
+          a.click();
+        }
+        cursor = data.complete ? null : data.next_cursor;
+      } while (cursor);
+    } catch (error) {
+      console.error('Export error:', error);
+    }
+    
+    if (rows === 0) {
+      alert('No flagged transactions to export');
+    }
   }
   
   // Transaction Cloning
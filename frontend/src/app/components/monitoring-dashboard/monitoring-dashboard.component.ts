@@ -3,6 +3,7 @@ import { CommonModule } from '@angular/common';
 import { BaseChartDirective } from 'ng2-charts';
 import { Chart, ChartConfiguration, ChartData, ChartType, registerables } from 'chart.js';
 import { formatCurrency } from '../../utils/currency';
+import { AnalyticsRollups } from '../../utils/analytics';
 
 Chart.register(...registerables);
 
@@ -32,6 +33,7 @@ interface Metrics {
 })
 export class MonitoringDashboardComponent implements OnInit, OnChanges {
   @Input() transactions: Transaction[] = [];
+  @Input() rollups: AnalyticsRollups | null = null;
   @Input() selectedCurrency: string = 'USD';
   @Input() totalVolumeInSelectedCurrency: number = 0;
 
@@ -78,12 +80,15 @@ export class MonitoringDashboardComponent implements OnInit, OnChanges {
   }
 
   updateMetrics() {
-    const total = this.transactions.length;
+    const bands = this.riskBands();
+    const total = this.rollups ? this.rollups.summary.count : this.transactions.length;
     const volume = this.totalVolumeInSelectedCurrency || this.transactions.reduce((sum, t) => sum + parseFloat(t.amount?.toString() || '0'), 0);
-    const avgRisk = this.transactions.length > 0 
-      ? this.transactions.reduce((sum, t) => sum + (t.risk_score || 0), 0) / this.transactions.length 
-      : 0;
-    const highRisk = this.transactions.filter(t => (t.risk_score || 0) > 70).length;
+    const avgRisk = this.rollups
+      ? this.rollups.summary.avg_risk
+      : this.transactions.length > 0
+        ? this.transactions.reduce((sum, t) => sum + (t.risk_score || 0), 0) / this.transactions.length
+        : 0;
+    const highRisk = bands.high;
 
     this.metrics = {
       totalTransactions: total,
@@ -94,6 +99,8 @@ export class MonitoringDashboardComponent implements OnInit, OnChanges {
   }
 
   updateCharts() {
+    const bands = this.riskBands();
+
     // Volume chart
     this.volumeChartData = {
       labels: this.transactions.map((t, i) => `Transaction ${i + 1}`),
@@ -127,11 +134,7 @@ export class MonitoringDashboardComponent implements OnInit, OnChanges {
       labels: ['Low Risk', 'Medium Risk', 'High Risk'],
       datasets: [
         {
-          data: [
-            this.transactions.filter(t => (t.risk_score || 0) < 30).length,
-            this.transactions.filter(t => (t.risk_score || 0) >= 30 && (t.risk_score || 0) <= 70).length,
-            this.transactions.filter(t => (t.risk_score || 0) > 70).length
-          ],
+          data: [bands.low, bands.medium, bands.high],
           backgroundColor: ['#4CAF50', '#FF9800', '#F44336'],
           borderWidth: 2
         }
@@ -139,6 +142,21 @@ export class MonitoringDashboardComponent implements OnInit, OnChanges {
     };
   }
 
+  // Risk band counts from the server rollups, or one pass over the loaded page
+  riskBands(): { low: number; medium: number; high: number } {
+    if (this.rollups) {
+      return this.rollups.summary.risk_bands;
+    }
+    const bands = { low: 0, medium: 0, high: 0 };
+    this.transactions.forEach(t => {
+      const risk = t.risk_score || 0;
+      if (risk > 70) bands.high++;
+      else if (risk >= 30) bands.medium++;
+      else bands.low++;
+    });
+    return bands;
+  }
+
   formatCurrency(amount: number, currency: string): string {
     return formatCurrency(amount, currency);
   }
@@ -22,8 +22,12 @@ interface Transaction {
 })
 export class TransactionHistoryComponent {
   @Input() transactions: Transaction[] = [];
+  @Input() hasMore = false;
+  @Input() loadingMore = false;
+  @Output() loadMore = new EventEmitter<void>();
   @Output() delete = new EventEmitter<string>();
   @Output() clone = new EventEmitter<Transaction>();
+  @Output() exportCsv = new EventEmitter<void>();
   
   searchTerm = '';
   filterStatus = 'all';
@@ -32,7 +36,7 @@ export class TransactionHistoryComponent {
   sortOrder = 'desc';
 
   get flaggedCount(): number {
-    return this.filteredTransactions.filter(t => (t.risk_score || 0) > 70).length;
+    return this.filteredTransactions.filter(t => t.status === 'flagged').length;
   }
   
   get filteredTransactions(): Transaction[] {
@@ -94,41 +98,12 @@ export class TransactionHistoryComponent {
   }
 
   exportToCSV() {
-    const flaggedTransactions = this.transactions.filter(t => (t.risk_score || 0) > 70);
-    if (flaggedTransactions.length === 0) {
-      alert('No flagged transactions to export');
-      return;
-    }
-    
-    const headers = ['Transaction ID', 'Date', 'Time', 'Amount', 'Currency', 'Merchant', 'Risk Score', 'Status'];
-    const csvContent = [
-      headers.join(','),
-      ...flaggedTransactions.map(t => {
-        const date = t.timestamp ? new Date(t.timestamp) : null;
-        return [
-          t.transaction_id,
-          date ? date.toLocaleDateString() : 'N/A',
-          date ? date.toLocaleTimeString() : 'N/A',
-          t.amount,
-          t.currency,
-          `"${t.merchant}"`,
-          t.risk_score,
-          t.status
-        ].join(',');
-      })
-    ].join('\n');
-    
-    const blob = new Blob([csvContent], { type: 'text/csv' });
-    const url = window.URL.createObjectURL(blob);
-    const a = document.createElement('a');
-    a.href = url;
-    a.download = `flagged-transactions-${new Date().toISOString().split('T')[0]}.csv`;
-    a.click();
-    window.URL.revokeObjectURL(url);
+    // The dashboard asks the backend to export the whole flagged history, not just the loaded pages
+    this.exportCsv.emit();
   }
 
   exportToPDF() {
-    const flaggedTransactions = this.transactions.filter(t => (t.risk_score || 0) > 70);
+    const flaggedTransactions = this.transactions.filter(t => t.status === 'flagged');
     if (flaggedTransactions.length === 0) {
       alert('No flagged transactions to export');
       return;
@@ -193,6 +168,10 @@ export class TransactionHistoryComponent {
     return getCurrencySymbol(currency);
   }
 
+  onLoadMore() {
+    this.loadMore.emit();
+  }
+
   onDelete(transactionId: string) {
     this.delete.emit(transactionId);
   }
@@ -0,0 +1,23 @@
+// Shape of the GET /analytics response (server-side rollups, UTC buckets)
+// summary and merchants cover all time; window, daily, hourly and weekday cover the last `days` days
+export interface AnalyticsRollups {
+  days: number;
+  scope: { [field: string]: 'all_time' | 'window' };
+  window: { from: string; to: string; count: number; amount_sum: number; avg_risk: number; flagged: number };
+  summary: {
+    count: number;
+    amount_sum: number;
+    avg_risk: number;
+    flagged: number;
+    risk_bands: { low: number; medium: number; high: number };
+    currencies: { [code: string]: { count: number; volume: number } };
+  };
+  daily: { date: string; count: number; amount: number; avg_risk: number; flagged: number }[];
+  hourly: { hour: number; count: number; amount: number }[];
+  weekday: { day: string; count: number; amount: number }[];
+  merchants: { merchant: string; count: number; amount: number; avg_risk: number; flagged: number }[];
+}
+
+export function riskLevel(avgRisk: number): string {
+  return avgRisk > 70 ? 'High' : avgRisk > 30 ? 'Medium' : 'Low';
+}
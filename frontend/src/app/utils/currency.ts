@@ -12,7 +12,9 @@ export const CURRENCY_SYMBOLS: { [key: string]: string } = {
   'CAD': 'C$'
 };
 
-// Exchange rates to USD (updated regularly)
+const FX_RATES_URL = 'https://lpf1gn8aia.execute-api.us-east-1.amazonaws.com/dev/fx-rates';
+
+// Units of each currency per USD; replaced in place by loadExchangeRates()
 export const EXCHANGE_RATES: { [key: string]: number } = {
   'USD': 1.0,
   'EUR': 0.92,
@@ -26,6 +28,26 @@ export const EXCHANGE_RATES: { [key: string]: number } = {
   'CAD': 1.36
 };
 
+let ratesRequest: Promise<void> | null = null;
+
+// Fetch the backend's rate table once per page load so conversions match risk scoring
+export const loadExchangeRates = (): Promise<void> => {
+  if (!ratesRequest) {
+    ratesRequest = fetch(FX_RATES_URL)
+      .then(response => response.ok ? response.json() : Promise.reject(response.status))
+      .then(data => {
+        if (data && data.rates) {
+          Object.assign(EXCHANGE_RATES, data.rates);
+        }
+      })
+      .catch(error => {
+        console.warn('Using built-in exchange rates:', error);
+        ratesRequest = null;
+      });
+  }
+  return ratesRequest;
+};
+
 export const getCurrencySymbol = (currency: string): string => {
   return CURRENCY_SYMBOLS[currency] || currency;
 };